@@ -12,51 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Benchmark for Detection Engine Python API."""
+"""Benchmark for Detection Engine Python API.
 
-import time
-import timeit
+See edgetpu.benchmark.runner (edgetpu_benchmark) for more options.
+"""
 
-from edgetpu.detection.engine import DetectionEngine
-from PIL import Image
 import test_utils
 
 
-def _RunBenchmarkForModel(model_name, image):
-  """Benchmarks model with given image.
-
-  Args:
-    model_name: string, file name of the model.
-    image: string, name of the image used for test.
-
-  Returns:
-    float, average inference time.
-  """
-  print('Benchmark for [', model_name, '] on ', image)
-  engine = DetectionEngine(test_utils.TestDataPath(model_name))
-  iterations = 200 if ('edgetpu' in model_name) else 10
-
-  with Image.open(test_utils.TestDataPath(image)) as img_obj:
-    benchmark_time = timeit.timeit(
-        lambda: engine.DetectWithImage(img_obj, threshold=0.4, top_k=10),
-        number=iterations)
-
-  time_per_inference = (benchmark_time / iterations) * 1000
-  return time_per_inference
-
 if __name__ == '__main__':
-  args = test_utils.ParseArgs()
-  images_for_tests = ['cat.bmp', 'cat_720p.jpg', 'cat_1080p.jpg']
-  machine = test_utils.MachineInfo()
-  test_utils.CheckCpuScalingGovernorStatus()
-  model_list, reference = test_utils.ReadReference(
-      'detection_reference_%s.csv' % machine)
-  total_models = len(model_list)
-  results = [('MODEL', 'IMAGE_NAME', 'INFERENCE_TIME')]
-  for cnt, model in enumerate(model_list, start=1):
-    print('-------------- Model ', cnt, '/', total_models, ' ---------------')
-    for img in images_for_tests:
-      results.append((model, img, _RunBenchmarkForModel(model, img)))
-  test_utils.SaveAsCsv('detection_benchmarks_%s_%s.csv' %
-                       (machine, time.strftime('%Y%m%d-%H%M%S')), results)
-  test_utils.CheckResult(reference, results, args.enable_assertion)
+  test_utils.RunReferenceBenchmarks(
+      'detection', 'detection', ['cat.bmp', 'cat_720p.jpg', 'cat_1080p.jpg'],
+      10)
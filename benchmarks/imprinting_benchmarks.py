@@ -80,6 +80,7 @@ def _BenchmarkForTraining(extractor, data_set):
 if __name__ == '__main__':
   args = test_utils.ParseArgs()
   machine = test_utils.MachineInfo()
+  test_utils.PrintRuntimeFlavor()
   extractors, reference = test_utils.ReadReference(
       'imprinting_reference_%s.csv' % machine)
   extractor_num = len(extractors)
@@ -89,6 +90,8 @@ if __name__ == '__main__':
     data = 'open_image_v4_subset'
     print('---------------- ', cnt, '/', extractor_num, ' ----------------')
     results.append((name, data, _BenchmarkForTraining(name, data)))
-  test_utils.SaveAsCsv('imprinting_benchmarks_%s_%s.csv' %
-                       (machine, time.strftime('%Y%m%d-%H%M%S')), results)
+  test_utils.SaveAsCsv(
+      args.result_file or 'imprinting_benchmarks_%s_%s.csv' % (
+          machine, time.strftime('%Y%m%d-%H%M%S')),
+      results)
   test_utils.CheckResult(reference, results, args.enable_assertion)
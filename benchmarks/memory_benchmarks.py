@@ -0,0 +1,96 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memory benchmark of the Edge TPU models of the latency references.
+
+Measures RSS of each engine, tracemalloc allocation per call and RSS growth
+over 100k calls of RunInference, ClassifyWithImage and DetectWithImage, and
+over 1k calls of TrainAll (which creates an engine per call). Results are
+checked against 'memory_reference_[machine].csv' next to the latency
+references when it exists; a result file can be copied there to become the
+reference. Leaks are reported in any case.
+
+See edgetpu.benchmark.memory (edgetpu_memory_benchmark) for more options.
+"""
+
+import os
+import time
+
+from edgetpu.benchmark import memory
+import test_utils
+
+_IMAGE = 'cat.bmp'
+_ITERATIONS = 100000
+_TRAIN_ALL_ITERATIONS = 1000
+
+
+def _EdgeTpuModels(name, machine, *subdirs):
+  model_list, _ = test_utils.ReadReference(
+      '%s_reference_%s.csv' % (name, machine))
+  return [test_utils.TestDataPath(*(subdirs + (m,))) for m in model_list
+          if 'edgetpu' in m]
+
+
+def main():
+  args = test_utils.ParseArgs()
+  machine = test_utils.MachineInfo()
+  test_utils.PrintRuntimeFlavor()
+  workloads = [
+      (memory.RUN_INFERENCE, _EdgeTpuModels('basic_engine', machine)),
+      (memory.CLASSIFY_WITH_IMAGE, _EdgeTpuModels('classification', machine)),
+      (memory.DETECT_WITH_IMAGE, _EdgeTpuModels('detection', machine)),
+      (memory.TRAIN_ALL, _EdgeTpuModels('imprinting', machine, 'imprinting')),
+  ]
+  footprints = memory.EngineFootprint(workloads[0][1])
+  records = []
+  for api, models in workloads:
+    iterations = (_TRAIN_ALL_ITERATIONS if api == memory.TRAIN_ALL else
+                  _ITERATIONS)
+    for cnt, model in enumerate(models, start=1):
+      print('-------------- %s %d / %d ---------------' % (api, cnt,
+                                                           len(models)))
+      record = memory.RunMemoryBenchmark(
+          model, api, test_utils.TestDataPath(_IMAGE), iterations)
+      records.append(record)
+      if 'error' in record:
+        print(' * Failed: ', record['error'])
+        continue
+      print('%s: %d bytes per call (peak), RSS slope %s bytes per call' % (
+          record['model'], record['peak_bytes']['mean'],
+          record['leak_check'].get('rss_slope', '-')))
+  rows = memory.ResultRows(footprints, records)
+  result_file = args.result_file or 'memory_benchmarks_%s_%s.csv' % (
+      machine, time.strftime('%Y%m%d-%H%M%S'))
+  test_utils.SaveAsCsv(result_file, rows)
+  test_utils.SaveAsJsonLines(os.path.splitext(result_file)[0] + '.jsonl',
+                             footprints + records)
+
+  reference_file = test_utils.ReferencePath('memory_reference_%s.csv' %
+                                            machine)
+  reference = {}
+  if os.path.exists(reference_file):
+    reference = memory.ReadReference(reference_file)
+  else:
+    print(' * No memory reference for %s, only leaks are checked.' % machine)
+  print('******************** Check results *********************')
+  messages = memory.CompareWithReference(rows, reference)
+  for msg in messages:
+    print(' * ' + msg)
+  print('******************** Check finished! *******************')
+  if args.enable_assertion:
+    assert not messages, 'Benchmark test failed!'
+
+
+if __name__ == '__main__':
+  main()
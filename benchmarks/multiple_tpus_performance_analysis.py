@@ -15,22 +15,43 @@
 """Script to analyze performance speedup when using multiple Edge TPUs.
 
 Basically, this script times how long it costs to run certain amount of
-inferences, `num_inferences`, with 1, 2, ..., (max # Edge TPU) Edge TPU.
+inferences, `num_inferences`, with 1, 2, ..., (max # Edge TPU) Edge TPU, using
+one engine per Edge TPU. Each device count is run in three layouts:
 
-It then reports the speedup one can get by using multiple Edge TPU
-devices. Speedup is defined as:
-    k_tpu_speedup = 1_tpu_time / k_tpu_time
+  threads: one process, one Python thread per Edge TPU.
+  processes: one process per Edge TPU.
+  hybrid: processes of `threads_per_process` threads each.
+
+Comparing the layouts separates the speedup lost to the GIL, which is held
+during pre/post-processing in Python, from the one lost to device or USB
+contention: only the former is recovered by processes. The weight of
+post-processing is varied by running detection models with top_k=1 and with
+top_k=100 (threshold 0, so every candidate is converted in Python).
+
+For each run it reports throughput, speedup and efficiency, defined as:
+    k_tpu_speedup = k_tpu_throughput / 1_tpu_throughput
+    k_tpu_efficiency = k_tpu_speedup / k
+and the CPU time of the workers during the run, as number of busy cores and
+as fraction of all host cores. A layout bound by the GIL shows about one busy
+core however many Edge TPUs it uses.
 
 Note:
 *) This is timing a particular usage pattern, and real use case might vary a
    lot. But it gives a rough idea about the speedup.
-*) Python interpreter has GIL, so code cannot take advantage of multiple cores
-   of host CPU. And if the task is CPU bounded, it is not advised to use
-   multiple threads inside python interpreter.
-*) This script can be quite time-consuming. Adjust `num_inferences` accordingly.
+*) Workers are always separate processes (the threads layout uses one), they
+   are started and load their models before timing starts.
+*) This script can be quite time-consuming. Adjust `--num_inferences`
+   accordingly.
+*) This is a closed-loop measurement, it doesn't show queueing delay. To see
+   tail latency versus offered load (e.g. to size the number of Edge TPUs for
+   a p99 latency objective), use edgetpu/benchmark/load_generator.py.
 """
 
+import argparse
+import collections
 import logging
+import multiprocessing
+import os
 import threading
 import time
 
@@ -41,119 +62,301 @@ import numpy as np
 from PIL import Image
 import test_utils
 
+THREADS = 'threads'
+PROCESSES = 'processes'
+HYBRID = 'hybrid'
+MODES = (THREADS, PROCESSES, HYBRID)
+
+# (model name, top_k) of the default workloads.
+_WORKLOADS = (
+    ('mobilenet_v1_1.0_224_quant_edgetpu.tflite', 1),
+    ('mobilenet_v2_1.0_224_quant_edgetpu.tflite', 1),
+    ('mobilenet_ssd_v1_coco_quant_postprocess_edgetpu.tflite', 1),
+    ('mobilenet_ssd_v1_coco_quant_postprocess_edgetpu.tflite', 100),
+    ('mobilenet_ssd_v2_coco_quant_postprocess_edgetpu.tflite', 1),
+    ('mobilenet_ssd_v2_coco_quant_postprocess_edgetpu.tflite', 100),
+    ('inception_v1_224_quant_edgetpu.tflite', 1),
+    ('inception_v2_224_quant_edgetpu.tflite', 1),
+    ('inception_v3_299_quant_edgetpu.tflite', 1),
+    ('inception_v4_299_quant_edgetpu.tflite', 1),
+)
+
+JobResult = collections.namedtuple(
+    'JobResult', ['wall_time', 'cpu_time', 'num_inferences', 'num_processes',
+                  'threads_per_process'])
 
-def run_inference_job(model_name,
-                      input_filename,
-                      num_inferences,
-                      num_threads,
-                      task_type,
-                      check_result=None):
-  """Runs classification or detection job with `num_threads`.
+
+def task_type_of(model_name):
+  """Returns `classification` or `detection` for the model."""
+  return 'detection' if 'ssd' in model_name else 'classification'
+
+
+def layout(mode, device_paths, threads_per_process=2):
+  """Splits Edge TPUs among worker processes.
 
   Args:
-    model_name: string
-    input_filename: string
-    num_inferences: int
-    num_threads: int
-    task_type: string, `classification` or `detection`
-    check_result: callback function to check the result.
+    mode: string, one of MODES.
+    device_paths: list of string, Edge TPUs to use.
+    threads_per_process: int, number of threads per process in hybrid mode.
 
   Returns:
-    double, wall time (in seconds) for running the job.
+    list of list of device paths, one list per process, one thread per path.
   """
+  if mode == THREADS:
+    return [list(device_paths)]
+  size = 1 if mode == PROCESSES else threads_per_process
+  return [list(device_paths[i:i + size])
+          for i in range(0, len(device_paths), size)]
+
 
-  def thread_job(model_name,
-                 input_filename,
-                 num_inferences,
-                 task_type,
-                 check_result=None):
-    """Runs classification or detection job on one Python thread."""
-    tid = threading.get_ident()
-    logging.info('Thread: %d, # inferences: %d, model: %s', tid, num_inferences,
-                 model_name)
+def _thread_job(device_path, model_name, input_filename, num_inferences,
+                task_type, top_k, barrier, failures):
+  """Runs classification or detection on one Edge TPU, after the barrier.
+
+  Failed inferences add device_path to the failures list.
+  """
+  tid = threading.get_ident()
+  ready = False
+  try:
     if task_type == 'classification':
-      task_engine = ClassificationEngine
-      inference_func = ClassificationEngine.ClassifyWithInputTensor
+      engine = ClassificationEngine(test_utils.TestDataPath(model_name),
+                                    device_path)
+      inference_func = engine.ClassifyWithInputTensor
+      kwargs = {'top_k': top_k}
     else:
       assert task_type == 'detection'
-      task_engine = DetectionEngine
-      inference_func = DetectionEngine.DetectWithInputTensor
-
-    engine = task_engine(test_utils.TestDataPath(model_name))
-    logging.info('Thread: %d, using device %s', tid, engine.device_path())
+      engine = DetectionEngine(test_utils.TestDataPath(model_name),
+                               device_path)
+      inference_func = engine.DetectWithInputTensor
+      kwargs = {'top_k': top_k, 'threshold': 0.0}
     with test_utils.TestImage(input_filename) as img:
       _, height, width, _ = engine.get_input_tensor_shape()
-      resized_img = np.asarray(img.resize((width, height),
-                                          Image.NEAREST)).flatten()
-      for _ in range(num_inferences):
-        result = inference_func(engine, resized_img, top_k=1)
+      input_tensor = np.asarray(img.resize((width, height),
+                                           Image.NEAREST)).flatten()
+    ready = True
+  finally:
+    # Any failure, KeyboardInterrupt included, releases the other threads.
+    if not ready:
+      barrier.abort()
+  logging.info('Process: %d, thread: %d, # inferences: %d, model: %s, '
+               'device: %s', os.getpid(), tid, num_inferences, model_name,
+               device_path)
+  barrier.wait()
+  try:
+    for _ in range(num_inferences):
+      inference_func(input_tensor, **kwargs)
+  except Exception:  # pylint: disable=broad-except
+    logging.exception('Thread: %d, model: %s failed on %s', tid, model_name,
+                      device_path)
+    failures.append(device_path)
+    return
+  logging.info('Thread: %d, model: %s done', tid, model_name)
 
-    # Check result once.
-    if check_result:
-      check_result(result)
-    assert len(result) == 1
-    logging.info('Thread: %d, model: %s done', tid, model_name)
 
-  start_time = time.perf_counter()
+def _process_job(device_paths, model_name, input_filename, num_inferences,
+                 task_type, top_k, barrier, cpu_times):
+  """Runs one thread per Edge TPU and reports CPU time of the process.
+
+  None is reported instead when a thread failed.
+  """
+  failures = []
+  workers = [
+      threading.Thread(
+          target=_thread_job,
+          args=(device_path, model_name, input_filename, num_inferences,
+                task_type, top_k, barrier, failures))
+      for device_path in device_paths
+  ]
+  for worker in workers:
+    worker.start()
+  try:
+    barrier.wait()
+  except threading.BrokenBarrierError:
+    for worker in workers:
+      worker.join()
+    cpu_times.put(None)
+    return
+  start_cpu = time.process_time()
+  for worker in workers:
+    worker.join()
+  cpu_times.put(None if failures else time.process_time() - start_cpu)
+
+
+def run_inference_job(model_name,
+                      input_filename,
+                      num_inferences,
+                      device_paths,
+                      mode=THREADS,
+                      top_k=1,
+                      threads_per_process=2):
+  """Runs classification or detection job with one engine per Edge TPU.
+
+  Args:
+    model_name: string
+    input_filename: string
+    num_inferences: int, total number of inferences, rounded up to a multiple
+      of the number of Edge TPUs.
+    device_paths: list of string, Edge TPUs to use.
+    mode: string, one of MODES.
+    top_k: int, number of results kept by each inference.
+    threads_per_process: int, number of threads per process in hybrid mode.
+
+  Returns:
+    JobResult, wall time and CPU time (in seconds) of the workers.
+
+  Raises:
+    ValueError: when device_paths is empty.
+    RuntimeError: when a worker failed to start or an inference failed.
+  """
+  if not device_paths:
+    raise ValueError('At least one Edge TPU is required!')
+  groups = layout(mode, device_paths, threads_per_process)
+  num_threads = len(device_paths)
   # Round up a bit if not divisible.
   num_inferences_per_thread = (num_inferences + num_threads - 1) // num_threads
-  workers = []
-  for _ in range(num_threads):
-    workers.append(
-        threading.Thread(
-            target=thread_job,
-            args=(model_name, input_filename, num_inferences_per_thread,
-                  task_type, check_result)))
-
+  # Processes are spawned, not forked, so each one opens Edge TPUs afresh.
+  context = multiprocessing.get_context('spawn')
+  barrier = context.Barrier(num_threads + len(groups) + 1)
+  cpu_times = context.Queue()
+  workers = [
+      context.Process(
+          target=_process_job,
+          args=(group, model_name, input_filename, num_inferences_per_thread,
+                task_type_of(model_name), top_k, barrier, cpu_times))
+      for group in groups
+  ]
   for worker in workers:
     worker.start()
+  try:
+    barrier.wait()
+  except threading.BrokenBarrierError:
+    for worker in workers:
+      worker.join()
+    raise RuntimeError('Failed to start workers of %s on %s!' %
+                       (model_name, device_paths))
+  start_time = time.perf_counter()
+  process_cpu_times = [cpu_times.get() for _ in workers]
+  wall_time = time.perf_counter() - start_time
   for worker in workers:
     worker.join()
-  return time.perf_counter() - start_time
+  # Throughput of a run where some inferences failed is meaningless.
+  if None in process_cpu_times:
+    raise RuntimeError('Inference of %s failed on %s, see the log!' %
+                       (model_name, device_paths))
+  cpu_time = sum(process_cpu_times)
+  return JobResult(wall_time, cpu_time, num_inferences_per_thread * num_threads,
+                   len(groups), max(len(group) for group in groups))
+
+
+def scaling_rows(model_name, top_k, results, num_cpus):
+  """Computes rows of the summary table for one workload.
+
+  Args:
+    model_name: string
+    top_k: int
+    results: {(mode, num_tpus) : JobResult}, must include a single Edge TPU
+      run of some mode as baseline.
+    num_cpus: int, number of host cores.
+
+  Returns:
+    list of tuple, one per run, in the column order of main().
+  """
+  base = next(r for (_, n), r in sorted(results.items()) if n == 1)
+  base_fps = base.num_inferences / base.wall_time
+  rows = []
+  for mode in MODES:
+    for (run_mode, num_tpus), r in sorted(results.items(),
+                                          key=lambda item: item[0][1]):
+      if run_mode != mode:
+        continue
+      fps = r.num_inferences / r.wall_time
+      speedup = fps / base_fps
+      busy_cores = r.cpu_time / r.wall_time
+      rows.append((model_name, task_type_of(model_name), top_k, mode, num_tpus,
+                   r.num_processes, r.threads_per_process,
+                   '%.3f' % r.wall_time, '%.1f' % fps, '%.2f' % speedup,
+                   '%.2f' % (speedup / num_tpus), '%.2f' % busy_cores,
+                   '%.1f%%' % (100.0 * busy_cores / num_cpus)))
+  return rows
+
+
+def _print_table(rows):
+  widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+  for row in rows:
+    print('  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
 
 
 def main():
-  num_inferences = 30000
-  input_filename = 'cat.bmp'
-  num_tpus = len(
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--num_inferences', type=int, default=30000,
+                      help='Total number of inferences of each run.')
+  parser.add_argument('--modes', nargs='+', default=list(MODES),
+                      choices=MODES, help='Layouts of workers to compare.')
+  parser.add_argument('--models', nargs='+', default=None,
+                      help='Models to run, default runs all reference models '
+                      '(detection ones with top_k 1 and 100).')
+  parser.add_argument('--top_k', type=int, nargs='+', default=[1, 100],
+                      help='top_k values of detection models given by '
+                      '--models.')
+  parser.add_argument('--threads_per_process', type=int, default=2,
+                      help='Number of threads per process in hybrid mode.')
+  parser.add_argument('--input', default='cat.bmp', help='Test image.')
+  args = parser.parse_args()
+
+  device_paths = list(
       edgetpu_utils.ListEdgeTpuPaths(edgetpu_utils.EDGE_TPU_STATE_NONE))
-  model_names = [
-      'mobilenet_v1_1.0_224_quant_edgetpu.tflite',
-      'mobilenet_v2_1.0_224_quant_edgetpu.tflite',
-      'mobilenet_ssd_v1_coco_quant_postprocess_edgetpu.tflite',
-      'mobilenet_ssd_v2_coco_quant_postprocess_edgetpu.tflite',
-      'inception_v1_224_quant_edgetpu.tflite',
-      'inception_v2_224_quant_edgetpu.tflite',
-      'inception_v3_299_quant_edgetpu.tflite',
-      'inception_v4_299_quant_edgetpu.tflite',
-  ]
+  num_tpus = len(device_paths)
+  if not num_tpus:
+    raise RuntimeError('No Edge TPU detected!')
+  num_cpus = os.cpu_count() or 1
+  if args.models:
+    workloads = []
+    for model_name in args.models:
+      if task_type_of(model_name) == 'detection':
+        workloads.extend((model_name, top_k) for top_k in args.top_k)
+      else:
+        workloads.append((model_name, 1))
+  else:
+    workloads = _WORKLOADS
 
-  def show_speedup(inference_costs):
-    logging.info('Single Edge TPU base time: %f seconds', inference_costs[0])
-    for i in range(1, len(inference_costs)):
-      logging.info('# TPUs: %d, speedup: %f', i + 1,
-                   inference_costs[0] / inference_costs[i])
-
-  inference_costs_map = {}
-  for model_name in model_names:
-    task_type = 'classification'
-    if 'ssd' in model_name:
-      task_type = 'detection'
-    inference_costs_map[model_name] = [0.0] * num_tpus
-    for num_threads in range(num_tpus, 0, -1):
-      cost = run_inference_job(model_name, input_filename, num_inferences,
-                               num_threads, task_type)
-      inference_costs_map[model_name][num_threads - 1] = cost
-      logging.info('model: %s, # threads: %d, cost: %f seconds', model_name,
-                   num_threads, cost)
-    show_speedup(inference_costs_map[model_name])
+  rows = [('MODEL', 'TASK', 'TOP_K', 'MODE', 'NUM_TPUS', 'PROCESSES',
+           'THREADS_PER_PROCESS', 'WALL_TIME', 'FPS', 'SPEEDUP', 'EFFICIENCY',
+           'BUSY_CORES', 'CPU_UTILIZATION')]
+  curves = collections.OrderedDict()
+  for model_name, top_k in workloads:
+    results = {}
+    # All layouts are the same with one Edge TPU, so it's run once.
+    results[(THREADS, 1)] = run_inference_job(
+        model_name, args.input, args.num_inferences, device_paths[:1],
+        THREADS, top_k)
+    for mode in args.modes:
+      for num_devices in range(2, num_tpus + 1):
+        r = run_inference_job(model_name, args.input, args.num_inferences,
+                              device_paths[:num_devices], mode, top_k,
+                              args.threads_per_process)
+        results[(mode, num_devices)] = r
+        logging.info('model: %s, top_k: %d, mode: %s, # TPUs: %d, cost: %f '
+                     'seconds, CPU: %f seconds', model_name, top_k, mode,
+                     num_devices, r.wall_time, r.cpu_time)
+    for mode in args.modes:
+      results.setdefault((mode, 1), results[(THREADS, 1)])
+    workload_rows = scaling_rows(model_name, top_k, results, num_cpus)
+    rows.extend(workload_rows)
+    curves[(model_name, top_k)] = workload_rows
 
   logging.info('============Summary==========')
-  for model_name in model_names:
-    inference_costs = inference_costs_map[model_name]
+  for (model_name, top_k), workload_rows in curves.items():
     logging.info('---------------------------')
-    logging.info('Model: %s', model_name)
-    show_speedup(inference_costs)
+    logging.info('Model: %s, top_k: %d', model_name, top_k)
+    for mode in args.modes:
+      logging.info('%s speedup: %s', mode, ', '.join(
+          '%d TPU %s' % (row[4], row[9]) for row in workload_rows
+          if row[3] == mode))
+  _print_table(rows)
+  test_utils.SaveAsCsv(
+      'multiple_tpus_scaling_%s_%s.csv' % (test_utils.MachineInfo(),
+                                           time.strftime('%Y%m%d-%H%M%S')),
+      rows)
 
 
 if __name__ == '__main__':
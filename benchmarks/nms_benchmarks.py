@@ -0,0 +1,112 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of edgetpu.utils.nms at 1k and 10k boxes.
+
+Boxes are either clustered, i.e. jittered copies of a few objects as when
+merging detections of tiles or models, or uniformly spread with little
+overlap, the worst case of greedy suppression. A pure Python greedy NMS is
+timed at 1k boxes as baseline.
+"""
+
+import time
+
+from edgetpu.utils import nms
+import numpy as np
+import test_utils
+
+_NUM_BOXES = (1000, 10000)
+_NUM_LABELS = 10
+
+
+def _ClusteredBoxes(rng, n):
+  """Returns boxes jittered around n / 20 objects in a 1000x1000 image."""
+  num_objects = max(n // 20, 1)
+  centers = rng.uniform(0, 1000, size=(num_objects, 2))
+  sizes = rng.uniform(20, 200, size=(num_objects, 2))
+  objects = rng.randint(num_objects, size=n)
+  jitter = rng.normal(scale=0.05, size=(n, 4)) * np.tile(sizes[objects], 2)
+  return np.concatenate([centers[objects] - sizes[objects] / 2,
+                         centers[objects] + sizes[objects] / 2],
+                        axis=1) + jitter
+
+
+def _UniformBoxes(rng, n):
+  """Returns boxes spread uniformly in a 1000x1000 image."""
+  centers = rng.uniform(0, 1000, size=(n, 2))
+  sizes = rng.uniform(5, 30, size=(n, 2))
+  return np.concatenate([centers - sizes / 2, centers + sizes / 2], axis=1)
+
+
+def _PythonNms(boxes, scores, threshold):
+  """Pure Python greedy NMS, the baseline."""
+
+  def Iou(a, b):
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    if w <= 0 or h <= 0:
+      return 0.0
+    intersection = w * h
+    return intersection / ((a[2] - a[0]) * (a[3] - a[1]) +
+                           (b[2] - b[0]) * (b[3] - b[1]) - intersection)
+
+  boxes = boxes.tolist()
+  keep = []
+  for i in sorted(range(len(boxes)), key=lambda i: -scores[i]):
+    if all(Iou(boxes[i], boxes[j]) <= threshold for j in keep):
+      keep.append(i)
+  return keep
+
+
+def _Time(fn, iterations):
+  fn()
+  start = time.perf_counter()
+  for _ in range(iterations):
+    fn()
+  return (time.perf_counter() - start) * 1000 / iterations
+
+
+def main():
+  args = test_utils.ParseArgs()
+  machine = test_utils.MachineInfo()
+  rng = np.random.RandomState(0)
+  results = [('DISTRIBUTION', 'NUM_BOXES', 'FUNCTION', 'TIME_MS')]
+  for distribution, make_boxes in (('clustered', _ClusteredBoxes),
+                                   ('uniform', _UniformBoxes)):
+    for n in _NUM_BOXES:
+      boxes = make_boxes(rng, n)
+      scores = rng.uniform(size=n)
+      labels = rng.randint(_NUM_LABELS, size=n)
+      iterations = 10 if n <= 1000 else 2
+      functions = [
+          ('nms', lambda: nms.Nms(boxes, scores, 0.5)),
+          ('class_aware_nms', lambda: nms.Nms(boxes, scores, 0.5, labels)),
+          ('soft_nms_gaussian', lambda: nms.SoftNms(boxes, scores)),
+          ('weighted_box_fusion',
+           lambda: nms.WeightedBoxFusion(boxes, scores, labels)),
+      ]
+      if n <= 1000:
+        functions.append(('python_nms',
+                          lambda: _PythonNms(boxes, scores, 0.5)))
+      for name, fn in functions:
+        latency = _Time(fn, iterations)
+        print('%s %d boxes, %s: %.2f ms' % (distribution, n, name, latency))
+        results.append((distribution, n, name, '%.2f' % latency))
+  test_utils.SaveAsCsv(
+      args.result_file or 'nms_benchmarks_%s_%s.csv' % (
+          machine, time.strftime('%Y%m%d-%H%M%S')), results)
+
+
+if __name__ == '__main__':
+  main()
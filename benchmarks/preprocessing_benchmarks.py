@@ -0,0 +1,71 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of image preprocessing next to device latency.
+
+Runs every resampling filter, with and without keep_aspect_ratio, on the test
+images of each input size of the Edge TPU models in the BasicEngine reference.
+Device latency is measured when an Edge TPU is available, otherwise the
+reference latency is shown.
+
+See edgetpu.benchmark.preprocessing (edgetpu_preprocessing_benchmark) for
+more options.
+"""
+
+import os
+import time
+
+from edgetpu.benchmark import preprocessing
+import test_utils
+
+_IMAGES = ['cat.bmp', 'cat_720p.jpg', 'cat_1080p.jpg']
+
+
+def main():
+  args = test_utils.ParseArgs()
+  machine = test_utils.MachineInfo()
+  model_list, reference = test_utils.ReadReference(
+      'basic_engine_reference_%s.csv' % machine)
+  models = [test_utils.TestDataPath(m) for m in sorted(model_list)
+            if 'edgetpu' in m]
+  input_sizes = preprocessing.InputSizes(models)
+  device_latencies = {}
+  for model in models:
+    device_latencies[model] = (preprocessing.DeviceLatency(model) or
+                               reference.get((os.path.basename(model),)))
+  cases = preprocessing.ExpandMatrix(
+      list(input_sizes), [test_utils.TestDataPath(i) for i in _IMAGES],
+      list(preprocessing.FILTERS), [False, True], 2, 50)
+  records = []
+  for cnt, case in enumerate(cases, start=1):
+    print('-------------- Case ', cnt, '/', len(cases), ' ---------------')
+    record = preprocessing.RunPreprocessingBenchmark(case)
+    records.append(record)
+    if 'error' in record:
+      print(' * Failed: ', record['error'])
+      continue
+    print('%s %dx%d %s keep_aspect_ratio=%s: %.2f ms (p50)' % (
+        record['image'], case.input_size[0], case.input_size[1],
+        case.resample, case.keep_aspect_ratio, record['total_ms']['p50']))
+  rows = preprocessing.ReportRows(records, input_sizes, device_latencies)
+  print(preprocessing.FormatRows(rows))
+  result_file = args.result_file or 'preprocessing_benchmarks_%s_%s.csv' % (
+      machine, time.strftime('%Y%m%d-%H%M%S'))
+  test_utils.SaveAsCsv(result_file, rows)
+  test_utils.SaveAsJsonLines(os.path.splitext(result_file)[0] + '.jsonl',
+                             records)
+
+
+if __name__ == '__main__':
+  main()
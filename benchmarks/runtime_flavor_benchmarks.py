@@ -0,0 +1,116 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Compares 'direct' and 'throttled' Edge TPU runtimes side by side.
+
+The runtime flavor is fixed once libedgetpu is loaded, so each benchmark script
+runs in a separate process per flavor (selected with EDGETPU_RUNTIME_FLAVOR).
+Their results are then merged into one table with latency and throughput of
+both flavors:
+
+  MODEL [IMAGE_NAME] DIRECT_TIME THROTTLED_TIME DIRECT_FPS THROTTLED_FPS SPEEDUP
+"""
+
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import time
+
+from edgetpu.basic import runtime_flavor
+import test_utils
+
+_BENCHMARKS = ('basic_engine', 'classification', 'detection')
+
+
+def _RunBenchmark(benchmark, flavor, result_file):
+  """Runs one benchmark script with given runtime flavor in a new process."""
+  env = dict(os.environ)
+  env[runtime_flavor.ENV_FLAVOR] = flavor
+  script = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                        '%s_benchmarks.py' % benchmark)
+  subprocess.check_call(
+      [sys.executable, script, '--result_file', result_file], env=env)
+
+
+def _ReadResult(result_file):
+  """Reads result csv as {environment : inference_time}."""
+  with open(test_utils.BenchmarkResultPath(result_file), newline='') as f:
+    reader = csv.reader(f, delimiter=' ', quotechar='|')
+    header = next(reader)
+    return header[:-1], {tuple(row[:-1]): float(row[-1]) for row in reader}
+
+
+def _Merge(columns, direct, throttled):
+  """Merges results of both flavors into rows of the side-by-side table."""
+  rows = [tuple(columns) + ('DIRECT_TIME', 'THROTTLED_TIME', 'DIRECT_FPS',
+                            'THROTTLED_FPS', 'SPEEDUP')]
+  for environment in sorted(set(direct) | set(throttled)):
+    direct_time = direct.get(environment)
+    throttled_time = throttled.get(environment)
+    row = list(environment)
+    for latency in (direct_time, throttled_time):
+      row.append('%.2f' % latency if latency else '-')
+    for latency in (direct_time, throttled_time):
+      row.append('%.1f' % (1000.0 / latency) if latency else '-')
+    if direct_time and throttled_time:
+      row.append('%.2f' % (throttled_time / direct_time))
+    else:
+      row.append('-')
+    rows.append(tuple(row))
+  return rows
+
+
+def _PrintTable(rows):
+  widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+  for row in rows:
+    print('  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--benchmarks', nargs='+', default=list(_BENCHMARKS),
+                      choices=_BENCHMARKS,
+                      help='Benchmark scripts to run with both flavors.')
+  args = parser.parse_args()
+
+  for flavor in runtime_flavor.FLAVORS:
+    if runtime_flavor.LibraryPath(flavor) is None:
+      print('Could not find %s runtime, set %s.' %
+            (flavor, runtime_flavor.ENV_RUNTIME_DIR))
+      sys.exit(1)
+
+  machine = test_utils.MachineInfo()
+  timestamp = time.strftime('%Y%m%d-%H%M%S')
+  for benchmark in args.benchmarks:
+    results = {}
+    for flavor in runtime_flavor.FLAVORS:
+      print('============ %s benchmarks, %s runtime ============' %
+            (benchmark, flavor))
+      result_file = '%s_benchmarks_%s_%s_%s.csv' % (benchmark, machine, flavor,
+                                                    timestamp)
+      _RunBenchmark(benchmark, flavor, result_file)
+      results[flavor] = _ReadResult(result_file)
+    columns, direct = results[runtime_flavor.DIRECT]
+    _, throttled = results[runtime_flavor.THROTTLED]
+    rows = _Merge(columns, direct, throttled)
+    print('============ %s: direct vs throttled ============' % benchmark)
+    _PrintTable(rows)
+    test_utils.SaveAsCsv(
+        '%s_runtime_flavors_%s_%s.csv' % (benchmark, machine, timestamp), rows)
+
+
+if __name__ == '__main__':
+  main()
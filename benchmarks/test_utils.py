@@ -17,11 +17,15 @@ import argparse
 import collections
 import contextlib
 import csv
+import json
 import os
-import platform
 import random
+import time
 import urllib.parse
 
+from edgetpu.basic import edgetpu_utils
+from edgetpu.benchmark import regression
+from edgetpu.benchmark import runner
 import numpy as np
 from PIL import Image
 
@@ -30,6 +34,8 @@ def ParseArgs():
   parser = argparse.ArgumentParser()
   parser.add_argument('--enable_assertion', dest='enable_assertion',
                       action='store_true', default=False)
+  parser.add_argument('--result_file', dest='result_file', default=None,
+                      help='Name of the result file in the result directory.')
   return parser.parse_args()
 
 
@@ -43,19 +49,8 @@ def CheckCpuScalingGovernorStatus():
     print('**************************************************************')
 
 
-def MachineInfo():
-  """Gets platform info to choose reference value."""
-  machine = platform.machine()
-  if machine == 'armv7l':
-    with open('/proc/device-tree/model') as model_file:
-      board_info = model_file.read()
-    if 'Raspberry Pi 3 Model B Rev' in board_info:
-      machine = 'rp3b'
-    elif 'Raspberry Pi 3 Model B Plus Rev' in board_info:
-      machine = 'rp3b+'
-    else:
-      machine = 'unknown'
-  return machine
+# Platform info to choose reference value.
+MachineInfo = runner.MachineInfo
 
 
 TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)),
@@ -66,6 +61,8 @@ REFERENCE_DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)),
 
 BENCHMARK_RESULT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)),
                                     'result')
+# Run history for regression detection, in BENCHMARK_RESULT_DIR.
+BENCHMARK_HISTORY_DB = 'history.sqlite'
 
 
 def TestDataPath(path, *paths):
@@ -140,6 +137,11 @@ def PrepareImages(image_list, directory, shape):
   return np.array(ret)
 
 
+def PrintRuntimeFlavor():
+  """Prints flavor of the Edge TPU runtime used by the benchmark."""
+  print('Edge TPU runtime flavor: %s' % edgetpu_utils.GetRuntimeFlavor())
+
+
 def ReadReference(file_name):
   """Reads reference from csv file.
 
@@ -151,16 +153,8 @@ def ReadReference(file_name):
     reference: { environment : reference_time}, environment is a string tuple
       while reference_time is a float number.
   """
-  model_list = set()
-  reference = {}
-  with open(ReferencePath(file_name), newline='') as csvfile:
-    reader = csv.reader(csvfile, delimiter=' ', quotechar='|')
-    # Drop first line(column names).
-    next(reader)
-    for row in reader:
-      reference[tuple(row[:-1])] = float(row[-1])
-      model_list.add(row[0])
-  return sorted(model_list), reference
+  reference = runner.ReadReference(ReferencePath(file_name))
+  return sorted({environment[0] for environment in reference}), reference
 
 
 def CheckResult(reference, result_list, enable_assertion):
@@ -184,6 +178,7 @@ def CheckResult(reference, result_list, enable_assertion):
     if environment not in reference:
       print(' * No matching record for [%s].' % (','.join(environment)))
       cnt += 1
+      continue
     reference_latency = reference[environment]
     up_limit = reference_latency * (1 + variance_threshold)
     down_limit = reference_latency * (1 - variance_threshold)
@@ -220,3 +215,100 @@ def SaveAsCsv(file_name, result):
     for line in result:
       writer.writerow(line)
   print(file_name, ' saved!')
+
+
+def SaveAsJsonLines(file_name, records):
+  """Saves benchmark records as JSON Lines file.
+
+  Args:
+    file_name: string, name of the saved file.
+    records: A list of dict.
+  """
+  os.makedirs(BENCHMARK_RESULT_DIR, exist_ok=True)
+  with open(BenchmarkResultPath(file_name), 'w') as f:
+    for record in records:
+      f.write(json.dumps(record) + '\n')
+  print(file_name, ' saved!')
+
+
+def RunReferenceBenchmarks(name, engine, images, cpu_iterations):
+  """Benchmarks all models of a reference file with the benchmark runner.
+
+  Models listed in '[name]_reference_[machine].csv' are run with given engine
+  on each image (or a random input if images is None). Mean latencies are
+  saved as csv and checked against the reference, full records are saved as
+  JSON Lines and added to the run history, whose latest run of each case is
+  then compared with the previous runs (see edgetpu.benchmark.regression).
+
+  Args:
+    name: string, name of the benchmark, e.g. 'classification'.
+    engine: string, engine of the benchmark runner.
+    images: list of strings, names of test images, or None.
+    cpu_iterations: int, number of iterations for models not compiled for
+      Edge TPU. Edge TPU models run 200 iterations.
+  """
+  args = ParseArgs()
+  machine = MachineInfo()
+  PrintRuntimeFlavor()
+  CheckCpuScalingGovernorStatus()
+  model_list, reference = ReadReference(
+      '%s_reference_%s.csv' % (name, machine))
+  total_models = len(model_list)
+  if images:
+    results = [('MODEL', 'IMAGE_NAME', 'INFERENCE_TIME')]
+  else:
+    results = [('MODEL', 'INFERENCE_TIME')]
+  records = []
+  for cnt, model in enumerate(model_list, start=1):
+    print('-------------- Model ', cnt, '/', total_models, ' ---------------')
+    iterations = 200 if ('edgetpu' in model) else cpu_iterations
+    for img in images or [None]:
+      print('Benchmark for [', model, ']', ' on ' + img if img else '')
+      record = runner.RunBenchmark(runner.BenchmarkCase(
+          TestDataPath(model), engine,
+          # *WithImage API, resizing is part of the reference latency.
+          preprocessing='nearest' if img else 'tensor',
+          image_path=TestDataPath(img) if img else None,
+          iterations=iterations), record_latencies=True)
+      records.append(record)
+      if 'error' in record:
+        print(' * Failed: ', record['error'])
+        continue
+      latency = record['latency_ms']
+      print('%.2f ms (p50 %.2f, p99 %.2f, iterations = %d)' % (
+          latency['mean'], latency['p50'], latency['p99'], iterations))
+      results.append(
+          (model, img, latency['mean']) if img else (model, latency['mean']))
+  result_file = args.result_file or '%s_benchmarks_%s_%s.csv' % (
+      name, machine, time.strftime('%Y%m%d-%H%M%S'))
+  SaveAsCsv(result_file, results)
+  SaveAsJsonLines(os.path.splitext(result_file)[0] + '.jsonl', records)
+  CheckResult(reference, results, args.enable_assertion)
+  CheckHistory(records, args.enable_assertion)
+
+
+def CheckHistory(records, enable_assertion):
+  """Adds records to the run history and checks them for regressions.
+
+  Args:
+    records: list of benchmark records with 'latencies_ms'.
+    enable_assertion: bool, throw assertion when a regression is detected.
+  """
+  if not os.path.exists(BENCHMARK_RESULT_DIR):
+    os.makedirs(BENCHMARK_RESULT_DIR)
+  store = regression.HistoryStore(BenchmarkResultPath(BENCHMARK_HISTORY_DB))
+  try:
+    cases = set()
+    for record in records:
+      if store.Add(record):
+        cases.add(tuple(record[f] for f in regression.CASE_FIELDS))
+    verdicts = [v for v in regression.CheckHistory(
+        store, MachineInfo(), edgetpu_utils.GetRuntimeFlavor())
+                if v.case in cases]
+  finally:
+    store.Close()
+  print('******************** Run history *********************')
+  print(regression.FormatVerdicts(verdicts))
+  if enable_assertion:
+    assert all(v.verdict != regression.REGRESSION for v in verdicts), (
+        'Benchmark regression detected!')
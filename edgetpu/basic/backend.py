@@ -0,0 +1,57 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Selects the implementation behind the engines.
+
+By default engines run on Edge TPUs through edgetpu.swig.edgetpu_cpp_wrapper.
+With EDGETPU_BACKEND=simulated they run on edgetpu.basic.simulated_backend
+instead, which needs neither the hardware nor libedgetpu:
+
+  EDGETPU_BACKEND=simulated EDGETPU_SIMULATED_DEVICES=4 python3 -m pytest tests
+
+The backend is chosen when engine modules are imported and stays for the
+lifetime of the process.
+"""
+
+import importlib
+import os
+
+ENV_BACKEND = 'EDGETPU_BACKEND'
+
+EDGETPU = 'edgetpu'
+SIMULATED = 'simulated'
+BACKENDS = (EDGETPU, SIMULATED)
+
+_MODULES = {
+    EDGETPU: 'edgetpu.swig.edgetpu_cpp_wrapper',
+    SIMULATED: 'edgetpu.basic.simulated_backend',
+}
+
+
+def Name():
+  """Returns the backend selected by $EDGETPU_BACKEND, EDGETPU by default.
+
+  Raises:
+    ValueError: when the backend is unknown.
+  """
+  name = os.environ.get(ENV_BACKEND) or EDGETPU
+  if name not in BACKENDS:
+    raise ValueError('Unknown {}: {}. Expected one of {}.'.format(
+        ENV_BACKEND, name, ', '.join(BACKENDS)))
+  return name
+
+
+def Wrapper():
+  """Returns the module providing BasicEngine, ImprintingEngine etc."""
+  return importlib.import_module(_MODULES[Name()])
@@ -12,4 +12,235 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from edgetpu.swig.edgetpu_cpp_wrapper import BasicEngine
\ No newline at end of file
+"""Python wrapper for BasicEngine."""
+
+import time
+
+from edgetpu.basic import backend
+from edgetpu.utils import instrumentation
+from edgetpu.utils import metrics
+import numpy
+
+
+class LatencyStats(object):
+  """Aggregated inference latencies, in milliseconds."""
+  __slots__ = ['count', 'total', 'min', 'max']
+
+  def __init__(self):
+    #: int, number of inferences.
+    self.count = 0
+    #: float, sum of latencies.
+    self.total = 0.0
+    #: float, minimum latency.
+    self.min = float('inf')
+    #: float, maximum latency.
+    self.max = 0.0
+
+  def Add(self, latency):
+    """Records latency of one inference."""
+    self.count += 1
+    self.total += latency
+    self.min = min(self.min, latency)
+    self.max = max(self.max, latency)
+
+  def mean(self):
+    """Returns mean latency, or 0.0 if there's no inference."""
+    return self.total / self.count if self.count else 0.0
+
+  def __repr__(self):
+    return 'LatencyStats(count=%d, mean=%.3f, min=%.3f, max=%.3f)' % (
+        self.count, self.mean(), self.min if self.count else 0.0, self.max)
+
+
+_wrapper = backend.Wrapper()
+
+
+class BasicEngine(instrumentation.StageTimingMixin, _wrapper.BasicEngine):
+  """Python wrapper for BasicEngine.
+
+  The first inference after an engine is created is much slower than the
+  following ones, because model parameters are uploaded to the Edge TPU. The
+  same happens again whenever another model ran on the same Edge TPU in
+  between and evicted the parameters (a model switch). The engine accounts
+  these cold inferences separately from steady-state ones, see
+  get_cold_latency_stats() and get_steady_latency_stats(). Call Warmup() right
+  after creation so that the first real request sees steady-state latency.
+  """
+
+  # A latency this many times higher than the steady-state average, after at
+  # least _MIN_STEADY_SAMPLES steady inferences, is taken as a model switch.
+  _SWITCH_FACTOR = 3.0
+  _MIN_STEADY_SAMPLES = 5
+  # Weight of the latest latency in the steady-state moving average.
+  _EMA_WEIGHT = 0.1
+
+  def __init__(self, model_path, device_path=None):
+    """Creates a BasicEngine with given model.
+
+    Args:
+      model_path: String, path to TF-Lite Flatbuffer file.
+      device_path: String, if specified, bind engine with Edge TPU at device_path.
+    """
+    if device_path:
+      super().__init__(model_path, device_path)
+    else:
+      super().__init__(model_path)
+    self._cold_stats = LatencyStats()
+    self._steady_stats = LatencyStats()
+    self._steady_average = 0.0
+    self._model_switch_count = 0
+    self._auto_rewarm_iterations = 0
+    self._warmup_input = None
+    self._metrics = None
+
+  def RunInference(self, input):  # pylint: disable=redefined-builtin
+    """Runs inference with given input.
+
+    Args:
+      input: 1-D numpy.array. Flattened input tensor.
+
+    Returns:
+      (latency, output_tensors). Latency is milliseconds in float while
+      output_tensors is 1-D numpy.array. If there are multiple output tensors,
+      it will be compressed into a 1-D array. You can use
+      get_all_output_tensors_sizes, get_num_of_output_tensors and
+      get_output_tensor_size to calculate the offset for each tensor.
+      For example, if the model output 2 tensors with value [1, 2, 3] and
+      [0.1, 0.4, 0.9], output_tesnors will be [1, 2, 3, 0.1, 0.4, 0.9].
+    """
+    recorder = self._stage_recorder
+    if recorder:
+      start = instrumentation.Now()
+    engine_metrics = self._metrics
+    if engine_metrics:
+      wall_start = time.perf_counter()
+      try:
+        latency, output = super().RunInference(input)
+      except Exception:
+        engine_metrics.RecordError()
+        raise
+      engine_metrics.Record(latency / 1000.0, time.perf_counter() - wall_start)
+    else:
+      latency, output = super().RunInference(input)
+    if recorder:
+      end = recorder.Record(instrumentation.INVOKE, start)
+      # The device time ends with the invocation and can't start before it,
+      # so the DEVICE event nests in the INVOKE one on timelines.
+      recorder.Add(instrumentation.DEVICE,
+                   min(int(latency * 1e6), end - start), end)
+    if self._RecordLatency(latency) and self._auto_rewarm_iterations:
+      # Warmup overwrites the output buffer of the engine.
+      output = numpy.copy(output)
+      self.Warmup(self._auto_rewarm_iterations)
+    return latency, output
+
+  def Warmup(self, n=1):
+    """Runs inferences with a synthetic input to upload model parameters.
+
+    Args:
+      n: int, number of inferences to run.
+
+    Returns:
+      List of float, latency of each warmup inference in milliseconds.
+
+    Raises:
+      ValueError: when n isn't positive.
+    """
+    if n <= 0:
+      raise ValueError('n must be positive!')
+    if self._warmup_input is None:
+      self._warmup_input = numpy.zeros(
+          self.required_input_array_size(), dtype=numpy.uint8)
+    latencies = []
+    for _ in range(n):
+      latency, _ = super().RunInference(self._warmup_input)
+      self._RecordLatency(latency)
+      latencies.append(latency)
+    return latencies
+
+  def set_auto_rewarm(self, enabled, iterations=1):
+    """Enables re-warming automatically after a model switch is detected.
+
+    A model switch is detected when inference time rises far above the
+    steady-state average, i.e. the parameters had to be uploaded again. With
+    auto re-warm the engine then runs Warmup(iterations) right away, so the
+    following requests see steady-state latency again.
+
+    Args:
+      enabled: bool, whether to re-warm automatically.
+      iterations: int, number of warmup inferences to run.
+    """
+    self._auto_rewarm_iterations = iterations if enabled else 0
+
+  def _TraceDevice(self):
+    # Events are grouped under the Edge TPU of the engine.
+    return self.device_path()
+
+  def set_metrics(self, registry=None):
+    """Records inference count, errors and latencies into a registry.
+
+    See edgetpu.utils.metrics for the exported metrics.
+
+    Args:
+      registry: metrics.Registry, metrics.REGISTRY by default.
+    """
+    self.clear_metrics()
+    self._metrics = metrics.EngineMetrics(self, registry)
+
+  def clear_metrics(self):
+    """Stops recording metrics and removes this engine from the registry."""
+    if self._metrics is not None:
+      self._metrics.Unregister()
+      self._metrics = None
+
+  def get_cold_latency_stats(self):
+    """Gets latencies of inferences that uploaded model parameters.
+
+    These are the first inference and the inferences after model switches.
+
+    Returns:
+      LatencyStats.
+    """
+    return self._cold_stats
+
+  def get_steady_latency_stats(self):
+    """Gets latencies of steady-state inferences.
+
+    Returns:
+      LatencyStats.
+    """
+    return self._steady_stats
+
+  def get_model_switch_count(self):
+    """Gets number of model switches detected since the first inference.
+
+    Returns:
+      An integer.
+    """
+    return self._model_switch_count
+
+  def is_warm(self):
+    """Returns True if the model parameters have been uploaded."""
+    return self._cold_stats.count > 0
+
+  def _RecordLatency(self, latency):
+    """Classifies latency as cold or steady.
+
+    Returns:
+      True if a model switch is detected.
+    """
+    if not self._cold_stats.count:
+      self._cold_stats.Add(latency)
+      return False
+    if (self._steady_stats.count >= self._MIN_STEADY_SAMPLES and
+        latency > self._SWITCH_FACTOR * self._steady_average):
+      self._cold_stats.Add(latency)
+      self._model_switch_count += 1
+      return True
+    self._steady_stats.Add(latency)
+    if self._steady_stats.count == 1:
+      self._steady_average = latency
+    else:
+      self._steady_average += self._EMA_WEIGHT * (
+          latency - self._steady_average)
+    return False
@@ -0,0 +1,250 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cross-process reservation of Edge TPU devices.
+
+ListEdgeTpuPaths() only knows about engines created by the current process, so
+services started at the same time tend to pick the same Edge TPU. DeviceManager
+records every reservation as a file holding an advisory lock (flock) in a lock
+directory shared by all processes on the host:
+
+  <lock_dir>/<quoted device path>/<pid>-<serial>.lock
+
+A reservation is alive as long as its lock is held. The kernel drops the lock
+when the holder exits or crashes, and lock files left behind are removed the
+next time any process counts reservations. Selection of a device is serialized
+with a host-wide lock, so concurrent starts are assigned deterministically to
+the least-loaded device.
+
+Example:
+  manager = DeviceManager()
+  engine = manager.CreateEngine(ClassificationEngine, model_path)
+"""
+
+import atexit
+import collections
+import contextlib
+import errno
+import fcntl
+import itertools
+import os
+import threading
+import urllib.parse
+import weakref
+
+from edgetpu.basic import edgetpu_utils
+
+DEFAULT_LOCK_DIR = os.environ.get('EDGETPU_LOCK_DIR', '/tmp/edgetpu_locks')
+
+_MANAGER_LOCK_FILE = 'manager.lock'
+
+# Live managers, released at exit. Weak so managers can be garbage collected.
+_MANAGERS = weakref.WeakSet()
+
+
+@atexit.register
+def _ReleaseAllManagers():
+  for manager in list(_MANAGERS):
+    manager.ReleaseAll()
+
+
+class DeviceReservation(object):
+  """A reservation of one Edge TPU held by this process.
+
+  The reservation is released by Release(), when the object is garbage
+  collected, or at the latest when the process exits.
+  """
+
+  def __init__(self, device_path, lock_path, lock_file):
+    #: string, path of the reserved Edge TPU.
+    self.device_path = device_path
+    self._lock_path = lock_path
+    self._lock_file = lock_file
+
+  def Release(self):
+    """Releases the reservation. It's safe to call it more than once."""
+    if self._lock_file is None:
+      return
+    with contextlib.suppress(OSError):
+      os.unlink(self._lock_path)
+    self._lock_file.close()
+    self._lock_file = None
+
+  def IsHeld(self):
+    """Returns True if the reservation hasn't been released."""
+    return self._lock_file is not None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *unused_exc_info):
+    self.Release()
+
+  def __del__(self):
+    self.Release()
+
+
+class DeviceManager(object):
+  """Reserves Edge TPUs across processes, picking the least-loaded one."""
+
+  def __init__(self, lock_dir=DEFAULT_LOCK_DIR, device_paths=None):
+    """Creates a DeviceManager.
+
+    Args:
+      lock_dir: string, directory shared by all processes for lock files.
+        Defaults to $EDGETPU_LOCK_DIR or /tmp/edgetpu_locks.
+      device_paths: list of strings, if specified, only these devices are
+        managed. By default all devices returned by ListEdgeTpuPaths().
+    """
+    self._lock_dir = lock_dir
+    self._device_paths = list(device_paths) if device_paths else None
+    self._serial = itertools.count()
+    self._reservations = weakref.WeakSet()
+    self._mutex = threading.Lock()
+    os.makedirs(lock_dir, exist_ok=True)
+    _MANAGERS.add(self)
+
+  def DevicePaths(self):
+    """Returns paths of managed Edge TPUs, in deterministic order."""
+    if self._device_paths is not None:
+      return list(self._device_paths)
+    return list(edgetpu_utils.ListEdgeTpuPaths(
+        edgetpu_utils.EDGE_TPU_STATE_NONE))
+
+  def GetLoads(self):
+    """Counts live reservations of each device, from all processes.
+
+    Returns:
+      OrderedDict {string : int}, map between device path and the number of
+      reservations held on it.
+    """
+    with self._ManagerLock():
+      return self._CountReservations(self.DevicePaths())
+
+  def Reserve(self, device_path=None, exclusive=False):
+    """Reserves an Edge TPU.
+
+    Args:
+      device_path: string, if specified, reserve this device. Otherwise the
+        device with the fewest reservations is picked, ties are broken by the
+        order of DevicePaths().
+      exclusive: bool, if true, only pick a device without any reservation.
+
+    Returns:
+      DeviceReservation.
+
+    Raises:
+      RuntimeError: when there's no device to reserve.
+    """
+    with self._ManagerLock():
+      loads = self._CountReservations(
+          [device_path] if device_path else self.DevicePaths())
+      if not loads:
+        raise RuntimeError('No Edge TPU detected!')
+      # min() returns the first device with the least load.
+      path = min(loads, key=loads.get)
+      if exclusive and loads[path] > 0:
+        raise RuntimeError(
+            'All Edge TPUs have been reserved, cannot reserve exclusively!')
+      reservation = self._CreateReservation(path)
+    with self._mutex:
+      self._reservations.add(reservation)
+    return reservation
+
+  def CreateEngine(self, engine_class, model_path, device_path=None,
+                   exclusive=False):
+    """Reserves an Edge TPU and creates an engine bound to it.
+
+    The reservation is stored on the engine and released once the engine is
+    garbage collected.
+
+    Args:
+      engine_class: class, BasicEngine or any of its subclasses.
+      model_path: string, path to TF-Lite Flatbuffer file.
+      device_path: string, see Reserve().
+      exclusive: bool, see Reserve().
+
+    Returns:
+      The engine.
+    """
+    reservation = self.Reserve(device_path, exclusive)
+    try:
+      engine = engine_class(model_path, reservation.device_path)
+    except Exception:  # pylint: disable=broad-except
+      reservation.Release()
+      raise
+    engine._device_reservation = reservation  # pylint: disable=protected-access
+    return engine
+
+  def ReleaseAll(self):
+    """Releases all reservations made by this manager."""
+    with self._mutex:
+      reservations = list(self._reservations)
+      self._reservations.clear()
+    for reservation in reservations:
+      reservation.Release()
+
+  @contextlib.contextmanager
+  def _ManagerLock(self):
+    """Serializes counting and reserving across processes."""
+    with open(os.path.join(self._lock_dir, _MANAGER_LOCK_FILE), 'a') as f:
+      fcntl.flock(f, fcntl.LOCK_EX)
+      try:
+        yield
+      finally:
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+  def _DeviceDir(self, device_path):
+    return os.path.join(self._lock_dir,
+                        urllib.parse.quote(device_path, safe=''))
+
+  def _CountReservations(self, device_paths):
+    """Counts live lock files and removes stale ones. Needs manager lock."""
+    loads = collections.OrderedDict()
+    for path in device_paths:
+      device_dir = self._DeviceDir(path)
+      count = 0
+      try:
+        names = os.listdir(device_dir)
+      except FileNotFoundError:
+        names = []
+      for name in names:
+        lock_path = os.path.join(device_dir, name)
+        try:
+          f = open(lock_path, 'a')
+        except FileNotFoundError:
+          continue
+        with f:
+          try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+          except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+              raise
+            count += 1
+            continue
+          # Nobody holds it, the owner is gone or released it meanwhile.
+          with contextlib.suppress(FileNotFoundError):
+            os.unlink(lock_path)
+      loads[path] = count
+    return loads
+
+  def _CreateReservation(self, device_path):
+    """Creates and locks a lock file for device_path. Needs manager lock."""
+    device_dir = self._DeviceDir(device_path)
+    os.makedirs(device_dir, exist_ok=True)
+    lock_path = os.path.join(
+        device_dir, '%d-%d.lock' % (os.getpid(), next(self._serial)))
+    lock_file = open(lock_path, 'w')
+    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    return DeviceReservation(device_path, lock_path, lock_file)
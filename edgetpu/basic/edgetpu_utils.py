@@ -12,12 +12,32 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import edgetpu.swig.edgetpu_cpp_wrapper as wrapper
-from edgetpu.swig.edgetpu_cpp_wrapper import GetRuntimeVersion
-from edgetpu.swig.edgetpu_cpp_wrapper import ListEdgeTpuPaths
+from edgetpu.basic import backend
+from edgetpu.basic import runtime_flavor
+
+wrapper = backend.Wrapper()
+GetRuntimeVersion = wrapper.GetRuntimeVersion
+ListEdgeTpuPaths = wrapper.ListEdgeTpuPaths
 
 SUPPORTED_RUNTIME_VERSION = wrapper.kSupportedRuntimeVersion
 # Edge TPU states
 EDGE_TPU_STATE_ASSIGNED = wrapper.EdgeTpuState_kAssigned
 EDGE_TPU_STATE_UNASSIGNED = wrapper.EdgeTpuState_kUnassigned
 EDGE_TPU_STATE_NONE = wrapper.EdgeTpuState_kNone
+# Edge TPU runtime flavors
+RUNTIME_FLAVOR_DIRECT = runtime_flavor.DIRECT
+RUNTIME_FLAVOR_THROTTLED = runtime_flavor.THROTTLED
+
+
+def GetRuntimeFlavor():
+  """Returns flavor of the Edge TPU runtime used by this process.
+
+  Returns:
+    string, RUNTIME_FLAVOR_DIRECT (maximum operating frequency),
+    RUNTIME_FLAVOR_THROTTLED (default operating frequency) or 'unknown' if the
+    loaded libedgetpu isn't one of the libraries shipped with this package;
+    'simulated' with the simulated backend.
+  """
+  if backend.Name() == backend.SIMULATED:
+    return backend.SIMULATED
+  return runtime_flavor.Active()
@@ -0,0 +1,185 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Selects the Edge TPU runtime (libedgetpu.so.1) flavor of the process.
+
+libedgetpu comes in two flavors: 'direct' runs the Edge TPU at the maximum
+operating frequency while 'throttled' runs it at the default frequency. The
+runtime is loaded when edgetpu.swig.edgetpu_cpp_wrapper is imported and then
+stays for the lifetime of the process, so the flavor must be chosen before any
+engine module is imported, either with environment variable:
+
+  EDGETPU_RUNTIME_FLAVOR=direct python3 my_app.py
+
+or explicitly (this module doesn't load the runtime itself):
+
+  from edgetpu.basic import runtime_flavor
+  runtime_flavor.Select(runtime_flavor.DIRECT)
+  from edgetpu.classification.engine import ClassificationEngine
+
+When no flavor is selected, the dynamic loader picks libedgetpu.so.1 as usual
+(LD_LIBRARY_PATH or the system installed one). Use Active() or
+edgetpu_utils.GetRuntimeFlavor() to check which one is in use.
+
+Libraries are searched in $EDGETPU_RUNTIME_DIR, /usr/lib/<gnu type>/edgetpu
+(see install.sh) and the libedgetpu directory of the source tree, with either
+layout:
+  <dir>/<flavor>/<gnu type>/libedgetpu.so.1
+  <dir>/libedgetpu_<suffix>.so, <dir>/libedgetpu_<suffix>_throttled.so
+"""
+
+import ctypes
+import filecmp
+import os
+import platform
+
+DIRECT = 'direct'
+THROTTLED = 'throttled'
+FLAVORS = (DIRECT, THROTTLED)
+# Reported by Active() when the loaded runtime isn't one of known flavors.
+UNKNOWN = 'unknown'
+
+ENV_FLAVOR = 'EDGETPU_RUNTIME_FLAVOR'
+ENV_RUNTIME_DIR = 'EDGETPU_RUNTIME_DIR'
+
+_SONAME = 'libedgetpu.so.1'
+
+# platform.machine() : (gnu type, suffix of library in install bundle).
+_PLATFORMS = {
+    'x86_64': ('x86_64-linux-gnu', 'x86_64'),
+    'armv7l': ('arm-linux-gnueabihf', 'arm32'),
+    'aarch64': ('aarch64-linux-gnu', 'arm64'),
+}
+
+# Handle of the library loaded by Select(), keeps it alive.
+_loaded_library = None
+
+
+def _SearchDirs():
+  """Returns directories to search for libedgetpu flavors, in order."""
+  dirs = []
+  if os.environ.get(ENV_RUNTIME_DIR):
+    dirs.append(os.environ[ENV_RUNTIME_DIR])
+  machine = platform.machine()
+  if machine in _PLATFORMS:
+    dirs.append(os.path.join('/usr/lib', _PLATFORMS[machine][0], 'edgetpu'))
+  dirs.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..',
+                           '..', 'libedgetpu'))
+  return dirs
+
+
+def LibraryPath(flavor):
+  """Finds libedgetpu of the given flavor for current platform.
+
+  Args:
+    flavor: string, DIRECT or THROTTLED.
+
+  Returns:
+    string, absolute path of the library, or None if not found.
+
+  Raises:
+    ValueError: when flavor is invalid.
+  """
+  if flavor not in FLAVORS:
+    raise ValueError('Unknown runtime flavor: {}. Expected one of {}.'.format(
+        flavor, ', '.join(FLAVORS)))
+  machine = platform.machine()
+  if machine not in _PLATFORMS:
+    return None
+  gnu_type, suffix = _PLATFORMS[machine]
+  bundle_name = 'libedgetpu_%s%s.so' % (
+      suffix, '_throttled' if flavor == THROTTLED else '')
+  for directory in _SearchDirs():
+    for path in (os.path.join(directory, flavor, gnu_type, _SONAME),
+                 os.path.join(directory, bundle_name)):
+      if os.path.isfile(path):
+        return os.path.realpath(path)
+  return None
+
+
+def LoadedLibraryPath():
+  """Returns path of libedgetpu loaded in this process, or None."""
+  try:
+    with open('/proc/self/maps') as f:
+      for line in f:
+        fields = line.split(None, 5)
+        if len(fields) == 6 and 'libedgetpu' in os.path.basename(fields[5]):
+          return os.path.realpath(fields[5].strip())
+  except OSError:
+    pass
+  return None
+
+
+def _FlavorOfLibrary(path):
+  """Matches a library file against known flavors."""
+  for flavor in FLAVORS:
+    candidate = LibraryPath(flavor)
+    if candidate is None:
+      continue
+    if candidate == path or filecmp.cmp(candidate, path, shallow=False):
+      return flavor
+  return UNKNOWN
+
+
+def Active():
+  """Returns flavor of the runtime loaded in this process.
+
+  Returns:
+    DIRECT or THROTTLED; UNKNOWN if the loaded runtime doesn't match any
+    library found by LibraryPath(); None if the runtime isn't loaded yet.
+  """
+  path = LoadedLibraryPath()
+  if path is None:
+    return None
+  return _FlavorOfLibrary(path)
+
+
+def Select(flavor):
+  """Loads the runtime of given flavor for this process.
+
+  Must be called before edgetpu.swig.edgetpu_cpp_wrapper is imported (i.e.
+  before importing any engine). Selecting the flavor already in use is a
+  no-op.
+
+  Args:
+    flavor: string, DIRECT or THROTTLED.
+
+  Raises:
+    ValueError: when flavor is invalid.
+    RuntimeError: when the library can't be found, or another runtime has
+      already been loaded in this process.
+  """
+  global _loaded_library
+  path = LibraryPath(flavor)
+  if path is None:
+    raise RuntimeError(
+        'Could not find {} runtime for {} in: {}'.format(
+            flavor, platform.machine(), ', '.join(_SearchDirs())))
+  loaded_path = LoadedLibraryPath()
+  if loaded_path is not None:
+    if loaded_path == path or _FlavorOfLibrary(loaded_path) == flavor:
+      return
+    raise RuntimeError(
+        'Edge TPU runtime {} is already loaded, cannot switch to {} runtime '
+        'within the same process.'.format(loaded_path, flavor))
+  # The wrapper links against the soname, so the dynamic loader reuses the
+  # library already loaded here instead of searching for it.
+  _loaded_library = ctypes.CDLL(path, mode=ctypes.RTLD_GLOBAL)
+
+
+def SelectFromEnvironment():
+  """Calls Select() with $EDGETPU_RUNTIME_FLAVOR if it's set."""
+  flavor = os.environ.get(ENV_FLAVOR)
+  if flavor:
+    Select(flavor)
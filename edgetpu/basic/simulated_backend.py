@@ -0,0 +1,440 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Simulated Edge TPU backend, a drop-in for edgetpu.swig.edgetpu_cpp_wrapper.
+
+Selected with EDGETPU_BACKEND=simulated (see edgetpu.basic.backend), it lets
+engines, pools, schedulers and post-processing run on hosts without an Edge
+TPU or libedgetpu:
+
+  * Model metadata (input shape, output tensor sizes) is read from the .tflite
+    file with edgetpu.basic.tflite_model.
+  * Outputs are deterministic pseudo-random values of the right sizes, seeded
+    by the model and the input. Quantized outputs are dequantized like the
+    runtime does, and SSD post-processed outputs (boxes, classes, scores,
+    count) are shaped like real detections.
+  * Inference sleeps for a latency drawn from a LatencyModel while holding the
+    simulated device, so engines sharing a device serialize and engines on
+    different devices run in parallel (sleep releases the GIL).
+
+Configuration through environment variables, read on first use:
+  EDGETPU_SIMULATED_DEVICES: number of simulated Edge TPUs, 1 by default.
+  EDGETPU_SIMULATED_LATENCY: 'reference' (default) uses the inference time
+    of benchmarks/reference/basic_engine_reference_<machine>.csv, or of the
+    csv file given as 'reference:<path>'; 'fixed:<ms>' uses the same latency
+    for every model.
+  EDGETPU_SIMULATED_JITTER: relative standard deviation of latency, 0 by
+    default.
+  EDGETPU_SIMULATED_SWITCH_PENALTY: milliseconds added to the first inference
+    of an engine and after another model ran on the same device, 10 by default.
+or programmatically with Configure().
+"""
+
+import csv
+import os
+import platform
+import shutil
+import threading
+import time
+import weakref
+import zlib
+
+from edgetpu.basic import tflite_model
+import numpy as np
+
+ENV_DEVICES = 'EDGETPU_SIMULATED_DEVICES'
+ENV_LATENCY = 'EDGETPU_SIMULATED_LATENCY'
+ENV_JITTER = 'EDGETPU_SIMULATED_JITTER'
+ENV_SWITCH_PENALTY = 'EDGETPU_SIMULATED_SWITCH_PENALTY'
+
+DEVICE_PATH_PREFIX = '/dev/simulated_edgetpu'
+
+# Same names and values as the SWIG wrapper.
+EdgeTpuState_kNone = 0
+EdgeTpuState_kAssigned = 1
+EdgeTpuState_kUnassigned = 2
+kSupportedRuntimeVersion = 'Simulated Edge TPU runtime'
+kEdgeTpuCppWrapperVersion = 'Simulated Edge TPU runtime'
+
+# Latency of models missing in the profile, in milliseconds.
+DEFAULT_LATENCY = 5.0
+DEFAULT_SWITCH_PENALTY = 10.0
+
+_REFERENCE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                              '..', '..', 'benchmarks', 'reference')
+
+
+def LoadProfile(csv_path):
+  """Reads per-model latencies from a benchmarks/reference csv file.
+
+  Args:
+    csv_path: string, path of the file.
+
+  Returns:
+    {model file name : latency in milliseconds}. For files with one row per
+    image, the mean over images.
+  """
+  latencies = {}
+  with open(csv_path, newline='') as f:
+    reader = csv.reader(f, delimiter=' ', quotechar='|')
+    next(reader)
+    for row in reader:
+      latencies.setdefault(row[0], []).append(float(row[-1]))
+  return {model: float(np.mean(values)) for model, values in latencies.items()}
+
+
+def DefaultProfilePath():
+  """Returns basic_engine reference of this machine, or None if not found."""
+  machine = platform.machine()
+  path = os.path.join(_REFERENCE_DIR,
+                      'basic_engine_reference_%s.csv' % machine)
+  return path if os.path.isfile(path) else None
+
+
+class LatencyModel(object):
+  """Draws the device latency of each simulated inference."""
+
+  def __init__(self, default_latency=DEFAULT_LATENCY, profile=None,
+               jitter=0.0, switch_penalty=DEFAULT_SWITCH_PENALTY, seed=0):
+    """Creates a latency model.
+
+    Args:
+      default_latency: float, milliseconds for models missing in profile.
+      profile: {model file name : milliseconds}, see LoadProfile().
+      jitter: float, relative standard deviation of latency (log-normal, so
+        latency stays positive).
+      switch_penalty: float, milliseconds added when the model parameters have
+        to be uploaded to the device.
+      seed: int, seed of the jitter.
+    """
+    self.default_latency = default_latency
+    self.profile = dict(profile or {})
+    self.jitter = jitter
+    self.switch_penalty = switch_penalty
+    self._rng = np.random.RandomState(seed)
+    self._lock = threading.Lock()
+
+  def BaseLatency(self, model_path):
+    """Returns latency of a model without jitter or penalty."""
+    return self.profile.get(os.path.basename(model_path),
+                            self.default_latency)
+
+  def Sample(self, model_path, cold):
+    """Draws latency of one inference.
+
+    Args:
+      model_path: string, path of the model.
+      cold: bool, whether the parameters have to be uploaded.
+
+    Returns:
+      float, latency in milliseconds.
+    """
+    latency = self.BaseLatency(model_path)
+    if self.jitter:
+      with self._lock:
+        latency *= self._rng.lognormal(0.0, self.jitter)
+    if cold:
+      latency += self.switch_penalty
+    return latency
+
+
+class _Device(object):
+  """State of one simulated Edge TPU."""
+
+  def __init__(self, path):
+    self.path = path
+    self.lock = threading.Lock()
+    # Number of engines bound to the device.
+    self.engines = 0
+    # Engine whose parameters are on the device, as id().
+    self.loaded_engine = None
+
+
+class _Simulator(object):
+  """Devices and latency model shared by all engines of the process."""
+
+  def __init__(self, num_devices, latency_model):
+    self.devices = [_Device('%s/%d' % (DEVICE_PATH_PREFIX, i))
+                    for i in range(num_devices)]
+    self.latency_model = latency_model
+    self.lock = threading.Lock()
+
+  def Assign(self, device_path):
+    with self.lock:
+      if device_path is not None:
+        for device in self.devices:
+          if device.path == device_path:
+            break
+        else:
+          raise RuntimeError(
+              'Path {} does not map to an Edge TPU device.'.format(
+                  device_path))
+      else:
+        unassigned = [d for d in self.devices if not d.engines]
+        if unassigned:
+          device = unassigned[0]
+        elif len(self.devices) == 1:
+          device = self.devices[0]
+        else:
+          raise RuntimeError(
+              'Multiple Edge TPUs detected and all have been mapped to at '
+              'least one model. If you want to share one Edge TPU with '
+              'multiple models, specify `device_path` name.')
+      device.engines += 1
+      return device
+
+  def Release(self, device):
+    with self.lock:
+      device.engines -= 1
+
+  def ListPaths(self, state):
+    with self.lock:
+      return tuple(
+          d.path for d in self.devices
+          if state == EdgeTpuState_kNone or
+          (state == EdgeTpuState_kAssigned) == bool(d.engines))
+
+
+_simulator = None
+_simulator_lock = threading.Lock()
+
+
+def _LatencyModelFromEnvironment():
+  spec = os.environ.get(ENV_LATENCY, 'reference')
+  jitter = float(os.environ.get(ENV_JITTER, 0.0))
+  switch_penalty = float(os.environ.get(ENV_SWITCH_PENALTY,
+                                        DEFAULT_SWITCH_PENALTY))
+  kind, _, value = spec.partition(':')
+  if kind == 'fixed':
+    return LatencyModel(float(value or DEFAULT_LATENCY), jitter=jitter,
+                        switch_penalty=switch_penalty)
+  if kind == 'reference':
+    path = value or DefaultProfilePath()
+    profile = LoadProfile(path) if path else None
+    return LatencyModel(profile=profile, jitter=jitter,
+                        switch_penalty=switch_penalty)
+  raise ValueError('Invalid {}: {}. Expected fixed:<ms> or '
+                   'reference[:<csv path>].'.format(ENV_LATENCY, spec))
+
+
+def _GetSimulator():
+  global _simulator
+  with _simulator_lock:
+    if _simulator is None:
+      _simulator = _Simulator(int(os.environ.get(ENV_DEVICES, 1)),
+                              _LatencyModelFromEnvironment())
+    return _simulator
+
+
+def Configure(num_devices=None, latency_model=None):
+  """Reconfigures the simulated devices.
+
+  Must be called before engines are created; existing engines keep their
+  devices.
+
+  Args:
+    num_devices: int, number of simulated Edge TPUs, unchanged if None.
+    latency_model: LatencyModel, unchanged if None.
+  """
+  global _simulator
+  current = _GetSimulator()
+  with _simulator_lock:
+    _simulator = _Simulator(
+        num_devices if num_devices is not None else len(current.devices),
+        latency_model or current.latency_model)
+
+
+def ListEdgeTpuPaths(state):
+  """Lists paths of simulated Edge TPUs in the given state."""
+  return _GetSimulator().ListPaths(state)
+
+
+def GetRuntimeVersion():
+  """Returns version string of the simulated runtime."""
+  return kSupportedRuntimeVersion
+
+
+def _ReadModel(model_path):
+  if not os.path.isfile(model_path):
+    raise RuntimeError('Could not open \'{}\'.'.format(model_path))
+  try:
+    return tflite_model.TfLiteModel(model_path)
+  except ValueError as e:
+    raise RuntimeError(str(e))
+
+
+def _IsDetectionOutput(sizes):
+  """Outputs of SSD post-processing: boxes, classes, scores, count."""
+  return (len(sizes) == 4 and sizes[3] == 1 and sizes[1] == sizes[2] and
+          sizes[0] == 4 * sizes[1])
+
+
+class BasicEngine(object):
+  """Simulated BasicEngine, same interface as the SWIG one."""
+
+  def __init__(self, model_path, device_path=None):
+    """Initializes BasicEngine with model's path.
+
+    Args:
+      model_path: [required] string.
+      device_path: [optional] string, path to simulated Edge TPU device.
+    """
+    model = _ReadModel(model_path)
+    if len(model.inputs) != 1:
+      raise RuntimeError('Model should have 1 input tensor only!')
+    self._model_path = model_path
+    self._input_shape = model.inputs[0].shape.copy()
+    self._input_size = model.inputs[0].size()
+    self._outputs = model.outputs
+    self._output_sizes = np.array([t.size() for t in model.outputs])
+    self._raw_output = np.zeros(self._output_sizes.sum(), dtype=np.float32)
+    self._inference_time = 0.0
+    self._model_seed = zlib.crc32(os.path.basename(model_path).encode())
+    self._simulator = _GetSimulator()
+    self._device = self._simulator.Assign(device_path)
+    weakref.finalize(self, self._simulator.Release, self._device)
+
+  def RunInference(self, input):  # pylint: disable=redefined-builtin
+    """Runs inference with given input.
+
+    Args:
+      input: 1-D numpy.array. Flattened input tensor.
+
+    Returns:
+      (latency, output_tensors), see the SWIG BasicEngine.
+    """
+    input = np.asarray(input)
+    if input.size != self._input_size:
+      raise RuntimeError(
+          'Size of input data doesn\'t match with required size! Required '
+          'size: {}, input size: {}.'.format(self._input_size, input.size))
+    device = self._device
+    with device.lock:
+      cold = device.loaded_engine != id(self)
+      device.loaded_engine = id(self)
+      latency = self._simulator.latency_model.Sample(self._model_path, cold)
+      time.sleep(latency / 1000.0)
+    self._raw_output = self._PseudoOutput(input)
+    self._inference_time = latency
+    return latency, self._raw_output
+
+  def _PseudoOutput(self, input):  # pylint: disable=redefined-builtin
+    rng = np.random.RandomState(
+        zlib.crc32(np.ascontiguousarray(input).view(np.uint8),
+                   self._model_seed))
+    if _IsDetectionOutput(self._output_sizes):
+      n = int(self._output_sizes[1])
+      corners = rng.uniform(0.0, 0.8, (n, 2))
+      sizes = rng.uniform(0.05, 0.2, (n, 2))
+      boxes = np.concatenate((corners, corners + sizes), axis=1)
+      classes = rng.randint(0, 90, n)
+      scores = np.sort(rng.uniform(0.0, 1.0, n))[::-1]
+      return np.concatenate((boxes.ravel(), classes, scores, [n])).astype(
+          np.float32)
+    chunks = []
+    for tensor in self._outputs:
+      if tensor.dtype in (np.uint8, np.int8) and tensor.scale is not None:
+        info = np.iinfo(tensor.dtype)
+        values = rng.randint(info.min, info.max + 1, tensor.size())
+        chunks.append(tensor.scale * (values - tensor.zero_point))
+      else:
+        chunks.append(rng.uniform(0.0, 1.0, tensor.size()))
+    return np.concatenate(chunks).astype(np.float32)
+
+  def get_input_tensor_shape(self):
+    """Gets shape of required input tensor, as 1-D numpy.array."""
+    return self._input_shape.copy()
+
+  def get_all_output_tensors_sizes(self):
+    """Gets sizes of output tensors, as numpy.array."""
+    return self._output_sizes.copy()
+
+  def get_num_of_output_tensors(self):
+    """Gets number of output tensors."""
+    return len(self._output_sizes)
+
+  def get_output_tensor_size(self, tensor_index):
+    """Gets size of specific output tensor."""
+    if tensor_index < 0:
+      raise RuntimeError('tensor_index must > 0!')
+    if tensor_index >= len(self._output_sizes):
+      raise RuntimeError('tensor_index doesn\'t exist!')
+    return int(self._output_sizes[tensor_index])
+
+  def required_input_array_size(self):
+    """Returns required size of input array of RunInference."""
+    return self._input_size
+
+  def total_output_array_size(self):
+    """Gets expected size of output array returned by RunInference."""
+    return int(self._output_sizes.sum())
+
+  def model_path(self):
+    """Gets the path of model loaded in the engine."""
+    return self._model_path
+
+  def get_raw_output(self):
+    """Gets output_tensors of last inference."""
+    return self._raw_output
+
+  def get_inference_time(self):
+    """Gets latency of last inference, in milliseconds."""
+    return self._inference_time
+
+  def device_path(self):
+    """Gets associated simulated device path of this engine."""
+    return self._device.path
+
+
+class ImprintingEngine(object):
+  """Simulated ImprintingEngine, same interface as the SWIG one.
+
+  Training only validates the input and assigns label ids; SaveModel() writes
+  a copy of the original model.
+  """
+
+  def __init__(self, model_path):
+    """Initializes ImprintingEngine with embedding extractor/model's path."""
+    if not os.path.isfile(model_path):
+      raise RuntimeError('Failed to open file: {}'.format(model_path))
+    model = _ReadModel(model_path)
+    output_shape = model.outputs[0].shape.tolist()
+    if len(output_shape) == 4 and output_shape[:3] != [1, 1, 1]:
+      raise RuntimeError(
+          'Embedding extractor\'s output tensor should be [1, 1, 1, x]')
+    self._model_path = model_path
+    self._input_size = model.inputs[0].size()
+    self._num_classes = output_shape[-1] if len(output_shape) == 2 else 0
+    self._trained = False
+
+  def Train(self, input):  # pylint: disable=redefined-builtin
+    """Trains model with a set of images from same class.
+
+    Returns:
+      int, the label_id for the class.
+    """
+    for tensor in input:
+      if np.asarray(tensor).size != self._input_size:
+        raise RuntimeError(
+            'Size of input data doesn\'t match with required size!')
+    label_id = self._num_classes
+    self._num_classes += 1
+    self._trained = True
+    return label_id
+
+  def SaveModel(self, output_path):
+    """Saves trained model as '.tflite' file."""
+    if not self._trained:
+      raise RuntimeError('Model without training won\'t be saved!')
+    shutil.copyfile(self._model_path, output_path)
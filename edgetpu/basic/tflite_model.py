@@ -0,0 +1,222 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Minimal reader of TF-Lite Flatbuffer files.
+
+Reads the metadata needed without the TF-Lite runtime: tensors of the main
+subgraph (name, shape, type, quantization), its inputs and outputs, operator
+codes, and the raw data of constant tensors. Only the fields of the schema
+used here are decoded, so the flatbuffers package isn't needed.
+"""
+
+import struct
+
+import numpy as np
+
+# TensorType of the TF-Lite schema : numpy dtype.
+_TENSOR_TYPES = {
+    0: np.float32,
+    1: np.float16,
+    2: np.int32,
+    3: np.uint8,
+    4: np.int64,
+    6: np.bool_,
+    7: np.int16,
+    8: np.complex64,
+    9: np.int8,
+}
+
+# BuiltinOperator.CUSTOM of the TF-Lite schema.
+_CUSTOM_OPERATOR = 32
+# Custom operator of models compiled for Edge TPU.
+EDGETPU_CUSTOM_OP = 'edgetpu-custom-op'
+
+_FILE_IDENTIFIER = b'TFL3'
+
+
+class _Table(object):
+  """A flatbuffer table, fields are read by index of the schema."""
+  __slots__ = ['_buf', '_pos', '_vtable', '_vtable_size']
+
+  def __init__(self, buf, pos):
+    self._buf = buf
+    self._pos = pos
+    self._vtable = pos - struct.unpack_from('<i', buf, pos)[0]
+    self._vtable_size = struct.unpack_from('<H', buf, self._vtable)[0]
+
+  def _Offset(self, field):
+    entry = 4 + 2 * field
+    if entry >= self._vtable_size:
+      return 0
+    return struct.unpack_from('<H', self._buf, self._vtable + entry)[0]
+
+  def Scalar(self, field, fmt, default=0):
+    offset = self._Offset(field)
+    if not offset:
+      return default
+    return struct.unpack_from('<' + fmt, self._buf, self._pos + offset)[0]
+
+  def _Indirect(self, field):
+    offset = self._Offset(field)
+    if not offset:
+      return None
+    pos = self._pos + offset
+    return pos + struct.unpack_from('<I', self._buf, pos)[0]
+
+  def Table(self, field):
+    pos = self._Indirect(field)
+    return None if pos is None else _Table(self._buf, pos)
+
+  def String(self, field):
+    pos = self._Indirect(field)
+    if pos is None:
+      return None
+    length = struct.unpack_from('<I', self._buf, pos)[0]
+    return bytes(self._buf[pos + 4:pos + 4 + length]).decode('utf-8')
+
+  def Vector(self, field, dtype):
+    """Reads a vector of scalars as numpy.array."""
+    pos = self._Indirect(field)
+    if pos is None:
+      return np.zeros(0, dtype=dtype)
+    length = struct.unpack_from('<I', self._buf, pos)[0]
+    return np.frombuffer(self._buf, dtype=np.dtype(dtype).newbyteorder('<'),
+                         count=length, offset=pos + 4)
+
+  def Tables(self, field):
+    """Reads a vector of tables."""
+    pos = self._Indirect(field)
+    if pos is None:
+      return []
+    length = struct.unpack_from('<I', self._buf, pos)[0]
+    tables = []
+    for i in range(length):
+      element = pos + 4 + 4 * i
+      tables.append(_Table(
+          self._buf, element + struct.unpack_from('<I', self._buf,
+                                                  element)[0]))
+    return tables
+
+
+class TensorInfo(object):
+  """Metadata of one tensor."""
+  __slots__ = ['index', 'name', 'shape', 'dtype', 'scale', 'zero_point',
+               'buffer']
+
+  def __init__(self, index, table):
+    #: int, index of the tensor in the subgraph.
+    self.index = index
+    #: string, name of the tensor.
+    self.name = table.String(3) or ''
+    #: 1-D numpy.array of int, shape of the tensor.
+    self.shape = table.Vector(0, np.int32).astype(np.int64)
+    #: numpy dtype of the elements, None for unsupported types.
+    self.dtype = _TENSOR_TYPES.get(table.Scalar(1, 'b'))
+    quantization = table.Table(4)
+    scale = quantization.Vector(2, np.float32) if quantization else []
+    zero_point = quantization.Vector(3, np.int64) if quantization else []
+    #: float, quantization scale, or None if not quantized.
+    self.scale = float(scale[0]) if len(scale) else None
+    #: int, quantization zero point, or None if not quantized.
+    self.zero_point = int(zero_point[0]) if len(zero_point) else None
+    #: int, index of the buffer holding constant data, 0 if none.
+    self.buffer = table.Scalar(2, 'I')
+
+  def size(self):
+    """Returns the number of elements."""
+    return int(np.prod(self.shape)) if self.shape.size else 1
+
+  def __repr__(self):
+    return 'TensorInfo(name=%s, shape=%s, dtype=%s)' % (
+        self.name, self.shape.tolist(),
+        np.dtype(self.dtype).name if self.dtype else None)
+
+
+class TfLiteModel(object):
+  """Metadata of a TF-Lite model, from the first subgraph."""
+
+  def __init__(self, model_path):
+    """Reads a model.
+
+    Args:
+      model_path: string, path to TF-Lite Flatbuffer file.
+
+    Raises:
+      ValueError: when the file isn't a TF-Lite model.
+    """
+    with open(model_path, 'rb') as f:
+      self._buf = f.read()
+    if len(self._buf) < 8 or self._buf[4:8] != _FILE_IDENTIFIER:
+      raise ValueError('{} is not a TF-Lite model!'.format(model_path))
+    #: string, path of the model.
+    self.model_path = model_path
+    model = _Table(self._buf, struct.unpack_from('<I', self._buf, 0)[0])
+    #: int, schema version.
+    self.version = model.Scalar(0, 'I')
+    #: string, description of the model.
+    self.description = model.String(3) or ''
+    #: list of string, operator code of each operator kind, the custom code
+    #: for custom operators, e.g. EDGETPU_CUSTOM_OP.
+    self.operator_codes = []
+    for code in model.Tables(1):
+      builtin = code.Scalar(0, 'b')
+      if builtin == _CUSTOM_OPERATOR:
+        self.operator_codes.append(code.String(1) or '')
+      else:
+        self.operator_codes.append(builtin)
+    subgraphs = model.Tables(2)
+    if not subgraphs:
+      raise ValueError('{} has no subgraph!'.format(model_path))
+    subgraph = subgraphs[0]
+    #: list of TensorInfo, all tensors of the subgraph.
+    self.tensors = [TensorInfo(i, t) for i, t in
+                    enumerate(subgraph.Tables(0))]
+    #: list of TensorInfo, inputs of the model.
+    self.inputs = [self.tensors[i] for i in subgraph.Vector(1, np.int32)]
+    #: list of TensorInfo, outputs of the model.
+    self.outputs = [self.tensors[i] for i in subgraph.Vector(2, np.int32)]
+    self._buffers = model.Tables(4)
+
+  def is_edgetpu_compiled(self):
+    """Returns True if the model was compiled for Edge TPU."""
+    return EDGETPU_CUSTOM_OP in self.operator_codes
+
+  def GetTensor(self, name):
+    """Finds a tensor by name.
+
+    Raises:
+      KeyError: when there's no tensor with this name.
+    """
+    for tensor in self.tensors:
+      if tensor.name == name:
+        return tensor
+    raise KeyError(name)
+
+  def GetTensorData(self, tensor):
+    """Gets the constant data of a tensor.
+
+    Args:
+      tensor: TensorInfo.
+
+    Returns:
+      numpy.array of tensor.shape, or None if the tensor has no constant data
+      (e.g. an activation, or a weight inside the Edge TPU custom operator).
+    """
+    if not tensor.buffer or tensor.dtype is None:
+      return None
+    data = self._buffers[tensor.buffer].Vector(0, np.uint8)
+    if not data.size:
+      return None
+    return data.view(np.dtype(tensor.dtype).newbyteorder('<')).reshape(
+        tensor.shape)
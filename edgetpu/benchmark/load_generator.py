@@ -0,0 +1,396 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Open-loop load generator for latency versus offered load curves.
+
+Closed-loop benchmarks issue the next request only when the previous one is
+done, so they never see queueing. Here requests arrive on a schedule that
+doesn't depend on the target (Poisson or bursty arrivals at a target rate),
+wait in a queue for a free worker, and latency is measured from the scheduled
+arrival time, so queueing delay is included even when the generator falls
+behind.
+
+Targets:
+  EngineTarget: a set of engines, one worker per engine.
+  HttpTarget: a local server, POSTs a payload to a URL.
+
+Rates are swept up to saturation, i.e. until achieved throughput falls behind
+offered load or the backlog grows beyond a limit, and each rate gives one
+LoadPoint with latency percentiles:
+
+  edgetpu_load_generator --model mobilenet_v1_1.0_224_quant_edgetpu.tflite \\
+      --num_engines 2 --duration 10 --slo_ms 30 --output load.jsonl
+
+prints the curve and the highest rate meeting p99 < 30 ms.
+"""
+
+import argparse
+import collections
+import json
+import queue
+import sys
+import threading
+import time
+import urllib.request
+
+from edgetpu.basic import edgetpu_utils
+from edgetpu.basic.basic_engine import BasicEngine
+import numpy as np
+
+POISSON = 'poisson'
+BURSTY = 'bursty'
+ARRIVALS = (POISSON, BURSTY)
+
+# Reported percentiles of a LoadPoint.
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def ArrivalTimes(rate, duration, arrival=POISSON, burst_size=8, seed=0):
+  """Generates request arrival times.
+
+  Args:
+    rate: float, mean number of requests per second.
+    duration: float, length of the schedule in seconds.
+    arrival: string, POISSON for exponential inter-arrival times; BURSTY for
+      bursts of burst_size simultaneous requests with Poisson burst arrivals
+      at rate / burst_size, same mean rate but much higher variance.
+    burst_size: int, number of requests per burst.
+    seed: int, seed of the schedule.
+
+  Returns:
+    1-D numpy.array of arrival times in seconds from start, sorted.
+
+  Raises:
+    ValueError: when arguments are invalid.
+  """
+  if rate <= 0 or duration <= 0:
+    raise ValueError('rate and duration must be positive!')
+  if arrival not in ARRIVALS:
+    raise ValueError('Unknown arrival process: {}. Expected one of {}.'.format(
+        arrival, ', '.join(ARRIVALS)))
+  rng = np.random.RandomState(seed)
+  event_rate = rate if arrival == POISSON else rate / float(burst_size)
+  # Draws a few more gaps than expected, and then cuts at duration.
+  count = int(event_rate * duration + 5 * np.sqrt(event_rate * duration) + 10)
+  times = np.cumsum(rng.exponential(1.0 / event_rate, count))
+  times = times[times < duration]
+  if arrival == BURSTY:
+    times = np.repeat(times, burst_size)
+  return times
+
+
+class EngineTarget(object):
+  """Runs inference on a set of engines, one worker per engine."""
+
+  def __init__(self, engines, input_tensor=None):
+    """Creates the target.
+
+    Args:
+      engines: list of BasicEngine (or subclass).
+      input_tensor: 1-D numpy.array of uint8, input of every request. By
+        default a random input of the size of the first engine's input.
+    """
+    self._engines = engines
+    if input_tensor is None:
+      input_tensor = np.random.randint(
+          0, 256, engines[0].required_input_array_size(), dtype=np.uint8)
+    self._input = input_tensor
+    #: int, number of requests processed concurrently.
+    self.num_workers = len(engines)
+
+  def __call__(self, worker):
+    self._engines[worker].RunInference(self._input)
+
+
+class HttpTarget(object):
+  """POSTs a payload to a local server, e.g. an inference service."""
+
+  def __init__(self, url, payload, content_type='application/octet-stream',
+               num_workers=4, timeout=10.0):
+    """Creates the target.
+
+    Args:
+      url: string, URL of the endpoint.
+      payload: bytes, request body.
+      content_type: string, Content-Type of the request.
+      num_workers: int, number of concurrent connections.
+      timeout: float, timeout of each request in seconds.
+    """
+    self._url = url
+    self._payload = payload
+    self._headers = {'Content-Type': content_type}
+    self._timeout = timeout
+    #: int, number of requests processed concurrently.
+    self.num_workers = num_workers
+
+  def __call__(self, worker):
+    request = urllib.request.Request(self._url, data=self._payload,
+                                     headers=self._headers)
+    with urllib.request.urlopen(request, timeout=self._timeout) as response:
+      response.read()
+
+
+class LoadPoint(object):
+  """Result of running one offered load."""
+  __slots__ = ['offered_rate', 'achieved_rate', 'requests', 'completed',
+               'errors', 'saturated', 'latency_ms', 'service_ms',
+               'max_backlog']
+
+  def __init__(self, offered_rate):
+    #: float, scheduled requests per second.
+    self.offered_rate = offered_rate
+    #: float, completed requests per second.
+    self.achieved_rate = 0.0
+    #: int, number of requests scheduled.
+    self.requests = 0
+    #: int, number of requests completed without error.
+    self.completed = 0
+    #: int, number of requests that raised an exception.
+    self.errors = 0
+    #: bool, whether the target couldn't keep up with offered load.
+    self.saturated = False
+    #: OrderedDict, {'mean', 'p50', 'p90', 'p99', 'p99.9', 'max'} of latency
+    #: from scheduled arrival to completion, in milliseconds.
+    self.latency_ms = None
+    #: float, mean time the target spent on a request, in milliseconds.
+    self.service_ms = None
+    #: int, maximum number of requests waiting for a worker.
+    self.max_backlog = 0
+
+  def ToDict(self):
+    return collections.OrderedDict(
+        (name, getattr(self, name)) for name in self.__slots__)
+
+
+def RunOpenLoop(target, arrival_times, max_backlog=10000,
+                min_achieved_ratio=0.95):
+  """Runs one schedule of requests against a target.
+
+  Args:
+    target: callable taking the worker index, with attribute num_workers.
+    arrival_times: 1-D numpy.array, see ArrivalTimes().
+    max_backlog: int, stops issuing requests once this many are waiting, the
+      point is then marked saturated.
+    min_achieved_ratio: float, the point is marked saturated when achieved
+      rate is below this fraction of offered rate.
+
+  Returns:
+    LoadPoint.
+  """
+  duration = float(arrival_times[-1]) if arrival_times.size else 0.0
+  point = LoadPoint(arrival_times.size / duration if duration else 0.0)
+  pending = queue.Queue()
+  lock = threading.Lock()
+  latencies = []
+  service_times = []
+  errors = [0]
+
+  def worker(index):
+    while True:
+      scheduled = pending.get()
+      if scheduled is None:
+        return
+      start = time.perf_counter()
+      try:
+        target(index)
+      except Exception:  # pylint:disable=broad-except
+        with lock:
+          errors[0] += 1
+        continue
+      end = time.perf_counter()
+      with lock:
+        latencies.append(end - scheduled)
+        service_times.append(end - start)
+
+  workers = [threading.Thread(target=worker, args=(i,), daemon=True)
+             for i in range(target.num_workers)]
+  for w in workers:
+    w.start()
+
+  start = time.perf_counter()
+  for offset in arrival_times:
+    scheduled = start + offset
+    delay = scheduled - time.perf_counter()
+    if delay > 0:
+      time.sleep(delay)
+    backlog = pending.qsize()
+    point.max_backlog = max(point.max_backlog, backlog)
+    if backlog >= max_backlog:
+      point.saturated = True
+      break
+    pending.put(scheduled)
+    point.requests += 1
+  for _ in workers:
+    pending.put(None)
+  for w in workers:
+    w.join()
+  wall_time = time.perf_counter() - start
+
+  point.completed = len(latencies)
+  point.errors = errors[0]
+  point.achieved_rate = point.completed / wall_time if wall_time else 0.0
+  if point.achieved_rate < min_achieved_ratio * point.offered_rate:
+    point.saturated = True
+  if latencies:
+    latencies = np.array(latencies) * 1000
+    point.latency_ms = collections.OrderedDict(
+        [('mean', float(latencies.mean()))] +
+        [('p%g' % p, float(v)) for p, v in
+         zip(PERCENTILES, np.percentile(latencies, PERCENTILES))] +
+        [('max', float(latencies.max()))])
+    point.service_ms = float(np.mean(service_times) * 1000)
+  return point
+
+
+def EstimateCapacity(target, iterations=50):
+  """Estimates the maximum throughput of a target in requests per second.
+
+  Runs iterations requests on one worker back to back, and assumes workers
+  scale linearly.
+  """
+  start = time.perf_counter()
+  for _ in range(iterations):
+    target(0)
+  return target.num_workers * iterations / (time.perf_counter() - start)
+
+
+def SweepRates(target, rates, duration, arrival=POISSON, burst_size=8,
+               max_backlog=10000, stop_at_saturation=True, seed=0):
+  """Runs RunOpenLoop() for increasing rates.
+
+  Args:
+    target: callable taking the worker index, with attribute num_workers.
+    rates: list of float, offered rates in requests per second.
+    duration: float, seconds per rate.
+    arrival: string, one of ARRIVALS.
+    burst_size: int, number of requests per burst of BURSTY arrivals.
+    max_backlog: int, see RunOpenLoop().
+    stop_at_saturation: bool, whether to skip the rates after the first
+      saturated one.
+    seed: int, seed of the schedules.
+
+  Returns:
+    List of LoadPoint in the order of rates.
+  """
+  points = []
+  for rate in sorted(rates):
+    point = RunOpenLoop(
+        target, ArrivalTimes(rate, duration, arrival, burst_size, seed),
+        max_backlog)
+    point.offered_rate = rate
+    points.append(point)
+    if point.saturated and stop_at_saturation:
+      break
+  return points
+
+
+def MaxRateForSlo(points, slo_ms, percentile='p99'):
+  """Finds the highest offered rate meeting a latency SLO.
+
+  Args:
+    points: list of LoadPoint.
+    slo_ms: float, latency objective in milliseconds.
+    percentile: string, key of LoadPoint.latency_ms, e.g. 'p99'.
+
+  Returns:
+    float, the rate, or None if no point meets the SLO.
+  """
+  rates = [p.offered_rate for p in points
+           if not p.saturated and not p.errors and p.latency_ms and
+           p.latency_ms[percentile] <= slo_ms]
+  return max(rates) if rates else None
+
+
+def FormatPoints(points):
+  """Formats points as a table, one row per offered rate."""
+  lines = ['%10s %10s %10s %10s %10s %10s %10s %10s %8s' % (
+      'OFFERED', 'ACHIEVED', 'MEAN_MS', 'P50_MS', 'P90_MS', 'P99_MS',
+      'P99.9_MS', 'SERVICE_MS', 'BACKLOG')]
+  for p in points:
+    latency = p.latency_ms or collections.defaultdict(float)
+    lines.append('%10.1f %10.1f %10.2f %10.2f %10.2f %10.2f %10.2f %10.2f '
+                 '%8d%s' % (
+                     p.offered_rate, p.achieved_rate, latency['mean'],
+                     latency['p50'], latency['p90'], latency['p99'],
+                     latency['p99.9'], p.service_ms or 0.0, p.max_backlog,
+                     ' saturated' if p.saturated else ''))
+  return '\n'.join(lines)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(
+      description='Open-loop load generator for Edge TPU engines.',
+      formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+  group = parser.add_mutually_exclusive_group(required=True)
+  group.add_argument('--model', help='Path of .tflite model to load.')
+  group.add_argument('--url', help='URL of a local server to POST to.')
+  parser.add_argument('--num_engines', type=int, default=None,
+                      help='Engines to create for --model, all Edge TPUs by '
+                      'default.')
+  parser.add_argument('--payload', default=None,
+                      help='File with the request body for --url.')
+  parser.add_argument('--num_connections', type=int, default=4,
+                      help='Concurrent requests for --url.')
+  parser.add_argument('--rates', nargs='+', type=float, default=None,
+                      help='Offered rates, by default 10%% to 120%% of '
+                      'estimated capacity.')
+  parser.add_argument('--duration', type=float, default=10.0,
+                      help='Seconds per rate.')
+  parser.add_argument('--arrival', default=POISSON, choices=ARRIVALS)
+  parser.add_argument('--burst_size', type=int, default=8)
+  parser.add_argument('--slo_ms', type=float, default=None,
+                      help='Reports the highest rate meeting this latency.')
+  parser.add_argument('--slo_percentile', default='p99',
+                      choices=['p%g' % p for p in PERCENTILES])
+  parser.add_argument('--output', default=None,
+                      help='JSON Lines output file, one line per rate.')
+  args = parser.parse_args(argv)
+
+  if args.model:
+    num_engines = args.num_engines or len(edgetpu_utils.ListEdgeTpuPaths(
+        edgetpu_utils.EDGE_TPU_STATE_NONE)) or 1
+    engines = [BasicEngine(args.model) for _ in range(num_engines)]
+    for engine in engines:
+      engine.Warmup()
+    target = EngineTarget(engines)
+  else:
+    payload = b''
+    if args.payload:
+      with open(args.payload, 'rb') as f:
+        payload = f.read()
+    target = HttpTarget(args.url, payload, num_workers=args.num_connections)
+
+  rates = args.rates
+  if not rates:
+    capacity = EstimateCapacity(target)
+    print('Estimated capacity: %.1f requests/s' % capacity)
+    rates = [capacity * r for r in np.arange(0.1, 1.21, 0.1)]
+  points = SweepRates(target, rates, args.duration, args.arrival,
+                      args.burst_size)
+  print(FormatPoints(points))
+  if args.output:
+    with open(args.output, 'w') as f:
+      for point in points:
+        f.write(json.dumps(point.ToDict()) + '\n')
+  if args.slo_ms is not None:
+    rate = MaxRateForSlo(points, args.slo_ms, args.slo_percentile)
+    if rate is None:
+      print('No rate meets %s < %g ms.' % (args.slo_percentile, args.slo_ms))
+      sys.exit(1)
+    print('Highest rate meeting %s < %g ms: %.1f requests/s' % (
+        args.slo_percentile, args.slo_ms, rate))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,446 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memory benchmark of Edge TPU engines.
+
+Measures, for each model:
+
+  engine_rss: growth of the resident set size (RSS) when the engine is
+    constructed, with the engines of previous models still alive, i.e. the
+    cost of each additional model in the process.
+  peak_bytes: Python/numpy memory allocated while one call runs (high-water
+    mark of tracemalloc), i.e. the allocation volume of the API.
+  retained_bytes: part of it still alive after the call, e.g. the output.
+  rss_slope: growth of RSS per call over many calls (100k by default), fitted
+    after a warmup. A slope above max_slope flags a leak.
+
+APIs are:
+  run_inference: BasicEngine.RunInference with a random input tensor.
+  classify_with_image: ClassificationEngine.ClassifyWithImage.
+  detect_with_image: DetectionEngine.DetectWithImage.
+  train_all: ImprintingEngine.TrainAll with one category, on a new engine for
+    each call, so the engine lifecycle is included.
+
+tracemalloc only sees allocations of Python and numpy, memory of the Edge TPU
+runtime shows in RSS only. RSS is read from /proc, so it's only available on
+Linux:
+
+  edgetpu_memory_benchmark --model_dir test_data \\
+      --models mobilenet_v1_1.0_224_quant_edgetpu.tflite \\
+      --apis run_inference classify_with_image --image test_data/cat.bmp
+
+Results are written in the format of benchmarks/reference, one row per model
+and API, and can be compared against such a file with --reference.
+"""
+
+import argparse
+import collections
+import csv
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+from edgetpu.basic import edgetpu_utils
+from edgetpu.basic.basic_engine import BasicEngine
+from edgetpu.benchmark import runner
+from edgetpu.classification.engine import ClassificationEngine
+from edgetpu.detection.engine import DetectionEngine
+from edgetpu.learn.imprinting.engine import ImprintingEngine
+import numpy as np
+from PIL import Image
+
+RUN_INFERENCE = 'run_inference'
+CLASSIFY_WITH_IMAGE = 'classify_with_image'
+DETECT_WITH_IMAGE = 'detect_with_image'
+TRAIN_ALL = 'train_all'
+APIS = (RUN_INFERENCE, CLASSIFY_WITH_IMAGE, DETECT_WITH_IMAGE, TRAIN_ALL)
+
+# Engine class of each API.
+_ENGINES = {
+    RUN_INFERENCE: BasicEngine,
+    CLASSIFY_WITH_IMAGE: ClassificationEngine,
+    DETECT_WITH_IMAGE: DetectionEngine,
+    TRAIN_ALL: BasicEngine,
+}
+
+# Columns of result and reference files, after MODEL and API.
+COLUMNS = ('ENGINE_RSS_KB', 'PEAK_BYTES_PER_CALL', 'RETAINED_BYTES_PER_CALL',
+           'RSS_SLOPE_BYTES_PER_CALL')
+
+DEFAULT_MAX_SLOPE = 4.0
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def ReadRss():
+  """Returns resident set size of this process in bytes, or None.
+
+  It's None where /proc isn't available.
+  """
+  try:
+    with open('/proc/self/statm') as f:
+      return int(f.read().split()[1]) * _PAGE_SIZE
+  except (OSError, IndexError, ValueError):
+    return None
+
+
+def _DevicePath():
+  """Returns the first Edge TPU, engines share it so they can coexist."""
+  paths = edgetpu_utils.ListEdgeTpuPaths(edgetpu_utils.EDGE_TPU_STATE_NONE)
+  return paths[0] if paths else None
+
+
+def EngineFootprint(model_paths, engine_class=BasicEngine, device_path=None):
+  """Measures RSS growth of constructing engines one after another.
+
+  Args:
+    model_paths: list of string, paths of .tflite models.
+    engine_class: class of the engines, e.g. ClassificationEngine.
+    device_path: string, Edge TPU shared by the engines, the first one if
+      None.
+
+  Returns:
+    list of OrderedDict, one per model, with RSS before and after its
+    engine is constructed, and their difference, in bytes. RSS fields are
+    None where RSS isn't available.
+  """
+  device_path = device_path or _DevicePath()
+  engines = []
+  records = []
+  try:
+    for model_path in model_paths:
+      gc.collect()
+      before = ReadRss()
+      engines.append(engine_class(model_path, device_path))
+      after = ReadRss()
+      records.append(collections.OrderedDict([
+          ('model', os.path.basename(model_path)),
+          ('engine', engine_class.__name__),
+          ('rss_before', before),
+          ('rss_after', after),
+          ('rss_delta', after - before if before is not None else None),
+      ]))
+  finally:
+    del engines
+  return records
+
+
+def MakeCall(api, model_path, image_path=None, device_path=None):
+  """Creates the function calling an API once.
+
+  Args:
+    api: string, one of APIS.
+    model_path: string, path of .tflite model.
+    image_path: string, input image, not used by run_inference.
+    device_path: string, Edge TPU to use, the first one if None.
+
+  Returns:
+    function without argument.
+
+  Raises:
+    ValueError: when api is unknown or an image is required.
+  """
+  if api not in APIS:
+    raise ValueError('Unknown API: {}'.format(api))
+  if api != RUN_INFERENCE and not image_path:
+    raise ValueError('{} requires an image!'.format(api))
+  device_path = device_path or _DevicePath()
+  engine = _ENGINES[api](model_path, device_path)
+  if api == RUN_INFERENCE:
+    input_tensor = np.random.RandomState(1).randint(
+        0, 256, size=engine.required_input_array_size(), dtype=np.uint8)
+    return lambda: engine.RunInference(input_tensor)
+
+  with Image.open(image_path) as img:
+    img = img.convert('RGB')
+  if api == CLASSIFY_WITH_IMAGE:
+    return lambda: engine.ClassifyWithImage(img)
+  if api == DETECT_WITH_IMAGE:
+    return lambda: engine.DetectWithImage(img)
+
+  _, height, width, _ = engine.get_input_tensor_shape()
+  input_data = {'category': [np.asarray(img.resize(
+      (width, height), Image.NEAREST)).flatten()]}
+  del engine
+
+  def TrainAll():
+    ImprintingEngine(model_path).TrainAll(input_data)
+
+  return TrainAll
+
+
+def AllocationPerCall(fn, calls=100, warmup=5):
+  """Measures Python/numpy memory allocated by each call with tracemalloc.
+
+  Args:
+    fn: function without argument.
+    calls: int, number of measured calls.
+    warmup: int, number of calls before measuring, e.g. to fill caches.
+
+  Returns:
+    OrderedDict with peak_bytes and retained_bytes summaries over the calls
+    (mean, max), see module documentation.
+  """
+  for _ in range(warmup):
+    fn()
+  was_tracing = tracemalloc.is_tracing()
+  if was_tracing:
+    tracemalloc.stop()
+  peaks = np.zeros(calls)
+  retained = np.zeros(calls)
+  try:
+    for i in range(calls):
+      tracemalloc.start()
+      fn()
+      retained[i], peaks[i] = tracemalloc.get_traced_memory()
+      tracemalloc.stop()
+  finally:
+    tracemalloc.stop()
+    if was_tracing:
+      tracemalloc.start()
+  return collections.OrderedDict([
+      ('peak_bytes', collections.OrderedDict([
+          ('mean', float(peaks.mean())), ('max', float(peaks.max()))])),
+      ('retained_bytes', collections.OrderedDict([
+          ('mean', float(retained.mean())), ('max', float(retained.max()))])),
+  ])
+
+
+def CheckLeak(fn, iterations=100000, num_samples=100, warmup=1000,
+              max_slope=DEFAULT_MAX_SLOPE):
+  """Checks whether RSS keeps growing over many calls.
+
+  Args:
+    fn: function without argument.
+    iterations: int, number of measured calls.
+    num_samples: int, number of RSS samples, evenly spaced over the calls.
+    warmup: int, number of calls before sampling, while allocator pools and
+      caches settle.
+    max_slope: float, largest growth in bytes per call not flagged as leak.
+
+  Returns:
+    OrderedDict with the RSS slope (bytes per call, least squares fit over
+    the samples), the total growth and whether it's flagged as leak; or
+    with 'error' if RSS isn't available.
+
+  Raises:
+    ValueError: when there are fewer than 2 samples or calls per sample.
+  """
+  num_samples = min(num_samples, iterations)
+  if num_samples < 2:
+    raise ValueError('At least 2 samples are needed!')
+  result = collections.OrderedDict([('iterations', iterations),
+                                    ('max_slope', max_slope)])
+  if ReadRss() is None:
+    result['error'] = 'RSS is not available on this platform.'
+    return result
+  for _ in range(warmup):
+    fn()
+  gc.collect()
+  calls = np.linspace(0, iterations, num_samples).astype(np.int64)
+  rss = np.zeros(num_samples)
+  done = 0
+  for i, target in enumerate(calls):
+    for _ in range(target - done):
+      fn()
+    done = target
+    rss[i] = ReadRss()
+  slope = float(np.polyfit(calls, rss, 1)[0])
+  result['rss_slope'] = slope
+  result['rss_growth'] = float(rss[-1] - rss[0])
+  result['leak'] = slope > max_slope
+  return result
+
+
+def RunMemoryBenchmark(model_path, api, image_path=None, iterations=100000,
+                       allocation_calls=100, max_slope=DEFAULT_MAX_SLOPE):
+  """Runs allocation and leak checks of one API of a model.
+
+  Returns:
+    OrderedDict, the benchmark record. It has 'error' instead of measurements
+    if the API couldn't run.
+  """
+  record = collections.OrderedDict([
+      ('model', os.path.basename(model_path)),
+      ('api', api),
+      ('image', os.path.basename(image_path) if image_path else None),
+      ('machine', runner.MachineInfo()),
+      ('runtime_flavor', edgetpu_utils.GetRuntimeFlavor()),
+      ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%S')),
+  ])
+  try:
+    fn = MakeCall(api, model_path, image_path)
+  except (ValueError, RuntimeError) as e:
+    record['error'] = str(e)
+    return record
+  record.update(AllocationPerCall(fn, allocation_calls))
+  record['leak_check'] = CheckLeak(fn, iterations, max_slope=max_slope)
+  return record
+
+
+def ResultRows(footprints, records):
+  """Joins engine footprints and records into rows of a result file.
+
+  Args:
+    footprints: list of records of EngineFootprint().
+    records: list of records of RunMemoryBenchmark().
+
+  Returns:
+    list of tuple, header ('MODEL', 'API') + COLUMNS, then one row per record
+    without error. Missing values are '-'.
+  """
+  engine_rss = {f['model']: f['rss_delta'] for f in footprints}
+  rows = [('MODEL', 'API') + COLUMNS]
+  for record in records:
+    if 'error' in record:
+      continue
+    leak_check = record['leak_check']
+    rss = engine_rss.get(record['model'])
+    rows.append((
+        record['model'], record['api'],
+        '%d' % (rss / 1024) if rss is not None else '-',
+        '%d' % record['peak_bytes']['mean'],
+        '%d' % record['retained_bytes']['mean'],
+        '%.2f' % leak_check['rss_slope'] if 'rss_slope' in leak_check
+        else '-'))
+  return rows
+
+
+def ReadReference(file_name):
+  """Reads a result or reference file.
+
+  Returns:
+    {(model, api) : {column : float}}, '-' values are left out.
+  """
+  reference = {}
+  with open(file_name, newline='') as f:
+    reader = csv.reader(f, delimiter=' ', quotechar='|')
+    header = next(reader)
+    for row in reader:
+      reference[tuple(row[:2])] = {
+          column: float(value) for column, value in zip(header[2:], row[2:])
+          if value != '-'}
+  return reference
+
+
+def WriteRows(file_name, rows):
+  """Writes rows in the csv format of benchmarks/reference."""
+  with open(file_name, 'w', newline='') as f:
+    writer = csv.writer(f, delimiter=' ', quotechar='|',
+                        quoting=csv.QUOTE_MINIMAL)
+    for row in rows:
+      writer.writerow(row)
+
+
+def CompareWithReference(rows, reference, tolerance=0.3,
+                         max_slope=DEFAULT_MAX_SLOPE):
+  """Compares result rows against reference.
+
+  Engine RSS and allocation per call are abnormal when they exceed the
+  reference by more than tolerance; rows whose RSS slope exceeds max_slope
+  are always abnormal.
+
+  Args:
+    rows: list of tuple, from ResultRows().
+    reference: see ReadReference().
+    tolerance: float, allowed relative increase.
+    max_slope: float, largest RSS growth in bytes per call not flagged as
+      leak.
+
+  Returns:
+    list of string, warning messages.
+  """
+  messages = []
+  header = rows[0]
+  slope_index = header.index('RSS_SLOPE_BYTES_PER_CALL')
+  for row in rows[1:]:
+    if row[slope_index] != '-' and float(row[slope_index]) > max_slope:
+      messages.append('Memory leak! [%s,%s] RSS grows %s bytes per call.' %
+                      (row[0], row[1], row[slope_index]))
+    expected = reference.get(tuple(row[:2]), {})
+    for column in ('ENGINE_RSS_KB', 'PEAK_BYTES_PER_CALL'):
+      value = row[header.index(column)]
+      if column in expected and value != '-' and (
+          float(value) > (1 + tolerance) * expected[column]):
+        messages.append('Unexpected high %s! [%s,%s]\n'
+                        '   Value: %s  Reference: %.0f' %
+                        (column, row[0], row[1], value, expected[column]))
+  return messages
+
+
+def ParseArgs(argv=None):
+  parser = argparse.ArgumentParser(
+      description='Benchmarks memory of Edge TPU engines.',
+      formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+  parser.add_argument('--models', nargs='+', required=True,
+                      help='Paths of .tflite models.')
+  parser.add_argument('--model_dir', default='',
+                      help='Directory prepended to relative model paths.')
+  parser.add_argument('--apis', nargs='+', default=[RUN_INFERENCE],
+                      choices=APIS)
+  parser.add_argument('--image', default=None,
+                      help='Input image for APIs other than run_inference.')
+  parser.add_argument('--iterations', type=int, default=100000,
+                      help='Calls of the leak check.')
+  parser.add_argument('--max_slope', type=float, default=DEFAULT_MAX_SLOPE,
+                      help='RSS growth in bytes per call flagged as leak.')
+  parser.add_argument('--output', default=None,
+                      help='Result file in reference format, stdout if not '
+                      'set.')
+  parser.add_argument('--records', default=None,
+                      help='JSON Lines file of the full records.')
+  parser.add_argument('--reference', default=None,
+                      help='Reference file to compare with.')
+  parser.add_argument('--enable_assertion', action='store_true',
+                      help='Exit with error on leaks or abnormal results.')
+  args = parser.parse_args(argv)
+  if args.iterations < 2:
+    parser.error('iterations must be >= 2.')
+  return args
+
+
+def main(argv=None):
+  args = ParseArgs(argv)
+  models = [os.path.join(args.model_dir, m) for m in args.models]
+  footprints = EngineFootprint(models)
+  records = []
+  for model in models:
+    for api in args.apis:
+      print('%s %s' % (os.path.basename(model), api), file=sys.stderr)
+      record = RunMemoryBenchmark(model, api, args.image, args.iterations,
+                                  max_slope=args.max_slope)
+      if 'error' in record:
+        print(' * Failed: ' + record['error'], file=sys.stderr)
+      records.append(record)
+  rows = ResultRows(footprints, records)
+  if args.output:
+    WriteRows(args.output, rows)
+  else:
+    writer = csv.writer(sys.stdout, delimiter=' ', quotechar='|')
+    writer.writerows(rows)
+  if args.records:
+    with open(args.records, 'w') as f:
+      runner.WriteJsonLines(f, footprints + records)
+  reference = ReadReference(args.reference) if args.reference else {}
+  messages = CompareWithReference(rows, reference, max_slope=args.max_slope)
+  for msg in messages:
+    print(' * ' + msg, file=sys.stderr)
+  if args.enable_assertion and messages:
+    sys.exit('Memory benchmark failed! %d abnormal results.' % len(messages))
+
+
+if __name__ == '__main__':
+  main()
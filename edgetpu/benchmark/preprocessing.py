@@ -0,0 +1,324 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark of image preprocessing on the host.
+
+Times the steps done before RunInference when feeding an image file to an
+engine, for each model input size, resampling filter, keep_aspect_ratio
+setting and source image:
+
+  decode: Image.open() and convert('RGB'), i.e. reading and decoding the file.
+  resize: img.resize(), or ResamplingWithOriginalRatio() (with its padding)
+    when keep_aspect_ratio is on, as done by DetectWithImage().
+  flatten: numpy.asarray(img).flatten(), i.e. building the input tensor.
+
+Each case is reported next to the device latency of the models with that
+input size, to tell whether the host or the Edge TPU is the bottleneck:
+
+  edgetpu_preprocessing_benchmark --model_dir test_data \\
+      --models mobilenet_v1_1.0_224_quant_edgetpu.tflite \\
+      --images test_data/cat.bmp test_data/cat_1080p.jpg \\
+      --filters nearest bilinear bicubic --keep_aspect_ratio off on
+
+Input sizes are read from the model files, so preprocessing can be measured
+on a host without Edge TPU; device latency is then left out.
+"""
+
+import argparse
+import collections
+import os
+import sys
+import time
+
+from edgetpu.basic.basic_engine import BasicEngine
+from edgetpu.basic import tflite_model
+from edgetpu.benchmark import runner
+from edgetpu.utils import image_processing
+import numpy as np
+from PIL import Image
+
+FILTERS = collections.OrderedDict([
+    ('nearest', Image.NEAREST),
+    ('box', Image.BOX),
+    ('bilinear', Image.BILINEAR),
+    ('hamming', Image.HAMMING),
+    ('bicubic', Image.BICUBIC),
+    ('lanczos', Image.LANCZOS),
+])
+
+DECODE = 'decode'
+RESIZE = 'resize'
+FLATTEN = 'flatten'
+STAGES = (DECODE, RESIZE, FLATTEN)
+
+
+class PreprocessingCase(object):
+  """One cell of the preprocessing benchmark matrix."""
+  __slots__ = ['image_path', 'input_size', 'resample', 'keep_aspect_ratio',
+               'warmup', 'iterations']
+
+  def __init__(self, image_path, input_size, resample='nearest',
+               keep_aspect_ratio=False, warmup=2, iterations=50):
+    #: string, path of the source image file.
+    self.image_path = image_path
+    #: (width, height), input size of the model.
+    self.input_size = tuple(input_size)
+    #: string, one of FILTERS.
+    self.resample = resample
+    #: bool, whether the aspect ratio of the image is kept.
+    self.keep_aspect_ratio = keep_aspect_ratio
+    #: int, number of untimed iterations.
+    self.warmup = warmup
+    #: int, number of timed iterations.
+    self.iterations = iterations
+
+
+def Preprocess(image_path, input_size, resample=Image.NEAREST,
+               keep_aspect_ratio=False):
+  """Turns an image file into an input tensor, timing each step.
+
+  Args:
+    image_path: string, path of the image file.
+    input_size: (width, height), input size of the model.
+    resample: PIL resampling filter.
+    keep_aspect_ratio: bool, whether to keep the aspect ratio of the image
+      and pad the rest, see image_processing.ResamplingWithOriginalRatio().
+
+  Returns:
+    (tensor, durations). tensor is a flattened uint8 numpy.array, durations is
+    {stage : seconds} for each of STAGES.
+  """
+  start = time.perf_counter()
+  with Image.open(image_path) as img:
+    img = img.convert('RGB')
+  decoded = time.perf_counter()
+  if keep_aspect_ratio:
+    img, _ = image_processing.ResamplingWithOriginalRatio(
+        img, input_size, resample)
+  else:
+    img = img.resize(input_size, resample)
+  resized = time.perf_counter()
+  tensor = np.asarray(img).flatten()
+  end = time.perf_counter()
+  return tensor, {DECODE: decoded - start, RESIZE: resized - decoded,
+                  FLATTEN: end - resized}
+
+
+def RunPreprocessingBenchmark(case):
+  """Runs one preprocessing case.
+
+  Args:
+    case: PreprocessingCase.
+
+  Returns:
+    OrderedDict, the benchmark record, with the latency distribution in
+    milliseconds of each stage and of their sum.
+  """
+  record = collections.OrderedDict([
+      ('image', os.path.basename(case.image_path)),
+      ('input_size', list(case.input_size)),
+      ('filter', case.resample),
+      ('keep_aspect_ratio', case.keep_aspect_ratio),
+      ('warmup', case.warmup),
+      ('iterations', case.iterations),
+      ('machine', runner.MachineInfo()),
+      ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%S')),
+  ])
+  if case.resample not in FILTERS:
+    record['error'] = 'Unknown filter: {}'.format(case.resample)
+    return record
+  resample = FILTERS[case.resample]
+  try:
+    with Image.open(case.image_path) as img:
+      record['source_size'] = list(img.size)
+  except OSError as e:
+    record['error'] = str(e)
+    return record
+
+  for _ in range(case.warmup):
+    Preprocess(case.image_path, case.input_size, resample,
+               case.keep_aspect_ratio)
+  latencies = {stage: np.zeros(case.iterations) for stage in STAGES}
+  for i in range(case.iterations):
+    _, durations = Preprocess(case.image_path, case.input_size, resample,
+                              case.keep_aspect_ratio)
+    for stage in STAGES:
+      latencies[stage][i] = durations[stage] * 1000
+  for stage in STAGES:
+    record['%s_ms' % stage] = runner.Summarize(latencies[stage])
+  record['total_ms'] = runner.Summarize(sum(latencies.values()))
+  return record
+
+
+def InputSizes(model_paths):
+  """Reads input sizes of models.
+
+  Args:
+    model_paths: list of string, paths of .tflite models.
+
+  Returns:
+    OrderedDict {(width, height) : list of model paths}, in order of first
+    appearance.
+
+  Raises:
+    ValueError: when a model doesn't take an image input.
+  """
+  sizes = collections.OrderedDict()
+  for model_path in model_paths:
+    shape = tflite_model.TfLiteModel(model_path).inputs[0].shape
+    if len(shape) != 4 or shape[3] != 3:
+      raise ValueError('{} does not take an RGB image input!'.format(
+          model_path))
+    sizes.setdefault((int(shape[2]), int(shape[1])), []).append(model_path)
+  return sizes
+
+
+def DeviceLatency(model_path, iterations=20):
+  """Measures median device latency of a model.
+
+  Args:
+    model_path: string, path of .tflite model.
+    iterations: int, number of timed inferences after one warmup inference.
+
+  Returns:
+    float, median of get_inference_time() in milliseconds, or None if the
+    model can't run (e.g. there's no Edge TPU).
+  """
+  try:
+    engine = BasicEngine(model_path)
+  except (ValueError, RuntimeError):
+    return None
+  input_tensor = np.zeros(engine.required_input_array_size(), dtype=np.uint8)
+  engine.RunInference(input_tensor)
+  latencies = [engine.RunInference(input_tensor)[0]
+               for _ in range(iterations)]
+  return float(np.median(latencies))
+
+
+def ExpandMatrix(input_sizes, images, filters, keep_aspect_ratios, warmup,
+                 iterations):
+  """Expands the benchmark matrix into cases.
+
+  Returns:
+    List of PreprocessingCase.
+  """
+  cases = []
+  for input_size in input_sizes:
+    for image in images:
+      for resample in filters:
+        for keep_aspect_ratio in keep_aspect_ratios:
+          cases.append(PreprocessingCase(image, input_size, resample,
+                                         keep_aspect_ratio, warmup,
+                                         iterations))
+  return cases
+
+
+def ReportRows(records, input_sizes, device_latencies):
+  """Joins preprocessing records with device latency of each model.
+
+  Args:
+    records: list of records from RunPreprocessingBenchmark().
+    input_sizes: {(width, height) : list of model paths}, see InputSizes().
+    device_latencies: {model path : milliseconds or None}.
+
+  Returns:
+    list of tuple, a header then one row per model and record. PREP_RATIO is
+    the median preprocessing time over device latency, above 1 the host is
+    the bottleneck of a single stream.
+  """
+  rows = [('MODEL', 'INPUT_SIZE', 'DEVICE_MS', 'IMAGE', 'SOURCE_SIZE',
+           'FILTER', 'KEEP_ASPECT_RATIO', 'DECODE_MS', 'RESIZE_MS',
+           'FLATTEN_MS', 'TOTAL_MS', 'PREP_RATIO')]
+  for record in records:
+    if 'error' in record:
+      continue
+    input_size = tuple(record['input_size'])
+    total = record['total_ms']['p50']
+    for model_path in input_sizes.get(input_size, []):
+      device = device_latencies.get(model_path)
+      rows.append((
+          os.path.basename(model_path), '%dx%d' % input_size,
+          '%.2f' % device if device else '-', record['image'],
+          '%dx%d' % tuple(record['source_size']), record['filter'],
+          'on' if record['keep_aspect_ratio'] else 'off',
+          '%.2f' % record['decode_ms']['p50'],
+          '%.2f' % record['resize_ms']['p50'],
+          '%.2f' % record['flatten_ms']['p50'], '%.2f' % total,
+          '%.2f' % (total / device) if device else '-'))
+  return rows
+
+
+def FormatRows(rows):
+  """Formats rows as a table with aligned columns."""
+  widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+  return '\n'.join('  '.join(str(v).ljust(w) for v, w in zip(row, widths))
+                   for row in rows)
+
+
+def ParseArgs(argv=None):
+  parser = argparse.ArgumentParser(
+      description='Benchmarks image preprocessing on the host.',
+      formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+  parser.add_argument('--models', nargs='+', required=True,
+                      help='Paths of .tflite models, for input sizes.')
+  parser.add_argument('--model_dir', default='',
+                      help='Directory prepended to relative model paths.')
+  parser.add_argument('--images', nargs='+', required=True,
+                      help='Source images.')
+  parser.add_argument('--filters', nargs='+', default=list(FILTERS),
+                      choices=list(FILTERS))
+  parser.add_argument('--keep_aspect_ratio', nargs='+', default=['off', 'on'],
+                      choices=['off', 'on'])
+  parser.add_argument('--warmup', type=int, default=2,
+                      help='Untimed iterations per case.')
+  parser.add_argument('--iterations', type=int, default=50,
+                      help='Timed iterations per case.')
+  parser.add_argument('--skip_device', action='store_true',
+                      help="Don't measure device latency.")
+  parser.add_argument('--output', default=None,
+                      help='JSON Lines output file of the records.')
+  args = parser.parse_args(argv)
+  if args.warmup < 0 or args.iterations <= 0:
+    parser.error('warmup must be >= 0 and iterations must be > 0.')
+  return args
+
+
+def main(argv=None):
+  args = ParseArgs(argv)
+  models = [os.path.join(args.model_dir, m) for m in args.models]
+  input_sizes = InputSizes(models)
+  device_latencies = {}
+  if not args.skip_device:
+    for model in models:
+      device_latencies[model] = DeviceLatency(model)
+  cases = ExpandMatrix(list(input_sizes), args.images, args.filters,
+                       [v == 'on' for v in args.keep_aspect_ratio],
+                       args.warmup, args.iterations)
+  records = []
+  for cnt, case in enumerate(cases, start=1):
+    print('[%d/%d] %s %dx%d %s keep_aspect_ratio=%s' % (
+        cnt, len(cases), case.image_path, case.input_size[0],
+        case.input_size[1], case.resample, case.keep_aspect_ratio),
+          file=sys.stderr)
+    records.append(RunPreprocessingBenchmark(case))
+    if 'error' in records[-1]:
+      print(' * Failed: ' + records[-1]['error'], file=sys.stderr)
+  if args.output:
+    with open(args.output, 'w') as f:
+      runner.WriteJsonLines(f, records)
+  print(FormatRows(ReportRows(records, input_sizes, device_latencies)))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,426 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Statistical performance regression detection for benchmark results.
+
+Benchmark records (see edgetpu.benchmark.runner, run with --record_latencies)
+are stored in a SQLite history. The latest run of each benchmark case is
+compared against the pooled latencies of the previous runs on the same machine
+and runtime flavor:
+
+  * Mann-Whitney U test tells whether the two latency distributions differ.
+  * Bootstrap confidence interval of the relative change of the median tells
+    by how much.
+  * Change point detection over the medians of all runs finds step changes,
+    e.g. a runtime upgrade that made a model 20% slower a few runs ago.
+
+A case is a regression (or improvement) only if the test is significant and
+the whole confidence interval is beyond the minimum effect size, so noisy runs
+are not flagged while consistent 5-20% shifts are.
+
+  edgetpu_benchmark_check --db benchmarks/result/history.sqlite \\
+      --ingest result.jsonl --enable_assertion
+"""
+
+import argparse
+import collections
+import json
+import math
+import sqlite3
+import sys
+
+import numpy as np
+
+REGRESSION = 'REGRESSION'
+IMPROVEMENT = 'IMPROVEMENT'
+NO_CHANGE = 'NO_CHANGE'
+INSUFFICIENT_DATA = 'INSUFFICIENT_DATA'
+
+# Fields identifying a benchmark case across runs.
+CASE_FIELDS = ('model', 'engine', 'preprocessing', 'image', 'threads')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  timestamp TEXT NOT NULL,
+  machine TEXT,
+  runtime_flavor TEXT,
+  runtime_version TEXT,
+  model TEXT NOT NULL,
+  engine TEXT NOT NULL,
+  preprocessing TEXT,
+  image TEXT,
+  threads INTEGER,
+  latencies BLOB NOT NULL
+)
+"""
+
+
+def _RankData(values):
+  """Ranks values from 1, ties get their average rank.
+
+  Returns:
+    (ranks, tie_counts). tie_counts is the size of each group of equal values.
+  """
+  n = values.size
+  sorter = np.argsort(values, kind='mergesort')
+  inverse = np.empty(n, dtype=np.intp)
+  inverse[sorter] = np.arange(n)
+  sorted_values = values[sorter]
+  first = np.concatenate(([True], sorted_values[1:] != sorted_values[:-1]))
+  dense = np.cumsum(first)[inverse]
+  boundaries = np.concatenate((np.nonzero(first)[0], [n]))
+  ranks = 0.5 * (boundaries[dense] + boundaries[dense - 1] + 1)
+  return ranks, np.diff(boundaries)
+
+
+def MannWhitneyU(a, b):
+  """Two-sided Mann-Whitney U test with normal approximation.
+
+  Args:
+    a: 1-D numpy.array, first sample.
+    b: 1-D numpy.array, second sample.
+
+  Returns:
+    (u, p_value). u is the U statistic of a.
+  """
+  a = np.asarray(a, dtype=np.float64)
+  b = np.asarray(b, dtype=np.float64)
+  n1, n2 = a.size, b.size
+  n = n1 + n2
+  ranks, ties = _RankData(np.concatenate((a, b)))
+  u = ranks[:n1].sum() - n1 * (n1 + 1) / 2.0
+  mean = n1 * n2 / 2.0
+  tie_term = (ties ** 3 - ties).sum() / float(n * (n - 1))
+  std = math.sqrt(n1 * n2 / 12.0 * ((n + 1) - tie_term))
+  if std == 0:
+    return u, 1.0
+  # With continuity correction.
+  z = (abs(u - mean) - 0.5) / std
+  return u, min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+
+def BootstrapMedianChange(baseline, candidate, num_resamples=2000,
+                          confidence=0.95, seed=0):
+  """Bootstrap confidence interval of the relative change of the median.
+
+  Args:
+    baseline: 1-D numpy.array, baseline latencies.
+    candidate: 1-D numpy.array, candidate latencies.
+    num_resamples: int, number of bootstrap resamples.
+    confidence: float, confidence level of the interval.
+    seed: int, seed of the resampling.
+
+  Returns:
+    (change, low, high). Relative change candidate/baseline - 1 of the
+    median, and its confidence interval.
+  """
+  baseline = np.asarray(baseline, dtype=np.float64)
+  candidate = np.asarray(candidate, dtype=np.float64)
+  rng = np.random.RandomState(seed)
+  baseline_medians = np.median(
+      baseline[rng.randint(0, baseline.size,
+                           (num_resamples, baseline.size))], axis=1)
+  candidate_medians = np.median(
+      candidate[rng.randint(0, candidate.size,
+                            (num_resamples, candidate.size))], axis=1)
+  changes = candidate_medians / baseline_medians - 1
+  alpha = (1 - confidence) / 2 * 100
+  low, high = np.percentile(changes, [alpha, 100 - alpha])
+  change = np.median(candidate) / np.median(baseline) - 1
+  return float(change), float(low), float(high)
+
+
+def DetectStepChange(series, min_segment=3, num_permutations=1000,
+                     alpha=0.01, seed=0):
+  """Finds the most likely single step change in a series.
+
+  The split maximizing the difference of segment means (scaled by segment
+  sizes) is tested against random permutations of the series.
+
+  Args:
+    series: 1-D numpy.array, e.g. median latency of each run in time order.
+    min_segment: int, minimum number of points on each side of the step.
+    num_permutations: int, number of permutations for the significance test.
+    alpha: float, significance level.
+    seed: int, seed of the permutations.
+
+  Returns:
+    (index, change, p_value) where series[index] is the first point after the
+    step and change is the relative change of the mean, or None if no
+    significant step is found.
+  """
+  series = np.asarray(series, dtype=np.float64)
+  n = series.size
+  if n < 2 * min_segment:
+    return None
+  splits = np.arange(min_segment, n - min_segment + 1)
+
+  def scores(x):
+    # x: (k, n). Returns the best score and split for each row.
+    cumsum = np.cumsum(x, axis=-1)
+    total = cumsum[..., -1:]
+    left = cumsum[..., splits - 1] / splits
+    right = (total - cumsum[..., splits - 1]) / (n - splits)
+    s = np.abs(right - left) * np.sqrt(splits * (n - splits) / float(n))
+    return s.max(axis=-1), s.argmax(axis=-1)
+
+  best, best_split = scores(series[np.newaxis])
+  rng = np.random.RandomState(seed)
+  permuted = np.array([rng.permutation(series)
+                       for _ in range(num_permutations)])
+  null_best, _ = scores(permuted)
+  p_value = (np.sum(null_best >= best[0]) + 1) / float(num_permutations + 1)
+  if p_value > alpha:
+    return None
+  index = int(splits[best_split[0]])
+  before = series[:index].mean()
+  return index, float(series[index:].mean() / before - 1), float(p_value)
+
+
+class Verdict(object):
+  """Comparison result of one benchmark case."""
+  __slots__ = ['case', 'verdict', 'baseline_p50', 'candidate_p50', 'change',
+               'ci_low', 'ci_high', 'p_value', 'step']
+
+  def __init__(self, case, verdict):
+    #: tuple, values of CASE_FIELDS.
+    self.case = case
+    #: string, REGRESSION, IMPROVEMENT, NO_CHANGE or INSUFFICIENT_DATA.
+    self.verdict = verdict
+    #: float, median latency of the baseline in milliseconds.
+    self.baseline_p50 = None
+    #: float, median latency of the latest run in milliseconds.
+    self.candidate_p50 = None
+    #: float, relative change of the median.
+    self.change = None
+    #: float, lower bound of the confidence interval of change.
+    self.ci_low = None
+    #: float, upper bound of the confidence interval of change.
+    self.ci_high = None
+    #: float, p-value of Mann-Whitney U test.
+    self.p_value = None
+    #: (timestamp, change), step change found in the run history, or None.
+    self.step = None
+
+
+def Compare(baseline, candidate, alpha=0.01, min_effect=0.05):
+  """Compares latencies of a candidate run against a baseline.
+
+  Args:
+    baseline: 1-D numpy.array, baseline latencies.
+    candidate: 1-D numpy.array, candidate latencies.
+    alpha: float, significance level of the Mann-Whitney U test.
+    min_effect: float, minimum relative change of median to report.
+
+  Returns:
+    Verdict, with case unset.
+  """
+  if len(baseline) < 5 or len(candidate) < 5:
+    return Verdict(None, INSUFFICIENT_DATA)
+  _, p_value = MannWhitneyU(baseline, candidate)
+  change, low, high = BootstrapMedianChange(baseline, candidate)
+  verdict = NO_CHANGE
+  if p_value < alpha:
+    if low > min_effect:
+      verdict = REGRESSION
+    elif high < -min_effect:
+      verdict = IMPROVEMENT
+  result = Verdict(None, verdict)
+  result.baseline_p50 = float(np.median(baseline))
+  result.candidate_p50 = float(np.median(candidate))
+  result.change, result.ci_low, result.ci_high = change, low, high
+  result.p_value = p_value
+  return result
+
+
+class HistoryStore(object):
+  """SQLite history of benchmark runs."""
+
+  def __init__(self, db_path):
+    """Opens (or creates) the history database.
+
+    Args:
+      db_path: string, path of the SQLite file.
+    """
+    self._conn = sqlite3.connect(db_path)
+    self._conn.execute(_SCHEMA)
+    self._conn.commit()
+
+  def Close(self):
+    self._conn.close()
+
+  def Add(self, record):
+    """Stores one benchmark record.
+
+    Latencies come from 'latencies_ms' of the record. Records without it
+    (or with 'error') are skipped.
+
+    Args:
+      record: dict, record produced by edgetpu.benchmark.runner.
+
+    Returns:
+      bool, whether the record was stored.
+    """
+    if 'error' in record or not record.get('latencies_ms'):
+      return False
+    latencies = np.asarray(record['latencies_ms'], dtype=np.float32)
+    self._conn.execute(
+        'INSERT INTO runs (timestamp, machine, runtime_flavor, '
+        'runtime_version, model, engine, preprocessing, image, threads, '
+        'latencies) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (record['timestamp'], record.get('machine'),
+         record.get('runtime_flavor'), record.get('runtime_version'),
+         record['model'], record['engine'], record.get('preprocessing'),
+         record.get('image'), record.get('threads'),
+         sqlite3.Binary(latencies.tobytes())))
+    self._conn.commit()
+    return True
+
+  def Cases(self, machine=None, runtime_flavor=None):
+    """Lists benchmark cases in the history.
+
+    Returns:
+      List of tuples, values of CASE_FIELDS.
+    """
+    query, params = self._Filter(
+        'SELECT DISTINCT %s FROM runs' % ', '.join(CASE_FIELDS), machine,
+        runtime_flavor)
+    return [tuple(row) for row in
+            self._conn.execute(query + ' ORDER BY 1, 2, 3, 4, 5', params)]
+
+  def Runs(self, case, machine=None, runtime_flavor=None):
+    """Gets runs of a case in time order.
+
+    Returns:
+      List of (timestamp, runtime_version, latencies numpy.array).
+    """
+    query, params = self._Filter(
+        'SELECT timestamp, runtime_version, latencies FROM runs', machine,
+        runtime_flavor)
+    conditions = ' AND '.join('%s IS ?' % f for f in CASE_FIELDS)
+    query += (' AND ' if 'WHERE' in query else ' WHERE ') + conditions
+    rows = self._conn.execute(query + ' ORDER BY timestamp, id',
+                              params + list(case))
+    return [(timestamp, version, np.frombuffer(blob, dtype=np.float32))
+            for timestamp, version, blob in rows]
+
+  @staticmethod
+  def _Filter(query, machine, runtime_flavor):
+    conditions, params = [], []
+    if machine is not None:
+      conditions.append('machine = ?')
+      params.append(machine)
+    if runtime_flavor is not None:
+      conditions.append('runtime_flavor = ?')
+      params.append(runtime_flavor)
+    if conditions:
+      query += ' WHERE ' + ' AND '.join(conditions)
+    return query, params
+
+
+def CheckHistory(store, machine=None, runtime_flavor=None, baseline_runs=5,
+                 alpha=0.01, min_effect=0.05):
+  """Compares the latest run of each case against its previous runs.
+
+  Args:
+    store: HistoryStore.
+    machine: string, if specified, only runs of this machine.
+    runtime_flavor: string, if specified, only runs of this runtime flavor.
+    baseline_runs: int, number of previous runs pooled as baseline.
+    alpha: float, significance level.
+    min_effect: float, minimum relative change of median to report.
+
+  Returns:
+    List of Verdict.
+  """
+  verdicts = []
+  for case in store.Cases(machine, runtime_flavor):
+    runs = store.Runs(case, machine, runtime_flavor)
+    if len(runs) < 2:
+      verdict = Verdict(case, INSUFFICIENT_DATA)
+    else:
+      baseline = np.concatenate(
+          [latencies for _, _, latencies in runs[-baseline_runs - 1:-1]])
+      verdict = Compare(baseline, runs[-1][2], alpha, min_effect)
+      verdict.case = case
+      step = DetectStepChange(
+          [np.median(latencies) for _, _, latencies in runs], alpha=alpha)
+      if step is not None and abs(step[1]) > min_effect:
+        verdict.step = (runs[step[0]][0], step[1])
+    verdicts.append(verdict)
+  return verdicts
+
+
+def FormatVerdicts(verdicts):
+  """Formats verdicts as a table, one row per case."""
+  rows = [CASE_FIELDS + ('BASELINE_P50', 'CANDIDATE_P50', 'CHANGE', 'CI',
+                         'P_VALUE', 'STEP', 'VERDICT')]
+
+  def fmt(value, pattern):
+    return '-' if value is None else pattern % value
+
+  for v in verdicts:
+    rows.append(tuple(str(f) for f in v.case) + (
+        fmt(v.baseline_p50, '%.2f'), fmt(v.candidate_p50, '%.2f'),
+        '-' if v.change is None else '%+.1f%%' % (v.change * 100),
+        '-' if v.ci_low is None else '[%+.1f%%, %+.1f%%]' % (
+            v.ci_low * 100, v.ci_high * 100),
+        fmt(v.p_value, '%.2g'),
+        '-' if v.step is None else '%+.1f%% since %s' % (
+            v.step[1] * 100, v.step[0]),
+        v.verdict))
+  widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+  return '\n'.join(
+      '  '.join(value.ljust(width) for value, width in zip(row, widths))
+      for row in rows)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(
+      description='Detects benchmark regressions against run history.',
+      formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+  parser.add_argument('--db', required=True, help='SQLite history file.')
+  parser.add_argument('--ingest', nargs='*', default=[],
+                      help='JSON Lines files of edgetpu_benchmark to add.')
+  parser.add_argument('--machine', default=None)
+  parser.add_argument('--runtime_flavor', default=None)
+  parser.add_argument('--baseline_runs', type=int, default=5)
+  parser.add_argument('--alpha', type=float, default=0.01)
+  parser.add_argument('--min_effect', type=float, default=0.05,
+                      help='Minimum relative change of median to report.')
+  parser.add_argument('--enable_assertion', action='store_true',
+                      help='Exit with error if any regression is found.')
+  args = parser.parse_args(argv)
+
+  store = HistoryStore(args.db)
+  try:
+    for file_name in args.ingest:
+      with open(file_name) as f:
+        for line in f:
+          if line.strip():
+            store.Add(json.loads(line))
+    verdicts = CheckHistory(store, args.machine, args.runtime_flavor,
+                            args.baseline_runs, args.alpha, args.min_effect)
+  finally:
+    store.Close()
+  print(FormatVerdicts(verdicts))
+  counts = collections.Counter(v.verdict for v in verdicts)
+  print(', '.join('%s: %d' % item for item in sorted(counts.items())))
+  if args.enable_assertion and counts[REGRESSION]:
+    sys.exit('Benchmark regression detected!')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,456 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark runner for Edge TPU engines.
+
+Runs a matrix of models x engines x preprocessing modes x thread counts. Each
+case constructs one engine per thread, runs explicit warmup iterations, then
+times every measured iteration and reports the latency distribution and the
+throughput as one JSON object per line:
+
+  edgetpu_benchmark --models mobilenet_v1_1.0_224_quant_edgetpu.tflite \\
+      --model_dir test_data --engines classification \\
+      --preprocessing tensor nearest bicubic --images test_data/cat.bmp \\
+      --threads 1 2 --warmup 10 --iterations 200 --output result.jsonl
+
+Engines:
+  basic: BasicEngine.RunInference with a random input tensor.
+  classification: ClassificationEngine.ClassifyWith{InputTensor,Image}.
+  detection: DetectionEngine.DetectWith{InputTensor,Image}.
+  imprinting: ImprintingEngine.Train with one category of images, on a new
+    engine for each iteration.
+
+Preprocessing modes:
+  tensor: image is resized once, the *WithInputTensor API is measured.
+  nearest, bilinear, bicubic: the *WithImage API is measured with this
+    resampling filter, so resizing is included.
+
+Reference csv files (benchmarks/reference/*.csv) can be given with
+--reference, the mean latency of each case is then compared against them.
+"""
+
+import argparse
+import collections
+import csv
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+from edgetpu.basic import edgetpu_utils
+from edgetpu.basic.basic_engine import BasicEngine
+from edgetpu.classification.engine import ClassificationEngine
+from edgetpu.detection.engine import DetectionEngine
+from edgetpu.learn.imprinting.engine import ImprintingEngine
+import numpy as np
+from PIL import Image
+
+ENGINES = ('basic', 'classification', 'detection', 'imprinting')
+
+PREPROCESSING = collections.OrderedDict([
+    ('tensor', None),
+    ('nearest', Image.NEAREST),
+    ('bilinear', Image.BILINEAR),
+    ('bicubic', Image.BICUBIC),
+])
+
+# Engines measured on a random input, they don't need an image.
+_RANDOM_INPUT_ENGINES = ('basic',)
+# Parameters of ClassifyWith* and DetectWith*, same as former benchmarks.
+_THRESHOLD = 0.4
+_TOP_K = 10
+# Number of images per category when benchmarking imprinting.
+_IMPRINTING_IMAGES = 10
+
+
+class BenchmarkCase(object):
+  """One cell of the benchmark matrix."""
+  __slots__ = ['model_path', 'engine', 'preprocessing', 'image_path',
+               'threads', 'warmup', 'iterations']
+
+  def __init__(self, model_path, engine, preprocessing='tensor',
+               image_path=None, threads=1, warmup=1, iterations=200):
+    #: string, path to TF-Lite Flatbuffer file.
+    self.model_path = model_path
+    #: string, one of ENGINES.
+    self.engine = engine
+    #: string, one of PREPROCESSING.
+    self.preprocessing = preprocessing
+    #: string, path of the input image. Not used by 'basic' engine.
+    self.image_path = image_path
+    #: int, number of threads, each with its own engine.
+    self.threads = threads
+    #: int, number of untimed iterations per thread.
+    self.warmup = warmup
+    #: int, number of timed iterations per thread.
+    self.iterations = iterations
+
+
+def MachineInfo():
+  """Gets platform info, same names as used by benchmarks/reference."""
+  machine = platform.machine()
+  if machine == 'armv7l':
+    try:
+      with open('/proc/device-tree/model') as model_file:
+        board_info = model_file.read()
+    except OSError:
+      board_info = ''
+    if 'Raspberry Pi 3 Model B Rev' in board_info:
+      machine = 'rp3b'
+    elif 'Raspberry Pi 3 Model B Plus Rev' in board_info:
+      machine = 'rp3b+'
+    else:
+      machine = 'unknown'
+  return machine
+
+
+def _RandomInput(size):
+  return np.random.RandomState(1).randint(0, 256, size=size, dtype=np.uint8)
+
+
+def _ResizedTensor(engine, img, resample=Image.NEAREST):
+  _, height, width, _ = engine.get_input_tensor_shape()
+  return np.asarray(img.resize((width, height), resample)).flatten()
+
+
+def _MakeWorkload(case, img, device_path):
+  """Creates the engine of a case and the function running one iteration.
+
+  Args:
+    case: BenchmarkCase.
+    img: PIL image object, or None for random input.
+    device_path: string, Edge TPU to bind the engine with, or None.
+
+  Returns:
+    (prepare, run, engine). prepare is called untimed before each iteration
+    (or None), run runs one iteration. engine is the BasicEngine whose
+    get_inference_time() reports device latency, or None.
+  """
+  resample = PREPROCESSING[case.preprocessing]
+  if case.engine == 'basic':
+    engine = BasicEngine(case.model_path, device_path)
+    input_tensor = _RandomInput(engine.required_input_array_size())
+    return None, lambda: engine.RunInference(input_tensor), engine
+
+  if case.engine == 'classification':
+    engine = ClassificationEngine(case.model_path, device_path)
+    if resample is None:
+      input_tensor = _ResizedTensor(engine, img)
+      return None, lambda: engine.ClassifyWithInputTensor(
+          input_tensor, threshold=_THRESHOLD, top_k=_TOP_K), engine
+    return None, lambda: engine.ClassifyWithImage(
+        img, threshold=_THRESHOLD, top_k=_TOP_K, resample=resample), engine
+
+  if case.engine == 'detection':
+    engine = DetectionEngine(case.model_path, device_path)
+    if resample is None:
+      input_tensor = _ResizedTensor(engine, img)
+      return None, lambda: engine.DetectWithInputTensor(
+          input_tensor, threshold=_THRESHOLD, top_k=_TOP_K), engine
+    return None, lambda: engine.DetectWithImage(
+        img, threshold=_THRESHOLD, top_k=_TOP_K, resample=resample), engine
+
+  if case.engine == 'imprinting':
+    shape_engine = BasicEngine(case.model_path, device_path)
+    tensors = [_ResizedTensor(shape_engine, img, resample or Image.NEAREST)
+              ] * _IMPRINTING_IMAGES
+    del shape_engine
+    state = {}
+
+    def prepare():
+      state['engine'] = ImprintingEngine(case.model_path)
+
+    def run():
+      state['engine'].Train(tensors)
+
+    return prepare, run, None
+
+  raise ValueError('Unknown engine: {}'.format(case.engine))
+
+
+def Summarize(latencies):
+  """Summarizes latencies (milliseconds) of one case."""
+  p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+  return collections.OrderedDict([
+      ('mean', float(np.mean(latencies))),
+      ('min', float(np.min(latencies))),
+      ('p50', float(p50)),
+      ('p90', float(p90)),
+      ('p99', float(p99)),
+      ('max', float(np.max(latencies))),
+  ])
+
+
+def RunBenchmark(case, record_latencies=False):
+  """Runs one benchmark case.
+
+  Args:
+    case: BenchmarkCase.
+    record_latencies: bool, whether to keep every latency in the record.
+
+  Returns:
+    OrderedDict, the benchmark record. It has 'error' instead of latency
+    fields if the case couldn't run (e.g. model doesn't fit the engine).
+  """
+  record = collections.OrderedDict([
+      ('model', os.path.basename(case.model_path)),
+      ('engine', case.engine),
+      ('preprocessing', case.preprocessing),
+      ('image', os.path.basename(case.image_path) if case.image_path else None),
+      ('threads', case.threads),
+      ('warmup', case.warmup),
+      ('iterations', case.iterations),
+      ('machine', MachineInfo()),
+      ('runtime_flavor', edgetpu_utils.GetRuntimeFlavor()),
+      ('runtime_version', edgetpu_utils.GetRuntimeVersion()),
+      ('timestamp', time.strftime('%Y-%m-%dT%H:%M:%S')),
+  ])
+  if case.preprocessing not in PREPROCESSING:
+    record['error'] = 'Unknown preprocessing: {}'.format(case.preprocessing)
+    return record
+
+  img = None
+  if case.engine not in _RANDOM_INPUT_ENGINES:
+    with Image.open(case.image_path) as img:
+      img = img.convert('RGB')
+
+  device_paths = [None]
+  if case.threads > 1:
+    device_paths = edgetpu_utils.ListEdgeTpuPaths(
+        edgetpu_utils.EDGE_TPU_STATE_NONE) or [None]
+
+  workloads = []
+  try:
+    for i in range(case.threads):
+      workloads.append(
+          _MakeWorkload(case, img, device_paths[i % len(device_paths)]))
+  except (ValueError, RuntimeError) as e:
+    # Engines already created hold their Edge TPU until they are released.
+    del workloads[:]
+    record['error'] = str(e)
+    return record
+
+  latencies = [None] * case.threads
+  device_latencies = [None] * case.threads
+  errors = []
+  barrier = threading.Barrier(case.threads + 1)
+
+  def job(index):
+    try:
+      measure(index)
+    except Exception as e:  # pylint: disable=broad-except
+      errors.append(e)
+      barrier.abort()
+
+  def measure(index):
+    prepare, run, engine = workloads[index]
+    for _ in range(case.warmup):
+      if prepare:
+        prepare()
+      run()
+    thread_latencies = np.zeros(case.iterations)
+    thread_device_latencies = np.zeros(case.iterations)
+    barrier.wait()
+    for i in range(case.iterations):
+      if prepare:
+        prepare()
+      start = time.perf_counter()
+      run()
+      thread_latencies[i] = (time.perf_counter() - start) * 1000
+      if engine is not None:
+        thread_device_latencies[i] = engine.get_inference_time()
+    latencies[index] = thread_latencies
+    if engine is not None:
+      device_latencies[index] = thread_device_latencies
+
+  workers = [threading.Thread(target=job, args=(i,))
+             for i in range(case.threads)]
+  for worker in workers:
+    worker.start()
+  try:
+    barrier.wait()
+  except threading.BrokenBarrierError:
+    pass
+  start_time = time.perf_counter()
+  for worker in workers:
+    worker.join()
+  wall_time = time.perf_counter() - start_time
+  if errors:
+    record['error'] = str(errors[0])
+    return record
+
+  all_latencies = np.concatenate(latencies)
+  record['latency_ms'] = Summarize(all_latencies)
+  if device_latencies[0] is not None:
+    record['device_latency_ms'] = Summarize(
+        np.concatenate(device_latencies))
+  record['throughput'] = all_latencies.size / wall_time
+  if record_latencies:
+    record['latencies_ms'] = [round(float(v), 4) for v in all_latencies]
+  return record
+
+
+def ExpandMatrix(models, engines, preprocessing, images, threads, warmup,
+                 iterations):
+  """Expands the benchmark matrix into cases, skipping meaningless ones.
+
+  Engines measured on random input ignore preprocessing and images; the
+  imprinting engine only supports 'tensor' preprocessing.
+
+  Returns:
+    List of BenchmarkCase.
+  """
+  cases = []
+  for model in models:
+    for engine in engines:
+      if engine in _RANDOM_INPUT_ENGINES:
+        modes, engine_images = ['tensor'], [None]
+      elif engine == 'imprinting':
+        modes, engine_images = ['tensor'], images
+      else:
+        modes, engine_images = preprocessing, images
+      for mode in modes:
+        for image in engine_images:
+          for num_threads in threads:
+            cases.append(BenchmarkCase(model, engine, mode, image, num_threads,
+                                       warmup, iterations))
+  return cases
+
+
+def ReadReference(file_name):
+  """Reads reference from csv file of benchmarks/reference.
+
+  Args:
+    file_name: string, path of the reference file.
+
+  Returns:
+    { environment : reference_time}, environment is a string tuple (e.g.
+    (model,) or (model, image)) while reference_time is a float number.
+  """
+  reference = {}
+  with open(file_name, newline='') as csvfile:
+    reader = csv.reader(csvfile, delimiter=' ', quotechar='|')
+    # Drop first line(column names).
+    next(reader)
+    for row in reader:
+      reference[tuple(row[:-1])] = float(row[-1])
+  return reference
+
+
+def CompareWithReference(record, reference, tolerance=0.3):
+  """Compares mean latency of a record against reference.
+
+  Args:
+    record: OrderedDict, the benchmark record.
+    reference: { environment : reference_time}, see ReadReference().
+    tolerance: float, allowed relative deviation.
+
+  Returns:
+    string, a warning message, or None if latency is within tolerance or
+    there is no matching reference. reference_ms is added to the record when
+    a reference is found.
+  """
+  if 'latency_ms' not in record:
+    return None
+  for environment in ((record['model'], record['image']), (record['model'],)):
+    if environment in reference:
+      break
+  else:
+    return None
+  reference_latency = reference[environment]
+  record['reference_ms'] = reference_latency
+  latency = record['latency_ms']['mean']
+  if abs(latency - reference_latency) > tolerance * reference_latency:
+    return ('Unexpected %s latency! [%s]\n'
+            '   Inference time: %.2f ms  Reference time: %.2f ms' %
+            ('high' if latency > reference_latency else 'low',
+             ','.join(environment), latency, reference_latency))
+  return None
+
+
+def WriteJsonLines(f, records):
+  """Writes records as JSON Lines to a file object."""
+  for record in records:
+    f.write(json.dumps(record) + '\n')
+  f.flush()
+
+
+def ParseArgs(argv=None):
+  parser = argparse.ArgumentParser(
+      description='Benchmarks Edge TPU engines.',
+      formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+  parser.add_argument('--models', nargs='+', required=True,
+                      help='Paths of .tflite models.')
+  parser.add_argument('--model_dir', default='',
+                      help='Directory prepended to relative model paths.')
+  parser.add_argument('--engines', nargs='+', default=['basic'],
+                      choices=ENGINES)
+  parser.add_argument('--preprocessing', nargs='+', default=['tensor'],
+                      choices=list(PREPROCESSING))
+  parser.add_argument('--images', nargs='+', default=[],
+                      help='Input images for non-basic engines.')
+  parser.add_argument('--threads', nargs='+', type=int, default=[1])
+  parser.add_argument('--warmup', type=int, default=1,
+                      help='Untimed iterations per thread.')
+  parser.add_argument('--iterations', type=int, default=200,
+                      help='Timed iterations per thread.')
+  parser.add_argument('--output', default=None,
+                      help='JSON Lines output file, stdout by default.')
+  parser.add_argument('--record_latencies', action='store_true',
+                      help='Keep every latency in the records.')
+  parser.add_argument('--reference', default=None,
+                      help='Reference csv file to compare mean latency with.')
+  parser.add_argument('--reference_tolerance', type=float, default=0.3)
+  parser.add_argument('--enable_assertion', action='store_true',
+                      help='Exit with error if any latency is abnormal.')
+  args = parser.parse_args(argv)
+  if args.warmup < 0 or args.iterations <= 0 or min(args.threads) <= 0:
+    parser.error('warmup must be >= 0, iterations and threads must be > 0.')
+  if set(args.engines) - set(_RANDOM_INPUT_ENGINES) and not args.images:
+    parser.error('--images is required for engines {}.'.format(
+        ', '.join(sorted(set(args.engines) - set(_RANDOM_INPUT_ENGINES)))))
+  return args
+
+
+def main(argv=None):
+  args = ParseArgs(argv)
+  models = [os.path.join(args.model_dir, m) for m in args.models]
+  cases = ExpandMatrix(models, args.engines, args.preprocessing, args.images,
+                       args.threads, args.warmup, args.iterations)
+  reference = ReadReference(args.reference) if args.reference else {}
+  output = open(args.output, 'w') if args.output else sys.stdout
+  num_abnormal = 0
+  try:
+    for cnt, case in enumerate(cases, start=1):
+      print('[%d/%d] %s %s %s %s threads=%d' % (
+          cnt, len(cases), os.path.basename(case.model_path), case.engine,
+          case.preprocessing, case.image_path or '', case.threads),
+            file=sys.stderr)
+      record = RunBenchmark(case, args.record_latencies)
+      msg = CompareWithReference(record, reference, args.reference_tolerance)
+      if msg:
+        print(' * ' + msg, file=sys.stderr)
+        num_abnormal += 1
+      WriteJsonLines(output, [record])
+  finally:
+    if output is not sys.stdout:
+      output.close()
+  if args.enable_assertion and num_abnormal:
+    sys.exit('Benchmark test failed! %d abnormal results.' % num_abnormal)
+
+
+if __name__ == '__main__':
+  main()
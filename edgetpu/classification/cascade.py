@@ -0,0 +1,387 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Early-exit cascade of classification models, fast model first.
+
+Each image is classified by the fastest model and escalated to the next,
+larger one only when the result is not confident enough: its top-1 score
+(CONFIDENCE) or the margin between its top-1 and top-2 scores (MARGIN) is
+below the threshold of the stage. The last model always answers:
+
+  classifier = CascadeClassifier(
+      [ClassificationEngine(mobilenet_v1),
+       ClassificationEngine(inception_v4, second_tpu_path)], [0.3])
+  print(classifier.ClassifyWithImage(img), classifier.GetStats())
+
+Putting the models on separate Edge TPUs keeps each one's parameters cached
+on its device.
+
+Models must share the label space, or label_maps translate the ids of each
+model into common ids. Thresholds are picked on a validation set with
+Calibrate(), for a target accuracy at minimum mean latency. The
+edgetpu_calibrate_cascade command does it for a directory of images, with one
+sub-directory per label:
+
+  edgetpu_calibrate_cascade --models small_edgetpu.tflite large_edgetpu.tflite
+      --labels imagenet_labels.txt --data validation/ --target_accuracy 0.75
+"""
+
+import argparse
+import itertools
+import os
+import time
+
+from edgetpu.classification.engine import ClassificationEngine
+import numpy as np
+from PIL import Image
+
+# Escalation criteria.
+CONFIDENCE = 'confidence'  # Top-1 score.
+MARGIN = 'margin'  # Top-1 score minus top-2 score.
+CRITERIA = (CONFIDENCE, MARGIN)
+
+
+def Certainty(results, criterion):
+  """Returns float, certainty of results of ClassifyWithImage() by criterion.
+
+  Args:
+    results: list of (int, float), sorted by decreasing score.
+    criterion: string, one of CRITERIA.
+
+  Raises:
+    ValueError: when criterion is unknown.
+  """
+  if criterion not in CRITERIA:
+    raise ValueError('Unknown criterion: {}'.format(criterion))
+  top1 = results[0][1] if results else 0.0
+  if criterion == CONFIDENCE:
+    return float(top1)
+  top2 = results[1][1] if len(results) > 1 else 0.0
+  return float(top1 - top2)
+
+
+def _MapResults(results, label_map):
+  """Translates ids of results, dropping the ones missing from label_map."""
+  if label_map is None:
+    return results
+  return [(label_map[i], s) for i, s in results if i in label_map]
+
+
+class CascadeStats(object):
+  """Statistics of a CascadeClassifier."""
+  __slots__ = ['images', 'exits', 'total_time']
+
+  def __init__(self, num_stages):
+    #: int, number of images classified.
+    self.images = 0
+    #: list of int, number of images answered by each stage.
+    self.exits = [0] * num_stages
+    #: float, milliseconds spent classifying all images.
+    self.total_time = 0.0
+
+  @property
+  def mean_latency(self):
+    """float, mean milliseconds per image."""
+    return self.total_time / self.images if self.images else 0.0
+
+  def __repr__(self):
+    return 'CascadeStats(images=%d, exits=%s, mean_latency=%.2f ms)' % (
+        self.images, self.exits, self.mean_latency)
+
+
+class CascadeClassifier(object):
+  """Classifies with a ladder of models, escalating uncertain images."""
+
+  def __init__(self, engines, thresholds, criterion=MARGIN, label_maps=None):
+    """Creates a CascadeClassifier.
+
+    Args:
+      engines: list of ClassificationEngine, from the fastest to the most
+        accurate model.
+      thresholds: list of float, one per engine but the last. An image is
+        escalated from stage i when its certainty is below thresholds[i].
+      criterion: string, one of CRITERIA.
+      label_maps: list of {int: int}, one per engine, translating the ids of
+        the engine into common ids; None for an engine already in the common
+        label space. By default all engines must share the label space.
+
+    Raises:
+      ValueError: when input param is invalid.
+    """
+    if not engines:
+      raise ValueError('At least one engine is required!')
+    if len(thresholds) != len(engines) - 1:
+      raise ValueError('One threshold per engine but the last is required!')
+    if criterion not in CRITERIA:
+      raise ValueError('Unknown criterion: {}'.format(criterion))
+    label_maps = list(label_maps or [None] * len(engines))
+    if len(label_maps) != len(engines):
+      raise ValueError('One label map per engine is required!')
+    num_labels = set(
+        int(e.get_all_output_tensors_sizes()[0])
+        for e, label_map in zip(engines, label_maps) if label_map is None)
+    if len(num_labels) > 1:
+      raise ValueError(
+          'Models have different label spaces, label_maps are required!')
+    self._engines = list(engines)
+    self._thresholds = list(thresholds)
+    self._criterion = criterion
+    self._label_maps = label_maps
+    self._stats = CascadeStats(len(engines))
+
+  def ClassifyWithImage(self, img, threshold=0.1, top_k=3,
+                        resample=Image.NEAREST):
+    """Classifies image with PIL image object.
+
+    Args:
+      img: PIL image object.
+      threshold: float, threshold to filter results.
+      top_k: keep top k candidates if there are many candidates with score
+        exceeds given threshold. By default we keep top 3.
+      resample: An optional resampling filter on image resizing.
+
+    Returns:
+      List of (int, float) which represents id and score, in the common label
+      space.
+    """
+    start = time.perf_counter()
+    for stage, engine in enumerate(self._engines):
+      results = _MapResults(
+          engine.ClassifyWithImage(img, threshold=0.0, top_k=max(top_k, 2),
+                                   resample=resample),
+          self._label_maps[stage])
+      if (stage == len(self._thresholds) or
+          Certainty(results, self._criterion) >= self._thresholds[stage]):
+        break
+    self._stats.images += 1
+    self._stats.exits[stage] += 1
+    self._stats.total_time += (time.perf_counter() - start) * 1000
+    return [(i, s) for i, s in results if s > threshold][:top_k]
+
+  def GetStats(self):
+    """Returns CascadeStats."""
+    return self._stats
+
+
+def CollectStageOutputs(engine, images, label_map=None, criterion=MARGIN,
+                        resample=Image.NEAREST):
+  """Classifies a validation set with one model of the cascade.
+
+  Args:
+    engine: ClassificationEngine.
+    images: iterable of PIL image objects.
+    label_map: {int: int}, translates ids of the engine into common ids.
+    criterion: string, one of CRITERIA.
+    resample: resampling filter on image resizing.
+
+  Returns:
+    (predictions, certainties, latencies), (N,) numpy.array of top-1 common
+    ids (-1 if none), certainty by criterion and milliseconds per image.
+  """
+  # Uploads the parameters first, so latencies are the ones of a warm model.
+  engine.Warmup()
+  predictions, certainties, latencies = [], [], []
+  for img in images:
+    start = time.perf_counter()
+    results = _MapResults(
+        engine.ClassifyWithImage(img, threshold=0.0, top_k=2,
+                                 resample=resample), label_map)
+    latencies.append((time.perf_counter() - start) * 1000)
+    predictions.append(results[0][0] if results else -1)
+    certainties.append(Certainty(results, criterion))
+  return (np.array(predictions, dtype=np.int64), np.array(certainties),
+          np.array(latencies))
+
+
+def Evaluate(correct, certainties, latencies, thresholds):
+  """Evaluates thresholds of a cascade on stage outputs.
+
+  Args:
+    correct: (S, N) numpy.array of bool, whether stage s is right on image n.
+    certainties: (S, N) numpy.array.
+    latencies: (S,) numpy.array, mean milliseconds of each stage.
+    thresholds: list of S - 1 float.
+
+  Returns:
+    (accuracy, mean_latency, exit_ratios), exit_ratios per stage.
+  """
+  num_stages, n = correct.shape
+  exit_stage = np.full(n, num_stages - 1)
+  undecided = np.ones(n, dtype=bool)
+  for stage, threshold in enumerate(thresholds):
+    exits = undecided & (certainties[stage] >= threshold)
+    exit_stage[exits] = stage
+    undecided &= ~exits
+  accuracy = float(np.mean(correct[exit_stage, np.arange(n)]))
+  exit_ratios = np.bincount(exit_stage, minlength=num_stages) / float(n)
+  # An image exiting at stage s ran stages 0 to s.
+  mean_latency = float(np.dot(exit_ratios, np.cumsum(latencies)))
+  return accuracy, mean_latency, exit_ratios
+
+
+def _CalibrationResult(correct, certainties, latencies, target_accuracy,
+                       thresholds):
+  """Returns (sort key, result dict) of thresholds, the smallest key wins."""
+  accuracy, mean_latency, exit_ratios = Evaluate(correct, certainties,
+                                                 latencies, thresholds)
+  met = accuracy >= target_accuracy
+  # Meeting the target first, then latency; otherwise accuracy first.
+  key = (not met, mean_latency if met else -accuracy,
+         -accuracy if met else mean_latency)
+  return key, {'thresholds': [float(t) for t in thresholds],
+               'accuracy': accuracy, 'mean_latency': mean_latency,
+               'exit_ratios': exit_ratios.tolist(), 'target_met': met}
+
+
+def Calibrate(correct, certainties, latencies, target_accuracy,
+              num_candidates=50, max_evaluations=10000):
+  """Picks thresholds reaching target_accuracy at minimum mean latency.
+
+  Candidate thresholds of each stage are quantiles of its certainties, plus
+  values always and never escalating. When there are at most max_evaluations
+  combinations, e.g. up to 3 stages with 50 candidates, every one is
+  evaluated. Otherwise, coordinate descent starting from always escalating
+  (the accuracy of the last model) sweeps the candidates of one stage at a
+  time, the others fixed, until no sweep improves the result. It costs a few
+  sweeps of S * num_candidates evaluations, but may miss the best
+  combination.
+
+  Args:
+    correct: (S, N) numpy.array of bool, whether stage s is right on image n.
+    certainties: (S, N) numpy.array.
+    latencies: (S,) numpy.array, mean milliseconds of each stage.
+    target_accuracy: float in [0, 1].
+    num_candidates: int, number of candidate thresholds per stage.
+    max_evaluations: int, largest number of combinations evaluated
+      exhaustively.
+
+  Returns:
+    dict with thresholds, accuracy, mean_latency, exit_ratios and whether the
+    target is met. When no thresholds reach the target, the most accurate
+    ones are returned.
+  """
+  correct = np.asarray(correct, dtype=bool)
+  certainties = np.asarray(certainties, dtype=np.float64)
+  latencies = np.asarray(latencies, dtype=np.float64)
+  candidates = []
+  for stage in range(correct.shape[0] - 1):
+    quantiles = np.percentile(certainties[stage],
+                              np.linspace(0, 100, num_candidates))
+    candidates.append(np.unique(np.concatenate(
+        [[-np.inf, np.inf], quantiles])))
+
+  def Result(thresholds):
+    return _CalibrationResult(correct, certainties, latencies,
+                              target_accuracy, thresholds)
+
+  if np.prod([float(len(c)) for c in candidates]) <= max_evaluations:
+    return min((Result(t) for t in itertools.product(*candidates)),
+               key=lambda result: result[0])[1]
+  best = Result([np.inf] * len(candidates))
+  improved = True
+  while improved:
+    improved = False
+    for stage, stage_candidates in enumerate(candidates):
+      for threshold in stage_candidates:
+        thresholds = list(best[1]['thresholds'])
+        thresholds[stage] = threshold
+        result = Result(thresholds)
+        # The key strictly decreases, so the search ends.
+        if result[0] < best[0]:
+          best = result
+          improved = True
+  return best[1]
+
+
+def ReadLabels(path):
+  """Reads a label file of '<id> <name>' lines, returns {name: id}."""
+  labels = {}
+  with open(path, 'r', encoding='utf-8') as f:
+    for line in f:
+      pair = line.strip().split(maxsplit=1)
+      if len(pair) == 2:
+        labels[pair[1].strip()] = int(pair[0])
+  return labels
+
+
+def ReadValidationSet(data_dir, labels):
+  """Lists images of data_dir/<label name>/, returns (paths, label ids)."""
+  paths, ids = [], []
+  for name in sorted(os.listdir(data_dir)):
+    category_dir = os.path.join(data_dir, name)
+    if not os.path.isdir(category_dir):
+      continue
+    if name not in labels:
+      raise ValueError('Unknown label: {}'.format(name))
+    for f in sorted(os.listdir(category_dir)):
+      paths.append(os.path.join(category_dir, f))
+      ids.append(labels[name])
+  return paths, np.array(ids, dtype=np.int64)
+
+
+def _Images(paths):
+  for path in paths:
+    with open(path, 'rb') as f:
+      with Image.open(f) as img:
+        yield img.convert('RGB')
+
+
+def ParseArgs(argv=None):
+  parser = argparse.ArgumentParser(
+      description='Picks thresholds of an early-exit classification cascade.',
+      formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+  parser.add_argument('--models', nargs='+', required=True,
+                      help='Paths of models, from the fastest to the largest.')
+  parser.add_argument('--labels', required=True,
+                      help='Label file shared by the models.')
+  parser.add_argument('--data', required=True,
+                      help='Directory with one sub-directory of images per '
+                           'label name.')
+  parser.add_argument('--target_accuracy', type=float, required=True)
+  parser.add_argument('--criterion', default=MARGIN, choices=list(CRITERIA))
+  parser.add_argument('--num_candidates', type=int, default=50,
+                      help='Candidate thresholds per stage.')
+  args = parser.parse_args(argv)
+  if len(args.models) < 2:
+    parser.error('At least two models are required.')
+  return args
+
+
+def main(argv=None):
+  args = ParseArgs(argv)
+  paths, truth = ReadValidationSet(args.data, ReadLabels(args.labels))
+  correct, certainties, latencies = [], [], []
+  for model in args.models:
+    predictions, stage_certainties, stage_latencies = CollectStageOutputs(
+        ClassificationEngine(model), _Images(paths),
+        criterion=args.criterion)
+    correct.append(predictions == truth)
+    certainties.append(stage_certainties)
+    latencies.append(np.mean(stage_latencies))
+    print('%s: accuracy %.4f, %.2f ms' % (model, np.mean(correct[-1]),
+                                          latencies[-1]))
+  result = Calibrate(np.array(correct), np.array(certainties),
+                     np.array(latencies), args.target_accuracy,
+                     args.num_candidates)
+  if not result['target_met']:
+    print('Target accuracy %.4f is not reachable.' % args.target_accuracy)
+  print('Thresholds (%s): %s' % (args.criterion, ', '.join(
+      '%.4f' % t for t in result['thresholds'])))
+  print('Accuracy %.4f, mean latency %.2f ms, exits per stage %s' % (
+      result['accuracy'], result['mean_latency'],
+      ', '.join('%.3f' % r for r in result['exit_ratios'])))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,293 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Several imprinted classifiers sharing one embedding extractor.
+
+Models trained by ImprintingEngine from the same embedding extractor only
+differ by their last fully-connected layer, which runs on the CPU. Instead of
+running the backbone on the Edge TPU once per model, the embedding is
+computed once and all heads are applied on the host with one matrix
+multiply:
+
+  extractor = BasicEngine(
+      'mobilenet_v1_1.0_224_quant_embedding_extractor_edgetpu.tflite')
+  classifier = MultiHeadClassifier(extractor, {
+      'shoes': 'shoes_edgetpu.tflite',
+      'bags': 'bags_edgetpu.tflite',
+  })
+  results = classifier.ClassifyWithImage(img, top_k=3)
+  # {'shoes': [(2, 0.61), ...], 'bags': [(0, 0.43), ...]}
+
+Like the imprinted models, the embedding is L2-normalized and each head
+gives the softmax of its logits.
+"""
+
+import collections
+
+from edgetpu.basic import tflite_model
+import numpy as np
+from PIL import Image
+
+# Names of the tensors of the fully-connected layer added by imprinting.
+WEIGHTS_TENSOR = 'Imprinting/FC/Weights'
+BIAS_TENSOR = 'Imprinting/FC/Bias'
+
+
+def _Dequantize(tensor, data):
+  data = data.astype(np.float32)
+  if tensor.scale is None:
+    return data
+  return (data - (tensor.zero_point or 0)) * np.float32(tensor.scale)
+
+
+def ReadHead(model_path):
+  """Reads the classification layer of a model saved by ImprintingEngine.
+
+  Args:
+    model_path: string, path to the model written by
+      ImprintingEngine.SaveModel().
+
+  Returns:
+    (weights, bias), (num_classes, embedding_size) and (num_classes,)
+    numpy.array of float32.
+
+  Raises:
+    ValueError: when the model has no imprinted layer on the CPU.
+  """
+  model = tflite_model.TfLiteModel(model_path)
+  try:
+    weights_tensor = model.GetTensor(WEIGHTS_TENSOR)
+  except KeyError:
+    raise ValueError('{} has no {} tensor, was it saved by ImprintingEngine?'
+                     .format(model_path, WEIGHTS_TENSOR))
+  weights = model.GetTensorData(weights_tensor)
+  if weights is None:
+    raise ValueError('{} has no constant data in {}!'.format(
+        model_path, WEIGHTS_TENSOR))
+  num_classes = int(weights_tensor.shape[0])
+  weights = _Dequantize(weights_tensor, weights).reshape(num_classes, -1)
+  try:
+    bias_tensor = model.GetTensor(BIAS_TENSOR)
+    bias = model.GetTensorData(bias_tensor)
+  except KeyError:
+    bias = None
+  if bias is None:
+    bias = np.zeros(num_classes, dtype=np.float32)
+  else:
+    bias = _Dequantize(bias_tensor, bias).reshape(num_classes)
+  return weights, bias
+
+
+def SegmentSoftmax(logits, offsets):
+  """Softmax of consecutive segments of a vector.
+
+  Args:
+    logits: 1-D numpy.array.
+    offsets: 1-D numpy.array of int, start of each non-empty segment, the
+      first one is 0.
+
+  Returns:
+    numpy.array like logits, each segment sums to 1.
+  """
+  maxima = np.maximum.reduceat(logits, offsets)
+  sizes = np.diff(np.append(offsets, logits.size))
+  exp = np.exp(logits - np.repeat(maxima, sizes))
+  return exp / np.repeat(np.add.reduceat(exp, offsets), sizes)
+
+
+def TopK(scores, threshold, top_k):
+  """Returns list of (int, float), the top_k scores above threshold."""
+  top_k = min(top_k, scores.size)
+  indices = np.argpartition(scores, -top_k)[-top_k:]
+  result = [(int(i), float(scores[i])) for i in indices
+            if scores[i] > threshold]
+  result.sort(key=lambda tup: -tup[1])
+  return result
+
+
+class MultiHeadClassifier(object):
+  """Classifies with several heads on the embedding of one extractor."""
+
+  def __init__(self, extractor, heads=None, softmax=True):
+    """Creates a MultiHeadClassifier.
+
+    Args:
+      extractor: BasicEngine of the embedding extractor the heads were
+        imprinted from, with one output tensor.
+      heads: {string : string or (weights, bias)}, by name, the path of a
+        model saved by ImprintingEngine, or its layer as returned by
+        ReadHead(); bias can be None.
+      softmax: bool, whether scores are the softmax of each head, like the
+        imprinted models, or the raw logits (cosine similarities).
+
+    Raises:
+      ValueError: when the extractor has several outputs, or a head doesn't
+        match its embedding.
+    """
+    output_sizes = extractor.get_all_output_tensors_sizes()
+    if output_sizes.size != 1:
+      raise ValueError(
+          'Embedding extractor should have 1 output tensor only! '
+          'This model has {}.'.format(output_sizes.size))
+    self._extractor = extractor
+    self._embedding_size = int(output_sizes[0])
+    self._softmax = softmax
+    self._heads = collections.OrderedDict()
+    self._Stack()
+    for name, head in (heads or {}).items():
+      if isinstance(head, str):
+        self.AddHead(name, *ReadHead(head))
+      else:
+        self.AddHead(name, *head)
+
+  def AddHead(self, name, weights, bias=None):
+    """Adds or replaces a head.
+
+    Args:
+      name: string, name of the head in results.
+      weights: (num_classes, embedding_size) numpy.array.
+      bias: (num_classes,) numpy.array, by default zeros.
+
+    Raises:
+      ValueError: when the shapes don't match the embedding.
+    """
+    weights = np.asarray(weights, dtype=np.float32)
+    if weights.ndim != 2 or weights.shape[1] != self._embedding_size:
+      raise ValueError(
+          'Weights of head {} should be [num_classes, {}], got {}!'.format(
+              name, self._embedding_size, list(weights.shape)))
+    if not weights.shape[0]:
+      raise ValueError('Head {} has no class!'.format(name))
+    if bias is None:
+      bias = np.zeros(weights.shape[0], dtype=np.float32)
+    bias = np.asarray(bias, dtype=np.float32).reshape(-1)
+    if bias.size != weights.shape[0]:
+      raise ValueError('Head {} has {} classes but {} biases!'.format(
+          name, weights.shape[0], bias.size))
+    self._heads[name] = (weights, bias)
+    self._Stack()
+
+  def RemoveHead(self, name):
+    """Removes a head.
+
+    Raises:
+      KeyError: when there's no head with this name.
+    """
+    del self._heads[name]
+    self._Stack()
+
+  def _Stack(self):
+    # One (total_classes, embedding_size) matrix for all heads.
+    if self._heads:
+      self._weights = np.concatenate(
+          [weights for weights, _ in self._heads.values()])
+      self._bias = np.concatenate([bias for _, bias in self._heads.values()])
+      sizes = [weights.shape[0] for weights, _ in self._heads.values()]
+    else:
+      self._weights = np.zeros((0, self._embedding_size), dtype=np.float32)
+      self._bias = np.zeros(0, dtype=np.float32)
+      sizes = []
+    self._offsets = np.cumsum([0] + sizes[:-1]).astype(np.intp)
+    self._bounds = np.cumsum([0] + sizes)
+
+  def get_head_names(self):
+    """Returns list of string, names of the heads in order."""
+    return list(self._heads)
+
+  def get_num_classes(self):
+    """Returns {string : int}, number of classes of each head."""
+    return collections.OrderedDict(
+        (name, weights.shape[0]) for name, (weights, _) in self._heads.items())
+
+  def ClassifyWithImage(self, img, threshold=0.1, top_k=3,
+                        resample=Image.NEAREST):
+    """Classifies image with PIL image object, by all heads.
+
+    Args:
+      img: PIL image object.
+      threshold: float, threshold to filter results.
+      top_k: int, number of candidates kept per head.
+      resample: An optional resampling filter on image resizing. By default it
+        is PIL.Image.NEAREST.
+
+    Returns:
+      OrderedDict {string : list of (int, float)}, id and score of each head.
+
+    Raises:
+      RuntimeError: when the extractor isn't used for image classification.
+    """
+    input_tensor_shape = self._extractor.get_input_tensor_shape()
+    if (input_tensor_shape.size != 4 or input_tensor_shape[3] != 3 or
+        input_tensor_shape[0] != 1):
+      raise RuntimeError(
+          'Invalid input tensor shape! Expected: [1, height, width, 3]')
+    _, height, width, _ = input_tensor_shape
+    input_tensor = np.asarray(img.resize((width, height), resample)).flatten()
+    return self.ClassifyWithInputTensor(input_tensor, threshold, top_k)
+
+  def ClassifyWithInputTensor(self, input_tensor, threshold=0.0, top_k=3):
+    """Classifies with raw input tensor, by all heads.
+
+    The extractor runs once, whatever the number of heads.
+
+    Returns:
+      OrderedDict {string : list of (int, float)}, id and score of each head.
+    """
+    _, embedding = self._extractor.RunInference(input_tensor)
+    return self.ClassifyEmbedding(embedding, threshold, top_k)
+
+  def ClassifyEmbedding(self, embedding, threshold=0.0, top_k=3):
+    """Classifies an embedding computed by the extractor, by all heads.
+
+    Args:
+      embedding: 1-D numpy.array, output of the extractor.
+      threshold: float, threshold to filter results.
+      top_k: int, number of candidates kept per head.
+
+    Returns:
+      OrderedDict {string : list of (int, float)}, id and score of each head.
+
+    Raises:
+      ValueError: when input param is invalid.
+    """
+    if top_k <= 0:
+      raise ValueError('top_k must be positive!')
+    scores = self.Scores(embedding)
+    results = collections.OrderedDict()
+    for i, name in enumerate(self._heads):
+      results[name] = TopK(scores[self._bounds[i]:self._bounds[i + 1]],
+                           threshold, top_k)
+    return results
+
+  def Scores(self, embedding):
+    """Computes the scores of all heads.
+
+    Args:
+      embedding: 1-D numpy.array, output of the extractor.
+
+    Returns:
+      1-D numpy.array of float32, the scores of the heads in order of
+      get_head_names(), concatenated.
+    """
+    embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    if embedding.size != self._embedding_size:
+      raise ValueError('Embedding should have {} values, got {}!'.format(
+          self._embedding_size, embedding.size))
+    norm = np.linalg.norm(embedding)
+    if norm:
+      embedding = embedding / norm
+    logits = self._weights.dot(embedding) + self._bias
+    if self._softmax and logits.size:
+      return SegmentSoftmax(logits, self._offsets)
+    return logits
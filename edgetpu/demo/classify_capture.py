@@ -22,6 +22,7 @@ import numpy as np
 import picamera
 
 import edgetpu.classification.engine
+from edgetpu.utils import motion_gate
 
 
 def main():
@@ -30,6 +31,13 @@ def main():
       '--model', help='File path of Tflite model.', required=True)
     parser.add_argument(
       '--label', help='File path of label file.', required=True)
+    parser.add_argument(
+      '--motion_threshold', type=float, default=None,
+      help='If specified, frames with at most this fraction of changed '
+           'blocks reuse the result of the last inference.')
+    parser.add_argument(
+      '--max_staleness', type=float, default=1.0,
+      help='Seconds a result is reused at most, with --motion_threshold.')
     args = parser.parse_args()
 
     with open(args.label, 'r', encoding="utf-8") as f:
@@ -42,6 +50,12 @@ def main():
         camera.resolution = (640, 480)
         camera.framerate = 30
         _, width, height, channels = engine.get_input_tensor_shape()
+        gate = None
+        if args.motion_threshold is not None:
+            gate = motion_gate.MotionGate(
+                engine.get_input_tensor_shape(),
+                threshold=args.motion_threshold,
+                max_staleness=args.max_staleness)
         camera.start_preview()
         try:
             stream = io.BytesIO()
@@ -53,11 +67,18 @@ def main():
                 stream.seek(0)
                 input = np.frombuffer(stream.getvalue(), dtype=np.uint8)
                 start_ms = time.time()
-                results = engine.ClassifyWithInputTensor(input, top_k=1)
+                if gate:
+                    results = gate.Run(
+                        input, engine.ClassifyWithInputTensor, top_k=1)
+                else:
+                    results = engine.ClassifyWithInputTensor(input, top_k=1)
                 elapsed_ms = time.time() - start_ms
                 if results:
                     camera.annotate_text = "%s %.2f\n%.2fms" % (
                         labels[results[0][0]], results[0][1], elapsed_ms*1000.0)
+                    if gate:
+                        camera.annotate_text += "\nskipped %.0f%%" % (
+                            gate.GetStats().skip_ratio * 100)
         finally:
             camera.stop_preview()
 
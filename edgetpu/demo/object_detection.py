@@ -33,6 +33,8 @@ Example (Running under python-tflite-source/edgetpu directory):
     --input='test_data/pets.jpg'
 
 '--output' is an optional flag to specify file name of output image.
+'--tiles' detects on a grid of tiles (e.g. '--tiles 3 2') for small objects in
+high resolution images.
 """
 
 import argparse
@@ -64,6 +66,9 @@ def main():
       '--input', help='File path of the input image.', required=True)
   parser.add_argument(
       '--output', help='File path of the output image.')
+  parser.add_argument(
+      '--tiles', type=int, nargs=2, metavar=('COLUMNS', 'ROWS'),
+      help='Detect tile by tile with this grid.')
   args = parser.parse_args()
 
   if not args.output:
@@ -76,12 +81,19 @@ def main():
   labels = ReadLabelFile(args.label) if args.label else None
 
   # Open image.
-  img = Image.open(args.input)
+  img = Image.open(args.input).convert('RGB')
   draw = ImageDraw.Draw(img)
 
   # Run inference.
-  ans = engine.DetectWithImage(img, threshold=0.05, keep_aspect_ratio=True,
-                               relative_coord=False, top_k=10)
+  if args.tiles:
+    ans = engine.DetectWithTiles(img, grid=args.tiles, overlap=0.2,
+                                 threshold=0.05, relative_coord=False,
+                                 top_k=10)
+    print('tile inference times (ms) = ',
+          engine.get_tile_inference_times().tolist())
+  else:
+    ans = engine.DetectWithImage(img, threshold=0.05, keep_aspect_ratio=True,
+                                 relative_coord=False, top_k=10)
 
   # Display result.
   if ans:
@@ -26,6 +26,10 @@ one model continuously kicks off the other model off the device's cache. In this
 case, running several inferences with one model in a batch before switching to
 another model can help to some extend. But using two Edge TPUs with two threads
 can help more.
+
+With --trace_file, a Chrome trace of both runs is saved (open it in
+chrome://tracing or ui.perfetto.dev) to check whether the two Edge TPUs
+actually overlap.
 """
 
 import argparse
@@ -36,6 +40,7 @@ import time
 from edgetpu.basic import edgetpu_utils
 from edgetpu.classification.engine import ClassificationEngine
 from edgetpu.detection.engine import DetectionEngine
+from edgetpu.utils import tracing
 import numpy as np
 from PIL import Image
 
@@ -49,7 +54,8 @@ def open_image(path):
 
 def get_input_tensor(engine, image):
   _, height, width, _ = engine.get_input_tensor_shape()
-  return np.asarray(image.resize((width, height), Image.NEAREST)).flatten()
+  with tracing.TRACER.Span('get_input_tensor', 'preprocess'):
+    return np.asarray(image.resize((width, height), Image.NEAREST)).flatten()
 
 
 def run_two_models_one_tpu(classification_model, detection_model, image_name,
@@ -75,6 +81,8 @@ def run_two_models_one_tpu(classification_model, detection_model, image_name,
   engine_a = ClassificationEngine(classification_model)
   # `engine_b` shares the same Edge TPU as `engine_a`
   engine_b = DetectionEngine(detection_model, engine_a.device_path())
+  engine_a.set_tracer(tracing.TRACER)
+  engine_b.set_tracer(tracing.TRACER)
   with open_image(image_name) as image:
     # Resized image for `engine_a`, `engine_b`.
     tensor_a = get_input_tensor(engine_a, image)
@@ -108,6 +116,7 @@ def run_two_models_two_tpus(classification_model, detection_model, image_name,
   def classification_job(classification_model, image_name, num_inferences):
     """Runs classification job."""
     engine = ClassificationEngine(classification_model)
+    engine.set_tracer(tracing.TRACER)
     with open_image(image_name) as image:
       tensor = get_input_tensor(engine, image)
 
@@ -118,10 +127,9 @@ def run_two_models_two_tpus(classification_model, detection_model, image_name,
   def detection_job(detection_model, image_name, num_inferences):
     """Runs detection job."""
     engine = DetectionEngine(detection_model)
+    engine.set_tracer(tracing.TRACER)
     with open_image(image_name) as img:
-      # Resized image.
-      _, height, width, _ = engine.get_input_tensor_shape()
-      tensor = np.asarray(img.resize((width, height), Image.NEAREST)).flatten()
+      tensor = get_input_tensor(engine, img)
 
     # Using `DetectWithInputTensor` to exclude image down-scale cost.
     for _ in range(num_inferences):
@@ -160,8 +168,13 @@ def main():
       help='Runs one model batch_size times before switching to the other.',
       type=int,
       default=10)
+  parser.add_argument(
+      '--trace_file',
+      help='Saves Chrome trace-event JSON of the runs to this file.')
 
   args = parser.parse_args()
+  if args.trace_file:
+    tracing.TRACER.Enable()
 
   edge_tpus = edgetpu_utils.ListEdgeTpuPaths(
       edgetpu_utils.EDGE_TPU_STATE_UNASSIGNED)
@@ -182,6 +195,9 @@ def main():
 
   print('Inference with one Edge TPU costs %.2f seconds.' % cost_one_tpu)
   print('Inference with two Edge TPUs costs %.2f seconds.' % cost_two_tpus)
+  if args.trace_file:
+    tracing.TRACER.Save(args.trace_file)
+    print('Trace saved to %s.' % args.trace_file)
 
 
 if __name__ == '__main__':
@@ -14,11 +14,51 @@
 
 """Python wrapper for ImprintingEngine."""
 
-import edgetpu.swig.edgetpu_cpp_wrapper
+from edgetpu.basic import backend
+from edgetpu.utils import instrumentation
+from edgetpu.utils import tracing
 
+_wrapper = backend.Wrapper()
 
-class ImprintingEngine(edgetpu.swig.edgetpu_cpp_wrapper.ImprintingEngine):
-  """Python wrapper for Imprinting Engine."""
+
+class ImprintingEngine(instrumentation.StageTimingMixin,
+                       _wrapper.ImprintingEngine):
+  """Python wrapper for Imprinting Engine.
+
+  Train and SaveModel are timed by set_stage_timing() and traced by
+  set_tracer().
+  """
+
+  def Train(self, input):  # pylint: disable=redefined-builtin
+    """Trains model with a set of images from same class.
+
+    Args:
+      input: list of numpy.array. Each numpy.array represents as a 1-D tensor
+        converted from an image.
+
+    Returns:
+      int, the label_id for the class.
+    """
+    recorder = self._stage_recorder
+    if recorder:
+      start = instrumentation.Now()
+    label_id = super().Train(input)
+    if recorder:
+      recorder.Record(instrumentation.TRAIN, start)
+    return label_id
+
+  def SaveModel(self, output_path):
+    """Saves trained model as '.tflite' file.
+
+    Args:
+      output_path: string, ouput path of the trained model.
+    """
+    recorder = self._stage_recorder
+    if recorder:
+      start = instrumentation.Now()
+    super().SaveModel(output_path)
+    if recorder:
+      recorder.Record(instrumentation.SAVE, start)
 
   def TrainAll(self, input_data):
     """Trains model given input of all categories.
@@ -34,3 +74,7 @@ class ImprintingEngine(edgetpu.swig.edgetpu_cpp_wrapper.ImprintingEngine):
     for category, tensors in input_data.items():
       ret[self.Train(tensors)] = category
     return ret
+
+  def _TraceDevice(self):
+    # Training runs on the host.
+    return tracing.HOST
@@ -0,0 +1,232 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Segmentation Engine used for semantic segmentation tasks."""
+
+from edgetpu.basic import tflite_model
+from edgetpu.basic.basic_engine import BasicEngine
+from edgetpu.utils import image_processing
+from edgetpu.utils import instrumentation
+import numpy as np
+from PIL import Image
+
+
+def OutputShape(output_shape, output_size, input_size):
+  """Finds (height, width, num_classes) of a segmentation output tensor.
+
+  Args:
+    output_shape: shape of the output tensor read from the model, [1, H, W, C],
+      [H, W, C] or [1, H, W]; None if unknown.
+    output_size: int, number of elements of the output tensor.
+    input_size: (height, width) of the input tensor, the output resolution
+      assumed when output_shape is unknown.
+
+  Returns:
+    (height, width, num_classes). num_classes is 1 for models outputting the
+    label of each pixel rather than scores.
+
+  Raises:
+    ValueError: when the output isn't a label map or per-class scores.
+  """
+  if output_shape is not None and len(output_shape):
+    shape = [int(d) for d in output_shape]
+    # Drops the batch of [1, H, W, C] and [1, H, W].
+    if len(shape) == 4 or (len(shape) == 3 and shape[0] == 1):
+      batch, shape = shape[0], shape[1:]
+      if batch != 1:
+        shape = []
+      elif len(shape) == 2:
+        shape.append(1)
+    if len(shape) != 3 or int(np.prod(shape)) != output_size:
+      raise ValueError(
+          'Segmentation model should output [1, height, width, classes] or '
+          '[1, height, width]! This model outputs {}.'.format(
+              list(output_shape)))
+    return tuple(shape)
+  height, width = input_size
+  if output_size % (height * width):
+    raise ValueError(
+        'Output size {} is not a multiple of the input resolution {}x{}!'
+        .format(output_size, width, height))
+  return (height, width, output_size // (height * width))
+
+
+def LabelMap(raw_result, output_shape):
+  """Decodes the raw output of a segmentation model into labels.
+
+  Scores are dequantized by the runtime with a positive scale, which keeps
+  their order, so the argmax equals the one of the quantized scores. It runs
+  on a view of raw_result, only the label map is allocated.
+
+  Args:
+    raw_result: 1-D numpy.array, output of RunInference().
+    output_shape: (height, width, num_classes), see OutputShape().
+
+  Returns:
+    (height, width) numpy.array of uint8, or uint16 with more than 256
+    classes.
+  """
+  height, width, num_classes = output_shape
+  if num_classes == 1:
+    labels = raw_result.reshape(height, width)
+    dtype = np.uint8 if labels.max(initial=0) < 256 else np.uint16
+    return np.rint(labels).astype(dtype)
+  dtype = np.uint8 if num_classes <= 256 else np.uint16
+  return raw_result.reshape(height, width, num_classes).argmax(
+      axis=2).astype(dtype)
+
+
+def UndoLetterbox(label_map, ratio, image_size):
+  """Maps a label map of a letterboxed input back to the source image.
+
+  Args:
+    label_map: (height, width) numpy.array.
+    ratio: (float, float), fraction of the width (height) of the input tensor
+      covered by the image, see image_processing.ResamplingWithOriginalRatio();
+      (1.0, 1.0) if the image was stretched.
+    image_size: (width, height) of the source image.
+
+  Returns:
+    numpy.array of image_size, nearest neighbor upsampling of the part of
+    label_map covering the image.
+  """
+  height, width = label_map.shape
+  valid_width = max(int(round(width * ratio[0])), 1)
+  valid_height = max(int(round(height * ratio[1])), 1)
+  return image_processing.ResizeArray(
+      label_map[:valid_height, :valid_width], image_size)
+
+
+def ClassMasks(label_map, classes=None):
+  """Splits a label map into one boolean mask per class.
+
+  Args:
+    label_map: (height, width) numpy.array.
+    classes: list of int, classes of the masks, by default the classes found
+      in label_map.
+
+  Returns:
+    (classes, masks), (K,) numpy.array of class ids and (K, height, width)
+    numpy.array of bool.
+  """
+  if classes is None:
+    classes = np.flatnonzero(np.bincount(label_map.ravel()))
+  classes = np.asarray(classes, dtype=label_map.dtype)
+  return classes, label_map[np.newaxis] == classes[:, np.newaxis, np.newaxis]
+
+
+class SegmentationEngine(BasicEngine):
+  """Engine used for semantic segmentation tasks."""
+
+  def __init__(self, model_path, device_path=None):
+    """Creates a SegmentationEngine with given model.
+
+    Args:
+      model_path: String, path to TF-Lite Flatbuffer file.
+      device_path: String, if specified, bind engine with Edge TPU at device_path.
+
+    Raises:
+      ValueError: An error occurred when the output format of model is invalid.
+    """
+    if device_path:
+      super().__init__(model_path, device_path)
+    else:
+      super().__init__(model_path)
+    output_tensors_sizes = self.get_all_output_tensors_sizes()
+    if output_tensors_sizes.size != 1:
+      raise ValueError(
+          ('Segmentation model should have 1 output tensor only! '
+           'This model has {}.'.format(output_tensors_sizes.size)))
+    input_tensor_shape = self.get_input_tensor_shape()
+    if (input_tensor_shape.size != 4 or input_tensor_shape[3] != 3 or
+        input_tensor_shape[0] != 1):
+      raise ValueError(
+          'Invalid input tensor shape! Expected: [1, height, width, 3]')
+    try:
+      output_shape = tflite_model.TfLiteModel(model_path).outputs[0].shape
+    except (ValueError, IndexError):
+      output_shape = None
+    self._output_shape = OutputShape(
+        output_shape, int(output_tensors_sizes[0]),
+        (int(input_tensor_shape[1]), int(input_tensor_shape[2])))
+
+  def get_output_shape(self):
+    """Returns (height, width, num_classes) of the output.
+
+    num_classes is 1 for models outputting labels rather than scores.
+    """
+    return self._output_shape
+
+  def SegmentWithImage(self, img, keep_aspect_ratio=False, upsample=True,
+                       resample=Image.NEAREST):
+    """Segments image with PIL image object.
+
+    Args:
+      img: PIL image object.
+      keep_aspect_ratio: bool, whether to keep aspect ratio when down-sampling
+        the input image, padding it at the bottom or right. By default it's
+        false.
+      upsample: bool, whether to resize the label map to the size of img,
+        without the padding of keep_aspect_ratio. Otherwise the label map has
+        the output resolution of the model, padding included.
+      resample: An optional resampling filter on image resizing. By default it
+        is PIL.Image.NEAREST.
+
+    Returns:
+      (height, width) numpy.array of uint8 (uint16 with more than 256
+      classes), the label of each pixel. See ClassMasks() for per-class
+      masks.
+    """
+    _, height, width, _ = self.get_input_tensor_shape()
+    recorder = self._stage_recorder
+    if recorder:
+      start = instrumentation.Now()
+    if keep_aspect_ratio:
+      resized_img, ratio = image_processing.ResamplingWithOriginalRatio(
+          img, (width, height), resample)
+    else:
+      resized_img, ratio = img.resize((width, height), resample), (1.0, 1.0)
+    if recorder:
+      start = recorder.Record(instrumentation.RESIZE, start)
+    input_tensor = np.asarray(resized_img).flatten()
+    if recorder:
+      recorder.Record(instrumentation.TO_TENSOR, start)
+    label_map = self.SegmentWithInputTensor(input_tensor)
+    if not upsample:
+      return label_map
+    if recorder:
+      start = instrumentation.Now()
+    label_map = UndoLetterbox(label_map, ratio, img.size)
+    if recorder:
+      recorder.Record(instrumentation.RESCALE, start)
+    return label_map
+
+  def SegmentWithInputTensor(self, input_tensor):
+    """Segments with raw input tensor.
+
+    Args:
+      input_tensor: numpy.array represents the input tensor.
+
+    Returns:
+      (height, width) numpy.array of uint8 (uint16 with more than 256
+      classes), the label of each pixel at the output resolution.
+    """
+    _, raw_result = self.RunInference(input_tensor)
+    recorder = self._stage_recorder
+    if recorder:
+      start = instrumentation.Now()
+    label_map = LabelMap(raw_result, self._output_shape)
+    if recorder:
+      recorder.Record(instrumentation.POSTPROCESS, start)
+    return label_map
@@ -11,3 +11,8 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+
+from edgetpu.basic import runtime_flavor
+
+# Must happen before _edgetpu_cpp_wrapper (linked against libedgetpu) loads.
+runtime_flavor.SelectFromEnvironment()
@@ -0,0 +1,234 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Detection followed by classification of each detected object.
+
+A detector finds objects and a fine-grained classifier, e.g. one of the iNat
+bird, insect or plant models, classifies the crop of each object:
+
+  cascade = DetectionClassificationCascade(
+      DetectionEngine(detection_model),
+      ClassificationEngine(classification_model, second_tpu_path))
+  for candidates in cascade.Run(frames):
+    for c in candidates:
+      print(c.bounding_box, c.label_id, c.classes)
+
+Crops of a frame are cut and resized at once into a batch allocated once, see
+image_processing.CropAndResize(), and classified back to back. Run() detects
+the next frame on a background thread while the crops of the current one are
+classified, so with the engines on two Edge TPUs throughput is bounded by the
+slower stage rather than the sum of both. On one Edge TPU the two models take
+turns on the device, which reloads their parameters when they don't both fit
+in its cache, see edgetpu/demo/two_models_inference.py.
+"""
+
+import queue
+import threading
+import time
+
+from edgetpu.utils import image_processing
+import numpy as np
+
+
+class CascadeCandidate(object):
+  """Data structure represents one detected and classified object.
+
+  Fields label_id, score and bounding_box are the ones of DetectionCandidate.
+  """
+  __slots__ = ['label_id', 'score', 'bounding_box', 'classes']
+
+  def __init__(self, label_id, score, bounding_box, classes):
+    #: int, label id of the detector.
+    self.label_id = label_id
+    #: float, score of the detector.
+    self.score = score
+    #: numpy.array, the bounding box with format [[x1, y1], [x2, y2]].
+    self.bounding_box = bounding_box
+    #: list of (int, float), id and score of the classifier on the crop.
+    self.classes = classes
+
+  def __repr__(self):
+    return 'CascadeCandidate(label_id=%d, score=%.2f, box=%s, classes=%s)' % (
+        self.label_id, self.score, self.bounding_box.flatten().tolist(),
+        self.classes)
+
+
+class CascadeStats(object):
+  """Statistics of a DetectionClassificationCascade."""
+  __slots__ = ['frames', 'crops', 'detection_time', 'classification_time']
+
+  def __init__(self):
+    #: int, number of frames processed.
+    self.frames = 0
+    #: int, number of crops classified.
+    self.crops = 0
+    #: float, seconds spent in detection.
+    self.detection_time = 0.0
+    #: float, seconds spent cropping and classifying.
+    self.classification_time = 0.0
+
+  def __repr__(self):
+    return ('CascadeStats(frames=%d, crops=%d, detection_time=%.3f s, '
+            'classification_time=%.3f s)' %
+            (self.frames, self.crops, self.detection_time,
+             self.classification_time))
+
+
+class DetectionClassificationCascade(object):
+  """Classifies the objects found by a detector."""
+
+  def __init__(self, detection_engine, classification_engine, threshold=0.4,
+               top_k=10, classification_threshold=0.1, classification_top_k=1,
+               crop_margin=0.0, relative_coord=True):
+    """Creates a DetectionClassificationCascade.
+
+    Args:
+      detection_engine: DetectionEngine.
+      classification_engine: ClassificationEngine, on another Edge TPU for
+        Run() to overlap both models.
+      threshold: float, score threshold of the detector.
+      top_k: int, maximum number of objects classified per frame.
+      classification_threshold: float, score threshold of the classifier.
+      classification_top_k: int, number of classes kept per object.
+      crop_margin: float, the crop of each object is enlarged by this fraction
+        of its width (height) on each side, for context.
+      relative_coord: bool, whether bounding boxes of results are relative
+        coordinates, as in DetectWithImage().
+
+    Raises:
+      ValueError: when input param is invalid.
+    """
+    if top_k <= 0 or classification_top_k <= 0:
+      raise ValueError('top_k must be positive!')
+    input_shape = classification_engine.get_input_tensor_shape()
+    if (input_shape.size != 4 or input_shape[3] != 3 or
+        input_shape[0] != 1):
+      raise ValueError(
+          'Invalid input tensor shape! Expected: [1, height, width, 3]')
+    self._detection_engine = detection_engine
+    self._classification_engine = classification_engine
+    self._threshold = threshold
+    self._top_k = top_k
+    self._classification_threshold = classification_threshold
+    self._classification_top_k = classification_top_k
+    self._crop_margin = crop_margin
+    self._relative_coord = relative_coord
+    _, height, width, _ = input_shape
+    self._crop_size = (width, height)
+    # Crops of one frame, reused for every frame.
+    self._batch = np.empty((top_k, height, width, 3), dtype=np.uint8)
+    self._stats = CascadeStats()
+
+  def _Detect(self, img):
+    """Returns (boxes, scores, labels) of img, boxes relative (N, 4)."""
+    start = time.perf_counter()
+    candidates = self._detection_engine.DetectWithImage(
+        img, threshold=self._threshold, top_k=self._top_k,
+        relative_coord=True)[:self._top_k]
+    boxes = np.array([np.asarray(c.bounding_box, dtype=np.float64).reshape(4)
+                      for c in candidates]).reshape(-1, 4)
+    scores = [c.score for c in candidates]
+    labels = [c.label_id for c in candidates]
+    self._stats.detection_time += time.perf_counter() - start
+    return boxes, scores, labels
+
+  def _Classify(self, img, detections):
+    """Classifies the crops of detections, returns list of CascadeCandidate."""
+    start = time.perf_counter()
+    boxes, scores, labels = detections
+    array = np.asarray(img)
+    image_size = np.array([array.shape[1], array.shape[0]] * 2)
+    margins = (boxes[:, 2:] - boxes[:, :2]) * self._crop_margin
+    crop_boxes = np.concatenate([boxes[:, :2] - margins,
+                                 boxes[:, 2:] + margins], axis=1)
+    crops = image_processing.CropAndResize(array, crop_boxes * image_size,
+                                           self._crop_size, out=self._batch)
+    if not self._relative_coord:
+      boxes = boxes * image_size
+    results = []
+    for i, crop in enumerate(crops):
+      classes = self._classification_engine.ClassifyWithInputTensor(
+          crop.ravel(), threshold=self._classification_threshold,
+          top_k=self._classification_top_k)
+      results.append(CascadeCandidate(labels[i], scores[i],
+                                      boxes[i].reshape(2, 2), classes))
+    self._stats.frames += 1
+    self._stats.crops += len(crops)
+    self._stats.classification_time += time.perf_counter() - start
+    return results
+
+  def DetectAndClassify(self, img):
+    """Detects and classifies the objects of one image.
+
+    Args:
+      img: PIL image object, RGB.
+
+    Returns:
+      List of CascadeCandidate.
+    """
+    return self._Classify(img, self._Detect(img))
+
+  def Run(self, images, queue_size=1):
+    """Detects and classifies the objects of a sequence of images.
+
+    The next images are detected on a background thread while the crops of
+    the current one are classified.
+
+    Args:
+      images: iterable of PIL image objects, RGB.
+      queue_size: int, number of detected images waiting for classification.
+
+    Yields:
+      List of CascadeCandidate for each image, in order.
+    """
+    # (img, detections, exception) of each detected image, None when done.
+    pending = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def DetectAll():
+      try:
+        for img in images:
+          if stop.is_set():
+            return
+          pending.put((img, self._Detect(img), None))
+      except Exception as e:  # pylint: disable=broad-except
+        pending.put((None, None, e))
+      finally:
+        pending.put(None)
+
+    worker = threading.Thread(target=DetectAll)
+    worker.daemon = True
+    worker.start()
+    try:
+      while True:
+        item = pending.get()
+        if item is None:
+          break
+        img, detections, error = item
+        if error:
+          raise error
+        yield self._Classify(img, detections)
+    finally:
+      # Unblocks the worker if the caller stopped early.
+      stop.set()
+      while worker.is_alive():
+        try:
+          pending.get(timeout=0.01)
+        except queue.Empty:
+          pass
+      worker.join()
+
+  def GetStats(self):
+    """Returns CascadeStats."""
+    return self._stats
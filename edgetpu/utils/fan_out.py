@@ -0,0 +1,168 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs several models on the same frame, concurrently.
+
+ClassifyWithImage() and DetectWithImage() resize the image for every model.
+FanOut resizes each frame once per distinct input size, shared by the models
+of that size, and runs the models on their own threads, so with the engines on
+separate Edge TPUs the latency of a frame approaches the one of the slowest
+model rather than the sum:
+
+  fan_out = FanOut({'classifier': ClassificationEngine(model_a, tpu_a),
+                    'detector': DetectionEngine(model_b, tpu_b),
+                    'faces': DetectionEngine(model_c, tpu_c)})
+  record = fan_out.Run(frame)
+  print(record.results['detector'], record.inference_times)
+  fan_out.Close()
+
+Engines sharing an Edge TPU still take turns on it.
+"""
+
+import concurrent.futures
+import threading
+import time
+
+from edgetpu.utils import stream_multiplexer
+import numpy as np
+from PIL import Image
+
+
+class FanOutRecord(object):
+  """Results of all models on one frame."""
+  __slots__ = ['results', 'inference_times', 'resize_time', 'total_time']
+
+  def __init__(self):
+    #: dict, result of each model by name.
+    self.results = {}
+    #: dict, milliseconds of each model by name, including waiting for its
+    #:  input tensor.
+    self.inference_times = {}
+    #: float, milliseconds spent resizing the frame, for all sizes.
+    self.resize_time = 0.0
+    #: float, milliseconds from the frame to the results of all models.
+    self.total_time = 0.0
+
+  def __repr__(self):
+    return 'FanOutRecord(results=%s, total_time=%.2f ms)' % (
+        self.results, self.total_time)
+
+
+class _ResizeCache(object):
+  """Input tensors of one frame by size, each one computed once."""
+
+  def __init__(self, img, resample):
+    self._img = img
+    self._resample = resample
+    self._lock = threading.Lock()
+    self._tensors = {}
+    self.resize_time = 0.0
+
+  def Get(self, size):
+    """Returns the flattened input tensor of size (width, height)."""
+    with self._lock:
+      future = self._tensors.get(size)
+      owner = future is None
+      if owner:
+        future = self._tensors[size] = concurrent.futures.Future()
+    if owner:
+      start = time.perf_counter()
+      try:
+        tensor = np.asarray(self._img.resize(size, self._resample)).flatten()
+      except Exception as e:  # pylint: disable=broad-except
+        future.set_exception(e)
+      else:
+        future.set_result(tensor)
+      with self._lock:
+        self.resize_time += (time.perf_counter() - start) * 1000
+    return future.result()
+
+
+class FanOut(object):
+  """Dispatches one frame to many engines."""
+
+  def __init__(self, engines, inference_fns=None, resample=Image.NEAREST):
+    """Creates a FanOut.
+
+    Args:
+      engines: dict, ClassificationEngine or DetectionEngine by name.
+      inference_fns: dict, function (engine, input_tensor) -> result by name,
+        for engines not run with stream_multiplexer.DefaultInferenceFunction().
+      resample: resampling filter on image resizing, for all models.
+
+    Raises:
+      ValueError: when engines is empty or an input shape is invalid.
+    """
+    if not engines:
+      raise ValueError('At least one engine is required!')
+    self._engines = dict(engines)
+    self._inference_fns = dict(inference_fns or {})
+    self._resample = resample
+    self._sizes = {}
+    for name, engine in self._engines.items():
+      input_shape = engine.get_input_tensor_shape()
+      if (input_shape.size != 4 or input_shape[3] != 3 or
+          input_shape[0] != 1):
+        raise ValueError(
+            'Invalid input tensor shape of {}! Expected: [1, height, width, 3]'
+            .format(name))
+      self._sizes[name] = (int(input_shape[2]), int(input_shape[1]))
+    self._executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=len(self._engines))
+
+  def get_input_sizes(self):
+    """Returns list of distinct (width, height) the frames are resized to."""
+    return sorted(set(self._sizes.values()))
+
+  def _RunModel(self, name, cache):
+    start = time.perf_counter()
+    tensor = cache.Get(self._sizes[name])
+    fn = self._inference_fns.get(name,
+                                 stream_multiplexer.DefaultInferenceFunction)
+    result = fn(self._engines[name], tensor)
+    return result, (time.perf_counter() - start) * 1000
+
+  def Run(self, img):
+    """Runs all models on one frame.
+
+    Args:
+      img: PIL image object, RGB.
+
+    Returns:
+      FanOutRecord.
+
+    Raises:
+      Exception raised by a model or the resize, after all models are done.
+    """
+    start = time.perf_counter()
+    cache = _ResizeCache(img, self._resample)
+    futures = {name: self._executor.submit(self._RunModel, name, cache)
+               for name in self._engines}
+    concurrent.futures.wait(list(futures.values()))
+    record = FanOutRecord()
+    for name, future in futures.items():
+      record.results[name], record.inference_times[name] = future.result()
+    record.resize_time = cache.resize_time
+    record.total_time = (time.perf_counter() - start) * 1000
+    return record
+
+  def Close(self):
+    """Stops the threads of the models."""
+    self._executor.shutdown()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.Close()
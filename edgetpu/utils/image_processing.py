@@ -14,6 +14,8 @@
 
 """Utils for image pre-processing before inference."""
 
+import numpy as np
+from PIL import Image
 from PIL import ImageOps
 
 
@@ -47,3 +49,111 @@ def ResamplingWithOriginalRatio(img, required_size, sample):
   padding = (0, 0, delta_w, delta_h)
   ratio = (new_size[0] / required_size[0], new_size[1] / required_size[1])
   return (ImageOps.expand(new_img, padding), ratio)
+
+
+def TileGrid(image_size, grid, overlap=0.0):
+  """Computes tiles covering an image, overlapping their neighbors.
+
+  Args:
+    image_size: (width, height), size of the image.
+    grid: (columns, rows), number of tiles along each axis.
+    overlap: float in [0, 1), fraction of a tile's width (height) shared with
+      its neighbor.
+
+  Returns:
+    (N, 4) numpy.array of int, [x1, y1, x2, y2] pixel coordinates of each
+    tile, row by row. x2 and y2 are exclusive, so tiles can be used as slices.
+
+  Raises:
+    ValueError: when grid or overlap is invalid.
+  """
+  columns, rows = grid
+  if columns <= 0 or rows <= 0 or not 0 <= overlap < 1:
+    raise ValueError('grid must be positive and overlap in [0, 1)!')
+  edges = []
+  for length, count in zip(image_size, (columns, rows)):
+    # count tiles of size t with stride t * (1 - overlap) cover the length.
+    size = length / (count - (count - 1) * overlap)
+    starts = np.arange(count) * size * (1 - overlap)
+    edges.append((np.round(starts).astype(np.int64),
+                  np.minimum(np.round(starts + size).astype(np.int64),
+                             length)))
+  (x1, x2), (y1, y2) = edges
+  tiles = np.empty((rows, columns, 4), dtype=np.int64)
+  tiles[..., 0] = x1[np.newaxis, :]
+  tiles[..., 1] = y1[:, np.newaxis]
+  tiles[..., 2] = x2[np.newaxis, :]
+  tiles[..., 3] = y2[:, np.newaxis]
+  return tiles.reshape(-1, 4)
+
+
+def ResizeArray(array, required_size, sample=Image.NEAREST):
+  """Resizes an image array, e.g. a slice of a larger image.
+
+  Nearest neighbor resizing gathers pixels straight from the array, so a
+  slice is read in place; other filters go through PIL.
+
+  Args:
+    array: (height, width, channels) numpy.array of uint8.
+    required_size: (width, height), required image size.
+    sample: Resampling filter on image resizing.
+
+  Returns:
+    (height, width, channels) numpy.array of uint8 with required_size.
+  """
+  width, height = required_size
+  if sample == Image.NEAREST:
+    # Same sampling positions as PIL: pixel centers, rounded down.
+    rows = ((np.arange(height) + 0.5) * (array.shape[0] / height)).astype(
+        np.int64)
+    columns = ((np.arange(width) + 0.5) * (array.shape[1] / width)).astype(
+        np.int64)
+    return array[rows[:, np.newaxis], columns]
+  return np.asarray(Image.fromarray(np.ascontiguousarray(array)).resize(
+      required_size, sample))
+
+
+def CropAndResize(array, boxes, required_size, out=None):
+  """Crops boxes of an image array and resizes them at once, nearest neighbor.
+
+  Pixels of all crops are gathered with one index array, sampling the same
+  positions as ResizeArray() of each crop.
+
+  Args:
+    array: (height, width, channels) numpy.array of uint8.
+    boxes: (K, 4) numpy.array of [x1, y1, x2, y2] pixel coordinates, clipped
+      to the image. Crops are at least one pixel.
+    required_size: (width, height), size of each crop.
+    out: if specified, (N, height, width, channels) numpy.array of uint8 with
+      N >= K, crops are written to its first K entries.
+
+  Returns:
+    (K, height, width, channels) numpy.array of uint8, out[:K] if out is
+    specified.
+
+  Raises:
+    ValueError: when out is too small.
+  """
+  width, height = required_size
+  image_height, image_width, channels = array.shape
+  boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+  x1 = np.clip(np.floor(boxes[:, 0]), 0, image_width - 1)
+  y1 = np.clip(np.floor(boxes[:, 1]), 0, image_height - 1)
+  x2 = np.clip(np.ceil(boxes[:, 2]), x1 + 1, image_width)
+  y2 = np.clip(np.ceil(boxes[:, 3]), y1 + 1, image_height)
+  rows = (y1[:, np.newaxis] + (np.arange(height) + 0.5) *
+          ((y2 - y1) / height)[:, np.newaxis]).astype(np.int64)
+  columns = (x1[:, np.newaxis] + (np.arange(width) + 0.5) *
+             ((x2 - x1) / width)[:, np.newaxis]).astype(np.int64)
+  indices = (rows[:, :, np.newaxis] * image_width +
+             columns[:, np.newaxis, :])
+  if out is None:
+    out = np.empty((len(boxes), height, width, channels), dtype=array.dtype)
+  elif (out.shape[0] < len(boxes) or
+        out.shape[1:] != (height, width, channels)):
+    raise ValueError('out is too small for {} crops of {}!'.format(
+        len(boxes), required_size))
+  out = out[:len(boxes)]
+  np.take(np.ascontiguousarray(array).reshape(-1, channels), indices, axis=0,
+          out=out)
+  return out
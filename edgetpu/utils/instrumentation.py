@@ -0,0 +1,279 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Per-stage latency instrumentation of the engines.
+
+Engines time the stages of their high-level APIs when stage timing is enabled
+with set_stage_timing(True), e.g. ClassifyWithImage() records:
+
+  resize: PIL resize of the input image.
+  to_tensor: numpy.asarray(img).flatten().
+  invoke: the SWIG call to RunInference, including the device time.
+  device: inference time reported by the runtime (get_inference_time()).
+  postprocess: converting raw output into results in Python.
+
+Durations are written with perf_counter_ns into a preallocated ring buffer, so
+recording doesn't allocate and a disabled engine only pays an attribute check
+per stage. get_stage_histograms() aggregates the samples in the buffer:
+
+  engine.set_stage_timing(True)
+  for img in images:
+    engine.ClassifyWithImage(img)
+  print(instrumentation.FormatHistograms(engine.get_stage_histograms()))
+
+A recorder belongs to one engine; like the engine, it must not be used from
+several threads concurrently.
+"""
+
+import collections
+import time
+
+import numpy as np
+
+RESIZE = 'resize'
+TO_TENSOR = 'to_tensor'
+INVOKE = 'invoke'
+DEVICE = 'device'
+POSTPROCESS = 'postprocess'
+RESCALE = 'rescale'
+TRAIN = 'train'
+SAVE = 'save'
+STAGES = (RESIZE, TO_TENSOR, INVOKE, DEVICE, POSTPROCESS, RESCALE, TRAIN,
+          SAVE)
+
+DEFAULT_CAPACITY = 4096
+
+_STAGE_IDS = {stage: i for i, stage in enumerate(STAGES)}
+
+if hasattr(time, 'perf_counter_ns'):
+  Now = time.perf_counter_ns
+else:
+
+  def Now():
+    """Returns perf_counter in nanoseconds, for Python < 3.7."""
+    return int(time.perf_counter() * 1e9)
+
+
+class StageHistogram(object):
+  """Latency distribution of one stage, in microseconds."""
+  __slots__ = ['stage', 'count', 'mean', 'p50', 'p90', 'p99', 'max',
+               'bucket_edges', 'bucket_counts']
+
+  def __init__(self, stage, durations_us):
+    #: string, one of STAGES.
+    self.stage = stage
+    #: int, number of samples.
+    self.count = durations_us.size
+    #: float, mean duration.
+    self.mean = float(durations_us.mean())
+    #: float, percentiles of duration.
+    self.p50, self.p90, self.p99 = (
+        float(v) for v in np.percentile(durations_us, [50, 90, 99]))
+    #: float, maximum duration.
+    self.max = float(durations_us.max())
+    #: 1-D numpy.array, power of two bucket edges covering all samples.
+    low = int(np.floor(np.log2(max(durations_us.min(), 1.0))))
+    high = int(np.ceil(np.log2(max(self.max, 1.0)))) + 1
+    self.bucket_edges = 2.0 ** np.arange(low, max(high, low + 1) + 1)
+    #: 1-D numpy.array, number of samples in each bucket.
+    self.bucket_counts, _ = np.histogram(
+        np.clip(durations_us, self.bucket_edges[0], None), self.bucket_edges)
+
+  def __repr__(self):
+    return ('StageHistogram(stage=%s, count=%d, mean=%.1f us, p50=%.1f us, '
+            'p99=%.1f us)' % (self.stage, self.count, self.mean, self.p50,
+                              self.p99))
+
+
+class StageRecorder(object):
+  """Ring buffer of stage durations."""
+
+  def __init__(self, capacity=DEFAULT_CAPACITY):
+    """Creates a recorder.
+
+    Args:
+      capacity: int, number of most recent samples kept.
+
+    Raises:
+      ValueError: when capacity isn't positive.
+    """
+    if capacity <= 0:
+      raise ValueError('capacity must be positive!')
+    self._capacity = capacity
+    self._stages = np.zeros(capacity, dtype=np.int8)
+    self._durations = np.zeros(capacity, dtype=np.int64)
+    self._count = 0
+
+  def Add(self, stage, duration_ns, end_ns=None):
+    """Records a duration measured elsewhere.
+
+    Args:
+      stage: string, one of STAGES.
+      duration_ns: int, duration in nanoseconds.
+      end_ns: int, timestamp from Now() when the stage ended, by default now.
+        Unused here, recorders placing stages on a timeline need it.
+    """
+    i = self._count % self._capacity
+    self._stages[i] = _STAGE_IDS[stage]
+    self._durations[i] = duration_ns
+    self._count += 1
+
+  def Record(self, stage, start_ns):
+    """Records a stage that started at start_ns and ends now.
+
+    Args:
+      stage: string, one of STAGES.
+      start_ns: int, timestamp from Now().
+
+    Returns:
+      int, the end timestamp, i.e. start of the next stage.
+    """
+    end_ns = Now()
+    self.Add(stage, end_ns - start_ns)
+    return end_ns
+
+  def Reset(self):
+    """Drops all samples."""
+    self._count = 0
+
+  def total_count(self):
+    """Returns number of samples recorded since creation or Reset()."""
+    return self._count
+
+  def Samples(self):
+    """Gets samples kept in the buffer, oldest first.
+
+    Returns:
+      {stage : 1-D numpy.array of durations in nanoseconds}.
+    """
+    n = min(self._count, self._capacity)
+    oldest = self._count % self._capacity if self._count > n else 0
+    order = (np.arange(n) + oldest) % self._capacity
+    stages = self._stages[order]
+    durations = self._durations[order]
+    samples = collections.OrderedDict()
+    for stage in STAGES:
+      selected = durations[stages == _STAGE_IDS[stage]]
+      if selected.size:
+        samples[stage] = selected
+    return samples
+
+  def Histograms(self):
+    """Aggregates samples kept in the buffer.
+
+    Returns:
+      OrderedDict {stage : StageHistogram}, in the order of STAGES, only for
+      stages with samples.
+    """
+    return collections.OrderedDict(
+        (stage, StageHistogram(stage, durations / 1000.0))
+        for stage, durations in self.Samples().items())
+
+
+class MultiRecorder(object):
+  """Forwards stages to several recorders, e.g. timing and tracing."""
+
+  def __init__(self, recorders):
+    self._recorders = tuple(recorders)
+
+  def Add(self, stage, duration_ns, end_ns=None):
+    for recorder in self._recorders:
+      recorder.Add(stage, duration_ns, end_ns)
+
+  def Record(self, stage, start_ns):
+    end_ns = Now()
+    for recorder in self._recorders:
+      recorder.Add(stage, end_ns - start_ns, end_ns)
+    return end_ns
+
+
+def CombineRecorders(*recorders):
+  """Returns one recorder for the given ones, None entries are skipped.
+
+  Returns:
+    None if there's no recorder, the recorder itself if there's one, a
+    MultiRecorder otherwise.
+  """
+  recorders = [r for r in recorders if r is not None]
+  if not recorders:
+    return None
+  if len(recorders) == 1:
+    return recorders[0]
+  return MultiRecorder(recorders)
+
+
+class StageTimingMixin(object):
+  """Stage timing and tracing switches shared by the engines.
+
+  Engines read _stage_recorder around each stage, it's None unless stage
+  timing or tracing is enabled. Subclasses implement _TraceDevice().
+  """
+
+  # Recorder of each stage, combines _stage_timing and _trace_recorder.
+  _stage_recorder = None
+  _stage_timing = None
+  _trace_recorder = None
+
+  def _TraceDevice(self):
+    """Returns string, the device trace events are grouped under."""
+    raise NotImplementedError()
+
+  def set_stage_timing(self, enabled, capacity=DEFAULT_CAPACITY):
+    """Enables per-stage latency instrumentation.
+
+    See edgetpu.utils.instrumentation for the stages. Enabling again keeps the
+    samples recorded so far.
+
+    Args:
+      enabled: bool, whether to time each stage.
+      capacity: int, number of most recent samples kept.
+    """
+    if not enabled:
+      self._stage_timing = None
+    elif self._stage_timing is None:
+      self._stage_timing = StageRecorder(capacity)
+    self._stage_recorder = CombineRecorders(self._stage_timing,
+                                            self._trace_recorder)
+
+  def get_stage_histograms(self):
+    """Gets latency distribution of each stage timed since enabled.
+
+    Returns:
+      OrderedDict {stage : StageHistogram}, empty when stage timing is
+      disabled.
+    """
+    if self._stage_timing is None:
+      return collections.OrderedDict()
+    return self._stage_timing.Histograms()
+
+  def set_tracer(self, tracer):
+    """Emits trace events of each stage, see edgetpu.utils.tracing.
+
+    Args:
+      tracer: tracing.Tracer, or None to stop tracing this engine.
+    """
+    self._trace_recorder = (tracer.Recorder(self._TraceDevice())
+                            if tracer is not None else None)
+    self._stage_recorder = CombineRecorders(self._stage_timing,
+                                            self._trace_recorder)
+
+
+def FormatHistograms(histograms):
+  """Formats histograms as a table, one row per stage, in microseconds."""
+  lines = ['%-12s %8s %10s %10s %10s %10s %10s' % (
+      'STAGE', 'COUNT', 'MEAN_US', 'P50_US', 'P90_US', 'P99_US', 'MAX_US')]
+  for h in histograms.values():
+    lines.append('%-12s %8d %10.1f %10.1f %10.1f %10.1f %10.1f' % (
+        h.stage, h.count, h.mean, h.p50, h.p90, h.p99, h.max))
+  return '\n'.join(lines)
@@ -0,0 +1,397 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-process metrics with Prometheus text exposition.
+
+Engines record into a registry once attached with BasicEngine.set_metrics():
+
+  edgetpu_inferences_total{engine, device, model}
+  edgetpu_inference_errors_total{engine, device, model}
+  edgetpu_device_latency_seconds{engine, device, model}: histogram of the
+    inference time reported by the runtime.
+  edgetpu_wall_latency_seconds{engine, device, model}: histogram of the whole
+    RunInference call, including the SWIG overhead.
+  edgetpu_model_info{engine, device, model, engine_class}: always 1, identity
+    of the model each engine runs.
+  edgetpu_queue_depth{queue}: pending requests, read at scrape time from
+    callbacks registered with TrackQueueDepth().
+
+device and model labels come from device_path() and model_path(). The labelled
+children are resolved once when attaching, so recording an inference only
+increments a few numbers under a lock.
+
+  registry = metrics.Registry()
+  engine.set_metrics(registry)
+  metrics.TrackQueueDepth(registry, 'camera0',
+                          lambda: mux.GetQueueDepth('camera0'))
+  server = metrics.StartHttpServer(9100, registry=registry)
+  ...
+  server.shutdown()
+"""
+
+import bisect
+import collections
+import http.server
+import itertools
+import socketserver
+import threading
+
+# Latency buckets in seconds, from sub-millisecond to slow CPU models.
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1,
+                           0.2, 0.5, 1.0, 2.0, 5.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_ENGINE_LABELS = ('engine', 'device', 'model')
+
+
+def _EscapeLabelValue(value):
+  return (str(value).replace('\\', r'\\').replace('\n', r'\n')
+          .replace('"', r'\"'))
+
+
+def _FormatLabels(names, values, extra=()):
+  pairs = list(zip(names, values)) + list(extra)
+  if not pairs:
+    return ''
+  return '{%s}' % ','.join(
+      '%s="%s"' % (name, _EscapeLabelValue(value)) for name, value in pairs)
+
+
+def _FormatValue(value):
+  if value == float('inf'):
+    return '+Inf'
+  return repr(float(value))
+
+
+class _CounterChild(object):
+  __slots__ = ['_lock', 'value']
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.value = 0.0
+
+  def Inc(self, amount=1.0):
+    with self._lock:
+      self.value += amount
+
+
+class _GaugeChild(object):
+  __slots__ = ['value', 'function']
+
+  def __init__(self):
+    self.value = 0.0
+    self.function = None
+
+  def Set(self, value):
+    self.value = value
+
+  def SetFunction(self, function):
+    """Reads the value from function() at each scrape instead."""
+    self.function = function
+
+  def Get(self):
+    return self.function() if self.function else self.value
+
+
+class _HistogramChild(object):
+  __slots__ = ['_lock', '_bounds', 'bucket_counts', 'sum', 'count']
+
+  def __init__(self, bounds):
+    self._lock = threading.Lock()
+    self._bounds = bounds
+    self.bucket_counts = [0] * (len(bounds) + 1)
+    self.sum = 0.0
+    self.count = 0
+
+  def Observe(self, value):
+    i = bisect.bisect_left(self._bounds, value)
+    with self._lock:
+      self.bucket_counts[i] += 1
+      self.sum += value
+      self.count += 1
+
+  def Snapshot(self):
+    """Returns (bucket_counts, sum, count), consistent with each other."""
+    with self._lock:
+      return list(self.bucket_counts), self.sum, self.count
+
+
+class _Metric(object):
+  """A metric family: name, help and one child per label values."""
+
+  type_name = None
+
+  def __init__(self, name, documentation, label_names=()):
+    self.name = name
+    self.documentation = documentation
+    self.label_names = tuple(label_names)
+    self._children = collections.OrderedDict()
+    self._lock = threading.Lock()
+
+  def Labels(self, *values):
+    """Gets the child of given label values, creating it if needed.
+
+    Keep the child instead of calling Labels() on the hot path.
+
+    Raises:
+      ValueError: when the number of values doesn't match label names.
+    """
+    if len(values) != len(self.label_names):
+      raise ValueError('Expected {} label values for {}, got {}.'.format(
+          len(self.label_names), self.name, len(values)))
+    values = tuple(str(v) for v in values)
+    with self._lock:
+      child = self._children.get(values)
+      if child is None:
+        child = self._children[values] = self._NewChild()
+      return child
+
+  def Remove(self, *values):
+    """Drops the child of given label values, e.g. of a closed engine."""
+    with self._lock:
+      self._children.pop(tuple(str(v) for v in values), None)
+
+  def Expose(self):
+    """Returns the text exposition of this metric."""
+    lines = ['# HELP %s %s' % (self.name, self.documentation.replace(
+        '\\', r'\\').replace('\n', r'\n')),
+             '# TYPE %s %s' % (self.name, self.type_name)]
+    with self._lock:
+      children = list(self._children.items())
+    for values, child in children:
+      lines.extend(self._ExposeChild(values, child))
+    return '\n'.join(lines)
+
+  def _NewChild(self):
+    raise NotImplementedError
+
+  def _ExposeChild(self, values, child):
+    raise NotImplementedError
+
+
+class Counter(_Metric):
+  """Monotonically increasing value."""
+
+  type_name = 'counter'
+
+  def _NewChild(self):
+    return _CounterChild()
+
+  def _ExposeChild(self, values, child):
+    return ['%s%s %s' % (self.name, _FormatLabels(self.label_names, values),
+                         _FormatValue(child.value))]
+
+
+class Gauge(_Metric):
+  """Value that can go up and down, or be read from a callback."""
+
+  type_name = 'gauge'
+
+  def _NewChild(self):
+    return _GaugeChild()
+
+  def _ExposeChild(self, values, child):
+    return ['%s%s %s' % (self.name, _FormatLabels(self.label_names, values),
+                         _FormatValue(child.Get()))]
+
+
+class Histogram(_Metric):
+  """Distribution of observed values in cumulative buckets."""
+
+  type_name = 'histogram'
+
+  def __init__(self, name, documentation, label_names=(),
+               buckets=DEFAULT_LATENCY_BUCKETS):
+    """Creates a histogram.
+
+    Raises:
+      ValueError: when buckets aren't increasing.
+    """
+    super().__init__(name, documentation, label_names)
+    self.buckets = tuple(float(b) for b in buckets)
+    if list(self.buckets) != sorted(set(self.buckets)):
+      raise ValueError('Buckets must be strictly increasing!')
+
+  def _NewChild(self):
+    return _HistogramChild(self.buckets)
+
+  def _ExposeChild(self, values, child):
+    counts, total, count = child.Snapshot()
+    lines = []
+    for bound, cumulative in zip(self.buckets + (float('inf'),),
+                                 itertools.accumulate(counts)):
+      lines.append('%s_bucket%s %d' % (
+          self.name, _FormatLabels(self.label_names, values,
+                                   [('le', _FormatValue(bound))]),
+          cumulative))
+    labels = _FormatLabels(self.label_names, values)
+    lines.append('%s_sum%s %s' % (self.name, labels, _FormatValue(total)))
+    lines.append('%s_count%s %d' % (self.name, labels, count))
+    return lines
+
+
+class Registry(object):
+  """Collection of metrics exposed together."""
+
+  def __init__(self):
+    self._metrics = collections.OrderedDict()
+    self._lock = threading.Lock()
+    self._engine_ids = itertools.count()
+
+  def _Get(self, metric_class, name, documentation, label_names, **kwargs):
+    with self._lock:
+      metric = self._metrics.get(name)
+      if metric is None:
+        metric = metric_class(name, documentation, label_names, **kwargs)
+        self._metrics[name] = metric
+      elif (type(metric) is not metric_class or
+            metric.label_names != tuple(label_names)):
+        raise ValueError('Metric {} is already registered as a different '
+                         'type or with other labels.'.format(name))
+      return metric
+
+  def Counter(self, name, documentation, label_names=()):
+    """Gets or registers a Counter."""
+    return self._Get(Counter, name, documentation, label_names)
+
+  def Gauge(self, name, documentation, label_names=()):
+    """Gets or registers a Gauge."""
+    return self._Get(Gauge, name, documentation, label_names)
+
+  def Histogram(self, name, documentation, label_names=(),
+                buckets=DEFAULT_LATENCY_BUCKETS):
+    """Gets or registers a Histogram."""
+    return self._Get(Histogram, name, documentation, label_names,
+                     buckets=buckets)
+
+  def NextEngineId(self):
+    """Returns a unique value for the engine label."""
+    return next(self._engine_ids)
+
+  def Expose(self):
+    """Returns the text exposition of all metrics."""
+    with self._lock:
+      metrics = list(self._metrics.values())
+    return ''.join(metric.Expose() + '\n' for metric in metrics)
+
+
+#: Registry used when none is given.
+REGISTRY = Registry()
+
+
+class EngineMetrics(object):
+  """Children of the engine metrics for one engine."""
+  __slots__ = ['_inferences', '_errors', '_device_latency', '_wall_latency',
+               '_families', '_info', '_label_values', '_info_values']
+
+  def __init__(self, engine, registry=None):
+    """Registers an engine.
+
+    Args:
+      engine: BasicEngine (or subclass), provides model_path() and
+        device_path().
+      registry: Registry, REGISTRY by default.
+    """
+    registry = registry or REGISTRY
+    self._label_values = (registry.NextEngineId(), engine.device_path(),
+                          engine.model_path())
+    self._families = [
+        registry.Counter('edgetpu_inferences_total', 'Number of inferences.',
+                         _ENGINE_LABELS),
+        registry.Counter('edgetpu_inference_errors_total',
+                         'Number of failed inferences.', _ENGINE_LABELS),
+        registry.Histogram('edgetpu_device_latency_seconds',
+                           'Inference time reported by the Edge TPU runtime.',
+                           _ENGINE_LABELS),
+        registry.Histogram('edgetpu_wall_latency_seconds',
+                           'Wall time of RunInference, including host '
+                           'overhead.', _ENGINE_LABELS),
+    ]
+    (self._inferences, self._errors, self._device_latency,
+     self._wall_latency) = (family.Labels(*self._label_values)
+                            for family in self._families)
+    self._info = registry.Gauge('edgetpu_model_info',
+                                'Model loaded by each engine.',
+                                _ENGINE_LABELS + ('engine_class',))
+    self._info_values = self._label_values + (type(engine).__name__,)
+    self._info.Labels(*self._info_values).Set(1)
+
+  def Record(self, device_latency, wall_latency):
+    """Records one inference, latencies in seconds."""
+    self._inferences.Inc()
+    self._device_latency.Observe(device_latency)
+    self._wall_latency.Observe(wall_latency)
+
+  def RecordError(self):
+    """Records one failed inference."""
+    self._errors.Inc()
+
+  def Unregister(self):
+    """Removes the children of this engine from the registry."""
+    for family in self._families:
+      family.Remove(*self._label_values)
+    self._info.Remove(*self._info_values)
+
+
+def TrackQueueDepth(registry, queue_name, function):
+  """Exposes the depth of a queue, read from function() at each scrape.
+
+  Args:
+    registry: Registry, or None for REGISTRY.
+    queue_name: string, value of the queue label.
+    function: callable returning the current number of pending requests.
+  """
+  registry = registry or REGISTRY
+  registry.Gauge('edgetpu_queue_depth', 'Number of pending requests.',
+                 ('queue',)).Labels(queue_name).SetFunction(function)
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+  daemon_threads = True
+
+
+def StartHttpServer(port, addr='', registry=None):
+  """Serves the text exposition of a registry on a daemon thread.
+
+  Args:
+    port: int, port to listen on, 0 picks a free one (see server_address).
+    addr: string, address to bind.
+    registry: Registry, REGISTRY by default.
+
+  Returns:
+    http.server.HTTPServer, call shutdown() to stop it.
+  """
+  registry = registry or REGISTRY
+
+  class Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):  # pylint: disable=invalid-name
+      if self.path.split('?')[0] not in ('/', '/metrics'):
+        self.send_error(404)
+        return
+      body = registry.Expose().encode('utf-8')
+      self.send_response(200)
+      self.send_header('Content-Type', CONTENT_TYPE)
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+      pass
+
+  server = _ThreadingHTTPServer((addr, port), Handler)
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  return server
@@ -0,0 +1,166 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Loads many engines concurrently at startup.
+
+Constructing engines one by one is slow when the host has many models, and on
+hosts with slow storage (e.g. SD card) reading the flatbuffers dominates. For
+each (model, device) pair of a manifest, LoadEngines() runs on a thread pool:
+
+  1. read: prefetches the model file into the page cache, so the engine reads
+     it from memory.
+  2. construct: creates the engine.
+  3. warmup: runs BasicEngine.Warmup(), so the parameters are uploaded to the
+     Edge TPU before the first real request.
+
+Example:
+  engines, timings = model_loader.LoadEngines([
+      (classification_model, '/sys/bus/usb/devices/2-1', ClassificationEngine),
+      (detection_model, '/sys/bus/usb/devices/2-2', DetectionEngine),
+  ])
+  print(model_loader.FormatTimings(timings))
+"""
+
+import concurrent.futures
+import os
+import time
+
+from edgetpu.basic.basic_engine import BasicEngine
+
+_READ_CHUNK_SIZE = 1 << 20
+
+
+class LoadTiming(object):
+  """Time breakdown of loading one engine, in milliseconds."""
+  __slots__ = ['model_path', 'device_path', 'read_time', 'construct_time',
+               'warmup_time']
+
+  def __init__(self, model_path):
+    #: string, path of the model.
+    self.model_path = model_path
+    #: string, path of the Edge TPU the engine is bound to.
+    self.device_path = None
+    #: float, time to prefetch the model file into page cache.
+    self.read_time = 0.0
+    #: float, time to construct the engine.
+    self.construct_time = 0.0
+    #: float, time of the warmup inference.
+    self.warmup_time = 0.0
+
+  def __repr__(self):
+    return ('LoadTiming(model_path=%s, device_path=%s, read=%.2f ms, '
+            'construct=%.2f ms, warmup=%.2f ms)' %
+            (self.model_path, self.device_path, self.read_time,
+             self.construct_time, self.warmup_time))
+
+
+def PrefetchModel(model_path):
+  """Brings the whole model file into the page cache.
+
+  Args:
+    model_path: string, path to TF-Lite Flatbuffer file.
+
+  Returns:
+    int, size of the file in bytes.
+  """
+  buf = bytearray(_READ_CHUNK_SIZE)
+  size = 0
+  with open(model_path, 'rb', buffering=0) as f:
+    if hasattr(os, 'posix_fadvise'):
+      # Lets the kernel read ahead the whole file while we walk through it.
+      os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+    while True:
+      n = f.readinto(buf)
+      if not n:
+        break
+      size += n
+  return size
+
+
+def _LoadOne(model_path, device_path, engine_class, warmup):
+  """Reads, constructs and warms up one engine."""
+  timing = LoadTiming(model_path)
+  start = time.perf_counter()
+  PrefetchModel(model_path)
+  end = time.perf_counter()
+  timing.read_time = (end - start) * 1000
+  start = end
+  if device_path:
+    engine = engine_class(model_path, device_path)
+  else:
+    engine = engine_class(model_path)
+  end = time.perf_counter()
+  timing.construct_time = (end - start) * 1000
+  if hasattr(engine, 'device_path'):
+    timing.device_path = engine.device_path()
+  if warmup and hasattr(engine, 'Warmup'):
+    start = end
+    engine.Warmup()
+    timing.warmup_time = (time.perf_counter() - start) * 1000
+  return engine, timing
+
+
+def LoadEngines(manifest, engine_class=BasicEngine, max_workers=None,
+                warmup=True):
+  """Loads engines of a manifest concurrently.
+
+  Args:
+    manifest: list of (model_path, device_path) or
+      (model_path, device_path, engine_class) tuples. device_path can be None
+      to let the runtime pick the Edge TPU, but explicit paths make the
+      assignment deterministic when loading concurrently.
+    engine_class: class, used for entries without engine_class.
+    max_workers: int, size of the thread pool. By default one thread per
+      entry.
+    warmup: bool, whether to run one warmup inference per engine.
+
+  Returns:
+    (engines, timings). Lists of engines and LoadTiming in the order of
+    manifest.
+
+  Raises:
+    ValueError: when manifest is empty.
+  """
+  if not manifest:
+    raise ValueError('manifest must not be empty!')
+  with concurrent.futures.ThreadPoolExecutor(
+      max_workers=max_workers or len(manifest)) as executor:
+    futures = []
+    for entry in manifest:
+      model_path, device_path = entry[0], entry[1]
+      entry_class = entry[2] if len(entry) > 2 else engine_class
+      futures.append(executor.submit(_LoadOne, model_path, device_path,
+                                     entry_class, warmup))
+    results = [future.result() for future in futures]
+  engines = [engine for engine, _ in results]
+  timings = [timing for _, timing in results]
+  return engines, timings
+
+
+def FormatTimings(timings):
+  """Formats timings as a table.
+
+  Args:
+    timings: list of LoadTiming.
+
+  Returns:
+    string.
+  """
+  lines = ['%-60s %-30s %12s %12s %12s' % ('MODEL', 'DEVICE', 'READ_MS',
+                                          'CONSTRUCT_MS', 'WARMUP_MS')]
+  for t in timings:
+    lines.append('%-60s %-30s %12.2f %12.2f %12.2f' % (
+        os.path.basename(t.model_path), t.device_path, t.read_time,
+        t.construct_time, t.warmup_time))
+  return '\n'.join(lines)
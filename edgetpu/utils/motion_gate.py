@@ -0,0 +1,182 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Skips inference of frames that did not change, e.g. of static scenes.
+
+The gate compares the input tensor, already resized for the model, with the
+input tensor of the last inference. Both are downsampled to grayscale blocks,
+and when few blocks changed the cached result of the last inference is
+returned instead of invoking the Edge TPU:
+
+  gate = motion_gate.MotionGate(engine.get_input_tensor_shape())
+  results = gate.Run(input_tensor, engine.ClassifyWithInputTensor, top_k=1)
+  print(gate.GetStats().skip_ratio)
+
+Frames are compared with the last inferred frame rather than the previous
+frame, so slow changes accumulate until they open the gate. The cached result
+is never older than max_staleness seconds, and is only returned for the same
+inference_fn and arguments.
+"""
+
+import time
+
+import numpy as np
+
+
+def _Same(a, b):
+  """Whether a and b are the same argument, numpy arrays included."""
+  if a is b:
+    return True
+  try:
+    return bool(np.all(a == b))
+  except (TypeError, ValueError):
+    return False
+
+
+class GateStats(object):
+  """Statistics of a MotionGate."""
+  __slots__ = ['frames', 'skipped', 'stale']
+
+  def __init__(self):
+    #: int, number of frames passed to the gate.
+    self.frames = 0
+    #: int, number of frames answered with the cached result.
+    self.skipped = 0
+    #: int, number of unchanged frames inferred because the cached result
+    #:  was too old.
+    self.stale = 0
+
+  @property
+  def skip_ratio(self):
+    """float, skipped frames over frames."""
+    return float(self.skipped) / self.frames if self.frames else 0.0
+
+  def __repr__(self):
+    return 'GateStats(frames=%d, skipped=%d, stale=%d, skip_ratio=%.3f)' % (
+        self.frames, self.skipped, self.stale, self.skip_ratio)
+
+
+class MotionGate(object):
+  """Returns the cached result of the last inference for unchanged frames."""
+
+  def __init__(self, input_shape, block_size=8, pixel_threshold=12.0,
+               threshold=0.01, max_staleness=1.0):
+    """Creates a MotionGate.
+
+    Args:
+      input_shape: [height, width, channels] of the input tensor, or the
+        [1, height, width, channels] of BasicEngine.get_input_tensor_shape().
+      block_size: int, size in pixels of the square blocks averaged before the
+        comparison, which removes most of the sensor noise.
+      pixel_threshold: float, a block changed when its mean intensity changed
+        by more than this, in [0, 255].
+      threshold: float, the frame changed when more than this fraction of its
+        blocks changed.
+      max_staleness: float, seconds. Inference runs when the cached result is
+        older than this, even if the frame did not change. None to disable.
+
+    Raises:
+      ValueError: when input param is invalid.
+    """
+    input_shape = tuple(int(d) for d in input_shape)
+    if len(input_shape) == 4:
+      input_shape = input_shape[1:]
+    if len(input_shape) != 3:
+      raise ValueError(
+          'Invalid input shape! Expected: [height, width, channels]')
+    if block_size <= 0:
+      raise ValueError('block_size must be positive!')
+    self._input_shape = input_shape
+    self._block_size = block_size
+    self._pixel_threshold = pixel_threshold
+    self._threshold = threshold
+    self._max_staleness = max_staleness
+    self._stats = GateStats()
+    self.Reset()
+
+  def Reset(self):
+    """Drops the cached result, the next frame is inferred."""
+    self._reference = None
+    self._result = None
+    self._result_time = None
+    # (inference_fn, args, kwargs) of the cached result.
+    self._call = None
+
+  def Downsample(self, input_tensor):
+    """Returns 2D numpy.array of mean intensity of the blocks of the tensor.
+
+    Rows and columns not filling a whole block are ignored.
+    """
+    height, width, channels = self._input_shape
+    size = self._block_size
+    rows = max(height // size, 1)
+    cols = max(width // size, 1)
+    size_y = min(size, height)
+    size_x = min(size, width)
+    image = np.asarray(input_tensor).reshape(self._input_shape)
+    image = image[:rows * size_y, :cols * size_x]
+    sums = image.reshape(rows, size_y, cols, size_x, channels).sum(
+        axis=(1, 3, 4), dtype=np.float32)
+    return sums / (size_y * size_x * channels)
+
+  def ChangedFraction(self, blocks):
+    """Returns float, fraction of blocks changed since the last inference."""
+    if self._reference is None:
+      return 1.0
+    changed = np.abs(blocks - self._reference) > self._pixel_threshold
+    return float(np.mean(changed))
+
+  def Run(self, input_tensor, inference_fn, *args, **kwargs):
+    """Runs inference_fn on input_tensor unless the frame did not change.
+
+    Args:
+      input_tensor: numpy.array of the input tensor, e.g. the uint8 array of
+        ClassifyWithInputTensor().
+      inference_fn: function (input_tensor, *args, **kwargs) -> result.
+      *args: passed to inference_fn.
+      **kwargs: passed to inference_fn.
+
+    Returns:
+      The result of inference_fn, or the cached result of the last inference
+      if it was run by the same inference_fn with the same arguments.
+    """
+    self._stats.frames += 1
+    blocks = self.Downsample(input_tensor)
+    now = time.perf_counter()
+    if (self.ChangedFraction(blocks) <= self._threshold and
+        self._SameCall(inference_fn, args, kwargs)):
+      if (self._max_staleness is None or
+          now - self._result_time <= self._max_staleness):
+        self._stats.skipped += 1
+        return self._result
+      self._stats.stale += 1
+    self._result = inference_fn(input_tensor, *args, **kwargs)
+    self._reference = blocks
+    self._result_time = now
+    self._call = (inference_fn, args, kwargs)
+    return self._result
+
+  def _SameCall(self, inference_fn, args, kwargs):
+    if self._call is None:
+      return False
+    cached_fn, cached_args, cached_kwargs = self._call
+    return (_Same(inference_fn, cached_fn) and
+            len(args) == len(cached_args) and
+            all(_Same(a, b) for a, b in zip(args, cached_args)) and
+            set(kwargs) == set(cached_kwargs) and
+            all(_Same(v, cached_kwargs[k]) for k, v in kwargs.items()))
+
+  def GetStats(self):
+    """Returns GateStats."""
+    return self._stats
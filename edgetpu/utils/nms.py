@@ -0,0 +1,360 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Non-maximum suppression and box fusion on numpy arrays.
+
+SSD models with postprocess already run per-class NMS, these utils are for
+merging detections of several tiles, models or frames. Boxes are (N, 4)
+numpy.array of [x1, y1, x2, y2], the order of
+DetectionCandidate.bounding_box.flatten(), in relative or pixel coordinates:
+
+  boxes, scores, labels = nms.FromCandidates(candidates_a + candidates_b)
+  keep = nms.Nms(boxes, scores, threshold=0.5, labels=labels)
+
+Boxes are sorted by x1 once, each kept box is then compared at once with the
+boxes of its x1 window only, which can overlap it. Cost grows with the number
+of kept boxes times the window size rather than N^2, see
+benchmarks/nms_benchmarks.py for timings at 1k and 10k boxes.
+
+Passing labels makes suppression class-aware: boxes are shifted by label so
+boxes of different labels never overlap, and all labels are handled in one
+pass.
+"""
+
+import numpy as np
+
+# Overlap metrics.
+IOU = 'iou'  # Intersection over union.
+IOS = 'ios'  # Intersection over the smaller box, e.g. for boxes cut at seams.
+METRICS = (IOU, IOS)
+
+# Score decay of soft NMS.
+LINEAR = 'linear'
+GAUSSIAN = 'gaussian'
+
+
+def Area(boxes):
+  """Returns (N,) numpy.array, areas of boxes, 0 for degenerate ones."""
+  boxes = np.asarray(boxes, dtype=np.float64)
+  return np.prod(np.maximum(boxes[:, 2:] - boxes[:, :2], 0), axis=1)
+
+
+def PairwiseOverlap(boxes_a, boxes_b, metric=IOU):
+  """Computes overlap of each box of boxes_a with each box of boxes_b.
+
+  Args:
+    boxes_a: (N, 4) numpy.array.
+    boxes_b: (M, 4) numpy.array.
+    metric: string, one of METRICS.
+
+  Returns:
+    (N, M) numpy.array.
+
+  Raises:
+    ValueError: when metric is unknown.
+  """
+  if metric not in METRICS:
+    raise ValueError('Unknown metric: {}'.format(metric))
+  boxes_a = np.asarray(boxes_a, dtype=np.float64)
+  boxes_b = np.asarray(boxes_b, dtype=np.float64)
+  top_left = np.maximum(boxes_a[:, np.newaxis, :2], boxes_b[np.newaxis, :, :2])
+  bottom_right = np.minimum(boxes_a[:, np.newaxis, 2:],
+                            boxes_b[np.newaxis, :, 2:])
+  wh = np.maximum(bottom_right - top_left, 0)
+  intersection = wh[..., 0] * wh[..., 1]
+  area_a = Area(boxes_a)[:, np.newaxis]
+  area_b = Area(boxes_b)[np.newaxis, :]
+  if metric == IOU:
+    denominator = area_a + area_b - intersection
+  else:
+    denominator = np.minimum(area_a, area_b)
+  return intersection / np.maximum(denominator, 1e-12)
+
+
+def _OverlapWithBox(box, area, boxes, areas, metric=IOU):
+  """Overlap of one box with each of boxes, given their areas."""
+  w = np.minimum(box[2], boxes[:, 2]) - np.maximum(box[0], boxes[:, 0])
+  h = np.minimum(box[3], boxes[:, 3]) - np.maximum(box[1], boxes[:, 1])
+  intersection = np.maximum(w, 0) * np.maximum(h, 0)
+  if metric == IOU:
+    denominator = area + areas - intersection
+  else:
+    denominator = np.minimum(area, areas)
+  return intersection / np.maximum(denominator, 1e-12)
+
+
+def _ShiftByLabel(boxes, labels):
+  """Shifts boxes so that boxes of different labels don't intersect."""
+  boxes = np.asarray(boxes, dtype=np.float64)
+  if labels is None or not len(boxes):
+    return boxes
+  labels = np.asarray(labels)
+  _, label_index = np.unique(labels, return_inverse=True)
+  span = boxes.max() - boxes.min() + 1
+  return boxes + (label_index.reshape(-1) * span)[:, np.newaxis]
+
+
+def _CheckInputs(boxes, scores, labels, metric=IOU):
+  if metric not in METRICS:
+    raise ValueError('Unknown metric: {}'.format(metric))
+  boxes = np.asarray(boxes)
+  if boxes.ndim != 2 or boxes.shape[1] != 4:
+    if boxes.size == 0:
+      return
+    raise ValueError('boxes must be of shape (N, 4)!')
+  if len(scores) != len(boxes) or (labels is not None and
+                                   len(labels) != len(boxes)):
+    raise ValueError('boxes, scores and labels must have the same length!')
+
+
+class _SweepIndex(object):
+  """Boxes sorted by x1, with the range of possible overlaps of each box.
+
+  Box j can only overlap box i if x1_j is in [x1_i - max_width, x2_i), which
+  is a contiguous window in x1 order, so each box is compared with its
+  neighbors only instead of all boxes.
+  """
+
+  def __init__(self, boxes):
+    #: 1-D numpy.array, original index of each sorted box.
+    self.order = np.argsort(boxes[:, 0], kind='stable')
+    #: (N, 4) numpy.array, boxes in x1 order.
+    self.boxes = boxes[self.order]
+    self.areas = Area(self.boxes)
+    max_width = max(float((self.boxes[:, 2] - self.boxes[:, 0]).max()), 0.0)
+    x1 = self.boxes[:, 0]
+    #: 1-D numpy.array, window of possible overlaps of each sorted box.
+    self.low = np.searchsorted(x1, x1 - max_width, 'left')
+    self.high = np.searchsorted(x1, self.boxes[:, 2], 'left')
+
+  def Overlap(self, i, candidates, metric):
+    """Overlap of sorted box i with sorted boxes of candidates."""
+    return _OverlapWithBox(self.boxes[i], self.areas[i],
+                           self.boxes[candidates], self.areas[candidates],
+                           metric)
+
+
+def Nms(boxes, scores, threshold=0.5, labels=None, metric=IOU,
+        max_output=None):
+  """Greedy non-maximum suppression.
+
+  A box is dropped when it overlaps a kept box of higher score by more than
+  threshold.
+
+  Args:
+    boxes: (N, 4) numpy.array of [x1, y1, x2, y2].
+    scores: (N,) numpy.array.
+    threshold: float, overlap above which the lower score box is dropped.
+    labels: (N,) numpy.array, only boxes with the same label suppress each
+      other. All boxes do if None.
+    metric: string, one of METRICS.
+    max_output: int, stop after keeping this many boxes.
+
+  Returns:
+    1-D numpy.array of int, indices of kept boxes by decreasing score.
+
+  Raises:
+    ValueError: when inputs are inconsistent, metric is unknown or
+      max_output isn't positive.
+  """
+  _CheckInputs(boxes, scores, labels, metric)
+  if max_output is not None and max_output < 1:
+    raise ValueError('max_output must be positive!')
+  scores = np.asarray(scores)
+  if not len(scores):
+    return np.zeros(0, dtype=np.int64)
+  index = _SweepIndex(_ShiftByLabel(boxes, labels))
+  # Position of each box in x1 order.
+  rank = np.empty(len(scores), dtype=np.int64)
+  rank[index.order] = np.arange(len(scores))
+  alive = np.ones(len(scores), dtype=bool)
+  max_output = len(scores) if max_output is None else max_output
+  keep = []
+  for i in rank[np.argsort(-scores, kind='stable')]:
+    if not alive[i]:
+      continue
+    keep.append(i)
+    if len(keep) >= max_output:
+      break
+    alive[i] = False
+    low = index.low[i]
+    candidates = np.flatnonzero(alive[low:index.high[i]]) + low
+    if len(candidates):
+      overlap = index.Overlap(i, candidates, metric)
+      alive[candidates[overlap > threshold]] = False
+  return index.order[np.array(keep, dtype=np.int64)]
+
+
+def SoftNms(boxes, scores, method=GAUSSIAN, sigma=0.5, threshold=0.3,
+            score_threshold=0.001, labels=None, metric=IOU, max_output=None):
+  """Soft non-maximum suppression (Bodla et al. 2017).
+
+  Instead of dropping boxes overlapping a kept box, their scores decay:
+    linear: score *= 1 - overlap, when overlap > threshold.
+    gaussian: score *= exp(-overlap^2 / sigma).
+  Boxes whose score falls below score_threshold are dropped.
+
+  Args:
+    boxes: (N, 4) numpy.array of [x1, y1, x2, y2].
+    scores: (N,) numpy.array.
+    method: string, LINEAR or GAUSSIAN.
+    sigma: float, spread of gaussian decay.
+    threshold: float, overlap above which linear decay applies.
+    score_threshold: float, smallest score kept.
+    labels: (N,) numpy.array, only boxes with the same label decay each
+      other. All boxes do if None.
+    metric: string, one of METRICS.
+    max_output: int, stop after keeping this many boxes.
+
+  Returns:
+    (indices, scores). indices is 1-D numpy.array of int, kept boxes by
+    decreasing decayed score, scores are their decayed scores.
+
+  Raises:
+    ValueError: when method or metric is unknown, inputs are inconsistent or
+      max_output isn't positive.
+  """
+  if method not in (LINEAR, GAUSSIAN):
+    raise ValueError('Unknown method: {}'.format(method))
+  _CheckInputs(boxes, scores, labels, metric)
+  if max_output is not None and max_output < 1:
+    raise ValueError('max_output must be positive!')
+  if not len(scores):
+    return np.zeros(0, dtype=np.int64), np.zeros(0)
+  index = _SweepIndex(_ShiftByLabel(boxes, labels))
+  # Decayed scores in x1 order, -inf once kept or dropped.
+  current = np.asarray(scores, dtype=np.float64)[index.order]
+  current[current < score_threshold] = -np.inf
+  max_output = len(current) if max_output is None else max_output
+  keep = []
+  kept_scores = []
+  while len(keep) < max_output:
+    i = np.argmax(current)
+    if current[i] == -np.inf:
+      break
+    keep.append(i)
+    kept_scores.append(current[i])
+    current[i] = -np.inf
+    low = index.low[i]
+    candidates = np.flatnonzero(current[low:index.high[i]] > -np.inf) + low
+    if not len(candidates):
+      continue
+    overlap = index.Overlap(i, candidates, metric)
+    if method == LINEAR:
+      decayed = current[candidates] * np.where(overlap > threshold,
+                                               1 - overlap, 1.0)
+    else:
+      decayed = current[candidates] * np.exp(-overlap * overlap / sigma)
+    decayed[decayed < score_threshold] = -np.inf
+    current[candidates] = decayed
+  return (index.order[np.array(keep, dtype=np.int64)],
+          np.array(kept_scores))
+
+
+def WeightedBoxFusion(boxes, scores, labels=None, threshold=0.55,
+                      num_models=1, skip_threshold=0.0):
+  """Weighted box fusion (Solovyev et al. 2019).
+
+  Boxes are clustered by decreasing score: a box overlapping no cluster by
+  more than threshold IoU leads a new cluster, the others join the cluster
+  of higher score whose leader they overlap most. The fused box of a cluster
+  is the score weighted mean of its boxes, its score is the mean score,
+  scaled down when fewer than num_models boxes agree. Unlike NMS, every box
+  contributes to the result.
+
+  Boxes are matched against the leader of each cluster rather than its
+  running fused box as in the paper, so that clusters are found with one
+  vectorized comparison per leader, in the x1 window of the leader like Nms
+  does. Leaders are the boxes Nms would keep.
+
+  Args:
+    boxes: (N, 4) numpy.array of [x1, y1, x2, y2].
+    scores: (N,) numpy.array.
+    labels: (N,) numpy.array, only boxes with the same label are fused.
+    threshold: float, IoU above which a box joins a cluster.
+    num_models: int, number of models (or tiles, frames) whose boxes are
+      fused, a box found by each of them gets its full score.
+    skip_threshold: float, boxes with lower score are ignored.
+
+  Returns:
+    (boxes, scores, labels) of fused boxes, by decreasing score. labels is
+    None if not given.
+
+  Raises:
+    ValueError: when inputs are inconsistent.
+  """
+  _CheckInputs(boxes, scores, labels)
+  boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+  scores = np.asarray(scores, dtype=np.float64)
+  selected = np.flatnonzero(scores > skip_threshold)
+  boxes = boxes[selected]
+  scores = scores[selected]
+  if labels is not None:
+    labels = np.asarray(labels)[selected]
+  if not len(selected):
+    return np.zeros((0, 4)), np.zeros(0), labels
+  index = _SweepIndex(_ShiftByLabel(boxes, labels))
+  # Everything below is in x1 order.
+  boxes = boxes[index.order]
+  scores = scores[index.order]
+  by_score = np.argsort(-scores, kind='stable')
+  score_rank = np.empty(len(scores), dtype=np.int64)
+  score_rank[by_score] = np.arange(len(scores))
+  # Leader of the cluster of each box, and its IoU with it.
+  cluster = np.full(len(scores), -1, dtype=np.int64)
+  best = np.zeros(len(scores))
+  for i in by_score:
+    if cluster[i] >= 0:
+      continue
+    cluster[i] = i
+    best[i] = np.inf
+    low = index.low[i]
+    candidates = np.arange(low, index.high[i])
+    # Only boxes of lower score join, the leaders of higher score were
+    # already compared with them.
+    candidates = candidates[score_rank[candidates] > score_rank[i]]
+    if not len(candidates):
+      continue
+    iou = index.Overlap(i, candidates, IOU)
+    better = (iou > threshold) & (iou > best[candidates])
+    cluster[candidates[better]] = i
+    best[candidates[better]] = iou[better]
+  leaders, members = np.unique(cluster, return_inverse=True)
+  members = members.reshape(-1)
+  weights = np.bincount(members, scores)
+  counts = np.bincount(members)
+  weighted = np.zeros((len(leaders), 4))
+  np.add.at(weighted, members, scores[:, np.newaxis] * boxes)
+  fused_boxes = weighted / weights[:, np.newaxis]
+  fused_scores = (weights / counts * np.minimum(counts, num_models) /
+                  num_models)
+  order = np.argsort(-fused_scores, kind='stable')
+  return (fused_boxes[order], fused_scores[order],
+          None if labels is None else labels[index.order][leaders][order])
+
+
+def FromCandidates(candidates):
+  """Converts DetectionCandidate objects into arrays.
+
+  Args:
+    candidates: list of DetectionCandidate.
+
+  Returns:
+    (boxes, scores, labels), (N, 4), (N,) and (N,) numpy.array.
+  """
+  boxes = np.array([np.asarray(c.bounding_box, dtype=np.float64).reshape(4)
+                    for c in candidates]).reshape(-1, 4)
+  scores = np.array([c.score for c in candidates], dtype=np.float64)
+  labels = np.array([c.label_id for c in candidates], dtype=np.int64)
+  return boxes, scores, labels
@@ -0,0 +1,252 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cache of inference results keyed by the content of the input tensor.
+
+Duplicate images, e.g. re-uploads of the same picture, give the same input
+tensor once resized, and so the same result:
+
+  cache = ResultCache(max_entries=10000, path='/var/cache/moderation.pkl')
+  classifier = CachedClassifier(ClassificationEngine(model_path), cache)
+  results = classifier.ClassifyWithImage(img, top_k=5)
+  print(cache.GetStats())
+  cache.Save()
+
+Keys hash the input tensor with BLAKE2b, together with the digest of the
+model file and the parameters of the call. Least recently used entries are
+evicted beyond max_entries. Concurrent calls with the same key wait for the
+first one instead of running the same inference again.
+
+The cache file is a pickle, only load files written by a trusted process.
+"""
+
+import collections
+import concurrent.futures
+import hashlib
+import os
+import pickle
+import threading
+
+import numpy as np
+from PIL import Image
+
+# Bytes read at once when hashing model files.
+_CHUNK_SIZE = 1 << 20
+
+
+def ModelDigest(model_path):
+  """Returns string, hex digest of the content of a model file."""
+  digest = hashlib.blake2b(digest_size=16)
+  with open(model_path, 'rb') as f:
+    for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+      digest.update(chunk)
+  return digest.hexdigest()
+
+
+def TensorKey(model_id, input_tensor, *params):
+  """Returns the cache key of an inference.
+
+  Args:
+    model_id: string, identity of the model, e.g. ModelDigest().
+    input_tensor: numpy.array, the input tensor.
+    *params: hashable parameters changing the result, e.g. threshold, top_k.
+
+  Returns:
+    tuple, usable as key of ResultCache.
+  """
+  tensor = np.ascontiguousarray(input_tensor)
+  digest = hashlib.blake2b(tensor.data, digest_size=16).digest()
+  return (model_id, digest, tensor.shape, tensor.dtype.str) + params
+
+
+class CacheStats(object):
+  """Counters of a ResultCache."""
+  __slots__ = ['hits', 'misses', 'coalesced', 'evictions']
+
+  def __init__(self):
+    #: int, lookups answered from the cache.
+    self.hits = 0
+    #: int, lookups running the inference.
+    self.misses = 0
+    #: int, lookups waiting for the same inference in flight.
+    self.coalesced = 0
+    #: int, entries evicted to stay within max_entries.
+    self.evictions = 0
+
+  @property
+  def hit_ratio(self):
+    """float, hits and coalesced lookups over all lookups."""
+    total = self.hits + self.misses + self.coalesced
+    return float(self.hits + self.coalesced) / total if total else 0.0
+
+  def __repr__(self):
+    return ('CacheStats(hits=%d, misses=%d, coalesced=%d, evictions=%d, '
+            'hit_ratio=%.3f)' % (self.hits, self.misses, self.coalesced,
+                                 self.evictions, self.hit_ratio))
+
+
+class ResultCache(object):
+  """Size-bounded LRU cache of results, coalescing identical requests."""
+
+  def __init__(self, max_entries=1024, path=None):
+    """Creates a ResultCache.
+
+    Args:
+      max_entries: int, number of results kept.
+      path: string, if specified, the cache is loaded from this file when it
+        exists, and Save() writes it there.
+
+    Raises:
+      ValueError: when max_entries is not positive.
+    """
+    if max_entries <= 0:
+      raise ValueError('max_entries must be positive!')
+    self._max_entries = max_entries
+    self._path = path
+    self._lock = threading.Lock()
+    self._entries = collections.OrderedDict()
+    # Future of each inference in flight, by key.
+    self._in_flight = {}
+    self._stats = CacheStats()
+    if path and os.path.exists(path):
+      self.Load(path)
+
+  def __len__(self):
+    return len(self._entries)
+
+  def Run(self, key, fn, *args, **kwargs):
+    """Returns the cached result of key, or runs fn(*args, **kwargs) for it.
+
+    Args:
+      key: hashable, e.g. TensorKey().
+      fn: function computing the result.
+      *args: passed to fn.
+      **kwargs: passed to fn.
+
+    Returns:
+      The result, shared by all lookups of key; don't modify it.
+
+    Raises:
+      Exception raised by fn, also in coalesced lookups. Failures aren't
+      cached.
+    """
+    with self._lock:
+      if key in self._entries:
+        self._entries.move_to_end(key)
+        self._stats.hits += 1
+        return self._entries[key]
+      future = self._in_flight.get(key)
+      if future:
+        self._stats.coalesced += 1
+      else:
+        self._stats.misses += 1
+        self._in_flight[key] = concurrent.futures.Future()
+    if future:
+      return future.result()
+    try:
+      result = fn(*args, **kwargs)
+    except Exception as e:
+      with self._lock:
+        future = self._in_flight.pop(key)
+      future.set_exception(e)
+      raise
+    with self._lock:
+      future = self._in_flight.pop(key)
+      self._Put(key, result)
+    future.set_result(result)
+    return result
+
+  def _Put(self, key, result):
+    self._entries[key] = result
+    self._entries.move_to_end(key)
+    while len(self._entries) > self._max_entries:
+      self._entries.popitem(last=False)
+      self._stats.evictions += 1
+
+  def Clear(self):
+    """Drops all entries, counters are kept."""
+    with self._lock:
+      self._entries.clear()
+
+  def Save(self, path=None):
+    """Writes the entries to path, by default the path of the cache.
+
+    Raises:
+      ValueError: when no path is known.
+    """
+    path = path or self._path
+    if not path:
+      raise ValueError('No path to save the cache to!')
+    with self._lock:
+      entries = list(self._entries.items())
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+      pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+  def Load(self, path):
+    """Adds the entries saved in path, as the most recently used ones."""
+    with open(path, 'rb') as f:
+      entries = pickle.load(f)
+    with self._lock:
+      for key, result in entries:
+        self._Put(key, result)
+
+  def GetStats(self):
+    """Returns CacheStats."""
+    return self._stats
+
+
+class CachedClassifier(object):
+  """ClassificationEngine answering duplicate inputs from a ResultCache."""
+
+  def __init__(self, engine, cache, model_id=None):
+    """Creates a CachedClassifier.
+
+    Args:
+      engine: ClassificationEngine.
+      cache: ResultCache, can be shared by several engines and models.
+      model_id: string, identity of the model in keys, by default the digest
+        of the model file so engines of the same model share entries.
+    """
+    self._engine = engine
+    self._cache = cache
+    self._model_id = model_id or ModelDigest(engine.model_path())
+
+  def ClassifyWithImage(self, img, threshold=0.1, top_k=3,
+                        resample=Image.NEAREST):
+    """Classifies image with PIL image object, see ClassificationEngine.
+
+    Returns:
+      List of (int, float) which represents id and score.
+    """
+    input_tensor_shape = self._engine.get_input_tensor_shape()
+    if (input_tensor_shape.size != 4 or input_tensor_shape[3] != 3 or
+        input_tensor_shape[0] != 1):
+      raise RuntimeError(
+          'Invalid input tensor shape! Expected: [1, height, width, 3]')
+    _, height, width, _ = input_tensor_shape
+    input_tensor = np.asarray(img.resize((width, height), resample)).flatten()
+    return self.ClassifyWithInputTensor(input_tensor, threshold, top_k)
+
+  def ClassifyWithInputTensor(self, input_tensor, threshold=0.0, top_k=3):
+    """Classifies with raw input tensor, see ClassificationEngine.
+
+    Returns:
+      List of (int, float) which represents id and score.
+    """
+    key = TensorKey(self._model_id, input_tensor, 'classify', float(threshold),
+                    int(top_k))
+    return list(self._cache.Run(key, self._engine.ClassifyWithInputTensor,
+                                input_tensor, threshold, top_k))
@@ -0,0 +1,374 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Multiplexes many frame streams onto a smaller set of Edge TPU engines.
+
+Streams are registered with a weight and an optional target FPS. Frames are
+dispatched to whichever engine becomes idle first, and the stream served next
+is picked with weighted fair queuing (start-time fair queuing on a virtual
+clock), so a fast stream cannot starve a slow one. Each stream keeps its own
+small queue of pending frames: when it overflows, or when a frame becomes older
+than the stream's staleness bound, only that stream's oldest frames are
+dropped.
+
+Example:
+  engines = CreateEngines(DetectionEngine, model_path)
+  mux = StreamMultiplexer(engines, callback=handle_result)
+  mux.AddStream('cam0', weight=2.0, target_fps=15)
+  mux.AddStream('cam1')
+  mux.Start()
+  ...
+  mux.Submit('cam0', frame)
+  ...
+  mux.Stop()
+  print(mux.GetStats())
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from edgetpu.basic import edgetpu_utils
+from edgetpu.detection.engine import DetectionEngine
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def CreateEngines(engine_class, model_path, max_engines=None):
+  """Creates one engine per unassigned Edge TPU.
+
+  Args:
+    engine_class: class, ClassificationEngine or DetectionEngine.
+    model_path: string, path to TF-Lite Flatbuffer file.
+    max_engines: int, if specified, create at most this many engines.
+
+  Returns:
+    List of engines, each bound to a different Edge TPU.
+
+  Raises:
+    RuntimeError: when no Edge TPU is available.
+  """
+  device_paths = edgetpu_utils.ListEdgeTpuPaths(
+      edgetpu_utils.EDGE_TPU_STATE_UNASSIGNED)
+  if not device_paths:
+    raise RuntimeError('No Edge TPU available!')
+  if max_engines:
+    device_paths = device_paths[:max_engines]
+  return [engine_class(model_path, path) for path in device_paths]
+
+
+def DefaultInferenceFunction(engine, frame):
+  """Runs inference with the default API of the engine.
+
+  Args:
+    engine: ClassificationEngine or DetectionEngine.
+    frame: PIL image object or numpy.array with the flattened input tensor.
+
+  Returns:
+    Result of ClassifyWith* or DetectWith*.
+  """
+  if isinstance(engine, DetectionEngine):
+    if isinstance(frame, np.ndarray):
+      return engine.DetectWithInputTensor(frame)
+    return engine.DetectWithImage(frame)
+  if isinstance(frame, np.ndarray):
+    return engine.ClassifyWithInputTensor(frame)
+  return engine.ClassifyWithImage(frame)
+
+
+class StreamStats(object):
+  """Statistics of one stream."""
+  __slots__ = ['name', 'submitted', 'processed', 'dropped', 'errors',
+               'achieved_fps', 'mean_latency', 'p50_latency', 'p99_latency']
+
+  def __init__(self, name):
+    #: string, name of the stream.
+    self.name = name
+    #: int, number of frames submitted.
+    self.submitted = 0
+    #: int, number of frames with inference done.
+    self.processed = 0
+    #: int, number of frames dropped because of overflow or staleness.
+    self.dropped = 0
+    #: int, number of frames failed with an exception during inference.
+    self.errors = 0
+    #: float, frames processed per second between the first and last frames
+    #: of the recent window.
+    self.achieved_fps = 0.0
+    #: float, end-to-end latency (submit to result) in milliseconds.
+    self.mean_latency = 0.0
+    #: float, median end-to-end latency in milliseconds.
+    self.p50_latency = 0.0
+    #: float, 99th percentile end-to-end latency in milliseconds.
+    self.p99_latency = 0.0
+
+  def __repr__(self):
+    return ('StreamStats(name=%s, submitted=%d, processed=%d, dropped=%d, '
+            'errors=%d, fps=%.2f, latency mean/p50/p99=%.2f/%.2f/%.2f ms)' %
+            (self.name, self.submitted, self.processed, self.dropped,
+             self.errors, self.achieved_fps, self.mean_latency,
+             self.p50_latency, self.p99_latency))
+
+
+class _Stream(object):
+  """Internal state of one registered stream."""
+
+  def __init__(self, name, weight, target_fps, max_queue_size, max_staleness,
+               window_size):
+    self.name = name
+    self.weight = float(weight)
+    self.min_interval = 1.0 / target_fps if target_fps else 0.0
+    self.max_staleness = max_staleness
+    # Pending (frame_id, submit_time, frame).
+    self.queue = collections.deque(maxlen=max_queue_size)
+    self.next_frame_id = 0
+    # Virtual finish tag of the last frame dispatched.
+    self.finish_tag = 0.0
+    self.next_dispatch_time = 0.0
+    self.stats = StreamStats(name)
+    # (done_time, latency) of the recent frames.
+    self.recent = collections.deque(maxlen=window_size)
+
+
+class StreamMultiplexer(object):
+  """Schedules frames from many streams onto a set of engines."""
+
+  def __init__(self, engines, inference_fn=DefaultInferenceFunction,
+               callback=None, window_size=300):
+    """Creates a StreamMultiplexer.
+
+    Args:
+      engines: list of engines, usually one per Edge TPU. See CreateEngines().
+      inference_fn: function (engine, frame) -> result, runs one inference.
+      callback: function (stream_name, frame_id, result, error), called on
+        the engine thread when a frame is done. error is None, or the
+        exception raised by inference_fn, in which case result is None.
+        Exceptions raised by the callback are logged.
+      window_size: int, number of recent frames used to compute FPS and
+        latency of each stream.
+
+    Raises:
+      ValueError: when engines is empty.
+    """
+    if not engines:
+      raise ValueError('At least one engine is required!')
+    self._engines = list(engines)
+    self._inference_fn = inference_fn
+    self._callback = callback
+    self._window_size = window_size
+    self._streams = collections.OrderedDict()
+    self._cond = threading.Condition()
+    self._virtual_time = 0.0
+    # Estimated service time (seconds) of one frame, used as the cost of a
+    # frame in the virtual clock.
+    self._service_time = 0.0
+    self._running = False
+    self._workers = []
+
+  def AddStream(self, name, weight=1.0, target_fps=None, max_queue_size=1,
+                max_staleness=None):
+    """Registers a stream.
+
+    Args:
+      name: string, unique name of the stream.
+      weight: float, share of engine time the stream gets when backlogged.
+      target_fps: float, if specified, frames of the stream are dispatched at
+        most at this rate.
+      max_queue_size: int, number of pending frames kept for the stream. When
+        full, the oldest pending frame of the stream is dropped. By default
+        only the latest frame is kept.
+      max_staleness: float, seconds. If specified, pending frames older than
+        this are dropped instead of being dispatched.
+
+    Raises:
+      ValueError: when input param is invalid.
+    """
+    if weight <= 0:
+      raise ValueError('weight must be positive!')
+    if max_queue_size <= 0:
+      raise ValueError('max_queue_size must be positive!')
+    with self._cond:
+      if name in self._streams:
+        raise ValueError('Stream {} already exists!'.format(name))
+      stream = _Stream(name, weight, target_fps, max_queue_size, max_staleness,
+                       self._window_size)
+      stream.finish_tag = self._virtual_time
+      self._streams[name] = stream
+
+  def RemoveStream(self, name):
+    """Unregisters a stream and drops its pending frames."""
+    with self._cond:
+      del self._streams[name]
+
+  def Submit(self, name, frame):
+    """Submits a frame of a stream.
+
+    Args:
+      name: string, name of the stream.
+      frame: PIL image object or input tensor, passed to inference_fn.
+
+    Returns:
+      int, id of the frame within the stream.
+    """
+    with self._cond:
+      stream = self._streams[name]
+      frame_id = stream.next_frame_id
+      stream.next_frame_id += 1
+      stream.stats.submitted += 1
+      if len(stream.queue) == stream.queue.maxlen:
+        stream.stats.dropped += 1
+      stream.queue.append((frame_id, time.perf_counter(), frame))
+      self._cond.notify()
+    return frame_id
+
+  def Start(self):
+    """Starts one worker thread per engine."""
+    with self._cond:
+      if self._running:
+        return
+      self._running = True
+    self._workers = [
+        threading.Thread(target=self._WorkerLoop, args=(engine,), daemon=True)
+        for engine in self._engines
+    ]
+    for worker in self._workers:
+      worker.start()
+
+  def Stop(self):
+    """Stops worker threads. Pending frames are dropped."""
+    with self._cond:
+      self._running = False
+      self._cond.notify_all()
+    for worker in self._workers:
+      worker.join()
+    self._workers = []
+    with self._cond:
+      for stream in self._streams.values():
+        stream.stats.dropped += len(stream.queue)
+        stream.queue.clear()
+
+  def GetQueueDepth(self, name):
+    """Returns number of pending frames of a stream."""
+    with self._cond:
+      return len(self._streams[name].queue)
+
+  def GetStats(self):
+    """Returns statistics of all streams.
+
+    Returns:
+      {string : StreamStats}, map between stream name and its statistics.
+    """
+    ret = collections.OrderedDict()
+    with self._cond:
+      for name, stream in self._streams.items():
+        stats = StreamStats(name)
+        stats.submitted = stream.stats.submitted
+        stats.processed = stream.stats.processed
+        stats.dropped = stream.stats.dropped
+        stats.errors = stream.stats.errors
+        if stream.recent:
+          done_times, latencies = zip(*stream.recent)
+          latencies = np.array(latencies) * 1000
+          # Intervals between the first and last frames of the window, so
+          # the rate doesn't decay once the stream stops.
+          elapsed = done_times[-1] - done_times[0]
+          if len(done_times) > 1 and elapsed > 0:
+            stats.achieved_fps = (len(done_times) - 1) / elapsed
+          stats.mean_latency = float(np.mean(latencies))
+          stats.p50_latency, stats.p99_latency = (
+              float(v) for v in np.percentile(latencies, [50, 99]))
+        ret[name] = stats
+    return ret
+
+  def _DropStale(self, stream, now):
+    """Drops pending frames of the stream exceeding its staleness bound."""
+    if stream.max_staleness is None:
+      return
+    while stream.queue and now - stream.queue[0][1] > stream.max_staleness:
+      stream.queue.popleft()
+      stream.stats.dropped += 1
+
+  def _NextJob(self):
+    """Picks the next frame to dispatch, must be called with lock held.
+
+    Returns:
+      (stream, job, wait). job is None if nothing can be dispatched now, in
+      which case wait is the seconds until a rate limited stream becomes
+      eligible (or None).
+    """
+    now = time.perf_counter()
+    best = None
+    best_tag = None
+    wait = None
+    for stream in self._streams.values():
+      self._DropStale(stream, now)
+      if not stream.queue:
+        continue
+      if stream.next_dispatch_time > now:
+        delay = stream.next_dispatch_time - now
+        wait = delay if wait is None else min(wait, delay)
+        continue
+      # Start tag of SFQ: an idle stream re-joins at the current virtual time.
+      start_tag = max(self._virtual_time, stream.finish_tag)
+      if best is None or start_tag < best_tag:
+        best = stream
+        best_tag = start_tag
+    if best is None:
+      return None, None, wait
+    self._virtual_time = best_tag
+    best.finish_tag = best_tag + max(self._service_time, 1e-6) / best.weight
+    best.next_dispatch_time = now + best.min_interval
+    return best, best.queue.popleft(), None
+
+  def _WorkerLoop(self, engine):
+    """Runs frames on one engine until stopped."""
+    while True:
+      with self._cond:
+        while True:
+          if not self._running:
+            return
+          stream, job, wait = self._NextJob()
+          if job is not None:
+            break
+          self._cond.wait(wait)
+      frame_id, submit_time, frame = job
+      start_time = time.perf_counter()
+      try:
+        result = self._inference_fn(engine, frame)
+        error = None
+      except Exception as e:  # pylint: disable=broad-except
+        result = None
+        error = e
+      done_time = time.perf_counter()
+      with self._cond:
+        # Exponential moving average of the service time.
+        service_time = done_time - start_time
+        if self._service_time:
+          self._service_time += 0.1 * (service_time - self._service_time)
+        else:
+          self._service_time = service_time
+        if error is not None:
+          stream.stats.errors += 1
+        else:
+          stream.stats.processed += 1
+          stream.recent.append((done_time, done_time - submit_time))
+      if self._callback:
+        # A failing callback mustn't stop the worker of the engine.
+        try:
+          self._callback(stream.name, frame_id, result, error)
+        except Exception:  # pylint: disable=broad-except
+          _LOGGER.exception('Callback failed on frame %d of stream %s.',
+                            frame_id, stream.name)
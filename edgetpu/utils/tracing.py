@@ -0,0 +1,217 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Timeline tracing in Chrome trace-event format.
+
+Engines attached with set_tracer() emit one event per stage (see
+edgetpu.utils.instrumentation) on the row of their thread, grouped per Edge
+TPU, so the trace shows whether devices overlap or the GIL and preprocessing
+serialize them. Application code can add its own spans:
+
+  tracer = tracing.TRACER
+  engine.set_tracer(tracer)
+  tracer.Enable()
+  with tracer.Span('decode'):
+    img = Image.open(path)
+  engine.ClassifyWithImage(img)
+  tracer.Save('trace.json')  # Open in chrome://tracing or ui.perfetto.dev.
+
+Tracing can be switched on and off at runtime; an attached but disabled
+tracer costs a method call per stage. With sample_rate below 1, events are
+kept only during periodic windows, e.g. sample_rate=0.01 and window=1.0
+records one second every 100 seconds. Complete timelines are kept inside a
+window, so overlap across threads stays visible. Events go into a bounded
+buffer, so tracing can stay on in production.
+"""
+
+import collections
+import contextlib
+import json
+import os
+import threading
+
+from edgetpu.utils import instrumentation
+
+# Trace "process" for events not bound to an Edge TPU.
+HOST = 'host'
+
+DEFAULT_MAX_EVENTS = 100000
+
+_CATEGORIES = {
+    instrumentation.RESIZE: 'preprocess',
+    instrumentation.TO_TENSOR: 'preprocess',
+    instrumentation.INVOKE: 'invoke',
+    instrumentation.DEVICE: 'invoke',
+    instrumentation.POSTPROCESS: 'postprocess',
+    instrumentation.RESCALE: 'postprocess',
+    instrumentation.TRAIN: 'train',
+    instrumentation.SAVE: 'train',
+}
+
+
+class _EngineRecorder(object):
+  """Recorder protocol of instrumentation, turns stages into trace events."""
+
+  def __init__(self, tracer, device):
+    self._tracer = tracer
+    self._device = device
+
+  def Add(self, stage, duration_ns, end_ns=None):
+    tracer = self._tracer
+    if tracer.enabled:
+      if end_ns is None:
+        end_ns = instrumentation.Now()
+      tracer.AddEvent(stage, _CATEGORIES.get(stage, 'engine'),
+                      end_ns - duration_ns, duration_ns, self._device)
+
+  def Record(self, stage, start_ns):
+    end_ns = instrumentation.Now()
+    tracer = self._tracer
+    if tracer.enabled:
+      tracer.AddEvent(stage, _CATEGORIES.get(stage, 'engine'), start_ns,
+                      end_ns - start_ns, self._device)
+    return end_ns
+
+
+class Tracer(object):
+  """Collects trace events of all threads."""
+
+  def __init__(self, max_events=DEFAULT_MAX_EVENTS):
+    """Creates a disabled tracer.
+
+    Args:
+      max_events: int, number of most recent events kept.
+    """
+    #: bool, whether events are recorded.
+    self.enabled = False
+    self._events = collections.deque(maxlen=max_events)
+    self._sample_period_ns = 0
+    self._window_ns = 0
+    self._origin_ns = 0
+    self._lock = threading.Lock()
+    self._devices = collections.OrderedDict([(HOST, 1)])
+
+  def Enable(self, sample_rate=1.0, window=1.0):
+    """Starts recording events.
+
+    Args:
+      sample_rate: float in (0, 1], fraction of time recorded.
+      window: float, length in seconds of each recorded window when
+        sample_rate < 1.
+
+    Raises:
+      ValueError: when sample_rate or window is invalid.
+    """
+    if not 0 < sample_rate <= 1 or window <= 0:
+      raise ValueError('sample_rate must be in (0, 1] and window positive!')
+    self._window_ns = int(window * 1e9)
+    self._sample_period_ns = (0 if sample_rate == 1 else
+                              int(self._window_ns / sample_rate))
+    self._origin_ns = instrumentation.Now()
+    self.enabled = True
+
+  def Disable(self):
+    """Stops recording events, recorded events are kept."""
+    self.enabled = False
+
+  def Clear(self):
+    """Drops recorded events."""
+    self._events.clear()
+
+  def Recorder(self, device=HOST):
+    """Returns a recorder for engine stages on the given device.
+
+    Args:
+      device: string, e.g. device_path() of the engine.
+    """
+    return _EngineRecorder(self, device)
+
+  def AddEvent(self, name, category, start_ns, duration_ns, device=HOST,
+               args=None):
+    """Records a complete event on the calling thread.
+
+    Args:
+      name: string, name of the event.
+      category: string, category of the event.
+      start_ns: int, start timestamp from instrumentation.Now().
+      duration_ns: int, duration in nanoseconds.
+      device: string, trace process of the event.
+      args: dict, extra data shown with the event.
+    """
+    if self._sample_period_ns and (
+        (start_ns - self._origin_ns) % self._sample_period_ns >=
+        self._window_ns):
+      return
+    thread = threading.current_thread()
+    self._events.append((name, category, start_ns, duration_ns, device,
+                         thread.ident, thread.name, args))
+
+  @contextlib.contextmanager
+  def Span(self, name, category='app', device=HOST, args=None):
+    """Records the enclosed block as an event, when enabled."""
+    if not self.enabled:
+      yield
+      return
+    start_ns = instrumentation.Now()
+    try:
+      yield
+    finally:
+      self.AddEvent(name, category, start_ns,
+                    instrumentation.Now() - start_ns, device, args)
+
+  def _Pid(self, device):
+    with self._lock:
+      pid = self._devices.get(device)
+      if pid is None:
+        pid = self._devices[device] = len(self._devices) + 1
+      return pid
+
+  def ToJson(self):
+    """Returns recorded events as Chrome trace-event JSON object."""
+    events = []
+    threads = collections.OrderedDict()
+    for (name, category, start_ns, duration_ns, device, tid, thread_name,
+         args) in list(self._events):
+      pid = self._Pid(device)
+      threads[(pid, tid)] = thread_name
+      event = {'name': name, 'cat': category, 'ph': 'X',
+               'ts': start_ns / 1000.0, 'dur': duration_ns / 1000.0,
+               'pid': pid, 'tid': tid}
+      if args:
+        event['args'] = args
+      events.append(event)
+    metadata = []
+    with self._lock:
+      devices = list(self._devices.items())
+    for device, pid in devices:
+      metadata.append({'name': 'process_name', 'ph': 'M', 'pid': pid,
+                       'args': {'name': device}})
+    for (pid, tid), thread_name in threads.items():
+      metadata.append({'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                       'tid': tid, 'args': {'name': thread_name}})
+    return {'traceEvents': metadata + events, 'displayTimeUnit': 'ms',
+            'otherData': {'pid': os.getpid()}}
+
+  def Save(self, path):
+    """Writes recorded events to a trace file.
+
+    Args:
+      path: string, output path, usually with .json extension.
+    """
+    with open(path, 'w') as f:
+      json.dump(self.ToJson(), f)
+
+
+#: Tracer used by default, disabled until Enable() is called.
+TRACER = Tracer()
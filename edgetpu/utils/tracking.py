@@ -0,0 +1,416 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tracking by detection, to run detection on keyframes of a video only.
+
+Objects of fixed cameras move smoothly, so boxes of frames between keyframes
+are predicted on CPU by a constant-velocity Kalman filter instead of being
+detected on the Edge TPU:
+
+  detector = tracking.TrackingDetector(engine, keyframe_interval=4)
+  for frame in frames:
+    for obj in detector.Process(frame):
+      print(obj.track_id, obj.label_id, obj.bounding_box)
+  print(detector.GetStats())
+
+On keyframes detections are associated with the predicted tracks by IoU,
+greedily and per label, matched tracks are corrected and unmatched detections
+start new tracks. Track IDs are stable as long as the object is matched.
+
+A keyframe is run every keyframe_interval frames, or earlier when the
+confidence of a track drops, i.e. when its predicted center becomes uncertain
+relative to its size. This is the case for new tracks, whose velocity is not
+known yet, and for tracks missed by the last keyframe.
+
+The state of all tracks is kept in arrays, [cx, cy, w, h] and their velocities
+per track, and predicted and corrected at once.
+"""
+
+import numpy as np
+
+from edgetpu.utils import nms
+
+# Index of the measured part, [cx, cy, w, h], of the state.
+_MEASURED = slice(0, 4)
+
+
+class TrackedObject(object):
+  """Data structure represents one tracked object.
+
+  Fields label_id, score and bounding_box are the ones of DetectionCandidate.
+  """
+  __slots__ = ['track_id', 'label_id', 'score', 'bounding_box', 'confidence',
+               'frames_since_update']
+
+  def __init__(self, track_id, label_id, score, x1, y1, x2, y2, confidence,
+               frames_since_update):
+    #: int, ID of the track, unique within one Tracker.
+    self.track_id = track_id
+    #: int, label id.
+    self.label_id = label_id
+    #: float, score of the last detection matched with the track.
+    self.score = score
+    #: numpy.array, the predicted bounding box with format [[x1, y1], [x2, y2]],
+    #:  in the coordinates of the detections.
+    self.bounding_box = np.array([[x1, y1], [x2, y2]])
+    #: float, in (0, 1], drops as the predicted center gets uncertain.
+    self.confidence = confidence
+    #: int, number of frames since the track was matched with a detection, 0
+    #:  on keyframes where it was.
+    self.frames_since_update = frames_since_update
+
+  def __repr__(self):
+    return ('TrackedObject(track_id=%d, label_id=%d, score=%.2f, box=%s, '
+            'confidence=%.2f)' % (self.track_id, self.label_id, self.score,
+                                  self.bounding_box.flatten().tolist(),
+                                  self.confidence))
+
+
+def BoxesToMeasurements(boxes):
+  """Converts (N, 4) [x1, y1, x2, y2] boxes into (N, 4) [cx, cy, w, h]."""
+  boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+  return np.concatenate([(boxes[:, :2] + boxes[:, 2:]) / 2,
+                         boxes[:, 2:] - boxes[:, :2]], axis=1)
+
+
+def MeasurementsToBoxes(measurements):
+  """Converts (N, 4) [cx, cy, w, h] into (N, 4) [x1, y1, x2, y2] boxes."""
+  centers = measurements[:, :2]
+  half_sizes = np.maximum(measurements[:, 2:4], 0) / 2
+  return np.concatenate([centers - half_sizes, centers + half_sizes], axis=1)
+
+
+class Tracker(object):
+  """Tracks boxes with constant-velocity Kalman filters and IoU association.
+
+  Call Predict() once per frame and Update() with the detections of keyframes,
+  after Predict() of the same frame. Noise of the filters is proportional to
+  the box size, so the same parameters work for relative and pixel
+  coordinates.
+  """
+
+  def __init__(self, iou_threshold=0.3, max_misses=1, std_position=1. / 20,
+               std_velocity=1. / 160):
+    """Creates a Tracker.
+
+    Args:
+      iou_threshold: float, minimum IoU between a predicted track and a
+        detection to associate them.
+      max_misses: int, number of consecutive updates a track can be missed
+        before it is deleted.
+      std_position: float, standard deviation of position noise, relative to
+        the box size.
+      std_velocity: float, standard deviation of velocity noise per frame,
+        relative to the box size.
+
+    Raises:
+      ValueError: when input param is invalid.
+    """
+    if max_misses < 0:
+      raise ValueError('max_misses must be non-negative!')
+    if std_position <= 0 or std_velocity <= 0:
+      raise ValueError('Noise standard deviations must be positive!')
+    self._iou_threshold = iou_threshold
+    self._max_misses = max_misses
+    self._std_position = std_position
+    self._std_velocity = std_velocity
+    # x' = x + v for each of [cx, cy, w, h].
+    self._transition = np.eye(8)
+    self._transition[:4, 4:] = np.eye(4)
+    self._next_id = 0
+    self.Reset()
+
+  def Reset(self):
+    """Deletes all tracks, IDs keep increasing."""
+    # (T, 8) states, (T, 8, 8) covariances.
+    self._states = np.zeros((0, 8))
+    self._covariances = np.zeros((0, 8, 8))
+    self._ids = np.zeros(0, dtype=np.int64)
+    self._labels = np.zeros(0, dtype=np.int64)
+    self._scores = np.zeros(0)
+    self._frames_since_update = np.zeros(0, dtype=np.int64)
+    self._misses = np.zeros(0, dtype=np.int64)
+
+  def _Scales(self, states):
+    """Returns (T, 8) box sizes [w, h, w, h, w, h, w, h] scaling the noise."""
+    sizes = np.maximum(states[:, 2:4], 1e-6)
+    return np.tile(sizes, 4)
+
+  def __len__(self):
+    return len(self._ids)
+
+  def get_num_created_tracks(self):
+    """Returns int, number of tracks started, including deleted ones."""
+    return self._next_id
+
+  def Predict(self):
+    """Advances all tracks by one frame."""
+    if not len(self):
+      return
+    scales = self._Scales(self._states)
+    stds = scales * np.repeat([self._std_position, self._std_velocity], 4)
+    self._states = self._states.dot(self._transition.T)
+    self._covariances = np.matmul(
+        np.matmul(self._transition, self._covariances), self._transition.T)
+    self._covariances += stds[:, :, np.newaxis] ** 2 * np.eye(8)
+    self._frames_since_update += 1
+
+  def get_boxes(self):
+    """Returns (T, 4) numpy.array, predicted [x1, y1, x2, y2] of tracks."""
+    return MeasurementsToBoxes(self._states[:, _MEASURED])
+
+  def get_confidences(self):
+    """Returns (T,) numpy.array, confidence of tracks in (0, 1].
+
+    Confidence is 1 / (1 + u), where u is the standard deviation of the
+    predicted center relative to the box size.
+    """
+    variances = self._covariances[:, [0, 1], [0, 1]]
+    sizes = np.maximum(self._states[:, 2:4], 1e-6)
+    uncertainty = np.sqrt(np.mean(variances / sizes ** 2, axis=1))
+    return 1.0 / (1.0 + uncertainty)
+
+  def _Associate(self, boxes, labels):
+    """Greedily matches tracks and detections by IoU, per label.
+
+    Returns:
+      (track_indices, detection_indices), numpy.array of matched pairs.
+    """
+    if not len(self) or not len(boxes):
+      return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    overlap = nms.PairwiseOverlap(self.get_boxes(), boxes)
+    overlap[self._labels[:, np.newaxis] != labels[np.newaxis, :]] = 0
+    order = np.argsort(-overlap, axis=None, kind='stable')
+    order = order[overlap.flat[order] >= self._iou_threshold]
+    track_taken = np.zeros(overlap.shape[0], dtype=bool)
+    detection_taken = np.zeros(overlap.shape[1], dtype=bool)
+    matches = []
+    for t, d in zip(*np.unravel_index(order, overlap.shape)):
+      if not track_taken[t] and not detection_taken[d]:
+        track_taken[t] = detection_taken[d] = True
+        matches.append((t, d))
+    matches = np.array(matches, dtype=np.int64).reshape(-1, 2)
+    return matches[:, 0], matches[:, 1]
+
+  def _Correct(self, indices, measurements):
+    """Corrects the tracks at indices with their matched measurements."""
+    states = self._states[indices]
+    covariances = self._covariances[indices]
+    stds = self._Scales(states)[:, _MEASURED] * self._std_position
+    innovations = measurements - states[:, _MEASURED]
+    innovation_covariances = (covariances[:, _MEASURED, _MEASURED] +
+                              stds[:, :, np.newaxis] ** 2 * np.eye(4))
+    gains = np.matmul(covariances[:, :, _MEASURED],
+                      np.linalg.inv(innovation_covariances))
+    self._states[indices] = states + np.matmul(
+        gains, innovations[:, :, np.newaxis])[:, :, 0]
+    self._covariances[indices] = covariances - np.matmul(
+        gains, covariances[:, _MEASURED, :])
+
+  def _Create(self, measurements, scores, labels):
+    """Starts tracks for measurements, with unknown velocity."""
+    n = len(measurements)
+    states = np.concatenate([measurements, np.zeros((n, 4))], axis=1)
+    scales = self._Scales(states)
+    stds = scales * np.repeat([2 * self._std_position,
+                               10 * self._std_velocity], 4)
+    self._states = np.concatenate([self._states, states])
+    self._covariances = np.concatenate(
+        [self._covariances, stds[:, :, np.newaxis] ** 2 * np.eye(8)])
+    self._ids = np.concatenate(
+        [self._ids, np.arange(self._next_id, self._next_id + n)])
+    self._next_id += n
+    self._labels = np.concatenate([self._labels, labels])
+    self._scores = np.concatenate([self._scores, scores])
+    self._frames_since_update = np.concatenate(
+        [self._frames_since_update, np.zeros(n, dtype=np.int64)])
+    self._misses = np.concatenate([self._misses, np.zeros(n, dtype=np.int64)])
+
+  def _Keep(self, mask):
+    for name in ('_states', '_covariances', '_ids', '_labels', '_scores',
+                 '_frames_since_update', '_misses'):
+      setattr(self, name, getattr(self, name)[mask])
+
+  def Update(self, boxes, scores, labels=None):
+    """Updates tracks with the detections of a keyframe.
+
+    Args:
+      boxes: (N, 4) numpy.array of [x1, y1, x2, y2], see
+        edgetpu.utils.nms.FromCandidates().
+      scores: (N,) numpy.array.
+      labels: (N,) numpy.array, if specified detections are only associated
+        with tracks of the same label.
+
+    Returns:
+      (N,) numpy.array, track ID of each detection.
+
+    Raises:
+      ValueError: when input arrays have different lengths.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+    labels = (np.zeros(len(boxes), dtype=np.int64) if labels is None else
+              np.asarray(labels, dtype=np.int64).reshape(-1))
+    if not len(boxes) == len(scores) == len(labels):
+      raise ValueError('boxes, scores and labels must have the same length!')
+    measurements = BoxesToMeasurements(boxes)
+    track_indices, detection_indices = self._Associate(boxes, labels)
+    if len(track_indices):
+      self._Correct(track_indices, measurements[detection_indices])
+    matched = np.zeros(len(self), dtype=bool)
+    matched[track_indices] = True
+    self._scores[track_indices] = scores[detection_indices]
+    self._frames_since_update[matched] = 0
+    self._misses[matched] = 0
+    self._misses[~matched] += 1
+
+    track_ids = np.empty(len(boxes), dtype=np.int64)
+    track_ids[detection_indices] = self._ids[track_indices]
+    new = np.ones(len(boxes), dtype=bool)
+    new[detection_indices] = False
+    track_ids[new] = np.arange(self._next_id, self._next_id + np.sum(new))
+    self._Create(measurements[new], scores[new], labels[new])
+    self._Keep(self._misses <= self._max_misses)
+    return track_ids
+
+  def GetObjects(self):
+    """Returns list of TrackedObject, one per track."""
+    boxes = self.get_boxes()
+    confidences = self.get_confidences()
+    return [
+        TrackedObject(int(self._ids[i]), int(self._labels[i]),
+                      float(self._scores[i]), *boxes[i].tolist(),
+                      confidence=float(confidences[i]),
+                      frames_since_update=int(self._frames_since_update[i]))
+        for i in range(len(self))
+    ]
+
+
+class TrackingStats(object):
+  """Statistics of a TrackingDetector."""
+  __slots__ = ['frames', 'keyframes', 'triggered_keyframes', 'tracks']
+
+  def __init__(self):
+    #: int, number of frames processed.
+    self.frames = 0
+    #: int, number of frames detection ran on, i.e. Edge TPU invocations.
+    self.keyframes = 0
+    #: int, number of keyframes run before the interval because the
+    #:  confidence of a track dropped.
+    self.triggered_keyframes = 0
+    #: int, number of tracks started.
+    self.tracks = 0
+
+  @property
+  def invocation_ratio(self):
+    """float, keyframes over frames."""
+    return float(self.keyframes) / self.frames if self.frames else 0.0
+
+  def __repr__(self):
+    return ('TrackingStats(frames=%d, keyframes=%d, triggered_keyframes=%d, '
+            'tracks=%d, invocation_ratio=%.3f)' %
+            (self.frames, self.keyframes, self.triggered_keyframes,
+             self.tracks, self.invocation_ratio))
+
+
+class TrackingDetector(object):
+  """Detects objects of a video on keyframes and tracks them in between."""
+
+  def __init__(self, engine, keyframe_interval=4, min_confidence=0.8,
+               threshold=0.4, top_k=20, keep_aspect_ratio=False,
+               relative_coord=True, resample=None, tracker=None):
+    """Creates a TrackingDetector.
+
+    Args:
+      engine: DetectionEngine, or any object with a compatible
+        DetectWithImage().
+      keyframe_interval: int, detection runs at least every keyframe_interval
+        frames, 1 detects every frame.
+      min_confidence: float, detection runs earlier when the confidence of a
+        track drops below this, see Tracker.get_confidences(). 0 disables
+        triggered keyframes.
+      threshold: float, passed to DetectWithImage().
+      top_k: int, passed to DetectWithImage().
+      keep_aspect_ratio: bool, passed to DetectWithImage().
+      relative_coord: bool, passed to DetectWithImage().
+      resample: resampling filter passed to DetectWithImage(), its default if
+        not specified.
+      tracker: Tracker, by default one with default parameters.
+
+    Raises:
+      ValueError: when keyframe_interval is not positive.
+    """
+    if keyframe_interval < 1:
+      raise ValueError('keyframe_interval must be positive!')
+    self._engine = engine
+    self._keyframe_interval = keyframe_interval
+    self._min_confidence = min_confidence
+    self._detect_args = {'threshold': threshold, 'top_k': top_k,
+                         'keep_aspect_ratio': keep_aspect_ratio,
+                         'relative_coord': relative_coord}
+    if resample is not None:
+      self._detect_args['resample'] = resample
+    self._tracker = tracker or Tracker()
+    self._frames_since_keyframe = None
+    self._stats = TrackingStats()
+
+  def _IsKeyframe(self):
+    """Returns (is_keyframe, triggered)."""
+    if (self._frames_since_keyframe is None or
+        self._frames_since_keyframe + 1 >= self._keyframe_interval):
+      return True, False
+    if (len(self._tracker) and
+        np.min(self._tracker.get_confidences()) < self._min_confidence):
+      return True, True
+    return False, False
+
+  def Process(self, img):
+    """Detects or tracks objects of the next frame.
+
+    Args:
+      img: PIL image object, the next frame of the video.
+
+    Returns:
+      List of TrackedObject, with boxes clipped to the image.
+    """
+    self._tracker.Predict()
+    is_keyframe, triggered = self._IsKeyframe()
+    self._stats.frames += 1
+    if is_keyframe:
+      candidates = self._engine.DetectWithImage(img, **self._detect_args)
+      boxes, scores, labels = nms.FromCandidates(candidates)
+      self._tracker.Update(boxes, scores, labels)
+      self._frames_since_keyframe = 0
+      self._stats.keyframes += 1
+      self._stats.triggered_keyframes += int(triggered)
+      self._stats.tracks = self._tracker.get_num_created_tracks()
+    else:
+      self._frames_since_keyframe += 1
+    objects = self._tracker.GetObjects()
+    if self._detect_args['relative_coord']:
+      upper = np.ones(2)
+    else:
+      upper = np.array(img.size)
+    for obj in objects:
+      obj.bounding_box = np.clip(obj.bounding_box, 0, upper)
+    return objects
+
+  def GetStats(self):
+    """Returns TrackingStats."""
+    return self._stats
+
+  def Reset(self):
+    """Starts a new video, e.g. after a scene cut; statistics are kept."""
+    self._tracker.Reset()
+    self._frames_since_keyframe = None
@@ -135,6 +135,17 @@ sudo cp -p "${LIBEDGETPU_SRC}" "${LIBEDGETPU_DST}"
 sudo ldconfig
 info "Done."
 
+# Both runtime flavors, selectable per process with EDGETPU_RUNTIME_FLAVOR.
+LIBEDGETPU_FLAVORS_DIR="/usr/lib/${HOST_GNU_TYPE}/edgetpu"
+info "Installing Edge TPU runtime flavors [${LIBEDGETPU_FLAVORS_DIR}]..."
+sudo mkdir -p "${LIBEDGETPU_FLAVORS_DIR}/direct/${HOST_GNU_TYPE}" \
+              "${LIBEDGETPU_FLAVORS_DIR}/throttled/${HOST_GNU_TYPE}"
+sudo cp -p "${SCRIPT_DIR}/libedgetpu/libedgetpu_${LIBEDGETPU_SUFFIX}.so" \
+  "${LIBEDGETPU_FLAVORS_DIR}/direct/${HOST_GNU_TYPE}/libedgetpu.so.1"
+sudo cp -p "${SCRIPT_DIR}/libedgetpu/libedgetpu_${LIBEDGETPU_SUFFIX}_throttled.so" \
+  "${LIBEDGETPU_FLAVORS_DIR}/throttled/${HOST_GNU_TYPE}/libedgetpu.so.1"
+info "Done."
+
 # Python API.
 WHEEL=$(ls ${SCRIPT_DIR}/edgetpu-*-py3-none-any.whl 2>/dev/null)
 if [[ $? == 0 ]]; then
@@ -139,6 +139,17 @@ echo -e "${BLUE}Unit test of BasicEngine"
 echo -e "Run unit test with BasicEngine. It will run inference on all models once.${DEFAULT}"
 run_test basic_engine_test
 
+echo -e "${BLUE}Unit test of benchmark runner${DEFAULT}"
+run_test benchmark_runner_test
+run_test regression_test
+run_test load_generator_test
+run_test instrumentation_test
+run_test metrics_test
+run_test tracing_test
+run_test simulated_backend_test
+run_test preprocessing_benchmark_test
+run_test memory_benchmark_test
+
 echo -e "${BLUE}Benchmark of BasicEngine"
 echo -e "Benchmark all supported models with BasicEngine.${DEFAULT}"
 echo -e "${YELLOW}This test will take long time.${DEFAULT}"
@@ -147,6 +158,7 @@ run_benchmark basic_engine_benchmarks
 echo -e "${BLUE}ClassificationEngine"
 echo -e "Now we'll run unit test of ClassificationEngine${DEFAULT}"
 run_test classification_engine_test
+run_test classification_cascade_test
 
 echo -e "${BLUE}Multiple Edge TPUs test${DEFAULT}"
 run_test multiple_tpus_test
@@ -154,6 +166,15 @@ run_test multiple_tpus_test
 echo -e "${BLUE}Edge TPU utils test${DEFAULT}"
 run_test edgetpu_utils_test
 
+echo -e "${BLUE}Device manager test${DEFAULT}"
+run_test device_manager_test
+
+echo -e "${BLUE}Model loader test${DEFAULT}"
+run_test model_loader_test
+
+echo -e "${BLUE}Stream multiplexer test${DEFAULT}"
+run_test stream_multiplexer_test
+
 echo -e "${BLUE}Benchmark for ClassificationEngine"
 echo -e "Benchmark all classification models with different image size.${DEFAULT}"
 echo -e "${YELLOW}This test will take long time.${DEFAULT}"
@@ -162,12 +183,35 @@ run_benchmark classification_benchmarks
 echo -e "${BLUE}DetectionEngine"
 echo -e "Now we'll run unit test of DetectionEngine${DEFAULT}"
 run_test detection_engine_test
+run_test image_processing_test
+run_test nms_test
+run_test tracking_test
+run_test motion_gate_test
+run_test cascade_test
+run_test fan_out_test
+run_test result_cache_test
+
+echo -e "${BLUE}SegmentationEngine"
+echo -e "Now we'll run unit test of SegmentationEngine${DEFAULT}"
+run_test segmentation_engine_test
 
 echo -e "${BLUE}Benchmark for DetectionEngine"
 echo -e "Benchmark all detection models with different image size.${DEFAULT}"
 echo -e "${YELLOW}This test will take long time.${DEFAULT}"
 run_benchmark detection_benchmarks
 
+echo -e "${BLUE}Benchmark of image preprocessing"
+echo -e "Benchmark resampling filters on each model input size and image size.${DEFAULT}"
+run_benchmark preprocessing_benchmarks
+
+echo -e "${BLUE}Benchmark of non-maximum suppression${DEFAULT}"
+run_benchmark nms_benchmarks
+
+echo -e "${BLUE}Memory benchmark"
+echo -e "Engine RSS, allocation per call and leak check of each API.${DEFAULT}"
+echo -e "${YELLOW}This test will take long time.${DEFAULT}"
+run_benchmark memory_benchmarks
+
 echo -e "${BLUE}COCO test for DetectionEngine"
 if [[ "$platform" == "x86_64_linux" ]]; then
   # Takes a long time.
@@ -190,6 +234,7 @@ fi
 echo -e "${BLUE}ImprintingEngine"
 echo -e "Now we'll run unit test of ImprintingEngine${DEFAULT}"
 run_test imprinting_engine_test
+run_test multi_head_test
 
 echo -e "${BLUE}Benchmark for ImprintingEngine"
 echo -e "Benchmark speed of transfer learning with Imprinting Engine.${DEFAULT}"
@@ -37,4 +37,16 @@ setup(
       'Pillow>=4.0.0',
   ],
   python_requires='>=3.5.2',
+  entry_points={
+      'console_scripts': [
+          'edgetpu_benchmark=edgetpu.benchmark.runner:main',
+          'edgetpu_benchmark_check=edgetpu.benchmark.regression:main',
+          'edgetpu_load_generator=edgetpu.benchmark.load_generator:main',
+          ('edgetpu_preprocessing_benchmark='
+           'edgetpu.benchmark.preprocessing:main'),
+          'edgetpu_memory_benchmark=edgetpu.benchmark.memory:main',
+          ('edgetpu_calibrate_cascade='
+           'edgetpu.classification.cascade:main'),
+      ],
+  },
 )
@@ -18,6 +18,7 @@ import unittest
 from . import test_utils
 from edgetpu.basic import edgetpu_utils
 from edgetpu.basic.basic_engine import BasicEngine
+from edgetpu.utils import metrics
 
 
 class TestBasicEnginePythonAPI(unittest.TestCase):
@@ -81,5 +82,68 @@ class TestBasicEnginePythonAPI(unittest.TestCase):
         all_edgetpu_paths[0])
     self.assertEqual(engine.device_path(), all_edgetpu_paths[0])
 
+  def testWarmup(self):
+    engine = BasicEngine(
+        test_utils.TestDataPath('mobilenet_v1_1.0_224_quant_edgetpu.tflite'))
+    self.assertFalse(engine.is_warm())
+    latencies = engine.Warmup(5)
+    self.assertEqual(5, len(latencies))
+    self.assertTrue(engine.is_warm())
+    cold_stats = engine.get_cold_latency_stats()
+    steady_stats = engine.get_steady_latency_stats()
+    self.assertEqual(1, cold_stats.count)
+    self.assertEqual(4, steady_stats.count)
+    self.assertEqual(latencies[0], cold_stats.max)
+    # Uploading parameters makes the first inference much slower.
+    self.assertGreater(cold_stats.mean(), 2 * steady_stats.mean())
+    with self.assertRaises(ValueError):
+      engine.Warmup(0)
+
+  def testModelSwitchDetection(self):
+    engine_a = BasicEngine(
+        test_utils.TestDataPath('inception_v4_299_quant_edgetpu.tflite'))
+    # Shares the same Edge TPU, evicts parameters of engine_a.
+    engine_b = BasicEngine(
+        test_utils.TestDataPath('inception_v3_299_quant_edgetpu.tflite'),
+        engine_a.device_path())
+    engine_a.set_auto_rewarm(True, iterations=2)
+    engine_a.Warmup(10)
+    self.assertEqual(0, engine_a.get_model_switch_count())
+    engine_b.Warmup()
+    input_data = test_utils.GenerateRandomInput(
+        1, engine_a.required_input_array_size())
+    engine_a.RunInference(input_data)
+    self.assertEqual(1, engine_a.get_model_switch_count())
+    self.assertEqual(2, engine_a.get_cold_latency_stats().count)
+    # Re-warmed right after the switch, so the next inference is steady.
+    steady_count = engine_a.get_steady_latency_stats().count
+    engine_a.RunInference(input_data)
+    self.assertEqual(1, engine_a.get_model_switch_count())
+    self.assertEqual(steady_count + 1,
+                     engine_a.get_steady_latency_stats().count)
+
+  def testMetrics(self):
+    engine = BasicEngine(
+        test_utils.TestDataPath('mobilenet_v1_1.0_224_quant_edgetpu.tflite'))
+    registry = metrics.Registry()
+    engine.set_metrics(registry)
+    input_data = test_utils.GenerateRandomInput(
+        1, engine.required_input_array_size())
+    for _ in range(3):
+      engine.RunInference(input_data)
+    with self.assertRaises(Exception):
+      engine.RunInference(input_data[:10])
+    text = registry.Expose()
+    labels = 'engine="0",device="%s",model="%s"' % (engine.device_path(),
+                                                    engine.model_path())
+    self.assertIn('edgetpu_inferences_total{%s} 3.0' % labels, text)
+    self.assertIn('edgetpu_inference_errors_total{%s} 1.0' % labels, text)
+    self.assertIn('edgetpu_device_latency_seconds_count{%s} 3' % labels, text)
+    self.assertIn('edgetpu_wall_latency_seconds_count{%s} 3' % labels, text)
+    self.assertIn(
+        'edgetpu_model_info{%s,engine_class="BasicEngine"} 1.0' % labels, text)
+    engine.clear_metrics()
+    self.assertNotIn(labels, registry.Expose())
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,88 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import unittest
+
+from . import test_utils
+from edgetpu.benchmark import runner
+
+
+class BenchmarkRunnerTest(unittest.TestCase):
+
+  def testExpandMatrix(self):
+    cases = runner.ExpandMatrix(
+        ['a.tflite', 'b.tflite'], ['basic', 'classification', 'imprinting'],
+        ['tensor', 'bicubic'], ['cat.bmp', 'owl.jpg'], [1, 2], 5, 100)
+    per_model = (1 * 1 * 2 +  # basic: random input only.
+                 2 * 2 * 2 +  # classification
+                 1 * 2 * 2)   # imprinting: tensor only.
+    self.assertEqual(2 * per_model, len(cases))
+    for case in cases:
+      self.assertEqual(5, case.warmup)
+      self.assertEqual(100, case.iterations)
+      if case.engine == 'basic':
+        self.assertIsNone(case.image_path)
+
+  def testRunBenchmark(self):
+    case = runner.BenchmarkCase(
+        test_utils.TestDataPath('mobilenet_v1_1.0_224_quant_edgetpu.tflite'),
+        'classification', preprocessing='bilinear',
+        image_path=test_utils.TestDataPath('cat.bmp'), warmup=2,
+        iterations=50)
+    record = runner.RunBenchmark(case, record_latencies=True)
+    self.assertNotIn('error', record)
+    latency = record['latency_ms']
+    self.assertLessEqual(latency['min'], latency['p50'])
+    self.assertLessEqual(latency['p50'], latency['p90'])
+    self.assertLessEqual(latency['p90'], latency['p99'])
+    self.assertLessEqual(latency['p99'], latency['max'])
+    self.assertEqual(50, len(record['latencies_ms']))
+    self.assertGreater(record['throughput'], 0.0)
+    # Device latency can't exceed end-to-end latency.
+    self.assertLessEqual(record['device_latency_ms']['p50'], latency['p50'])
+
+  def testModelNotFitEngine(self):
+    case = runner.BenchmarkCase(
+        test_utils.TestDataPath('mobilenet_v1_1.0_224_quant_edgetpu.tflite'),
+        'detection', image_path=test_utils.TestDataPath('cat.bmp'))
+    record = runner.RunBenchmark(case)
+    self.assertIn('error', record)
+    self.assertNotIn('latency_ms', record)
+
+  def testMainWithReference(self):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      reference = os.path.join(tmp_dir, 'reference.csv')
+      with open(reference, 'w') as f:
+        f.write('MODEL INFERENCE_TIME\n')
+        f.write('mobilenet_v1_1.0_224_quant_edgetpu.tflite 0.001\n')
+      output = os.path.join(tmp_dir, 'result.jsonl')
+      argv = ['--models', 'mobilenet_v1_1.0_224_quant_edgetpu.tflite',
+              '--model_dir', test_utils.TEST_DATA_DIR, '--threads', '1', '2',
+              '--iterations', '20', '--output', output,
+              '--reference', reference]
+      runner.main(argv)
+      with open(output) as f:
+        records = [json.loads(line) for line in f]
+      self.assertEqual([1, 2], [r['threads'] for r in records])
+      self.assertEqual(0.001, records[0]['reference_ms'])
+      # Way slower than the reference.
+      with self.assertRaises(SystemExit):
+        runner.main(argv + ['--enable_assertion'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,143 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+
+from . import test_utils
+from edgetpu.classification.engine import ClassificationEngine
+from edgetpu.detection.engine import DetectionCandidate
+from edgetpu.utils import cascade
+from edgetpu.utils import image_processing
+import numpy as np
+from PIL import Image
+
+_BIRD_MODEL = 'mobilenet_v2_1.0_224_inat_bird_quant_edgetpu.tflite'
+
+
+def _Sleep(delay, spans):
+  """Sleeps delay seconds, appending the (start, end) of the sleep to spans."""
+  start = time.perf_counter()
+  time.sleep(delay)
+  spans.append((start, time.perf_counter()))
+
+
+def _Overlap(spans, other_spans):
+  """Returns True if a span of spans overlaps one of other_spans."""
+  return any(start < other_end and other_start < end
+             for start, end in spans for other_start, other_end in other_spans)
+
+
+class _FixedDetector(object):
+  """Detects the same boxes on every image, after delay seconds."""
+
+  def __init__(self, boxes, delay=0.0):
+    self.boxes = boxes
+    self.delay = delay
+    self.spans = []
+
+  def DetectWithImage(self, img, threshold=0.1, top_k=3, relative_coord=True):
+    del img, threshold, relative_coord
+    _Sleep(self.delay, self.spans)
+    return [DetectionCandidate(0, 0.9, *box) for box in self.boxes[:top_k]]
+
+
+class _SlowClassifier(object):
+
+  def __init__(self, delay):
+    self.delay = delay
+    self.spans = []
+
+  def get_input_tensor_shape(self):
+    return np.array([1, 16, 16, 3])
+
+  def ClassifyWithInputTensor(self, input_tensor, threshold=0.0, top_k=3):
+    del threshold, top_k
+    _Sleep(self.delay, self.spans)
+    return [(int(input_tensor[0]), 1.0)]
+
+
+class CascadeTest(unittest.TestCase):
+
+  def testDetectAndClassify(self):
+    boxes = [(0.1, 0.1, 0.6, 0.9), (0.4, 0.2, 1.0, 1.0)]
+    engine = ClassificationEngine(test_utils.TestDataPath(_BIRD_MODEL))
+    detector = cascade.DetectionClassificationCascade(
+        _FixedDetector(boxes), engine, classification_top_k=3,
+        relative_coord=False)
+    with test_utils.TestImage('parrot.jpg') as img:
+      img = img.convert('RGB')
+      results = detector.DetectAndClassify(img)
+    self.assertEqual(2, len(results))
+    array = np.asarray(img)
+    image_size = np.array(img.size * 2)
+    for box, result in zip(boxes, results):
+      np.testing.assert_allclose(np.array(box) * image_size,
+                                 result.bounding_box.flatten())
+      crop = image_processing.CropAndResize(array, [np.array(box) * image_size],
+                                            (224, 224))
+      expected = engine.ClassifyWithInputTensor(crop.ravel(), threshold=0.1,
+                                                top_k=3)
+      self.assertEqual([c for c, _ in expected], [c for c, _ in result.classes])
+    stats = detector.GetStats()
+    self.assertEqual(1, stats.frames)
+    self.assertEqual(2, stats.crops)
+
+  def testRunInOrder(self):
+    detector = cascade.DetectionClassificationCascade(
+        _FixedDetector([(0, 0, 1, 1)]), _SlowClassifier(0))
+    images = [Image.new('RGB', (32, 32), (i, 0, 0)) for i in range(10)]
+    results = list(detector.Run(images))
+    self.assertEqual(list(range(10)), [r[0].classes[0][0] for r in results])
+
+  def testRunOverlapsStages(self):
+    detector_engine = _FixedDetector([(0, 0, 0.5, 0.5), (0.5, 0.5, 1, 1)],
+                                     delay=0.02)
+    classifier = _SlowClassifier(0.01)
+    detector = cascade.DetectionClassificationCascade(detector_engine,
+                                                      classifier)
+    images = [Image.new('RGB', (32, 32)) for _ in range(10)]
+    self.assertEqual(10, len(list(detector.Run(images))))
+    self.assertEqual(20, detector.GetStats().crops)
+    # Next frames are detected while crops of previous ones are classified.
+    self.assertTrue(_Overlap(detector_engine.spans, classifier.spans))
+
+  def testRunStopsEarly(self):
+    detector = cascade.DetectionClassificationCascade(
+        _FixedDetector([(0, 0, 1, 1)]), _SlowClassifier(0))
+    images = (Image.new('RGB', (32, 32)) for _ in range(100))
+    for i, _ in enumerate(detector.Run(images)):
+      if i == 2:
+        break
+    self.assertLess(detector.GetStats().frames, 100)
+
+  def testRunRaises(self):
+    # Detection fails on the background thread.
+    detector = cascade.DetectionClassificationCascade(
+        _FixedDetector(None), _SlowClassifier(0))
+    with self.assertRaises(TypeError):
+      list(detector.Run([Image.new('RGB', (32, 32))]))
+
+  def testTopK(self):
+    detector = cascade.DetectionClassificationCascade(
+        _FixedDetector([(0, 0, 1, 1)] * 5), _SlowClassifier(0), top_k=3)
+    self.assertEqual(
+        3, len(detector.DetectAndClassify(Image.new('RGB', (32, 32)))))
+    with self.assertRaises(ValueError):
+      cascade.DetectionClassificationCascade(
+          _FixedDetector([]), _SlowClassifier(0), top_k=0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,189 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from . import test_utils
+from edgetpu.classification import cascade
+from edgetpu.classification.engine import ClassificationEngine
+import numpy as np
+
+
+class _FixedEngine(object):
+  """Returns the same scores for every image."""
+
+  def __init__(self, scores):
+    self.scores = np.array(scores)
+    self.calls = 0
+    self.warmups = 0
+
+  def get_all_output_tensors_sizes(self):
+    return np.array([len(self.scores)])
+
+  def Warmup(self, n=1):
+    self.warmups += n
+
+  def ClassifyWithImage(self, img, threshold=0.1, top_k=3, resample=None):
+    del img, resample
+    self.calls += 1
+    order = np.argsort(-self.scores)[:top_k]
+    return [(int(i), float(self.scores[i])) for i in order
+            if self.scores[i] > threshold]
+
+
+class CascadeClassifierTest(unittest.TestCase):
+
+  def testCertainty(self):
+    results = [(3, 0.6), (1, 0.25)]
+    self.assertAlmostEqual(0.6, cascade.Certainty(results, cascade.CONFIDENCE))
+    self.assertAlmostEqual(0.35, cascade.Certainty(results, cascade.MARGIN))
+    self.assertAlmostEqual(0.6, cascade.Certainty(results[:1], cascade.MARGIN))
+    self.assertEqual(0.0, cascade.Certainty([], cascade.CONFIDENCE))
+    with self.assertRaises(ValueError):
+      cascade.Certainty(results, 'entropy')
+
+  def testEarlyExit(self):
+    small = _FixedEngine([0.1, 0.5, 0.4])
+    large = _FixedEngine([0.05, 0.05, 0.9])
+    classifier = cascade.CascadeClassifier([small, large], [0.2])
+    # Margin 0.1 is below 0.2, the large model answers.
+    self.assertEqual([(2, 0.9)], classifier.ClassifyWithImage(None, top_k=1))
+    self.assertEqual(1, large.calls)
+
+    classifier = cascade.CascadeClassifier([small, large], [0.45],
+                                           criterion=cascade.CONFIDENCE)
+    self.assertEqual([(1, 0.5), (2, 0.4)],
+                     classifier.ClassifyWithImage(None, threshold=0.3))
+    self.assertEqual(1, large.calls)
+    stats = classifier.GetStats()
+    self.assertEqual(1, stats.images)
+    self.assertEqual([1, 0], stats.exits)
+
+  def testLabelMaps(self):
+    small = _FixedEngine([0.9, 0.1])
+    large = _FixedEngine([0.1, 0.2, 0.7])
+    with self.assertRaises(ValueError):
+      cascade.CascadeClassifier([small, large], [0.5])
+    classifier = cascade.CascadeClassifier(
+        [small, large], [0.5], label_maps=[{0: 2, 1: 0}, None])
+    self.assertEqual([(2, 0.9)], classifier.ClassifyWithImage(None, top_k=1))
+
+  def testInvalidArgs(self):
+    engine = _FixedEngine([0.5, 0.5])
+    with self.assertRaises(ValueError):
+      cascade.CascadeClassifier([engine, engine], [])
+    with self.assertRaises(ValueError):
+      cascade.CascadeClassifier([engine, engine], [0.1], criterion='entropy')
+    with self.assertRaises(ValueError):
+      cascade.CascadeClassifier([engine, engine], [0.1], label_maps=[None])
+
+  def testWithEngines(self):
+    model = test_utils.TestDataPath('mobilenet_v2_1.0_224_quant_edgetpu.tflite')
+    engine = ClassificationEngine(model)
+    classifier = cascade.CascadeClassifier(
+        [engine, ClassificationEngine(model)], [0.0])
+    with test_utils.TestImage('cat.bmp') as img:
+      expected = engine.ClassifyWithImage(img, top_k=1)
+      results = classifier.ClassifyWithImage(img, top_k=1)
+    self.assertEqual(1, len(results))
+    self.assertAlmostEqual(expected[0][1], results[0][1])
+    self.assertEqual([1, 0], classifier.GetStats().exits)
+
+
+class CalibrateTest(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(0)
+    n = 1000
+    self.certainties = np.stack([rng.uniform(size=n), rng.uniform(size=n)])
+    # The small model is right when certain, the large one mostly.
+    self.correct = np.stack([rng.uniform(size=n) < self.certainties[0],
+                             rng.uniform(size=n) < 0.9])
+    self.latencies = np.array([2.0, 20.0])
+
+  def testEvaluate(self):
+    accuracy, latency, exits = cascade.Evaluate(
+        self.correct, self.certainties, self.latencies, [np.inf])
+    self.assertAlmostEqual(np.mean(self.correct[1]), accuracy)
+    self.assertAlmostEqual(22.0, latency)
+    np.testing.assert_allclose([0, 1], exits)
+    accuracy, latency, exits = cascade.Evaluate(
+        self.correct, self.certainties, self.latencies, [-np.inf])
+    self.assertAlmostEqual(np.mean(self.correct[0]), accuracy)
+    self.assertAlmostEqual(2.0, latency)
+
+  def testCalibrate(self):
+    result = cascade.Calibrate(self.correct, self.certainties, self.latencies,
+                               0.85)
+    self.assertTrue(result['target_met'])
+    self.assertGreaterEqual(result['accuracy'], 0.85)
+    # Cheaper than always running the large model.
+    self.assertLess(result['mean_latency'], 22.0)
+    self.assertGreater(result['exit_ratios'][0], 0)
+    # A stricter target costs more latency.
+    strict = cascade.Calibrate(self.correct, self.certainties,
+                               self.latencies, 0.89)
+    self.assertGreaterEqual(strict['mean_latency'], result['mean_latency'])
+
+  def testUnreachableTarget(self):
+    result = cascade.Calibrate(self.correct, self.certainties, self.latencies,
+                               0.99)
+    self.assertFalse(result['target_met'])
+    self.assertGreaterEqual(result['accuracy'], np.mean(self.correct[1]))
+
+  def testThreeStages(self):
+    correct = np.concatenate([self.correct[:1], self.correct])
+    certainties = np.concatenate([self.certainties[:1], self.certainties])
+    result = cascade.Calibrate(correct, certainties, [1.0, 2.0, 20.0], 0.85,
+                               num_candidates=20)
+    self.assertEqual(2, len(result['thresholds']))
+    self.assertTrue(result['target_met'])
+
+  def testCoordinateDescent(self):
+    correct = np.concatenate([self.correct[:1], self.correct])
+    certainties = np.concatenate([self.certainties[:1], self.certainties])
+    args = (correct, certainties, [1.0, 2.0, 20.0], 0.85)
+    exhaustive = cascade.Calibrate(*args, num_candidates=20)
+    descent = cascade.Calibrate(*args, num_candidates=20, max_evaluations=0)
+    self.assertTrue(descent['target_met'])
+    self.assertLessEqual(descent['mean_latency'],
+                         exhaustive['mean_latency'] * 1.05)
+
+  def testManyStages(self):
+    rng = np.random.RandomState(1)
+    n = 2000
+    num_stages = 6
+    certainties = rng.uniform(size=(num_stages, n))
+    # Larger models are right more often.
+    skill = np.linspace(0.3, 0.0, num_stages)[:, np.newaxis]
+    correct = rng.uniform(size=(num_stages, n)) < certainties + skill + 0.4
+    latencies = 2.0 ** np.arange(num_stages)
+    result = cascade.Calibrate(correct, certainties, latencies,
+                               np.mean(correct[-1]) - 0.02)
+    self.assertEqual(num_stages - 1, len(result['thresholds']))
+    self.assertTrue(result['target_met'])
+    self.assertLess(result['mean_latency'], np.sum(latencies))
+
+  def testCollectStageOutputs(self):
+    engine = _FixedEngine([0.1, 0.7, 0.2])
+    predictions, certainties, latencies = cascade.CollectStageOutputs(
+        engine, [None] * 3)
+    self.assertEqual(1, engine.warmups)
+    np.testing.assert_array_equal([1, 1, 1], predictions)
+    np.testing.assert_allclose([0.5, 0.5, 0.5], certainties)
+    self.assertEqual(3, latencies.size)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -93,6 +93,24 @@ class TestClassificationEnginePythonAPI(unittest.TestCase):
     self.assertGreater(raw_output[283], 0.12)  # tiger cat
     self.assertGreater(raw_output[286], 0.79)  # Egyptian cat
 
+  def testStageTiming(self):
+    engine = mobilenet_v1_engine()
+    self.assertEqual({}, dict(engine.get_stage_histograms()))
+    engine.set_stage_timing(True)
+    with test_utils.TestImage('cat.bmp') as img:
+      for _ in range(10):
+        engine.ClassifyWithImage(img, top_k=3)
+    histograms = engine.get_stage_histograms()
+    self.assertEqual(['resize', 'to_tensor', 'invoke', 'device',
+                      'postprocess'], list(histograms))
+    for h in histograms.values():
+      self.assertEqual(10, h.count)
+    # The SWIG call includes the device time.
+    self.assertGreaterEqual(histograms['invoke'].p50,
+                            histograms['device'].p50)
+    engine.set_stage_timing(False)
+    self.assertEqual({}, dict(engine.get_stage_histograms()))
+
   def testVariousModels(self):
     # Mobilenet V1
     self._TestClassifyCat(
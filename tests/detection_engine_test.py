@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import unittest
+from edgetpu.classification.engine import ClassificationEngine
 from edgetpu.detection.engine import DetectionEngine
 import numpy as np
 from PIL import Image
@@ -23,6 +24,13 @@ def mobilenet_ssd_v1_coco_engine():
   return  DetectionEngine(
       test_utils.TestDataPath('mobilenet_ssd_v1_coco_quant_postprocess.tflite'))
 
+
+class _FailingEngine(DetectionEngine):
+
+  def RunInference(self, input):  # pylint: disable=redefined-builtin
+    raise TypeError('failed')
+
+
 class TestDetectionEnginePythonAPI(unittest.TestCase):
 
   def _TestCat(self, model_name):
@@ -110,6 +118,55 @@ class TestDetectionEnginePythonAPI(unittest.TestCase):
           test_utils.IOU(
               np.array([[0.1, 0.1], [0.7, 1.0]]), ret[0].bounding_box), 0.9)
 
+  def testDetectWithTiles(self):
+    engine = mobilenet_ssd_v1_coco_engine()
+    with test_utils.TestImage('cat.bmp') as img:
+      # A single tile is the same as the whole image.
+      expected = engine.DetectWithImage(img, top_k=1)
+      ret = engine.DetectWithTiles(img, grid=(1, 1), top_k=1)
+      self.assertEqual(len(ret), 1)
+      self.assertEqual(expected[0].label_id, ret[0].label_id)
+      self.assertAlmostEqual(expected[0].score, ret[0].score, places=5)
+      self.assertGreater(
+          test_utils.IOU(expected[0].bounding_box, ret[0].bounding_box), 0.99)
+      self.assertEqual(1, engine.get_tile_inference_times().size)
+
+    with test_utils.TestImage('cat_1080p.jpg') as img:
+      ret = engine.DetectWithTiles(img, grid=(3, 2), overlap=0.2, top_k=10)
+      self.assertEqual(6, engine.get_tile_inference_times().size)
+      self.assertTrue(np.all(engine.get_tile_inference_times() > 0))
+      self.assertTrue(ret)
+      self.assertLessEqual(len(ret), 10)
+      self.assertEqual(sorted([c.score for c in ret], reverse=True),
+                       [c.score for c in ret])
+      for c in ret:
+        self.assertTrue(np.all(c.bounding_box >= 0))
+        self.assertTrue(np.all(c.bounding_box <= 1))
+      ret = engine.DetectWithTiles(img, grid=(3, 2), relative_coord=False)
+      for c in ret:
+        self.assertTrue(np.all(c.bounding_box[1] <= img.size))
+
+  def testDetectWithTilesOnSeveralEngines(self):
+    engine = mobilenet_ssd_v1_coco_engine()
+    with test_utils.TestImage('cat.bmp') as img:
+      expected = engine.DetectWithTiles(img, grid=(2, 2))
+      ret = engine.DetectWithTiles(img, grid=(2, 2),
+                                   engines=[mobilenet_ssd_v1_coco_engine()])
+      self.assertEqual([c.score for c in expected], [c.score for c in ret])
+      # The error of the worker thread is raised as is.
+      failing = _FailingEngine(test_utils.TestDataPath(
+          'mobilenet_ssd_v1_coco_quant_postprocess.tflite'))
+      with self.assertRaises(TypeError):
+        engine.DetectWithTiles(img, grid=(2, 2), engines=[failing])
+      with self.assertRaises(ValueError):
+        engine.DetectWithTiles(img, engines=[ClassificationEngine(
+            test_utils.TestDataPath(
+                'mobilenet_v2_1.0_224_quant_edgetpu.tflite'))])
+      with self.assertRaises(ValueError):
+        engine.DetectWithTiles(img, engines=[DetectionEngine(
+            test_utils.TestDataPath(
+                'mobilenet_ssd_v2_face_quant_postprocess.tflite'))])
+
   def testRawInput(self):
     engine = mobilenet_ssd_v1_coco_engine()
     with test_utils.TestImage('cat.bmp') as img:
@@ -0,0 +1,105 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+import multiprocessing
+import tempfile
+import unittest
+import weakref
+
+from . import test_utils
+from edgetpu.basic import device_manager
+from edgetpu.basic import edgetpu_utils
+from edgetpu.classification.engine import ClassificationEngine
+
+
+def _HoldReservation(lock_dir, ready, release):
+  """Reserves a device in a child process until `release` is set."""
+  manager = device_manager.DeviceManager(lock_dir)
+  reservation = manager.Reserve()
+  ready.put(reservation.device_path)
+  release.wait()
+
+
+class DeviceManagerTest(unittest.TestCase):
+
+  def setUp(self):
+    self._lock_dir = tempfile.TemporaryDirectory()
+    self._all_tpus = edgetpu_utils.ListEdgeTpuPaths(
+        edgetpu_utils.EDGE_TPU_STATE_NONE)
+
+  def tearDown(self):
+    self._lock_dir.cleanup()
+
+  def testLeastLoadedAssignment(self):
+    manager = device_manager.DeviceManager(self._lock_dir.name)
+    reservations = [manager.Reserve() for _ in range(2 * len(self._all_tpus))]
+    # Reservations go round robin over devices in order.
+    expected = list(self._all_tpus) * 2
+    self.assertListEqual(expected, [r.device_path for r in reservations])
+    self.assertListEqual([2] * len(self._all_tpus),
+                         list(manager.GetLoads().values()))
+    reservations[0].Release()
+    self.assertEqual(1, manager.GetLoads()[self._all_tpus[0]])
+    self.assertEqual(self._all_tpus[0], manager.Reserve().device_path)
+
+  def testExclusive(self):
+    manager = device_manager.DeviceManager(self._lock_dir.name)
+    unused_reservations = [
+        manager.Reserve(exclusive=True) for _ in self._all_tpus]
+    with self.assertRaises(RuntimeError):
+      manager.Reserve(exclusive=True)
+
+  def testManagersAreGarbageCollected(self):
+    manager = device_manager.DeviceManager(
+        self._lock_dir.name, device_paths=['/dev/apex_0'])
+    reservation = manager.Reserve()
+    ref = weakref.ref(manager)
+    del manager
+    gc.collect()
+    self.assertIsNone(ref())
+    # Reservations outlive their manager until released.
+    self.assertTrue(reservation.IsHeld())
+    reservation.Release()
+
+  def testCrossProcess(self):
+    ctx = multiprocessing.get_context('spawn')
+    ready = ctx.Queue()
+    release = ctx.Event()
+    child = ctx.Process(
+        target=_HoldReservation, args=(self._lock_dir.name, ready, release))
+    child.start()
+    child_device = ready.get(timeout=30)
+    manager = device_manager.DeviceManager(self._lock_dir.name)
+    self.assertEqual(1, manager.GetLoads()[child_device])
+    if len(self._all_tpus) > 1:
+      self.assertNotEqual(child_device, manager.Reserve().device_path)
+    # Killed child must not leave its reservation behind.
+    child.terminate()
+    child.join()
+    self.assertEqual(0, manager.GetLoads()[child_device])
+
+  def testCreateEngine(self):
+    manager = device_manager.DeviceManager(self._lock_dir.name)
+    engine = manager.CreateEngine(
+        ClassificationEngine,
+        test_utils.TestDataPath('mobilenet_v1_1.0_224_quant_edgetpu.tflite'))
+    self.assertEqual(self._all_tpus[0], engine.device_path())
+    self.assertEqual(1, manager.GetLoads()[engine.device_path()])
+    del engine
+    self.assertEqual(0, manager.GetLoads()[self._all_tpus[0]])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -12,10 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import unittest
 
 from . import test_utils
+from edgetpu.basic import backend
 from edgetpu.basic import edgetpu_utils
+from edgetpu.basic import runtime_flavor
 from edgetpu.basic.basic_engine import BasicEngine
 
 
@@ -25,6 +28,23 @@ class EdgeTpuUtilsTest(unittest.TestCase):
     self.assertEqual(edgetpu_utils.SUPPORTED_RUNTIME_VERSION,
                      edgetpu_utils.GetRuntimeVersion())
 
+  def testRuntimeFlavor(self):
+    flavor = edgetpu_utils.GetRuntimeFlavor()
+    if backend.Name() == backend.SIMULATED:
+      self.assertEqual(backend.SIMULATED, flavor)
+      return
+    self.assertIn(flavor, (edgetpu_utils.RUNTIME_FLAVOR_DIRECT,
+                           edgetpu_utils.RUNTIME_FLAVOR_THROTTLED))
+    if os.environ.get(runtime_flavor.ENV_FLAVOR):
+      self.assertEqual(os.environ[runtime_flavor.ENV_FLAVOR], flavor)
+    # Switching flavor within the process isn't possible.
+    other = (edgetpu_utils.RUNTIME_FLAVOR_THROTTLED
+             if flavor == edgetpu_utils.RUNTIME_FLAVOR_DIRECT else
+             edgetpu_utils.RUNTIME_FLAVOR_DIRECT)
+    with self.assertRaises(RuntimeError):
+      runtime_flavor.Select(other)
+    runtime_flavor.Select(flavor)
+
   def testListEdgeTpuPaths(self):
     num_all = len(
         edgetpu_utils.ListEdgeTpuPaths(edgetpu_utils.EDGE_TPU_STATE_NONE))
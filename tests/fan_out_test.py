@@ -0,0 +1,117 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+
+from . import test_utils
+from edgetpu.classification.engine import ClassificationEngine
+from edgetpu.utils import fan_out
+import numpy as np
+from PIL import Image
+
+
+class _SleepyEngine(object):
+
+  def __init__(self, width, height, delay=0.0):
+    self.shape = np.array([1, height, width, 3])
+    self.delay = delay
+    # (start, end) of each inference.
+    self.spans = []
+
+  def get_input_tensor_shape(self):
+    return self.shape
+
+
+def _Run(engine, input_tensor):
+  start = time.perf_counter()
+  time.sleep(engine.delay)
+  engine.spans.append((start, time.perf_counter()))
+  return input_tensor.size
+
+
+class _CountingImage(object):
+  """PIL image counting its resizes."""
+
+  def __init__(self, img):
+    self.img = img
+    self.resizes = []
+    self._lock = threading.Lock()
+
+  def resize(self, size, resample):
+    with self._lock:
+      self.resizes.append(size)
+    return self.img.resize(size, resample)
+
+
+class FanOutTest(unittest.TestCase):
+
+  def testResizeOncePerSize(self):
+    engines = {'a': _SleepyEngine(224, 224), 'b': _SleepyEngine(300, 300),
+               'c': _SleepyEngine(224, 224)}
+    with fan_out.FanOut(engines, {name: _Run for name in engines}) as runner:
+      self.assertEqual([(224, 224), (300, 300)], runner.get_input_sizes())
+      img = _CountingImage(Image.new('RGB', (640, 480)))
+      record = runner.Run(img)
+    self.assertEqual([(224, 224), (300, 300)], sorted(img.resizes))
+    self.assertEqual({'a': 224 * 224 * 3, 'b': 300 * 300 * 3,
+                      'c': 224 * 224 * 3}, record.results)
+    self.assertEqual(set(engines), set(record.inference_times))
+
+  def testModelsRunConcurrently(self):
+    engines = {name: _SleepyEngine(32, 32, 0.05) for name in 'abc'}
+    with fan_out.FanOut(engines, {name: _Run for name in engines}) as runner:
+      runner.Run(Image.new('RGB', (64, 64)))
+    spans = [engine.spans[0] for engine in engines.values()]
+    # Every inference overlaps another one, none waited for the others.
+    for i, (start, end) in enumerate(spans):
+      self.assertTrue(any(start < other_end and other_start < end
+                          for j, (other_start, other_end) in enumerate(spans)
+                          if j != i))
+
+  def testErrorsAreRaised(self):
+
+    def Fail(engine, input_tensor):
+      raise RuntimeError('failed')
+
+    engines = {'a': _SleepyEngine(32, 32), 'b': _SleepyEngine(32, 32)}
+    with fan_out.FanOut(engines, {'a': _Run, 'b': Fail}) as runner:
+      with self.assertRaises(RuntimeError):
+        runner.Run(Image.new('RGB', (64, 64)))
+
+  def testInvalidEngines(self):
+    with self.assertRaises(ValueError):
+      fan_out.FanOut({})
+    engine = _SleepyEngine(32, 32)
+    engine.shape = np.array([1, 32, 32, 1])
+    with self.assertRaises(ValueError):
+      fan_out.FanOut({'gray': engine})
+
+  def testWithEngines(self):
+    model = test_utils.TestDataPath('mobilenet_v2_1.0_224_quant_edgetpu.tflite')
+    engine = ClassificationEngine(model)
+    with fan_out.FanOut({'a': engine,
+                         'b': ClassificationEngine(model)}) as runner:
+      with test_utils.TestImage('cat.bmp') as img:
+        record = runner.Run(img)
+        expected = engine.ClassifyWithImage(img, threshold=0.0)
+    self.assertEqual([s for _, s in expected],
+                     [s for _, s in record.results['a']])
+    self.assertEqual([s for _, s in expected],
+                     [s for _, s in record.results['b']])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,86 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from . import test_utils
+from edgetpu.utils import image_processing
+import numpy as np
+from PIL import Image
+
+
+class ImageProcessingTest(unittest.TestCase):
+
+  def testTileGrid(self):
+    tiles = image_processing.TileGrid((1920, 1080), (3, 2), 0.2)
+    self.assertEqual((6, 4), tiles.shape)
+    # Row by row, covering the whole image.
+    np.testing.assert_array_equal([0, 0], tiles[0, :2])
+    np.testing.assert_array_equal([1920, 1080], tiles[-1, 2:])
+    np.testing.assert_array_equal(tiles[:3, 1], [0, 0, 0])
+    # Neighbors overlap by 20% of a tile.
+    width = tiles[0, 2] - tiles[0, 0]
+    self.assertAlmostEqual(0.2 * width, tiles[0, 2] - tiles[1, 0], delta=1)
+    height = tiles[0, 3] - tiles[0, 1]
+    self.assertAlmostEqual(0.2 * height, tiles[0, 3] - tiles[3, 1], delta=1)
+
+    np.testing.assert_array_equal(
+        [[0, 0, 300, 200]], image_processing.TileGrid((300, 200), (1, 1)))
+    np.testing.assert_array_equal(
+        [[0, 0, 150, 200], [150, 0, 300, 200]],
+        image_processing.TileGrid((300, 200), (2, 1)))
+    with self.assertRaises(ValueError):
+      image_processing.TileGrid((300, 200), (0, 1))
+    with self.assertRaises(ValueError):
+      image_processing.TileGrid((300, 200), (2, 2), 1.0)
+
+  def testResizeArray(self):
+    with test_utils.TestImage('cat_720p.jpg') as img:
+      array = np.asarray(img.convert('RGB'))
+    tile = array[100:500, 300:900]
+    for sample in (Image.NEAREST, Image.BILINEAR):
+      resized = image_processing.ResizeArray(tile, (300, 200), sample)
+      expected = np.asarray(
+          Image.fromarray(np.ascontiguousarray(tile)).resize((300, 200),
+                                                             sample))
+      self.assertEqual((200, 300, 3), resized.shape)
+      np.testing.assert_array_equal(expected, resized)
+
+  def testCropAndResize(self):
+    with test_utils.TestImage('cat_720p.jpg') as img:
+      array = np.asarray(img.convert('RGB'))
+    boxes = np.array([[300, 100, 900, 500], [0, 0, 1280, 720],
+                      [1200, 700, 1300, 800]])
+    out = np.zeros((4, 224, 224, 3), dtype=np.uint8)
+    crops = image_processing.CropAndResize(array, boxes, (224, 224), out)
+    self.assertEqual((3, 224, 224, 3), crops.shape)
+    np.testing.assert_array_equal(out[:3], crops)
+    np.testing.assert_array_equal(
+        image_processing.ResizeArray(array[100:500, 300:900], (224, 224)),
+        crops[0])
+    np.testing.assert_array_equal(
+        image_processing.ResizeArray(array, (224, 224)), crops[1])
+    # Clipped to the image.
+    np.testing.assert_array_equal(
+        image_processing.ResizeArray(array[700:, 1200:], (224, 224)), crops[2])
+    self.assertEqual(
+        (0, 224, 224, 3),
+        image_processing.CropAndResize(array, np.zeros((0, 4)),
+                                       (224, 224)).shape)
+    with self.assertRaises(ValueError):
+      image_processing.CropAndResize(array, boxes, (224, 224), out[:2])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,103 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from edgetpu.utils import instrumentation
+import numpy as np
+
+
+class InstrumentationTest(unittest.TestCase):
+
+  def testRingBuffer(self):
+    recorder = instrumentation.StageRecorder(capacity=10)
+    for i in range(15):
+      recorder.Add(instrumentation.RESIZE if i % 2 else instrumentation.INVOKE,
+                   i * 1000)
+    self.assertEqual(15, recorder.total_count())
+    samples = recorder.Samples()
+    # Only the 10 most recent samples are kept, oldest first.
+    self.assertEqual([6000, 8000, 10000, 12000, 14000],
+                     list(samples[instrumentation.INVOKE]))
+    self.assertEqual([5000, 7000, 9000, 11000, 13000],
+                     list(samples[instrumentation.RESIZE]))
+    recorder.Reset()
+    self.assertEqual({}, dict(recorder.Samples()))
+    with self.assertRaises(ValueError):
+      instrumentation.StageRecorder(capacity=0)
+
+  def testRecord(self):
+    recorder = instrumentation.StageRecorder()
+    start = instrumentation.Now()
+    end = recorder.Record(instrumentation.POSTPROCESS, start)
+    self.assertGreaterEqual(end, start)
+    self.assertEqual([end - start],
+                     list(recorder.Samples()[instrumentation.POSTPROCESS]))
+
+  def testHistograms(self):
+    recorder = instrumentation.StageRecorder()
+    for duration_us in np.arange(1, 101):
+      recorder.Add(instrumentation.DEVICE, duration_us * 1000)
+    histograms = recorder.Histograms()
+    self.assertEqual([instrumentation.DEVICE], list(histograms))
+    h = histograms[instrumentation.DEVICE]
+    self.assertEqual(100, h.count)
+    self.assertAlmostEqual(50.5, h.mean)
+    self.assertAlmostEqual(50.5, h.p50)
+    self.assertEqual(100.0, h.max)
+    self.assertEqual(100, h.bucket_counts.sum())
+    self.assertLessEqual(h.bucket_edges[0], 1.0)
+    self.assertGreater(h.bucket_edges[-1], 100.0)
+    self.assertEqual(
+        2, len(instrumentation.FormatHistograms(histograms).splitlines()))
+
+  def testStageTimingMixin(self):
+
+    class Tracer(object):
+
+      def __init__(self):
+        self.devices = []
+        self.recorder = instrumentation.StageRecorder()
+
+      def Recorder(self, device):
+        self.devices.append(device)
+        return self.recorder
+
+    class Engine(instrumentation.StageTimingMixin):
+
+      def _TraceDevice(self):
+        return '/dev/apex_0'
+
+    engine = Engine()
+    self.assertIsNone(engine._stage_recorder)
+    self.assertEqual({}, engine.get_stage_histograms())
+    engine.set_stage_timing(True)
+    engine._stage_recorder.Add(instrumentation.INVOKE, 1000)
+    tracer = Tracer()
+    engine.set_tracer(tracer)
+    self.assertEqual(['/dev/apex_0'], tracer.devices)
+    # Both timing and tracing see the stage.
+    engine._stage_recorder.Add(instrumentation.INVOKE, 3000)
+    self.assertEqual(2, engine.get_stage_histograms()[
+        instrumentation.INVOKE].count)
+    self.assertEqual(1, tracer.recorder.total_count())
+    engine.set_stage_timing(False)
+    self.assertIs(tracer.recorder, engine._stage_recorder)
+    self.assertEqual({}, engine.get_stage_histograms())
+    engine.set_tracer(None)
+    self.assertIsNone(engine._stage_recorder)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,64 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from . import test_utils
+from edgetpu.basic.basic_engine import BasicEngine
+from edgetpu.benchmark import load_generator
+import numpy as np
+
+
+class LoadGeneratorTest(unittest.TestCase):
+
+  def testArrivalTimes(self):
+    poisson = load_generator.ArrivalTimes(100, 100, seed=1)
+    self.assertAlmostEqual(10000, poisson.size, delta=400)
+    self.assertTrue(np.all(np.diff(poisson) >= 0))
+    self.assertLess(poisson[-1], 100)
+    bursty = load_generator.ArrivalTimes(
+        100, 100, load_generator.BURSTY, burst_size=10, seed=1)
+    self.assertAlmostEqual(10000, bursty.size, delta=1300)
+    self.assertEqual(0, bursty.size % 10)
+    # Same mean rate, bursts make inter-arrival times far more variable.
+    self.assertGreater(np.std(np.diff(bursty)), 2 * np.std(np.diff(poisson)))
+    with self.assertRaises(ValueError):
+      load_generator.ArrivalTimes(0, 10)
+    with self.assertRaises(ValueError):
+      load_generator.ArrivalTimes(10, 10, 'uniform')
+
+  def testSweepRates(self):
+    engine = BasicEngine(test_utils.TestDataPath(
+        'mobilenet_v1_1.0_224_quant_edgetpu.tflite'))
+    engine.Warmup()
+    target = load_generator.EngineTarget([engine])
+    capacity = load_generator.EstimateCapacity(target)
+    points = load_generator.SweepRates(
+        target, [capacity * 0.2, capacity * 0.5, capacity * 3], duration=2)
+    self.assertEqual(3, len(points))
+    light, _, overloaded = points
+    self.assertFalse(light.saturated)
+    self.assertEqual(light.requests, light.completed)
+    self.assertTrue(overloaded.saturated)
+    # Queueing delay dominates latency past saturation.
+    self.assertGreater(overloaded.latency_ms['p99'],
+                       5 * light.latency_ms['p99'])
+    self.assertEqual(light.offered_rate, load_generator.MaxRateForSlo(
+        points[:1], light.latency_ms['p99']))
+    self.assertIsNone(load_generator.MaxRateForSlo(points, 0.0))
+    self.assertEqual(4, len(load_generator.FormatPoints(points).splitlines()))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,95 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+from . import test_utils
+from edgetpu.benchmark import memory
+import numpy as np
+
+
+class MemoryBenchmarkTest(unittest.TestCase):
+
+  def testAllocationPerCall(self):
+    kept = []
+    result = memory.AllocationPerCall(lambda: np.ones(100000).sum(), calls=10)
+    self.assertGreaterEqual(result['peak_bytes']['mean'], 800000)
+    self.assertLess(result['retained_bytes']['max'], 10000)
+    result = memory.AllocationPerCall(
+        lambda: kept.append(np.ones(100000)), calls=10, warmup=0)
+    self.assertGreaterEqual(result['retained_bytes']['mean'], 800000)
+    self.assertEqual(10, len(kept))
+
+  @unittest.skipIf(memory.ReadRss() is None, 'RSS is not available.')
+  def testCheckLeak(self):
+    kept = []
+    result = memory.CheckLeak(lambda: kept.append(bytearray(10000)),
+                              iterations=2000, num_samples=20, warmup=10)
+    self.assertTrue(result['leak'])
+    self.assertAlmostEqual(10000, result['rss_slope'], delta=2000)
+    del kept[:]
+    result = memory.CheckLeak(lambda: bytearray(10000), iterations=2000,
+                              num_samples=20, warmup=10)
+    self.assertFalse(result['leak'])
+    with self.assertRaises(ValueError):
+      memory.CheckLeak(lambda: None, iterations=1)
+
+  def testRunMemoryBenchmark(self):
+    model = test_utils.TestDataPath('mobilenet_v2_1.0_224_quant_edgetpu.tflite')
+    image = test_utils.TestDataPath('cat.bmp')
+    footprints = memory.EngineFootprint([model])
+    self.assertEqual('mobilenet_v2_1.0_224_quant_edgetpu.tflite',
+                     footprints[0]['model'])
+    records = []
+    for api in (memory.RUN_INFERENCE, memory.CLASSIFY_WITH_IMAGE):
+      record = memory.RunMemoryBenchmark(model, api, image, iterations=20,
+                                         allocation_calls=3)
+      self.assertNotIn('error', record)
+      # The output tensor is allocated by each call.
+      self.assertGreaterEqual(record['peak_bytes']['mean'], 1001 * 4)
+      records.append(record)
+    record = memory.RunMemoryBenchmark(model, memory.DETECT_WITH_IMAGE)
+    self.assertIn('requires an image', record['error'])
+    records.append(record)
+
+    rows = memory.ResultRows(footprints, records)
+    self.assertEqual(('MODEL', 'API') + memory.COLUMNS, rows[0])
+    self.assertEqual(3, len(rows))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      path = os.path.join(tmp_dir, 'memory_reference.csv')
+      memory.WriteRows(path, rows)
+      reference = memory.ReadReference(path)
+    self.assertEqual(
+        float(rows[1][3]),
+        reference[(rows[1][0], memory.RUN_INFERENCE)]['PEAK_BYTES_PER_CALL'])
+    self.assertEqual([], memory.CompareWithReference(rows, reference))
+
+  def testCompareWithReference(self):
+    rows = [('MODEL', 'API') + memory.COLUMNS,
+            ('a.tflite', memory.RUN_INFERENCE, '100', '1000', '0', '0.50'),
+            ('b.tflite', memory.RUN_INFERENCE, '-', '5000', '0', '100.00')]
+    reference = {('a.tflite', memory.RUN_INFERENCE): {
+        'ENGINE_RSS_KB': 50, 'PEAK_BYTES_PER_CALL': 1000}}
+    messages = memory.CompareWithReference(rows, reference)
+    self.assertEqual(2, len(messages))
+    self.assertIn('ENGINE_RSS_KB', messages[0])
+    self.assertIn('leak', messages[1])
+    self.assertEqual([], memory.CompareWithReference(rows, {},
+                                                     max_slope=200))
+
+
+if __name__ == '__main__':
+  unittest.main()
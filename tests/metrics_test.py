@@ -0,0 +1,80 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+import urllib.request
+
+from edgetpu.utils import metrics
+
+
+class MetricsTest(unittest.TestCase):
+
+  def testCounterAndGauge(self):
+    registry = metrics.Registry()
+    counter = registry.Counter('requests_total', 'Requests.', ('path',))
+    counter.Labels('/a').Inc()
+    counter.Labels('/a').Inc(2)
+    counter.Labels('say "hi"\n').Inc()
+    depth = [5]
+    registry.Gauge('depth', 'Depth.').Labels().SetFunction(lambda: depth[0])
+    depth[0] = 7
+    text = registry.Expose()
+    self.assertIn('# TYPE requests_total counter\n', text)
+    self.assertIn('requests_total{path="/a"} 3.0\n', text)
+    self.assertIn('requests_total{path="say \\"hi\\"\\n"} 1.0\n', text)
+    self.assertIn('depth 7.0\n', text)
+    # Same name and labels returns the registered metric.
+    self.assertIs(counter,
+                  registry.Counter('requests_total', 'Requests.', ('path',)))
+    with self.assertRaises(ValueError):
+      registry.Gauge('requests_total', 'Requests.', ('path',))
+    with self.assertRaises(ValueError):
+      counter.Labels('/a', 'extra')
+
+  def testHistogram(self):
+    registry = metrics.Registry()
+    histogram = registry.Histogram('latency_seconds', 'Latency.',
+                                   buckets=(0.01, 0.1))
+    child = histogram.Labels()
+    for value in (0.005, 0.01, 0.05, 1.0):
+      child.Observe(value)
+    text = registry.Expose()
+    self.assertIn('latency_seconds_bucket{le="0.01"} 2\n', text)
+    self.assertIn('latency_seconds_bucket{le="0.1"} 3\n', text)
+    self.assertIn('latency_seconds_bucket{le="+Inf"} 4\n', text)
+    self.assertIn('latency_seconds_sum 1.065\n', text)
+    self.assertIn('latency_seconds_count 4\n', text)
+    with self.assertRaises(ValueError):
+      registry.Histogram('bad', 'Bad.', buckets=(0.1, 0.01))
+
+  def testHttpServer(self):
+    registry = metrics.Registry()
+    registry.Counter('up_total', 'Up.').Labels().Inc()
+    metrics.TrackQueueDepth(registry, 'camera0', lambda: 2)
+    server = metrics.StartHttpServer(0, '127.0.0.1', registry)
+    try:
+      url = 'http://127.0.0.1:%d/metrics' % server.server_address[1]
+      with urllib.request.urlopen(url) as response:
+        self.assertEqual(metrics.CONTENT_TYPE,
+                         response.headers['Content-Type'])
+        body = response.read().decode('utf-8')
+    finally:
+      server.shutdown()
+      server.server_close()
+    self.assertIn('up_total 1.0\n', body)
+    self.assertIn('edgetpu_queue_depth{queue="camera0"} 2.0\n', body)
+
+
+if __name__ == '__main__':
+  unittest.main()
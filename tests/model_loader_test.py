@@ -0,0 +1,67 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import unittest
+
+from . import test_utils
+from edgetpu.basic import edgetpu_utils
+from edgetpu.classification.engine import ClassificationEngine
+from edgetpu.detection.engine import DetectionEngine
+from edgetpu.utils import model_loader
+
+
+class ModelLoaderTest(unittest.TestCase):
+
+  def testPrefetchModel(self):
+    model_path = test_utils.TestDataPath('mobilenet_v1_1.0_224_quant.tflite')
+    self.assertEqual(os.path.getsize(model_path),
+                     model_loader.PrefetchModel(model_path))
+
+  def testLoadEngines(self):
+    edge_tpus = edgetpu_utils.ListEdgeTpuPaths(
+        edgetpu_utils.EDGE_TPU_STATE_UNASSIGNED)
+    classification_model = test_utils.TestDataPath(
+        'mobilenet_v1_1.0_224_quant_edgetpu.tflite')
+    detection_model = test_utils.TestDataPath(
+        'mobilenet_ssd_v1_coco_quant_postprocess_edgetpu.tflite')
+    manifest = [
+        (classification_model, edge_tpus[0], ClassificationEngine),
+        (detection_model, edge_tpus[-1], DetectionEngine),
+    ]
+    engines, timings = model_loader.LoadEngines(manifest)
+    self.assertIsInstance(engines[0], ClassificationEngine)
+    self.assertIsInstance(engines[1], DetectionEngine)
+    for engine, timing, entry in zip(engines, timings, manifest):
+      self.assertEqual(entry[0], engine.model_path())
+      self.assertEqual(entry[1], engine.device_path())
+      self.assertEqual(entry[1], timing.device_path)
+      self.assertGreater(timing.read_time, 0.0)
+      self.assertGreater(timing.construct_time, 0.0)
+      self.assertGreater(timing.warmup_time, 0.0)
+    print(model_loader.FormatTimings(timings))
+
+    # Engines are warmed up, first inference doesn't upload parameters.
+    with test_utils.TestImage('cat.bmp') as img:
+      ret = engines[0].ClassifyWithImage(img, top_k=1)
+    self.assertEqual(286, ret[0][0])  # Egyptian cat
+    self.assertLess(engines[0].get_inference_time(), timings[0].warmup_time)
+
+  def testEmptyManifest(self):
+    with self.assertRaises(ValueError):
+      model_loader.LoadEngines([])
+
+
+if __name__ == '__main__':
+  unittest.main()
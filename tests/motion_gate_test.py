@@ -0,0 +1,128 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+
+from edgetpu.utils import motion_gate
+import numpy as np
+
+_SHAPE = (64, 48, 3)
+
+
+class _Counter(object):
+
+  def __init__(self):
+    self.calls = 0
+
+  def __call__(self, input_tensor, top_k=3):
+    self.calls += 1
+    return [(self.calls, float(top_k))]
+
+
+def _Frame(seed, noise=2):
+  rng = np.random.RandomState(seed)
+  scene = np.full(_SHAPE, 100, dtype=np.int16)
+  scene[10:20, 10:30] = 200
+  noise = rng.randint(-noise, noise + 1, size=_SHAPE)
+  return np.clip(scene + noise, 0, 255).astype(np.uint8).flatten()
+
+
+class MotionGateTest(unittest.TestCase):
+
+  def testDownsample(self):
+    gate = motion_gate.MotionGate([1, 4, 6, 3], block_size=2)
+    tensor = np.zeros((4, 6, 3), dtype=np.uint8)
+    tensor[:2, :2] = 8
+    tensor[3, 5] = 255  # Single pixel of the bottom right block.
+    blocks = gate.Downsample(tensor.flatten())
+    self.assertEqual((2, 3), blocks.shape)
+    self.assertEqual(8, blocks[0, 0])
+    self.assertAlmostEqual(255 / 4., blocks[1, 2])
+    self.assertEqual(0, blocks[0, 1])
+
+  def testSkipsUnchangedFrames(self):
+    gate = motion_gate.MotionGate(_SHAPE, max_staleness=None)
+    inference = _Counter()
+    first = gate.Run(_Frame(0), inference, top_k=1)
+    for seed in range(1, 10):
+      self.assertEqual(first, gate.Run(_Frame(seed), inference, top_k=1))
+    self.assertEqual(1, inference.calls)
+    stats = gate.GetStats()
+    self.assertEqual(10, stats.frames)
+    self.assertEqual(9, stats.skipped)
+    self.assertAlmostEqual(0.9, stats.skip_ratio)
+
+  def testChangedFramesAreInferred(self):
+    gate = motion_gate.MotionGate(_SHAPE, max_staleness=None)
+    inference = _Counter()
+    gate.Run(_Frame(0), inference)
+    frame = _Frame(1).reshape(_SHAPE)
+    frame[40:56, 24:40] = 0  # An object appears.
+    self.assertEqual([(2, 3.0)], gate.Run(frame.flatten(), inference))
+    # The new frame is the reference now.
+    gate.Run(frame.flatten(), inference)
+    self.assertEqual(2, inference.calls)
+
+  def testSlowChangesAccumulate(self):
+    gate = motion_gate.MotionGate(_SHAPE, max_staleness=None)
+    inference = _Counter()
+    for brightness in range(0, 40, 4):
+      gate.Run(np.clip(_Frame(0).astype(np.int16) + brightness, 0,
+                       255).astype(np.uint8), inference)
+    # Inferred at brightness 0, 16 and 32, each over pixel_threshold of the
+    # last inferred frame, though consecutive frames differ by 4 only.
+    self.assertEqual(3, inference.calls)
+
+  def testMaxStaleness(self):
+    gate = motion_gate.MotionGate(_SHAPE, max_staleness=0.01)
+    inference = _Counter()
+    gate.Run(_Frame(0), inference)
+    gate.Run(_Frame(1), inference)
+    time.sleep(0.02)
+    gate.Run(_Frame(2), inference)
+    self.assertEqual(2, inference.calls)
+    self.assertEqual(1, gate.GetStats().stale)
+
+  def testReset(self):
+    gate = motion_gate.MotionGate(_SHAPE)
+    inference = _Counter()
+    gate.Run(_Frame(0), inference)
+    gate.Reset()
+    gate.Run(_Frame(0), inference)
+    self.assertEqual(2, inference.calls)
+
+  def testDifferentCallIsInferred(self):
+    gate = motion_gate.MotionGate(_SHAPE, max_staleness=None)
+    inference = _Counter()
+    other = _Counter()
+    gate.Run(_Frame(0), inference, top_k=1)
+    # Same frame, but another top_k, function or argument.
+    self.assertEqual([(2, 2.0)], gate.Run(_Frame(1), inference, top_k=2))
+    self.assertEqual([(3, 2.0)], gate.Run(_Frame(2), inference, 2))
+    self.assertEqual([(1, 2.0)], gate.Run(_Frame(3), other, 2))
+    self.assertEqual([(1, 2.0)], gate.Run(_Frame(4), other, np.int64(2)))
+    self.assertEqual(3, inference.calls)
+    self.assertEqual(1, other.calls)
+    self.assertEqual(1, gate.GetStats().skipped)
+
+  def testInvalidShape(self):
+    with self.assertRaises(ValueError):
+      motion_gate.MotionGate([224, 224])
+    with self.assertRaises(ValueError):
+      motion_gate.MotionGate(_SHAPE, block_size=0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,140 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from . import test_utils
+from edgetpu.basic.basic_engine import BasicEngine
+from edgetpu.classification import multi_head
+import numpy as np
+
+
+class _Extractor(object):
+  """Embedding extractor returning a fixed embedding."""
+
+  def __init__(self, embedding):
+    self.embedding = np.asarray(embedding, dtype=np.float32)
+    self.runs = 0
+
+  def get_all_output_tensors_sizes(self):
+    return np.array([self.embedding.size])
+
+  def get_input_tensor_shape(self):
+    return np.array([1, 4, 4, 3])
+
+  def RunInference(self, input_tensor):
+    self.runs += 1
+    return 0.0, self.embedding
+
+
+def _Softmax(logits):
+  exp = np.exp(logits - logits.max())
+  return exp / exp.sum()
+
+
+class MultiHeadTest(unittest.TestCase):
+
+  def testSegmentSoftmax(self):
+    logits = np.array([1., 2., 3., 0.5, 100., -1.], dtype=np.float32)
+    scores = multi_head.SegmentSoftmax(logits, np.array([0, 3, 4]))
+    np.testing.assert_allclose(_Softmax(logits[:3]), scores[:3], rtol=1e-6)
+    self.assertAlmostEqual(1.0, scores[3])
+    np.testing.assert_allclose(_Softmax(logits[4:]), scores[4:], rtol=1e-6)
+
+  def testMatchesSeparateHeads(self):
+    rng = np.random.RandomState(0)
+    embedding = rng.rand(16)
+    heads = {'a': (rng.randn(5, 16), rng.randn(5)),
+             'b': (rng.randn(3, 16), None),
+             'c': (rng.randn(1, 16), rng.randn(1))}
+    extractor = _Extractor(embedding)
+    classifier = multi_head.MultiHeadClassifier(extractor, heads)
+    self.assertEqual(['a', 'b', 'c'], classifier.get_head_names())
+    self.assertEqual({'a': 5, 'b': 3, 'c': 1}, classifier.get_num_classes())
+    results = classifier.ClassifyWithInputTensor(np.zeros(48, np.uint8),
+                                                 top_k=3)
+    self.assertEqual(1, extractor.runs)
+    normalized = embedding / np.linalg.norm(embedding)
+    for name, (weights, bias) in heads.items():
+      logits = weights.dot(normalized)
+      if bias is not None:
+        logits += bias
+      scores = _Softmax(logits)
+      expected = np.argsort(-scores)[:3]
+      self.assertEqual(list(expected), [i for i, _ in results[name]])
+      np.testing.assert_allclose(scores[expected],
+                                 [s for _, s in results[name]], rtol=1e-5)
+
+  def testThresholdAndLogits(self):
+    weights = np.eye(4, dtype=np.float32)
+    classifier = multi_head.MultiHeadClassifier(
+        _Extractor(np.zeros(4)), {'a': (weights, None)}, softmax=False)
+    results = classifier.ClassifyEmbedding([0., 3., 4., 0.], threshold=0.7,
+                                           top_k=4)
+    self.assertEqual([2], [i for i, _ in results['a']])
+    self.assertAlmostEqual(0.8, results['a'][0][1], places=6)
+    with self.assertRaises(ValueError):
+      classifier.ClassifyEmbedding(np.zeros(4), top_k=0)
+    with self.assertRaises(ValueError):
+      classifier.ClassifyEmbedding(np.zeros(5))
+
+  def testAddAndRemoveHeads(self):
+    classifier = multi_head.MultiHeadClassifier(_Extractor(np.ones(4)))
+    self.assertEqual({}, classifier.ClassifyEmbedding(np.ones(4)))
+    classifier.AddHead('a', np.ones((2, 4)))
+    classifier.AddHead('b', np.eye(4), np.arange(4))
+    classifier.RemoveHead('a')
+    results = classifier.ClassifyEmbedding(np.ones(4), top_k=1)
+    self.assertEqual(['b'], list(results))
+    self.assertEqual(3, results['b'][0][0])
+    with self.assertRaises(ValueError):
+      classifier.AddHead('c', np.ones((2, 5)))
+    with self.assertRaises(ValueError):
+      classifier.AddHead('c', np.ones((2, 4)), np.ones(3))
+    with self.assertRaises(KeyError):
+      classifier.RemoveHead('a')
+
+  def testReadHead(self):
+    weights, bias = multi_head.ReadHead(test_utils.TestDataPath(
+        'imprinting/retrained_mobilenet_v1_cat_only_edgetpu.tflite'))
+    self.assertEqual((1, 1024), weights.shape)
+    self.assertEqual((1,), bias.shape)
+    self.assertEqual(np.float32, weights.dtype)
+    # Imprinted weights are normalized embeddings.
+    self.assertAlmostEqual(1.0, np.linalg.norm(weights[0]), delta=0.05)
+    with self.assertRaises(ValueError):
+      multi_head.ReadHead(test_utils.TestDataPath(
+          'imprinting/mobilenet_v1_1.0_224_quant_embedding_extractor_edgetpu'
+          '.tflite'))
+
+  def testWithExtractor(self):
+    extractor = BasicEngine(test_utils.TestDataPath(
+        'imprinting/mobilenet_v1_1.0_224_quant_embedding_extractor_edgetpu'
+        '.tflite'))
+    model = test_utils.TestDataPath(
+        'imprinting/retrained_mobilenet_v1_cat_only_edgetpu.tflite')
+    rng = np.random.RandomState(0)
+    classifier = multi_head.MultiHeadClassifier(
+        extractor, {'cat': model, 'random': (rng.randn(7, 1024), None)})
+    with test_utils.TestImage('cat.bmp') as img:
+      results = classifier.ClassifyWithImage(img, threshold=0.0, top_k=3)
+    self.assertEqual(['cat', 'random'], list(results))
+    # A single class gets all the probability.
+    self.assertEqual(0, results['cat'][0][0])
+    self.assertAlmostEqual(1.0, results['cat'][0][1], places=5)
+    self.assertEqual(3, len(results['random']))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,145 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from edgetpu.utils import nms
+import numpy as np
+
+
+def _RandomBoxes(seed, n, num_labels=1):
+  rng = np.random.RandomState(seed)
+  centers = rng.uniform(0, 100, size=(n, 2))
+  sizes = rng.uniform(5, 30, size=(n, 2))
+  boxes = np.concatenate([centers - sizes / 2, centers + sizes / 2], axis=1)
+  return boxes, rng.uniform(size=n), rng.randint(num_labels, size=n)
+
+
+def _NaiveNms(boxes, scores, threshold, labels):
+  keep = []
+  for i in sorted(range(len(scores)), key=lambda i: -scores[i]):
+    if all(labels[i] != labels[j] or
+           nms.PairwiseOverlap(boxes[i:i + 1], boxes[j:j + 1])[0, 0] <=
+           threshold for j in keep):
+      keep.append(i)
+  return keep
+
+
+class NmsTest(unittest.TestCase):
+
+  def testPairwiseOverlap(self):
+    a = np.array([[0, 0, 10, 10]])
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30],
+                  [2, 2, 4, 4]])
+    np.testing.assert_allclose([[1, 1 / 3, 0, 0.04]],
+                               nms.PairwiseOverlap(a, b))
+    np.testing.assert_allclose([[1, 0.5, 0, 1]],
+                               nms.PairwiseOverlap(a, b, nms.IOS))
+    with self.assertRaises(ValueError):
+      nms.PairwiseOverlap(a, b, 'unknown')
+
+  def testNmsMatchesGreedyReference(self):
+    # Enough boxes for windows to matter, with and without labels.
+    for num_labels in (1, 3):
+      boxes, scores, labels = _RandomBoxes(1, 600, num_labels)
+      keep = nms.Nms(boxes, scores, 0.3,
+                     labels=labels if num_labels > 1 else None)
+      self.assertEqual(_NaiveNms(boxes, scores, 0.3, labels), keep.tolist())
+
+  def testNms(self):
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [0, 0, 5, 10],
+                      [50, 50, 60, 60]])
+    scores = np.array([0.9, 0.8, 0.7, 0.6])
+    self.assertEqual([0, 2, 3], nms.Nms(boxes, scores, 0.5).tolist())
+    # Half box is covered by the first one.
+    self.assertEqual([0, 3], nms.Nms(boxes, scores, 0.5,
+                                     metric=nms.IOS).tolist())
+    self.assertEqual([0, 1, 2, 3], nms.Nms(boxes, scores, 0.5,
+                                           labels=[0, 1, 2, 0]).tolist())
+    self.assertEqual([0], nms.Nms(boxes, scores, max_output=1).tolist())
+    self.assertEqual([], nms.Nms(np.zeros((0, 4)), np.zeros(0)).tolist())
+    with self.assertRaises(ValueError):
+      nms.Nms(boxes, scores[:2])
+    with self.assertRaises(ValueError):
+      nms.Nms(boxes, scores, max_output=0)
+
+  def testSoftNms(self):
+    boxes = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [50, 50, 60, 60]])
+    scores = np.array([0.9, 0.8, 0.7])
+    keep, new_scores = nms.SoftNms(boxes, scores, nms.LINEAR, threshold=0.3)
+    self.assertEqual([0, 2, 1], keep.tolist())
+    np.testing.assert_allclose([0.9, 0.7, 0.8 * (1 - 1 / 3)], new_scores)
+    keep, new_scores = nms.SoftNms(boxes, scores, nms.GAUSSIAN, sigma=0.5)
+    self.assertEqual([0, 2, 1], keep.tolist())
+    np.testing.assert_allclose([0.9, 0.7, 0.8 * np.exp(-(1 / 9) / 0.5)],
+                               new_scores)
+    # Low scores are dropped.
+    keep, _ = nms.SoftNms(boxes, scores, nms.LINEAR, threshold=0.3,
+                          score_threshold=0.6)
+    self.assertEqual([0, 2], keep.tolist())
+    keep, _ = nms.SoftNms(boxes, scores, nms.LINEAR, labels=[0, 1, 0])
+    self.assertEqual([0, 1, 2], keep.tolist())
+    with self.assertRaises(ValueError):
+      nms.SoftNms(boxes, scores, 'unknown')
+    with self.assertRaises(ValueError):
+      nms.SoftNms(boxes, scores, max_output=0)
+
+  def testWeightedBoxFusion(self):
+    boxes = np.array([[0, 0, 10, 10], [2, 0, 12, 10], [50, 50, 60, 60],
+                      [0, 0, 10, 10]])
+    scores = np.array([0.9, 0.3, 0.6, 0.8])
+    labels = np.array([1, 1, 1, 2])
+    fused, fused_scores, fused_labels = nms.WeightedBoxFusion(
+        boxes, scores, labels, threshold=0.5, num_models=2)
+    np.testing.assert_allclose(
+        [[0.5, 0, 10.5, 10], [0, 0, 10, 10], [50, 50, 60, 60]], fused)
+    # Cluster of 2 keeps its mean score, single boxes are halved.
+    np.testing.assert_allclose([0.6, 0.4, 0.3], fused_scores)
+    self.assertEqual([1, 2, 1], fused_labels.tolist())
+
+    fused, fused_scores, fused_labels = nms.WeightedBoxFusion(
+        boxes, scores, skip_threshold=0.5)
+    self.assertIsNone(fused_labels)
+    self.assertEqual(2, len(fused))
+    np.testing.assert_allclose([0.85, 0.6], fused_scores)
+
+    # Clusters are led by the boxes NMS keeps.
+    boxes, scores, labels = _RandomBoxes(2, 300, 3)
+    fused, fused_scores, _ = nms.WeightedBoxFusion(boxes, scores, labels)
+    self.assertEqual(len(nms.Nms(boxes, scores, 0.55, labels)), len(fused))
+    self.assertTrue(np.all(np.diff(fused_scores) <= 0))
+
+    fused, _, _ = nms.WeightedBoxFusion(np.zeros((0, 4)), np.zeros(0))
+    self.assertEqual((0, 4), fused.shape)
+
+  def testFromCandidates(self):
+
+    class Candidate(object):
+
+      def __init__(self, label_id, score, box):
+        self.label_id = label_id
+        self.score = score
+        self.bounding_box = np.array(box)
+
+    boxes, scores, labels = nms.FromCandidates(
+        [Candidate(3, 0.5, [[0.1, 0.2], [0.3, 0.4]])])
+    np.testing.assert_allclose([[0.1, 0.2, 0.3, 0.4]], boxes)
+    self.assertEqual([0.5], scores.tolist())
+    self.assertEqual([3], labels.tolist())
+    boxes, _, _ = nms.FromCandidates([])
+    self.assertEqual((0, 4), boxes.shape)
+
+
+if __name__ == '__main__':
+  unittest.main()
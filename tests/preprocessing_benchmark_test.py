@@ -0,0 +1,85 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from . import test_utils
+from edgetpu.benchmark import preprocessing
+import numpy as np
+from PIL import Image
+
+
+class PreprocessingBenchmarkTest(unittest.TestCase):
+
+  def testPreprocess(self):
+    image_path = test_utils.TestDataPath('cat.bmp')
+    for keep_aspect_ratio in (False, True):
+      tensor, durations = preprocessing.Preprocess(
+          image_path, (224, 160), Image.BILINEAR, keep_aspect_ratio)
+      self.assertEqual((224 * 160 * 3,), tensor.shape)
+      self.assertEqual(np.uint8, tensor.dtype)
+      self.assertEqual(set(preprocessing.STAGES), set(durations))
+      for duration in durations.values():
+        self.assertGreaterEqual(duration, 0)
+    # Source is wider than tall, so padding is added at the bottom.
+    with Image.open(image_path) as img:
+      self.assertGreater(img.size[0], img.size[1])
+    tensor, _ = preprocessing.Preprocess(image_path, (224, 224),
+                                         keep_aspect_ratio=True)
+    self.assertFalse(tensor.reshape(224, 224, 3)[-1].any())
+
+  def testInputSizes(self):
+    models = [
+        test_utils.TestDataPath('mobilenet_v2_1.0_224_quant.tflite'),
+        test_utils.TestDataPath('mobilenet_v2_1.0_224_quant_edgetpu.tflite')
+    ]
+    self.assertEqual({(224, 224): models}, preprocessing.InputSizes(models))
+
+  def testExpandMatrix(self):
+    cases = preprocessing.ExpandMatrix(
+        [(224, 224), (300, 300)], ['cat.bmp', 'owl.jpg'],
+        ['nearest', 'bicubic', 'lanczos'], [False, True], 1, 10)
+    self.assertEqual(2 * 2 * 3 * 2, len(cases))
+    for case in cases:
+      self.assertEqual(1, case.warmup)
+      self.assertEqual(10, case.iterations)
+
+  def testRunBenchmark(self):
+    model = test_utils.TestDataPath('mobilenet_v2_1.0_224_quant_edgetpu.tflite')
+    record = preprocessing.RunPreprocessingBenchmark(
+        preprocessing.PreprocessingCase(
+            test_utils.TestDataPath('cat.bmp'), (224, 224), 'bicubic',
+            warmup=0, iterations=3))
+    self.assertNotIn('error', record)
+    for stage in preprocessing.STAGES + ('total',):
+      self.assertGreater(record['%s_ms' % stage]['p50'], 0)
+    self.assertGreaterEqual(
+        record['total_ms']['max'] * 1.0001,
+        record['decode_ms']['min'] + record['resize_ms']['min'])
+
+    rows = preprocessing.ReportRows([record], {(224, 224): [model]},
+                                    {model: 2.0})
+    self.assertEqual(2, len(rows))
+    self.assertEqual('224x224', rows[1][1])
+    self.assertEqual('%.2f' % (record['total_ms']['p50'] / 2.0), rows[1][-1])
+    rows = preprocessing.ReportRows([record], {(224, 224): [model]}, {})
+    self.assertEqual('-', rows[1][2])
+
+    record = preprocessing.RunPreprocessingBenchmark(
+        preprocessing.PreprocessingCase('cat.bmp', (224, 224), 'unknown'))
+    self.assertIn('error', record)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,96 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+from edgetpu.benchmark import regression
+import numpy as np
+
+
+def _Latencies(rng, median, size=200):
+  # Right-skewed like real inference latencies.
+  return median + rng.gamma(2.0, median * 0.01, size) - median * 0.02
+
+
+def _Record(timestamp, latencies, model='a.tflite'):
+  return {'timestamp': timestamp, 'machine': 'x86_64',
+          'runtime_flavor': 'direct', 'runtime_version': 'v1',
+          'model': model, 'engine': 'basic', 'preprocessing': 'tensor',
+          'image': None, 'threads': 1, 'latencies_ms': list(latencies)}
+
+
+class RegressionTest(unittest.TestCase):
+
+  def testMannWhitneyU(self):
+    rng = np.random.RandomState(0)
+    a = _Latencies(rng, 10.0)
+    _, p_value = regression.MannWhitneyU(a, _Latencies(rng, 10.0))
+    self.assertGreater(p_value, 0.01)
+    _, p_value = regression.MannWhitneyU(a, _Latencies(rng, 11.0))
+    self.assertLess(p_value, 1e-6)
+    # All ties.
+    self.assertEqual(1.0, regression.MannWhitneyU([1.0] * 5, [1.0] * 5)[1])
+
+  def testCompare(self):
+    rng = np.random.RandomState(1)
+    baseline = _Latencies(rng, 10.0)
+    self.assertEqual(
+        regression.NO_CHANGE,
+        regression.Compare(baseline, _Latencies(rng, 10.0)).verdict)
+    slower = regression.Compare(baseline, _Latencies(rng, 12.0))
+    self.assertEqual(regression.REGRESSION, slower.verdict)
+    self.assertAlmostEqual(0.2, slower.change, delta=0.02)
+    self.assertLess(slower.ci_low, slower.change)
+    self.assertGreater(slower.ci_high, slower.change)
+    self.assertEqual(
+        regression.IMPROVEMENT,
+        regression.Compare(baseline, _Latencies(rng, 8.0)).verdict)
+    self.assertEqual(regression.INSUFFICIENT_DATA,
+                     regression.Compare(baseline, [10.0]).verdict)
+
+  def testDetectStepChange(self):
+    rng = np.random.RandomState(2)
+    self.assertIsNone(regression.DetectStepChange(rng.normal(10, 0.1, 12)))
+    series = np.concatenate((rng.normal(10, 0.1, 8), rng.normal(12, 0.1, 4)))
+    index, change, _ = regression.DetectStepChange(series)
+    self.assertEqual(8, index)
+    self.assertAlmostEqual(0.2, change, delta=0.02)
+
+  def testCheckHistory(self):
+    rng = np.random.RandomState(3)
+    with tempfile.TemporaryDirectory() as tmp:
+      store = regression.HistoryStore(os.path.join(tmp, 'history.sqlite'))
+      for i in range(6):
+        store.Add(_Record('2019-01-0%dT00:00:00' % (i + 1),
+                          _Latencies(rng, 10.0)))
+        store.Add(_Record('2019-01-0%dT00:00:00' % (i + 1),
+                          _Latencies(rng, 5.0), model='b.tflite'))
+      store.Add(_Record('2019-01-07T00:00:00', _Latencies(rng, 12.0)))
+      store.Add(_Record('2019-01-07T00:00:00', _Latencies(rng, 5.0),
+                        model='b.tflite'))
+      store.Add(_Record('2019-01-07T00:00:00', [], model='c.tflite'))
+      verdicts = {v.case[0]: v for v in regression.CheckHistory(store)}
+      store.Close()
+    self.assertEqual(['a.tflite', 'b.tflite'], sorted(verdicts))
+    self.assertEqual(regression.REGRESSION, verdicts['a.tflite'].verdict)
+    self.assertEqual(regression.NO_CHANGE, verdicts['b.tflite'].verdict)
+    table = regression.FormatVerdicts(list(verdicts.values()))
+    self.assertIn('REGRESSION', table)
+    self.assertEqual(3, len(table.splitlines()))
+
+
+if __name__ == '__main__':
+  unittest.main()
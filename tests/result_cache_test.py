@@ -0,0 +1,140 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from . import test_utils
+from edgetpu.classification.engine import ClassificationEngine
+from edgetpu.utils import result_cache
+import numpy as np
+
+
+class _Counter(object):
+
+  def __init__(self, delay=0.0):
+    self.calls = 0
+    self.delay = delay
+
+  def __call__(self, value):
+    self.calls += 1
+    time.sleep(self.delay)
+    return value * 2
+
+
+class ResultCacheTest(unittest.TestCase):
+
+  def testTensorKey(self):
+    a = np.arange(12, dtype=np.uint8)
+    key = result_cache.TensorKey('m', a, 0.1, 3)
+    self.assertEqual(key, result_cache.TensorKey('m', a.copy(), 0.1, 3))
+    # Same bytes, another shape.
+    self.assertNotEqual(key, result_cache.TensorKey('m', a.reshape(3, 4), 0.1,
+                                                    3))
+    b = a.copy()
+    b[5] += 1
+    self.assertNotEqual(key, result_cache.TensorKey('m', b, 0.1, 3))
+    self.assertNotEqual(key, result_cache.TensorKey('n', a, 0.1, 3))
+    self.assertNotEqual(key, result_cache.TensorKey('m', a, 0.1, 5))
+
+  def testHitsAndMisses(self):
+    cache = result_cache.ResultCache()
+    fn = _Counter()
+    self.assertEqual(2, cache.Run('a', fn, 1))
+    self.assertEqual(2, cache.Run('a', fn, 1))
+    self.assertEqual(4, cache.Run('b', fn, 2))
+    self.assertEqual(2, fn.calls)
+    stats = cache.GetStats()
+    self.assertEqual((1, 2, 0), (stats.hits, stats.misses, stats.coalesced))
+
+  def testLruEviction(self):
+    cache = result_cache.ResultCache(max_entries=2)
+    fn = _Counter()
+    cache.Run('a', fn, 1)
+    cache.Run('b', fn, 2)
+    cache.Run('a', fn, 1)  # 'b' is now the least recently used.
+    cache.Run('c', fn, 3)
+    self.assertEqual(2, len(cache))
+    self.assertEqual(1, cache.GetStats().evictions)
+    cache.Run('a', fn, 1)
+    self.assertEqual(3, fn.calls)
+    cache.Run('b', fn, 2)
+    self.assertEqual(4, fn.calls)
+
+  def testCoalescing(self):
+    cache = result_cache.ResultCache()
+    fn = _Counter(delay=0.1)
+    results = []
+
+    def Lookup():
+      results.append(cache.Run('a', fn, 21))
+
+    threads = [threading.Thread(target=Lookup) for _ in range(5)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual([42] * 5, results)
+    self.assertEqual(1, fn.calls)
+    stats = cache.GetStats()
+    self.assertEqual(1, stats.misses)
+    self.assertEqual(4, stats.coalesced)
+    self.assertAlmostEqual(0.8, stats.hit_ratio)
+
+  def testFailuresAreNotCached(self):
+    cache = result_cache.ResultCache()
+
+    def Fail():
+      raise RuntimeError('failed')
+
+    with self.assertRaises(RuntimeError):
+      cache.Run('a', Fail)
+    self.assertEqual(0, len(cache))
+    self.assertEqual(1, cache.Run('a', lambda: 1))
+
+  def testPersistence(self):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      path = os.path.join(tmp_dir, 'cache.pkl')
+      cache = result_cache.ResultCache(path=path)
+      key = result_cache.TensorKey('m', np.zeros(4, dtype=np.uint8), 3)
+      cache.Run(key, lambda: [(1, 0.5)])
+      cache.Save()
+      loaded = result_cache.ResultCache(path=path)
+      self.assertEqual([(1, 0.5)], loaded.Run(key, lambda: None))
+      self.assertEqual(1, loaded.GetStats().hits)
+    with self.assertRaises(ValueError):
+      result_cache.ResultCache().Save()
+
+  def testCachedClassifier(self):
+    model = test_utils.TestDataPath('mobilenet_v2_1.0_224_quant_edgetpu.tflite')
+    engine = ClassificationEngine(model)
+    cache = result_cache.ResultCache()
+    classifier = result_cache.CachedClassifier(engine, cache)
+    # Another engine of the same model shares the entries.
+    other = result_cache.CachedClassifier(ClassificationEngine(model), cache)
+    with test_utils.TestImage('cat.bmp') as img:
+      expected = engine.ClassifyWithImage(img, top_k=3)
+      self.assertEqual(expected, classifier.ClassifyWithImage(img, top_k=3))
+      self.assertEqual(expected, other.ClassifyWithImage(img, top_k=3))
+      classifier.ClassifyWithImage(img, top_k=1)
+    stats = cache.GetStats()
+    self.assertEqual(1, stats.hits)
+    self.assertEqual(2, stats.misses)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,154 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from . import test_utils
+from edgetpu.basic.basic_engine import BasicEngine
+from edgetpu.segmentation import engine
+from edgetpu.segmentation.engine import SegmentationEngine
+from edgetpu.utils import instrumentation
+import numpy as np
+from PIL import Image
+
+
+class _FakeSegmentationEngine(SegmentationEngine):
+  """SegmentationEngine with a 224x224 input returning fixed scores."""
+
+  def __init__(self, scores):
+    # A classification model provides the input tensor, outputs are faked.
+    BasicEngine.__init__(self, test_utils.TestDataPath(
+        'mobilenet_v2_1.0_224_quant_edgetpu.tflite'))
+    self._scores = np.asarray(scores, dtype=np.float32)
+    self._output_shape = self._scores.shape
+    self.input_tensors = []
+
+  def RunInference(self, input):  # pylint: disable=redefined-builtin
+    self.input_tensors.append(input)
+    return 1.0, self._scores.ravel().copy()
+
+
+class SegmentationEngineTest(unittest.TestCase):
+
+  def testOutputShape(self):
+    self.assertEqual((65, 65, 21),
+                     engine.OutputShape([1, 65, 65, 21], 65 * 65 * 21, None))
+    self.assertEqual((65, 65, 21),
+                     engine.OutputShape([65, 65, 21], 65 * 65 * 21, None))
+    self.assertEqual((513, 513, 1),
+                     engine.OutputShape([1, 513, 513], 513 * 513, None))
+    # Unknown shape, at the input resolution.
+    self.assertEqual((8, 6, 3), engine.OutputShape(None, 8 * 6 * 3, (8, 6)))
+    with self.assertRaises(ValueError):
+      engine.OutputShape([1, 1001], 1001, (224, 224))
+    with self.assertRaises(ValueError):
+      engine.OutputShape([2, 65, 65, 21], 2 * 65 * 65 * 21, None)
+    with self.assertRaises(ValueError):
+      engine.OutputShape(None, 1001, (224, 224))
+
+  def testLabelMap(self):
+    rng = np.random.RandomState(0)
+    scores = rng.randint(256, size=(4, 5, 21)).astype(np.float32) / 255
+    labels = engine.LabelMap(scores.ravel(), (4, 5, 21))
+    self.assertEqual(np.uint8, labels.dtype)
+    np.testing.assert_array_equal(np.argmax(scores, axis=2), labels)
+    # Models outputting labels.
+    labels = engine.LabelMap(np.array([0., 3., 20., 1.]), (2, 2, 1))
+    np.testing.assert_array_equal([[0, 3], [20, 1]], labels)
+    self.assertEqual(np.uint8, labels.dtype)
+    self.assertEqual(np.uint16, engine.LabelMap(np.zeros(2 * 300),
+                                                (1, 2, 300)).dtype)
+
+  def testUndoLetterbox(self):
+    label_map = np.zeros((4, 4), dtype=np.uint8)
+    label_map[:2, :] = 1  # Top half of the image.
+    label_map[2:, :] = 9  # Padding at the bottom.
+    # A 8x4 image letterboxed into 4x4 covers the top half.
+    restored = engine.UndoLetterbox(label_map, (1.0, 0.5), (8, 4))
+    self.assertEqual((4, 8), restored.shape)
+    self.assertTrue(np.all(restored == 1))
+    restored = engine.UndoLetterbox(label_map, (1.0, 1.0), (2, 2))
+    np.testing.assert_array_equal([[1, 1], [9, 9]], restored)
+
+  def testClassMasks(self):
+    label_map = np.array([[0, 2], [2, 5]], dtype=np.uint8)
+    classes, masks = engine.ClassMasks(label_map)
+    np.testing.assert_array_equal([0, 2, 5], classes)
+    self.assertEqual((3, 2, 2), masks.shape)
+    np.testing.assert_array_equal([[False, True], [True, False]], masks[1])
+    classes, masks = engine.ClassMasks(label_map, [5, 7])
+    np.testing.assert_array_equal([[False, False], [False, True]], masks[0])
+    self.assertFalse(masks[1].any())
+
+  def _TopBottomScores(self):
+    # 8x8 output, class 1 on the top half and class 2 on the bottom one.
+    scores = np.zeros((8, 8, 3), dtype=np.float32)
+    scores[:4, :, 1] = 1.0
+    scores[4:, :, 2] = 1.0
+    return scores
+
+  def testSegmentWithImage(self):
+    segmenter = _FakeSegmentationEngine(self._TopBottomScores())
+    segmenter.set_stage_timing(True)
+    img = Image.new('RGB', (448, 224), (255, 0, 0))
+    label_map = segmenter.SegmentWithImage(img)
+    self.assertEqual(np.uint8, label_map.dtype)
+    # Stretched input, the label map is resized to the image.
+    self.assertEqual((224, 448), label_map.shape)
+    self.assertTrue(np.all(label_map[:112] == 1))
+    self.assertTrue(np.all(label_map[112:] == 2))
+    self.assertEqual(224 * 224 * 3, segmenter.input_tensors[-1].size)
+    label_map = segmenter.SegmentWithImage(img, upsample=False)
+    self.assertEqual((8, 8), label_map.shape)
+    np.testing.assert_array_equal(
+        np.argmax(self._TopBottomScores(), axis=2), label_map)
+    self.assertEqual(
+        [instrumentation.RESIZE, instrumentation.TO_TENSOR,
+         instrumentation.POSTPROCESS, instrumentation.RESCALE],
+        list(segmenter.get_stage_histograms()))
+
+  def testSegmentWithImageKeepAspectRatio(self):
+    segmenter = _FakeSegmentationEngine(self._TopBottomScores())
+    # The image covers the top half of the input, the rest is padding.
+    img = Image.new('RGB', (448, 224), (255, 0, 0))
+    label_map = segmenter.SegmentWithImage(img, keep_aspect_ratio=True)
+    self.assertEqual((224, 448), label_map.shape)
+    self.assertTrue(np.all(label_map == 1))
+    input_tensor = segmenter.input_tensors[-1].reshape(224, 224, 3)
+    self.assertTrue(np.all(input_tensor[:112, :, 0] == 255))
+    self.assertTrue(np.all(input_tensor[112:] == 0))
+    # Without upsampling the padding is kept.
+    label_map = segmenter.SegmentWithImage(img, keep_aspect_ratio=True,
+                                           upsample=False)
+    self.assertEqual((8, 8), label_map.shape)
+    self.assertTrue(np.all(label_map[4:] == 2))
+
+  def testSegmentWithInputTensor(self):
+    scores = np.zeros((4, 6, 300), dtype=np.float32)
+    scores[:, :, 299] = 1.0
+    segmenter = _FakeSegmentationEngine(scores)
+    label_map = segmenter.SegmentWithInputTensor(
+        np.zeros(224 * 224 * 3, dtype=np.uint8))
+    self.assertEqual(np.uint16, label_map.dtype)
+    self.assertEqual((4, 6), label_map.shape)
+    self.assertTrue(np.all(label_map == 299))
+
+  def testRejectsClassificationModel(self):
+    with self.assertRaises(ValueError):
+      SegmentationEngine(
+          test_utils.TestDataPath('mobilenet_v2_1.0_224_quant_edgetpu.tflite'))
+
+
+if __name__ == '__main__':
+  unittest.main()
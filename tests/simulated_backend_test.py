@@ -0,0 +1,189 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from . import test_utils
+from edgetpu.basic import simulated_backend
+from edgetpu.basic import tflite_model
+import numpy as np
+
+
+def _ModelPath():
+  return test_utils.TestDataPath('mobilenet_v2_1.0_224_quant_edgetpu.tflite')
+
+
+class TfLiteModelTest(unittest.TestCase):
+
+  def testReadModel(self):
+    model = tflite_model.TfLiteModel(_ModelPath())
+    self.assertTrue(model.is_edgetpu_compiled())
+    self.assertEqual(1, len(model.inputs))
+    self.assertEqual([1, 224, 224, 3], model.inputs[0].shape.tolist())
+    self.assertEqual(np.uint8, model.inputs[0].dtype)
+    self.assertEqual([1, 1001], model.outputs[0].shape.tolist())
+    self.assertEqual(1001, model.outputs[0].size())
+    self.assertIsNotNone(model.outputs[0].scale)
+    self.assertIs(model.outputs[0],
+                  model.GetTensor('MobilenetV2/Predictions/Softmax'))
+
+  def testTensorData(self):
+    model = tflite_model.TfLiteModel(
+        test_utils.TestDataPath('mobilenet_v2_1.0_224_quant.tflite'))
+    self.assertFalse(model.is_edgetpu_compiled())
+    weights = [t for t in model.tensors
+               if model.GetTensorData(t) is not None]
+    self.assertTrue(weights)
+    for tensor in weights:
+      self.assertEqual(tuple(tensor.shape),
+                       model.GetTensorData(tensor).shape)
+    self.assertIsNone(model.GetTensorData(model.inputs[0]))
+
+  def testInvalidFile(self):
+    with tempfile.NamedTemporaryFile(suffix='.tflite') as f:
+      f.write(b'not a model')
+      f.flush()
+      with self.assertRaises(ValueError):
+        tflite_model.TfLiteModel(f.name)
+
+
+class SimulatedBackendTest(unittest.TestCase):
+
+  def setUp(self):
+    simulated_backend.Configure(
+        num_devices=2,
+        latency_model=simulated_backend.LatencyModel(
+            default_latency=20.0, switch_penalty=30.0))
+
+  def testEngineInterface(self):
+    engine = simulated_backend.BasicEngine(_ModelPath())
+    self.assertEqual([1, 224, 224, 3],
+                     engine.get_input_tensor_shape().tolist())
+    self.assertEqual(224 * 224 * 3, engine.required_input_array_size())
+    self.assertEqual([1001], engine.get_all_output_tensors_sizes().tolist())
+    self.assertEqual(1001, engine.total_output_array_size())
+    self.assertEqual(1, engine.get_num_of_output_tensors())
+    self.assertEqual(_ModelPath(), engine.model_path())
+    self.assertEqual('/dev/simulated_edgetpu/0', engine.device_path())
+    input_data = test_utils.GenerateRandomInput(1, 224 * 224 * 3)
+    latency, output = engine.RunInference(input_data)
+    # Cold inference: base latency and switch penalty.
+    self.assertEqual(50.0, latency)
+    self.assertEqual(50.0, engine.get_inference_time())
+    self.assertEqual(1001, output.size)
+    self.assertTrue(np.all((output >= 0) & (output < 1)))
+    # Deterministic for the same input.
+    latency, second_output = engine.RunInference(input_data)
+    self.assertEqual(20.0, latency)
+    np.testing.assert_array_equal(output, second_output)
+    np.testing.assert_array_equal(output, engine.get_raw_output())
+    with self.assertRaises(RuntimeError):
+      engine.RunInference(input_data[:10])
+    with self.assertRaises(RuntimeError):
+      engine.get_output_tensor_size(1)
+
+  def testDeviceAssignment(self):
+    engines = [simulated_backend.BasicEngine(_ModelPath()) for _ in range(2)]
+    self.assertEqual(
+        (), simulated_backend.ListEdgeTpuPaths(
+            simulated_backend.EdgeTpuState_kUnassigned))
+    with self.assertRaisesRegex(RuntimeError, 'Multiple Edge TPUs detected'):
+      simulated_backend.BasicEngine(_ModelPath())
+    with self.assertRaisesRegex(RuntimeError, 'does not map'):
+      simulated_backend.BasicEngine(_ModelPath(), 'invalid_path')
+    with self.assertRaisesRegex(RuntimeError, 'Could not open'):
+      simulated_backend.BasicEngine('invalid_model_path.tflite')
+    del engines
+    self.assertEqual(
+        2, len(simulated_backend.ListEdgeTpuPaths(
+            simulated_backend.EdgeTpuState_kUnassigned)))
+
+  def testParallelDevices(self):
+    model_path = _ModelPath()
+    input_data = np.array(test_utils.GenerateRandomInput(1, 224 * 224 * 3),
+                          dtype=np.uint8)
+
+    def Run(device_paths):
+      """Returns wall time, device (start, end) and latency of inferences."""
+      engines = [simulated_backend.BasicEngine(model_path, path)
+                 for path in device_paths]
+      for engine in engines:
+        engine.RunInference(input_data)
+      spans = [[] for _ in engines]
+      latencies = []
+
+      def Job(engine, engine_spans):
+        for _ in range(5):
+          latency, _ = engine.RunInference(input_data)
+          latencies.append(latency)
+          # The device time ends when the call returns, waiting for another
+          # engine of the same device comes before it.
+          end = time.perf_counter()
+          engine_spans.append((end - latency / 1000.0, end))
+
+      threads = [threading.Thread(target=Job, args=args)
+                 for args in zip(engines, spans)]
+      start = time.perf_counter()
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join()
+      return time.perf_counter() - start, spans, latencies
+
+    def Overlaps(spans, other_spans):
+      return any(start < other_end and other_start < end
+                 for start, end in spans
+                 for other_start, other_end in other_spans)
+
+    paths = simulated_backend.ListEdgeTpuPaths(
+        simulated_backend.EdgeTpuState_kNone)
+    # Engines sharing a device run one after the other.
+    shared, _, latencies = Run([paths[0], paths[0]])
+    self.assertGreaterEqual(shared, sum(latencies) / 1000.0)
+    # Engines on separate devices run at the same time.
+    _, spans, _ = Run(paths[:2])
+    self.assertTrue(Overlaps(spans[0], spans[1]))
+
+  def testLatencyModel(self):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      profile_path = os.path.join(tmp_dir, 'reference.csv')
+      with open(profile_path, 'w') as f:
+        f.write('MODEL IMAGE_NAME INFERENCE_TIME\n')
+        f.write('a.tflite cat.bmp 2.0\n')
+        f.write('a.tflite owl.jpg 4.0\n')
+      profile = simulated_backend.LoadProfile(profile_path)
+    self.assertEqual({'a.tflite': 3.0}, profile)
+    model = simulated_backend.LatencyModel(
+        default_latency=7.0, profile=profile, jitter=0.2, switch_penalty=1.0)
+    self.assertEqual(3.0, model.BaseLatency('/models/a.tflite'))
+    self.assertEqual(7.0, model.BaseLatency('b.tflite'))
+    samples = [model.Sample('a.tflite', False) for _ in range(1000)]
+    self.assertAlmostEqual(3.0, np.median(samples), delta=0.1)
+    self.assertAlmostEqual(0.2, np.std(np.log(samples)), delta=0.03)
+
+  def testImprintingEngine(self):
+    engine = simulated_backend.ImprintingEngine(_ModelPath())
+    with self.assertRaisesRegex(RuntimeError, 'without training'):
+      engine.SaveModel('unused.tflite')
+    data = [test_utils.GenerateRandomInput(1, 224 * 224 * 3)]
+    self.assertEqual(1001, engine.Train(data))
+    self.assertEqual(1002, engine.Train(data))
+
+
+if __name__ == '__main__':
+  unittest.main()
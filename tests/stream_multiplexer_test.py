@@ -0,0 +1,192 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+
+from . import test_utils
+from edgetpu.classification.engine import ClassificationEngine
+from edgetpu.utils import stream_multiplexer
+
+
+class StreamMultiplexerTest(unittest.TestCase):
+
+  def _RunStreams(self, weights, duration):
+    labels = test_utils.ReadLabelFile(
+        test_utils.TestDataPath('imagenet_labels.txt'))
+    engines = stream_multiplexer.CreateEngines(
+        ClassificationEngine,
+        test_utils.TestDataPath('mobilenet_v1_1.0_224_quant_edgetpu.tflite'),
+        max_engines=1)
+    results = []
+
+    def callback(name, frame_id, result, error):
+      self.assertIsNone(error)
+      results.append((name, frame_id, result))
+
+    mux = stream_multiplexer.StreamMultiplexer(engines, callback=callback)
+    for i, weight in enumerate(weights):
+      mux.AddStream('stream%d' % i, weight=weight)
+    with test_utils.TestImage('cat.bmp') as img:
+      img.load()
+      mux.Start()
+      # Keep every stream backlogged.
+      deadline = time.perf_counter() + duration
+      while time.perf_counter() < deadline:
+        for i in range(len(weights)):
+          mux.Submit('stream%d' % i, img)
+        time.sleep(0.001)
+      mux.Stop()
+    for _, _, result in results:
+      self.assertEqual(labels[result[0][0]], 'Egyptian cat')
+    return mux.GetStats()
+
+  def testWeightedShare(self):
+    stats = self._RunStreams([1.0, 3.0], duration=2.0)
+    slow, fast = stats['stream0'], stats['stream1']
+    self.assertGreater(slow.processed, 0)
+    ratio = fast.processed / slow.processed
+    self.assertGreater(ratio, 2.0)
+    self.assertLess(ratio, 4.0)
+    # Only latest frame is kept, the rest are dropped per stream.
+    self.assertGreater(slow.dropped, 0)
+    # Frames pending at Stop() are dropped too.
+    self.assertEqual(slow.submitted,
+                     slow.processed + slow.dropped + slow.errors)
+
+  def testTargetFps(self):
+    engines = stream_multiplexer.CreateEngines(
+        ClassificationEngine,
+        test_utils.TestDataPath('mobilenet_v1_1.0_224_quant_edgetpu.tflite'),
+        max_engines=1)
+    mux = stream_multiplexer.StreamMultiplexer(engines)
+    mux.AddStream('limited', target_fps=10)
+    mux.AddStream('free')
+    stop = threading.Event()
+    with test_utils.TestImage('cat.bmp') as img:
+      img.load()
+      mux.Start()
+
+      def feed():
+        while not stop.is_set():
+          mux.Submit('limited', img)
+          mux.Submit('free', img)
+          time.sleep(0.001)
+
+      feeder = threading.Thread(target=feed)
+      feeder.start()
+      time.sleep(2.0)
+      stop.set()
+      feeder.join()
+      mux.Stop()
+    stats = mux.GetStats()
+    self.assertLess(stats['limited'].achieved_fps, 11.0)
+    self.assertGreater(stats['free'].achieved_fps,
+                       stats['limited'].achieved_fps)
+    self.assertGreater(stats['free'].p99_latency, 0.0)
+
+  def testStopDiscardsPendingFrames(self):
+    results = []
+    mux = stream_multiplexer.StreamMultiplexer(
+        [object()], inference_fn=lambda engine, frame: frame,
+        callback=lambda name, frame_id, result, error: results.append(result))
+    mux.AddStream('a', max_queue_size=5)
+    for i in range(3):
+      mux.Submit('a', i)
+    mux.Stop()
+    self.assertEqual(0, mux.GetQueueDepth('a'))
+    stats = mux.GetStats()['a']
+    self.assertEqual((3, 0, 3), (stats.submitted, stats.processed,
+                                 stats.dropped))
+    # Old frames aren't processed after a restart.
+    mux.Start()
+    mux.Submit('a', 3)
+    deadline = time.perf_counter() + 5.0
+    while not results and time.perf_counter() < deadline:
+      time.sleep(0.01)
+    mux.Stop()
+    self.assertEqual([3], results)
+
+  def testErrors(self):
+    done = []
+
+    def Infer(engine, frame):
+      if frame == 'bad':
+        raise RuntimeError('inference failed')
+      return frame
+
+    def Callback(name, frame_id, result, error):
+      done.append((frame_id, result, error))
+      if frame_id == 0:
+        raise RuntimeError('callback failed')
+
+    mux = stream_multiplexer.StreamMultiplexer([object()], inference_fn=Infer,
+                                               callback=Callback)
+    mux.AddStream('a', max_queue_size=3)
+    mux.Start()
+    # The worker survives the failing callback of frame 0.
+    for frame in ('good', 'bad', 'good'):
+      mux.Submit('a', frame)
+    deadline = time.perf_counter() + 5.0
+    while len(done) < 3 and time.perf_counter() < deadline:
+      time.sleep(0.01)
+    mux.Stop()
+    self.assertEqual(3, len(done))
+    self.assertEqual((0, 'good', None), done[0])
+    self.assertIsNone(done[1][1])
+    self.assertIsInstance(done[1][2], RuntimeError)
+    self.assertEqual((2, 'good', None), done[2])
+    stats = mux.GetStats()['a']
+    self.assertEqual((2, 1), (stats.processed, stats.errors))
+
+  def testAchievedFpsAfterStop(self):
+
+    def Infer(engine, frame):
+      time.sleep(0.01)
+      return frame
+
+    mux = stream_multiplexer.StreamMultiplexer([object()], inference_fn=Infer)
+    mux.AddStream('a', max_queue_size=10)
+    for i in range(10):
+      mux.Submit('a', i)
+    mux.Start()
+    deadline = time.perf_counter() + 5.0
+    while mux.GetStats()['a'].processed < 10 and time.perf_counter() < deadline:
+      time.sleep(0.01)
+    mux.Stop()
+    fps = mux.GetStats()['a'].achieved_fps
+    self.assertGreater(fps, 0.0)
+    # At most one frame per 10 ms.
+    self.assertLess(fps, 101.0)
+    time.sleep(0.1)
+    self.assertEqual(fps, mux.GetStats()['a'].achieved_fps)
+
+  def testInvalidParams(self):
+    engines = stream_multiplexer.CreateEngines(
+        ClassificationEngine,
+        test_utils.TestDataPath('mobilenet_v1_1.0_224_quant_edgetpu.tflite'),
+        max_engines=1)
+    with self.assertRaises(ValueError):
+      stream_multiplexer.StreamMultiplexer([])
+    mux = stream_multiplexer.StreamMultiplexer(engines)
+    mux.AddStream('a')
+    with self.assertRaises(ValueError):
+      mux.AddStream('a')
+    with self.assertRaises(ValueError):
+      mux.AddStream('b', weight=0)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,128 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from . import test_utils
+from edgetpu.classification.engine import ClassificationEngine
+from edgetpu.utils import instrumentation
+from edgetpu.utils import tracing
+
+
+class TracingTest(unittest.TestCase):
+
+  def testDisabled(self):
+    tracer = tracing.Tracer()
+    recorder = tracer.Recorder('/dev/apex_0')
+    recorder.Record(instrumentation.INVOKE, instrumentation.Now())
+    with tracer.Span('decode'):
+      pass
+    self.assertEqual([], tracer.ToJson()['traceEvents'][1:])
+
+  def testEvents(self):
+    tracer = tracing.Tracer()
+    tracer.Enable()
+
+    def job(device):
+      recorder = tracer.Recorder(device)
+      start = recorder.Record(instrumentation.RESIZE, instrumentation.Now())
+      recorder.Record(instrumentation.INVOKE, start)
+      recorder.Add(instrumentation.DEVICE, 1000)
+
+    threads = [threading.Thread(target=job, args=(device,), name=device)
+               for device in ('/dev/apex_0', '/dev/apex_1')]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    with tracer.Span('decode', args={'frame': 1}):
+      pass
+    trace = tracer.ToJson()
+    events = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+    self.assertEqual(7, len(events))
+    processes = {e['args']['name']: e['pid'] for e in trace['traceEvents']
+                 if e['name'] == 'process_name'}
+    self.assertEqual({tracing.HOST, '/dev/apex_0', '/dev/apex_1'},
+                     set(processes))
+    invokes = [e for e in events if e['name'] == instrumentation.INVOKE]
+    self.assertEqual({processes['/dev/apex_0'], processes['/dev/apex_1']},
+                     {e['pid'] for e in invokes})
+    self.assertEqual('invoke', invokes[0]['cat'])
+    device_events = [e for e in events if e['name'] == instrumentation.DEVICE]
+    self.assertEqual([1.0, 1.0], [e['dur'] for e in device_events])
+    decode = [e for e in events if e['name'] == 'decode'][0]
+    self.assertEqual(processes[tracing.HOST], decode['pid'])
+    self.assertEqual({'frame': 1}, decode['args'])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      path = os.path.join(tmp_dir, 'trace.json')
+      tracer.Save(path)
+      with open(path) as f:
+        self.assertEqual(len(trace['traceEvents']),
+                         len(json.load(f)['traceEvents']))
+
+  def testSampling(self):
+    tracer = tracing.Tracer()
+    tracer.Enable(sample_rate=0.25, window=1.0)
+    origin = instrumentation.Now()
+    # Windows are [0, 1) s every 4 s from Enable().
+    for offset in (0.5, 1.5, 3.9, 4.2, 8.99):
+      tracer.AddEvent('e', 'test', origin + int(offset * 1e9), 1)
+    self.assertEqual(3, len([e for e in tracer.ToJson()['traceEvents']
+                             if e['ph'] == 'X']))
+    tracer.Clear()
+    self.assertEqual(1, len(tracer.ToJson()['traceEvents']))
+    with self.assertRaises(ValueError):
+      tracer.Enable(sample_rate=0)
+
+  def testMultiRecorder(self):
+    timing = instrumentation.StageRecorder()
+    tracer = tracing.Tracer()
+    tracer.Enable()
+    recorder = instrumentation.CombineRecorders(
+        timing, None, tracer.Recorder())
+    recorder.Record(instrumentation.POSTPROCESS, instrumentation.Now())
+    self.assertEqual(1, timing.total_count())
+    self.assertEqual(1, len([e for e in tracer.ToJson()['traceEvents']
+                             if e['ph'] == 'X']))
+    self.assertIs(timing, instrumentation.CombineRecorders(None, timing))
+    self.assertIsNone(instrumentation.CombineRecorders(None))
+
+  def testDeviceNestsInInvoke(self):
+    engine = ClassificationEngine(
+        test_utils.TestDataPath('mobilenet_v2_1.0_224_quant_edgetpu.tflite'))
+    tracer = tracing.Tracer()
+    engine.set_tracer(tracer)
+    engine.set_stage_timing(True)
+    tracer.Enable()
+    with test_utils.TestImage('cat.bmp') as img:
+      for _ in range(5):
+        engine.ClassifyWithImage(img)
+    events = [e for e in tracer.ToJson()['traceEvents'] if e['ph'] == 'X']
+    invokes = [e for e in events if e['name'] == instrumentation.INVOKE]
+    devices = [e for e in events if e['name'] == instrumentation.DEVICE]
+    self.assertEqual(5, len(invokes))
+    self.assertEqual(5, len(devices))
+    for invoke, device in zip(invokes, devices):
+      self.assertEqual(invoke['tid'], device['tid'])
+      self.assertGreaterEqual(device['ts'], invoke['ts'])
+      self.assertLessEqual(device['ts'] + device['dur'],
+                           invoke['ts'] + invoke['dur'] + 1e-3)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,172 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from edgetpu.utils import nms
+from edgetpu.utils import tracking
+import numpy as np
+from PIL import Image
+
+
+class _Candidate(object):
+
+  def __init__(self, label_id, score, box):
+    self.label_id = label_id
+    self.score = score
+    self.bounding_box = np.array(box).reshape(2, 2)
+
+
+def _Scene(frame):
+  """Two objects moving at constant speed, in relative coordinates."""
+  return np.array([
+      [0.1 + 0.004 * frame, 0.2, 0.3 + 0.004 * frame, 0.4],
+      [0.6 - 0.003 * frame, 0.5 + 0.002 * frame, 0.7 - 0.003 * frame,
+       0.7 + 0.002 * frame],
+  ])
+
+
+class _SceneEngine(object):
+  """Detects the objects of _Scene() at the current frame, with noise."""
+
+  def __init__(self, scene=_Scene):
+    self.scene = scene
+    self.frame = 0
+    self.calls = 0
+    self._rng = np.random.RandomState(0)
+
+  def DetectWithImage(self, img, threshold=0.1, top_k=3,
+                      keep_aspect_ratio=False, relative_coord=True):
+    del img, threshold, top_k, keep_aspect_ratio, relative_coord
+    self.calls += 1
+    return [_Candidate(label, 0.8, box + self._rng.normal(scale=0.003, size=4))
+            for label, box in enumerate(self.scene(self.frame))]
+
+
+class TrackerTest(unittest.TestCase):
+
+  def testMeasurementsRoundTrip(self):
+    boxes = np.array([[1., 2., 5., 10.], [0.1, 0.2, 0.3, 0.5]])
+    np.testing.assert_allclose(
+        tracking.MeasurementsToBoxes(tracking.BoxesToMeasurements(boxes)),
+        boxes)
+
+  def testConstantVelocity(self):
+    tracker = tracking.Tracker()
+    for frame in range(20):
+      tracker.Predict()
+      ids = tracker.Update(_Scene(frame)[:1], [0.9])
+      self.assertEqual([0], ids.tolist())
+    for frame in range(20, 25):
+      tracker.Predict()
+    np.testing.assert_allclose(_Scene(24)[:1], tracker.get_boxes(), atol=2e-3)
+    self.assertEqual(5, tracker.GetObjects()[0].frames_since_update)
+
+  def testConfidenceDropsWithoutUpdates(self):
+    tracker = tracking.Tracker()
+    tracker.Update(_Scene(0), [0.9, 0.8])
+    confidences = [tracker.get_confidences()]
+    for _ in range(3):
+      tracker.Predict()
+      confidences.append(tracker.get_confidences())
+    self.assertTrue(np.all(np.diff(confidences, axis=0) < 0))
+
+  def testAssociationIsPerLabel(self):
+    tracker = tracking.Tracker()
+    box = [[0.1, 0.1, 0.3, 0.3]]
+    self.assertEqual([0], tracker.Update(box, [0.9], [1]).tolist())
+    tracker.Predict()
+    self.assertEqual([1], tracker.Update(box, [0.9], [2]).tolist())
+    tracker.Predict()
+    self.assertEqual([1], tracker.Update(box, [0.9], [2]).tolist())
+    self.assertEqual([1], [obj.track_id for obj in tracker.GetObjects()])
+
+  def testMissedTracksAreDeleted(self):
+    tracker = tracking.Tracker(max_misses=1)
+    tracker.Update(_Scene(0), [0.9, 0.8])
+    tracker.Predict()
+    tracker.Update(_Scene(1)[:1], [0.9])
+    self.assertEqual(2, len(tracker))
+    tracker.Predict()
+    tracker.Update(_Scene(2)[:1], [0.9])
+    self.assertEqual([0], [obj.track_id for obj in tracker.GetObjects()])
+    self.assertEqual(2, tracker.get_num_created_tracks())
+
+  def testInvalidInput(self):
+    with self.assertRaises(ValueError):
+      tracking.Tracker().Update(_Scene(0), [0.9])
+    with self.assertRaises(ValueError):
+      tracking.Tracker(max_misses=-1)
+
+
+class TrackingDetectorTest(unittest.TestCase):
+
+  def _Run(self, detector, engine, num_frames):
+    image = Image.new('RGB', (640, 480))
+    matched = 0
+    track_ids = set()
+    for frame in range(num_frames):
+      engine.frame = frame
+      objects = detector.Process(image)
+      track_ids.update(obj.track_id for obj in objects)
+      boxes = np.array([obj.bounding_box.flatten() for obj in objects])
+      if len(boxes):
+        overlap = nms.PairwiseOverlap(engine.scene(frame), boxes)
+        matched += np.sum(overlap.max(axis=1) >= 0.5)
+    return float(matched) / (2 * num_frames), track_ids
+
+  def testFewerInvocationsWithStableIds(self):
+    engine = _SceneEngine()
+    detector = tracking.TrackingDetector(engine, keyframe_interval=4)
+    recall, track_ids = self._Run(detector, engine, 100)
+    self.assertEqual(25, engine.calls)
+    self.assertEqual(engine.calls, detector.GetStats().keyframes)
+    self.assertAlmostEqual(0.25, detector.GetStats().invocation_ratio)
+    self.assertGreaterEqual(recall, 0.99)
+    self.assertEqual({0, 1}, track_ids)
+
+  def testConfidenceTriggersKeyframes(self):
+    engine = _SceneEngine()
+    detector = tracking.TrackingDetector(engine, keyframe_interval=10,
+                                         min_confidence=0.95)
+    self._Run(detector, engine, 20)
+    stats = detector.GetStats()
+    self.assertGreater(stats.triggered_keyframes, 0)
+    self.assertEqual(engine.calls, stats.keyframes)
+
+  def testKeyframeIntervalOne(self):
+    engine = _SceneEngine()
+    detector = tracking.TrackingDetector(engine, keyframe_interval=1)
+    self._Run(detector, engine, 10)
+    self.assertEqual(10, engine.calls)
+
+  def testBoxesAreClipped(self):
+    engine = _SceneEngine(lambda frame: np.array([[0.7 + 0.05 * frame, 0.1,
+                                                   0.9 + 0.05 * frame, 0.3]]))
+    detector = tracking.TrackingDetector(engine, keyframe_interval=3,
+                                         min_confidence=0)
+    image = Image.new('RGB', (640, 480))
+    for frame in range(8):
+      engine.frame = frame
+      objects = detector.Process(image)
+    self.assertLessEqual(objects[0].bounding_box.max(), 1.0)
+    self.assertGreaterEqual(objects[0].bounding_box.min(), 0.0)
+
+  def testInvalidInterval(self):
+    with self.assertRaises(ValueError):
+      tracking.TrackingDetector(_SceneEngine(), keyframe_interval=0)
+
+
+if __name__ == '__main__':
+  unittest.main()
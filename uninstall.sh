@@ -83,6 +83,14 @@ if [[ -f "${LIBEDGETPU_DST}" ]]; then
   info "Done."
 fi
 
+# Runtime flavors.
+LIBEDGETPU_FLAVORS_DIR="/usr/lib/${HOST_GNU_TYPE}/edgetpu"
+if [[ -d "${LIBEDGETPU_FLAVORS_DIR}" ]]; then
+  info "Uninstalling Edge TPU runtime flavors [${LIBEDGETPU_FLAVORS_DIR}]..."
+  sudo rm -rf "${LIBEDGETPU_FLAVORS_DIR}"
+  info "Done."
+fi
+
 # Python API.
 if sudo python3 -m pip show edgetpu 1>/dev/null; then
   info "Uninstalling Edge TPU Python API..."